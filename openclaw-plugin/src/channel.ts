@@ -6,12 +6,14 @@ import {
 } from "openclaw/plugin-sdk";
 import { getBotCivRuntime } from "./runtime.js";
 import { botcivOutbound } from "./outbound.js";
+import type { WireProtocol } from "./protocol.js";
 
 export type BotCivAccountConfig = {
   enabled: boolean;
   serverUrl: string;
   agentId: number;
   token: string;
+  wireProtocol?: WireProtocol;
   dm?: {
     policy?: string;
     allowFrom?: Array<string | number>;
@@ -27,6 +29,7 @@ export type ResolvedBotCivAccount = {
   serverUrl: string;
   agentId: number;
   token: string;
+  wireProtocol: WireProtocol;
 };
 
 function resolveBotCivAccount(cfg: any, accountId?: string | null): ResolvedBotCivAccount {
@@ -40,6 +43,7 @@ function resolveBotCivAccount(cfg: any, accountId?: string | null): ResolvedBotC
     serverUrl: botcivCfg.serverUrl ?? "",
     agentId: botcivCfg.agentId ?? 1,
     token: botcivCfg.token ?? "",
+    wireProtocol: botcivCfg.wireProtocol === "msgpack" ? "msgpack" : "json",
   };
 }
 
@@ -115,6 +119,7 @@ export const botcivPlugin: ChannelPlugin<ResolvedBotCivAccount> = {
         serverUrl: account.serverUrl,
         agentId: account.agentId,
         token: account.token,
+        wireProtocol: account.wireProtocol,
         cfg: ctx.cfg,
         runtime: ctx.runtime,
         abortSignal: ctx.abortSignal,
@@ -9,11 +9,13 @@ import {
 import { getBotCivRuntime } from "./runtime.js";
 import { sendBotCivMessage } from "./send.js";
 import { setSharedWs } from "./connection.js";
+import { decodeFrame, encodeFrame, type WireProtocol } from "./protocol.js";
 
 export type MonitorBotCivOpts = {
   serverUrl: string;
   agentId: number;
   token: string;
+  wireProtocol?: WireProtocol;
   cfg: any;
   runtime: RuntimeEnv;
   abortSignal?: AbortSignal;
@@ -36,6 +38,8 @@ export async function monitorBotCivProvider(opts: MonitorBotCivOpts): Promise<vo
   let reconnectTimer: ReturnType<typeof setTimeout> | null = null;
   let pingTimer: ReturnType<typeof setInterval> | null = null;
   let lastSinceId = 0;
+  let lastSeq = 0;
+  let epoch = "";
   let aborted = false;
 
   function cleanup() {
@@ -51,9 +55,27 @@ export async function monitorBotCivProvider(opts: MonitorBotCivOpts): Promise<vo
 
   async function handleMessage(data: any) {
     try {
+      // 每条广播帧带 seq + epoch，重连时带上，服务端从环形缓冲补发；
+      // 服务端重启后 epoch 变了、seq 从头编号，要跟着重置，否则新 seq 全被当成旧的
+      if (typeof data.seq === "number") {
+        if (data.epoch && data.epoch !== epoch) {
+          epoch = data.epoch;
+          lastSeq = data.seq;
+        } else if (data.seq > lastSeq) {
+          lastSeq = data.seq;
+        }
+      }
       const msgType = data.type;
       if (msgType === "pong") return;
 
+      if (msgType === "replay_done") {
+        // gap：seq 补不上，服务端已按 since_id 从消息表补了聊天消息；以服务端当前 epoch / seq 为准
+        epoch = data.data?.epoch ?? epoch;
+        lastSeq = data.data?.seq ?? lastSeq;
+        if (data.data?.gap) logVerbose("botciv: replay gap, caught up from message history");
+        return;
+      }
+
       if (msgType === "new_message") {
         const msg = data.data;
         if (!msg) return;
@@ -190,7 +212,12 @@ export async function monitorBotCivProvider(opts: MonitorBotCivOpts): Promise<vo
   function connect() {
     if (aborted) return;
 
-    const url = lastSinceId > 0 ? `${wsUrl}&since_id=${lastSinceId}` : wsUrl;
+    // topics=chat 让补发也只含聊天消息；since_seq 覆盖不到时服务端按 since_id 查消息表
+    let url = `${wsUrl}&topics=chat`;
+    // msgpack：服务端支持时下行改为二进制帧，不支持时照常发 JSON 文本帧
+    if (opts.wireProtocol === "msgpack") url += "&proto=msgpack";
+    if (lastSeq > 0) url += `&since_seq=${lastSeq}&epoch=${encodeURIComponent(epoch)}`;
+    if (lastSinceId > 0) url += `&since_id=${lastSinceId}`;
     logVerbose(`botciv: connecting to ${opts.serverUrl}`);
 
     ws = new WebSocket(url);
@@ -199,18 +226,20 @@ export async function monitorBotCivProvider(opts: MonitorBotCivOpts): Promise<vo
       logVerbose("botciv: connected");
       runtime.log?.("botciv: WebSocket connected");
       setSharedWs(ws);
+      // 只处理 new_message，订阅 chat 主题，服务端不再推送状态/城市/市场事件
+      ws.send(encodeFrame(ws, { type: "subscribe", topics: ["chat"] }));
 
       if (pingTimer) clearInterval(pingTimer);
       pingTimer = setInterval(() => {
         if (ws?.readyState === 1) {
-          ws.send(JSON.stringify({ type: "pong" }));
+          ws.send(encodeFrame(ws, { type: "pong" }));
         }
       }, 25000);
     });
 
-    ws.on("message", (raw: any) => {
+    ws.on("message", (raw: any, isBinary: boolean) => {
       try {
-        const data = JSON.parse(raw.toString());
+        const data = decodeFrame(ws, raw, isBinary);
         handleMessage(data);
       } catch (err) {
         logVerbose(`botciv: parse error: ${String(err)}`);
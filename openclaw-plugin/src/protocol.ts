@@ -0,0 +1,58 @@
+// WebSocket frame encoding for botciv.
+// JSON text frames are the default. With wireProtocol "msgpack" the plugin asks
+// for ?proto=msgpack and the server answers with binary MessagePack frames whose
+// common field names are one- or two-letter codes. A server without msgpack keeps
+// sending text frames, so every frame is decoded by its type (text / binary).
+
+import { decode, encode } from "@msgpack/msgpack";
+
+export type WireProtocol = "json" | "msgpack";
+
+// Must match KEY_CODES in server/app/api/ws_protocol.py (existing codes never change).
+// An original key that equals a code or starts with "~" gets one extra "~".
+const KEY_CODES: Record<string, string> = {
+  type: "t", data: "d", seq: "s", id: "i", agent_id: "a", agent_name: "n",
+  sender_type: "st", message_type: "mt", content: "c", mentions: "m",
+  created_at: "ca", event: "e", timestamp: "ts", status: "su", activity: "ac",
+  agents: "as", topics: "tp", reason: "r", action: "x", replayed: "rp",
+  gap: "g", name: "nm", city: "cy", amount: "am", delta: "dt",
+  epoch: "ep",
+};
+const CODE_KEYS: Record<string, string> = Object.fromEntries(
+  Object.entries(KEY_CODES).map(([name, code]) => [code, name]),
+);
+const ESCAPE = "~";
+
+function shortKey(key: string): string {
+  if (Object.hasOwn(KEY_CODES, key)) return KEY_CODES[key];
+  if (Object.hasOwn(CODE_KEYS, key) || key.startsWith(ESCAPE)) return ESCAPE + key;
+  return key;
+}
+
+function longKey(key: string): string {
+  if (Object.hasOwn(CODE_KEYS, key)) return CODE_KEYS[key];
+  return key.startsWith(ESCAPE) ? key.slice(1) : key;
+}
+
+function mapKeys(obj: any, fn: (key: string) => string): any {
+  if (Array.isArray(obj)) return obj.map((v) => mapKeys(v, fn));
+  if (obj && typeof obj === "object" && !(obj instanceof Uint8Array)) {
+    const out: Record<string, any> = {};
+    for (const [k, v] of Object.entries(obj)) out[fn(k)] = mapKeys(v, fn);
+    return out;
+  }
+  return obj;
+}
+
+// Sockets on which the server has sent binary frames, i.e. agreed to msgpack
+const binarySockets = new WeakSet<object>();
+
+export function decodeFrame(ws: any, raw: any, isBinary: boolean): any {
+  if (!isBinary) return JSON.parse(raw.toString());
+  binarySockets.add(ws);
+  return mapKeys(decode(raw), longKey);
+}
+
+export function encodeFrame(ws: any, obj: Record<string, any>): string | Uint8Array {
+  return binarySockets.has(ws) ? encode(mapKeys(obj, shortKey)) : JSON.stringify(obj);
+}
@@ -1,3 +1,5 @@
+import { encodeFrame } from "./protocol.js";
+
 export async function sendBotCivMessage(
   ws: any,
   text: string,
@@ -5,7 +7,7 @@ export async function sendBotCivMessage(
   if (ws.readyState !== 1) {
     throw new Error("botciv: WebSocket not connected");
   }
-  ws.send(JSON.stringify({
+  ws.send(encodeFrame(ws, {
     type: "chat_message",
     content: text,
   }));
@@ -3,7 +3,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 import logging
 import secrets
-from ..core import get_db
+from ..core import get_read_db, write_queue
 from ..models import Agent
 from .schemas import AgentCreate, AgentUpdate, AgentOut, SoulPersonality
 
@@ -32,29 +32,33 @@ def _validate_personality_json(raw: dict | None) -> dict | None:
 
 
 @router.get("/", response_model=list[AgentOut])
-async def list_agents(db: AsyncSession = Depends(get_db)):
+async def list_agents(db: AsyncSession = Depends(get_read_db)):
     result = await db.execute(select(Agent).where(Agent.id != 0))
     return result.scalars().all()
 
 
 @router.post("/", response_model=AgentOut, status_code=201)
-async def create_agent(data: AgentCreate, db: AsyncSession = Depends(get_db)):
-    # 检查名称唯一性
-    existing = await db.execute(select(Agent).where(Agent.name == data.name))
-    if existing.scalar_one_or_none():
-        raise HTTPException(409, f"Agent name '{data.name}' already exists")
-
+async def create_agent(data: AgentCreate):
     validated_pj = _validate_personality_json(data.personality_json)
-    agent = Agent(name=data.name, persona=data.persona, model=data.model, avatar=data.avatar,
-                  bot_token=generate_bot_token(), personality_json=validated_pj)
-    db.add(agent)
-    await db.commit()
-    await db.refresh(agent)
-    return agent
+
+    async def work(db: AsyncSession) -> Agent:
+        # 检查名称唯一性
+        existing = await db.execute(select(Agent).where(Agent.name == data.name))
+        if existing.scalar_one_or_none():
+            raise HTTPException(409, f"Agent name '{data.name}' already exists")
+
+        agent = Agent(name=data.name, persona=data.persona, model=data.model, avatar=data.avatar,
+                      bot_token=generate_bot_token(), personality_json=validated_pj)
+        db.add(agent)
+        await db.flush()
+        await db.refresh(agent)
+        return agent
+
+    return await write_queue.submit(work)
 
 
 @router.get("/{agent_id}", response_model=AgentOut)
-async def get_agent(agent_id: int, db: AsyncSession = Depends(get_db)):
+async def get_agent(agent_id: int, db: AsyncSession = Depends(get_read_db)):
     agent = await db.get(Agent, agent_id)
     if not agent:
         raise HTTPException(404, "Agent not found")
@@ -62,59 +66,69 @@ async def get_agent(agent_id: int, db: AsyncSession = Depends(get_db)):
 
 
 @router.put("/{agent_id}", response_model=AgentOut)
-async def update_agent(agent_id: int, data: AgentUpdate, db: AsyncSession = Depends(get_db)):
-    agent = await db.get(Agent, agent_id)
-    if not agent:
-        raise HTTPException(404, "Agent not found")
-    if agent_id == 0:
-        raise HTTPException(403, "Cannot modify the Human agent")
-
+async def update_agent(agent_id: int, data: AgentUpdate):
     update_data = data.model_dump(exclude_unset=True)
 
-    # 如果改名，检查唯一性
-    if "name" in update_data and update_data["name"] != agent.name:
-        existing = await db.execute(select(Agent).where(Agent.name == update_data["name"]))
-        if existing.scalar_one_or_none():
-            raise HTTPException(409, f"Agent name '{update_data['name']}' already exists")
-
     # personality_json 校验
     if "personality_json" in update_data:
         update_data["personality_json"] = _validate_personality_json(update_data["personality_json"])
 
-    for field, value in update_data.items():
-        setattr(agent, field, value)
+    async def work(db: AsyncSession) -> Agent:
+        agent = await db.get(Agent, agent_id)
+        if not agent:
+            raise HTTPException(404, "Agent not found")
+        if agent_id == 0:
+            raise HTTPException(403, "Cannot modify the Human agent")
 
-    await db.commit()
-    await db.refresh(agent)
-    return agent
+        # 如果改名，检查唯一性
+        if "name" in update_data and update_data["name"] != agent.name:
+            existing = await db.execute(select(Agent).where(Agent.name == update_data["name"]))
+            if existing.scalar_one_or_none():
+                raise HTTPException(409, f"Agent name '{update_data['name']}' already exists")
+
+        for field, value in update_data.items():
+            setattr(agent, field, value)
+
+        await db.flush()
+        await db.refresh(agent)
+        return agent
+
+    return await write_queue.submit(work)
 
 
 @router.delete("/{agent_id}", status_code=204)
-async def delete_agent(agent_id: int, db: AsyncSession = Depends(get_db)):
+async def delete_agent(agent_id: int):
     if agent_id == 0:
         raise HTTPException(403, "Cannot delete the Human agent")
-    agent = await db.get(Agent, agent_id)
-    if not agent:
-        raise HTTPException(404, "Agent not found")
-    await db.delete(agent)
-    await db.commit()
+
+    async def work(db: AsyncSession) -> None:
+        agent = await db.get(Agent, agent_id)
+        if not agent:
+            raise HTTPException(404, "Agent not found")
+        await db.delete(agent)
+
+    await write_queue.submit(work)
 
 
 @router.post("/{agent_id}/regenerate-token", response_model=AgentOut)
-async def regenerate_token(agent_id: int, db: AsyncSession = Depends(get_db)):
+async def regenerate_token(agent_id: int):
     if agent_id == 0:
         raise HTTPException(403, "Human agent does not have a bot token")
-    agent = await db.get(Agent, agent_id)
-    if not agent:
-        raise HTTPException(404, "Agent not found")
-    agent.bot_token = generate_bot_token()
-    await db.commit()
-    await db.refresh(agent)
-    return agent
+
+    async def work(db: AsyncSession) -> Agent:
+        agent = await db.get(Agent, agent_id)
+        if not agent:
+            raise HTTPException(404, "Agent not found")
+        agent.bot_token = generate_bot_token()
+        await db.flush()
+        await db.refresh(agent)
+        return agent
+
+    return await write_queue.submit(work)
 
 
 @router.get("/{agent_id}/strategies")
-async def get_agent_strategies(agent_id: int, db: AsyncSession = Depends(get_db)):
+async def get_agent_strategies(agent_id: int, db: AsyncSession = Depends(get_read_db)):
     """获取 Agent 当前活跃策略（策略自动机观测接口）。"""
     agent = await db.get(Agent, agent_id)
     if not agent:
@@ -125,7 +139,7 @@ async def get_agent_strategies(agent_id: int, db: AsyncSession = Depends(get_db)
 
 
 @router.post("/{agent_id}/strategies")
-async def set_agent_strategies(agent_id: int, strategies: list[dict], db: AsyncSession = Depends(get_db)):
+async def set_agent_strategies(agent_id: int, strategies: list[dict], db: AsyncSession = Depends(get_read_db)):
     """设置 Agent 策略（全量替换）。"""
     agent = await db.get(Agent, agent_id)
     if not agent:
@@ -137,7 +151,7 @@ async def set_agent_strategies(agent_id: int, strategies: list[dict], db: AsyncS
 
 
 @router.delete("/{agent_id}/strategies")
-async def clear_agent_strategies(agent_id: int, db: AsyncSession = Depends(get_db)):
+async def clear_agent_strategies(agent_id: int, db: AsyncSession = Depends(get_read_db)):
     """清空 Agent 所有策略。"""
     agent = await db.get(Agent, agent_id)
     if not agent:
@@ -1,21 +1,31 @@
-import re
-import json
 import asyncio
 import logging
 from datetime import datetime
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, func as sa_func
 from sqlalchemy.orm import joinedload
-from ..core import get_db, async_session
+from ..core import get_db, get_read_db, async_session, async_read_session, write_queue
+from ..core.config import settings
+from ..core.event_bus import event_bus
 from ..models import Message, Agent, MemoryReference
-from ..services.wakeup_service import WakeupService
+from ..services.wakeup_service import WakeupService, get_recent_messages
 from ..services.agent_runner import runner_manager
 from ..services.economy_service import economy_service
 from ..services.memory_service import memory_service
+from ..services.write_behind import write_behind
+from ..services.archive_service import archive_service
+from ..services.message_ingest import message_ingestor
+from ..services.agent_directory import agent_directory
+from ..services.llm_gateway import llm_gateway
+from ..services.reply_stream import open_stream
 from ..models import MemoryType
 from .schemas import MessageOut
-from openai import AsyncOpenAI
+from .ws_protocol import JSON_CODEC, WireCodec, decode_frame, negotiate
+from .ws_sender import ConnectionSender, coalesce_key
+from .ws_topics import TOPIC_ALL, TopicIndex, event_topics, parse_topics
+from .event_log import EventLog
+from .ws_heartbeat import HeartbeatWheel
 
 logger = logging.getLogger(__name__)
 router = APIRouter(tags=["chat"])
@@ -23,20 +33,26 @@ router = APIRouter(tags=["chat"])
 # prevent fire-and-forget tasks from being GC'd
 _background_tasks: set[asyncio.Task] = set()
 
-# 连接池：人类支持多标签页，Bot 同一 agent_id 只允许一个
+# 连接池（本 worker 持有的 socket）：人类支持多标签页，Bot 同一 agent_id 只允许一个。
+# 跨 worker 的在线状态看 event_bus.presence
 human_connections: dict[int, list[WebSocket]] = {}  # {0: [ws1, ws2, ...]}
 bot_connections: dict[int, WebSocket] = {}  # {agent_id: ws}
-
-# 心跳间隔（秒）
-HEARTBEAT_INTERVAL = 30
+# 已登记到 presence 的连接 → (agent_id, conn_type)，保证 join/leave 一一对应
+_registered: dict[WebSocket, tuple[int, str]] = {}
+# 每个连接的发送队列 + 写任务（broadcast 只入队）
+_senders: dict[WebSocket, ConnectionSender] = {}
+# 主题订阅索引（broadcast 只投递给订阅了相关主题的连接）
+topic_index = TopicIndex()
+# 带 seq 的最近广播帧，断线重连时补发
+event_log = EventLog(settings.ws_replay_buffer_size, event_bus.epoch)
 
 # 唤醒服务单例
 wakeup_service = WakeupService()
 
-# M2-4: 每 agent 回复计数器，每 EXTRACT_EVERY 条触发记忆提取
+# M2-4: 每 agent 回复计数器，每 EXTRACT_EVERY 条触发记忆提取（多 worker 共享）
 # 注意：仅在 bot 不在线（服务端 fallback 生成回复）时触发，bot 在线时由 bot 自行处理记忆
 EXTRACT_EVERY = 5
-_agent_reply_counts: dict[int, int] = {}
+_agent_reply_counts = event_bus.counters("agent_reply_counts")
 
 # M6.2-P1: LLM 记忆摘要
 MEMORY_SUMMARY_TIMEOUT = 15  # 秒
@@ -60,32 +76,30 @@ def _truncation_fallback(conversation: str) -> str:
     return f"对话摘要: {conversation[:200]}"
 
 
-async def _call_llm_provider(provider, prompt: str) -> str:
-    """调用单个 LLM provider，返回文本结果"""
-    async with AsyncOpenAI(
-        api_key=provider.get_auth_token(),
-        base_url=provider.get_base_url(),
-    ) as client:
-        response = await client.chat.completions.create(
-            model=provider.model_id,
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=200,  # 100 字 ≈ 150~200 token
-        )
-        if not response.choices:
-            return ""
-        content = response.choices[0].message.content or ""
-        return content.strip()
+async def _call_llm_provider(provider, prompt: str, deadline: float | None = None) -> str:
+    """调用单个 LLM provider，返回文本结果（超过 deadline 抛 TimeoutError，并记该供应商一次失败）"""
+    response = await llm_gateway.chat(
+        provider,
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=200,  # 100 字 ≈ 150~200 token
+        deadline=deadline,
+        repick=False,  # 供应商的 fallback 由 _llm_summarize 按健康度排序逐个试
+    )
+    if not response.choices:
+        return ""
+    content = response.choices[0].message.content or ""
+    return content.strip()
 
 
 async def _llm_summarize(conversation: str) -> str | None:
     """
     调用 LLM 生成对话摘要，带 fallback 链：
-    1. memory-summary-model 主供应商
-    2. memory-summary-model 备用供应商
-    3. 截断拼接兜底
+    1. memory-summary-model 的各供应商，按健康度排序（首选在前，熔断中的垫底）
+    2. 截断拼接兜底
     返回 None 表示"无有效记忆"，调用方跳过保存。
     """
     from ..core.config import MODEL_REGISTRY
+    from ..core.provider_health import provider_health
 
     prompt = MEMORY_SUMMARY_PROMPT.format(conversation=conversation)
 
@@ -94,14 +108,10 @@ async def _llm_summarize(conversation: str) -> str | None:
         logger.warning("memory-summary-model not in MODEL_REGISTRY, using truncation fallback")
         return _truncation_fallback(conversation)
 
-    for i, provider in enumerate(entry.providers):
-        if not provider.is_available():
-            continue
+    # 按健康度排序：最健康的先试，熔断中的垫底
+    for i, provider in enumerate(provider_health.rank(entry.providers)):
         try:
-            summary = await asyncio.wait_for(
-                _call_llm_provider(provider, prompt),
-                timeout=MEMORY_SUMMARY_TIMEOUT,
-            )
+            summary = await _call_llm_provider(provider, prompt, deadline=MEMORY_SUMMARY_TIMEOUT)
             if summary and len(summary.strip()) >= 5:
                 cleaned = summary.strip()
                 if "无有效记忆" in cleaned:
@@ -133,8 +143,7 @@ async def _llm_summarize(conversation: str) -> str | None:
 
 async def _extract_memory(agent_id: int, recent_messages: list[dict]):
     """每 EXTRACT_EVERY 轮对话自动摘要为短期记忆"""
-    count = _agent_reply_counts.get(agent_id, 0) + 1
-    _agent_reply_counts[agent_id] = count
+    count = _agent_reply_counts.incr(agent_id)
     if count % EXTRACT_EVERY != 0:
         return
     if len(recent_messages) < EXTRACT_EVERY:
@@ -154,30 +163,73 @@ async def _extract_memory(agent_id: int, recent_messages: list[dict]):
         logger.warning("Memory extraction failed for agent %d: %s", agent_id, e)
 
 
+def reply_unit_of_work(
+    agent_id: int, agent_name: str, reply: str,
+    usage_info: dict | None, used_memory_ids: list[int] | None = None,
+    draft_id: str | None = None, outbox: list[dict] | None = None,
+):
+    """构造 Agent 回复的写入闭包（消息 + 扣额度 + 用量 + 记忆引用），交给 write_queue 统一提交
+
+    outbox：new_message 帧放进这里，由调用方在提交成功后广播
+    """
+    async def work(db: AsyncSession):
+        msg = await send_agent_message(agent_id, agent_name, reply, db, draft_id=draft_id, outbox=outbox)
+        await economy_service.deduct_quota(agent_id, db)
+        if usage_info:
+            from ..models.tables import LLMUsage
+            record = LLMUsage(
+                model=usage_info["model"],
+                agent_id=usage_info["agent_id"],
+                prompt_tokens=usage_info["prompt_tokens"],
+                completion_tokens=usage_info["completion_tokens"],
+                total_tokens=usage_info["total_tokens"],
+                latency_ms=usage_info["latency_ms"],
+            )
+            db.add(record)
+        # 写入记忆引用
+        if used_memory_ids and msg:
+            for mid in used_memory_ids:
+                db.add(MemoryReference(message_id=msg.id, memory_id=mid))
+        return msg
+    return work
+
+
+async def submit_reply(
+    agent_id: int, agent_name: str, reply: str,
+    usage_info: dict | None, used_memory_ids: list[int] | None = None,
+    draft_id: str | None = None,
+):
+    """提交 Agent 回复。写后缓冲运行时，用量和记忆引用改由缓冲批量落盘，不占回复事务。
+
+    draft_id：流式生成时的草稿 id，随 new_message 广播，客户端用它替换草稿。
+    new_message 在所在批次提交后才广播，回滚的回复不会被客户端看到。
+    """
+    buffered = write_behind.running
+    outbox: list[dict] = []
+    msg = await write_queue.submit(reply_unit_of_work(
+        agent_id, agent_name, reply,
+        None if buffered else usage_info,
+        None if buffered else used_memory_ids,
+        draft_id, outbox,
+    ))
+    for frame in outbox:
+        await broadcast(frame)
+    if buffered:
+        if usage_info:
+            write_behind.record_llm_usage(usage_info)
+        if used_memory_ids and msg:
+            write_behind.record_memory_refs(msg.id, used_memory_ids)
+    return msg
+
+
 async def delayed_send(agent_info: dict, reply: str, usage_info: dict | None, delay: float, used_memory_ids: list[int] | None = None):
     """延迟发送 Agent 回复（batch 模式下错开广播时间）"""
     await asyncio.sleep(delay)
     history = list(agent_info["history"])  # 防御性拷贝
     try:
-        async with async_session() as db:
-            msg = await send_agent_message(agent_info["agent_id"], agent_info["agent_name"], reply, db)
-            await economy_service.deduct_quota(agent_info["agent_id"], db)
-            if usage_info:
-                from ..models.tables import LLMUsage
-                record = LLMUsage(
-                    model=usage_info["model"],
-                    agent_id=usage_info["agent_id"],
-                    prompt_tokens=usage_info["prompt_tokens"],
-                    completion_tokens=usage_info["completion_tokens"],
-                    total_tokens=usage_info["total_tokens"],
-                    latency_ms=usage_info["latency_ms"],
-                )
-                db.add(record)
-            # 写入记忆引用
-            if used_memory_ids and msg:
-                for mid in used_memory_ids:
-                    db.add(MemoryReference(message_id=msg.id, memory_id=mid))
-            await db.commit()
+        await submit_reply(
+            agent_info["agent_id"], agent_info["agent_name"], reply, usage_info, used_memory_ids,
+        )
 
         # 记忆提取（fire-and-forget，不阻塞消息发送）
         history.append({"name": agent_info["agent_name"], "content": reply})
@@ -191,17 +243,15 @@ async def delayed_send(agent_info: dict, reply: str, usage_info: dict | None, de
         logger.error("Delayed send failed for agent %s: %s", agent_info["agent_name"], e, exc_info=True)
 
 
-def parse_mentions(content: str, agent_names: dict[str, int]) -> list[int]:
-    """解析 @提及，返回被提及的 agent_id 列表"""
-    pattern = r'@([\w\u4e00-\u9fff]+)'
-    matches = re.findall(pattern, content)
-    return [agent_names[name] for name in matches if name in agent_names]
+def parse_mentions(content: str) -> list[int]:
+    """解析 @提及，返回被提及的 agent_id 列表（调用前先 await agent_directory.ensure_loaded）"""
+    return agent_directory.parse_mentions(content)
 
 
 async def get_agent_name_map(db: AsyncSession) -> dict[str, int]:
-    """获取 {agent_name: agent_id} 映射"""
-    result = await db.execute(select(Agent.name, Agent.id))
-    return {name: aid for name, aid in result.all()}
+    """获取 {agent_name: agent_id} 映射（进程内名录，只在失效后查 DB）"""
+    await agent_directory.ensure_loaded(db)
+    return agent_directory.name_map()
 
 
 def _all_connections() -> list[tuple[int, WebSocket]]:
@@ -215,24 +265,147 @@ def _all_connections() -> list[tuple[int, WebSocket]]:
     return conns
 
 
-async def broadcast(data: dict):
-    """广播消息给所有在线连接（human + bot）"""
-    text = json.dumps(data, ensure_ascii=False)
-    for aid, ws in _all_connections():
+def _register_connection(aid: int, ws: WebSocket, conn_type: str, codec: WireCodec = JSON_CODEC):
+    """登记连接：连接池 + 发送队列（按协商的编码）+ 默认订阅全部主题"""
+    if conn_type == "bot":
+        bot_connections[aid] = ws
+    else:
+        human_connections.setdefault(aid, []).append(ws)
+    _sender_for(aid, ws, codec)
+    topic_index.add(ws)
+    heartbeat.add(ws)
+    _registered[ws] = (aid, conn_type)
+    event_bus.presence.join(aid, conn_type)
+
+
+def _remove_connection(aid: int, ws: WebSocket):
+    """从连接池移除一个连接（发送失败 / 队列溢出断开 / 正常断开）"""
+    topic_index.remove(ws)
+    heartbeat.remove(ws)
+    entry = _registered.pop(ws, None)
+    if entry is not None:
+        event_bus.presence.leave(*entry)
+    if aid in human_connections:
         try:
-            await ws.send_text(text)
-        except Exception as e:
-            logger.warning("broadcast send failed for agent_id=%s: %s", aid, e)
-            # 清理失败的连接
-            if aid in human_connections:
-                try:
-                    human_connections[aid].remove(ws)
-                except ValueError:
-                    pass
-                if not human_connections[aid]:
-                    human_connections.pop(aid, None)
-            elif aid in bot_connections and bot_connections[aid] is ws:
-                bot_connections.pop(aid, None)
+            human_connections[aid].remove(ws)
+        except ValueError:
+            pass
+        if not human_connections[aid]:
+            human_connections.pop(aid, None)
+    elif bot_connections.get(aid) is ws:
+        bot_connections.pop(aid, None)
+
+
+def _sender_for(aid: int, ws: WebSocket, codec: WireCodec = JSON_CODEC) -> ConnectionSender:
+    sender = _senders.get(ws)
+    if sender is None:
+        def _on_failed(s: ConnectionSender):
+            _senders.pop(ws, None)
+            _remove_connection(aid, ws)
+
+        sender = ConnectionSender(
+            ws,
+            maxsize=settings.ws_send_queue_size,
+            policy=settings.ws_overflow_policy,
+            on_failed=_on_failed,
+            label=f"agent_id={aid}",
+            codec=codec,
+        )
+        _senders[ws] = sender
+    return sender
+
+
+async def broadcast(data: dict):
+    """广播消息给所有在线连接（human + bot）。
+
+    每种编码只编码一次并放入订阅了相关主题的连接的发送队列，不等待实际发送，耗时与慢客户端无关。
+    事件总线分配 seq 并转给其他 worker，本 worker 的连接立即投递。
+    """
+    await deliver(data, await event_bus.publish(data))
+
+
+async def deliver(data: dict, seq: int):
+    """把一帧投递给本 worker 的连接（本地广播，或事件总线转来的其他 worker 的事件）。
+
+    每帧记入 event_log（即使当前无人订阅，重连的客户端也要补发）。
+    """
+    event = event_log.append(data, seq)
+    targets = topic_index.subscribers(event_topics(data))
+    if not targets:
+        return
+    key = coalesce_key(data)
+    for ws in targets:
+        sender = _senders.get(ws)
+        if sender is not None:
+            sender.enqueue(event.frame_for(sender.codec), key)
+
+
+def deliver_local(data: dict):
+    """只投递给本 worker 的连接：不分配 seq、不记 event_log、不经事件总线。
+
+    用于流式草稿这类高频、丢了也无妨的临时帧（最终结果另有正式广播），不挤占补发缓冲。
+    """
+    targets = topic_index.subscribers(event_topics(data))
+    if not targets:
+        return
+    event = EventLog.transient(data)
+    for ws in targets:
+        sender = _senders.get(ws)
+        if sender is not None:
+            sender.enqueue(event.frame_for(sender.codec))
+
+
+def _wants(ws: WebSocket, data: dict) -> bool:
+    topics = topic_index.topics_of(ws)
+    return TOPIC_ALL in topics or bool(topics & event_topics(data))
+
+
+def _replay(ws: WebSocket, since_seq: int | None, since_id: int | None, missed: list[MessageOut] | None):
+    """把断线期间的帧放进发送队列，最后发一帧 replay_done。
+
+    必须在登记连接后同步调用（中间不能 await），补发帧才会排在所有实时帧之前且不重复。
+    missed 为 None 表示 event_log 覆盖了 since_seq，直接按 seq 补发；
+    否则先补 messages 表里的聊天消息，再补查询之后才广播、已在缓冲里的消息。
+    """
+    sender = _senders[ws]
+    codec = sender.codec
+    if missed is None:
+        events = [e for e in event_log.since(since_seq) if _wants(ws, e.data)]
+        frames = [e.frame_for(codec) for e in events]
+    else:
+        frames = []
+        if _wants(ws, {"type": "new_message", "data": {}}):
+            frames = [codec.encode({"type": "new_message", "data": m.model_dump()}) for m in missed]
+            last_id = missed[-1].id if missed else (since_id or 0)
+            frames += [e.frame_for(codec) for e in event_log.messages_after(last_id)]
+    for frame in frames:
+        sender.enqueue(frame)
+    sender.enqueue(codec.encode({
+        "type": "replay_done",
+        "data": {
+            "seq": event_log.last_seq,
+            "epoch": event_log.epoch,
+            "replayed": len(frames),
+            "gap": missed is not None and since_seq is not None,
+        },
+    }))
+
+
+async def _handle_subscription(ws: WebSocket, payload: dict):
+    """处理 subscribe / unsubscribe 帧，回一帧当前订阅"""
+    try:
+        topics = parse_topics(payload.get("topics"))
+    except ValueError as e:
+        reply = {"type": "error", "data": {"reason": str(e)}}
+    else:
+        if payload["type"] == "subscribe":
+            topic_index.replace(ws, topics)
+        else:
+            topic_index.unsubscribe(ws, topics)
+        reply = {"type": "subscribed", "data": {"topics": sorted(topic_index.topics_of(ws))}}
+    sender = _senders.get(ws)
+    if sender is not None:
+        sender.enqueue(sender.codec.encode(reply))
 
 
 async def broadcast_system_event(event: str, agent_id: int, agent_name: str):
@@ -248,10 +421,16 @@ async def broadcast_system_event(event: str, agent_id: int, agent_name: str):
     })
 
 
-async def send_agent_message(agent_id: int, agent_name: str, content: str, db: AsyncSession):
-    """Agent 发送消息（持久化 + 广播），调用方负责 commit"""
-    name_map = await get_agent_name_map(db)
-    mentions = parse_mentions(content, name_map)
+async def send_agent_message(
+    agent_id: int, agent_name: str, content: str, db: AsyncSession,
+    draft_id: str | None = None, outbox: list[dict] | None = None,
+):
+    """Agent 发送消息（持久化 + 广播），调用方负责 commit
+
+    传了 outbox 时不立即广播，new_message 帧追加进 outbox，由调用方 commit 之后再发。
+    """
+    await agent_directory.ensure_loaded(db)
+    mentions = parse_mentions(content)
     msg = Message(
         agent_id=agent_id,
         sender_type="agent",
@@ -263,138 +442,142 @@ async def send_agent_message(agent_id: int, agent_name: str, content: str, db: A
     await db.flush()
     await db.refresh(msg)
 
-    await broadcast({
-        "type": "new_message",
-        "data": {
-            "id": msg.id,
-            "agent_id": agent_id,
-            "agent_name": agent_name,
-            "sender_type": "agent",
-            "message_type": "chat",
-            "content": content,
-            "mentions": mentions,
-            "created_at": str(msg.created_at),
-        }
-    })
+    data = {
+        "id": msg.id,
+        "agent_id": agent_id,
+        "agent_name": agent_name,
+        "sender_type": "agent",
+        "message_type": "chat",
+        "content": content,
+        "mentions": mentions,
+        "created_at": str(msg.created_at),
+    }
+    if draft_id:
+        data["draft_id"] = draft_id
+    frame = {"type": "new_message", "data": data}
+    if outbox is not None:
+        outbox.append(frame)
+    else:
+        await broadcast(frame)
     return msg
 
 
 async def handle_wakeup(message: Message):
     """异步唤醒处理：选人 → 如果 Bot 在线则跳过，否则 fallback 生成回复"""
+    await handle_wakeup_batch([message])
+
+
+async def handle_wakeup_batch(messages: list[Message]):
+    """一批入站消息一起唤醒：整批做一次选人，每个被唤醒的 agent 只基于最新历史回复一次"""
     try:
-        # 第一阶段：读取数据（短时间持有数据库会话）
-        wake_list = []
-        agents_to_reply = []
+        await run_wakeup_replies(await decide_wakeup(messages))
+    except Exception as e:
+        logger.error("Wakeup handling failed: %s", e, exc_info=True)
 
-        async with async_session() as db:
-            online_ids = set(human_connections.keys()) | set(bot_connections.keys())
-            logger.debug("Wakeup: online_ids=%s", online_ids)
-            wake_list = await wakeup_service.process(message, online_ids, db)
-            logger.debug("Wakeup: wake_list=%s", wake_list)
-
-            if not wake_list:
-                return
-
-            for agent_id in wake_list:
-                # Bot 在线 → 跳过，Bot 自己会处理
-                if agent_id in bot_connections:
-                    logger.info("Agent %d has bot online, skipping server-side reply", agent_id)
-                    continue
-
-                # Bot 不在线 → fallback 到服务端驱动
-                agent = await db.get(Agent, agent_id)
-                if not agent:
-                    logger.warning("Wakeup: agent %d not found in db", agent_id)
-                    continue
-
-                # 经济预检查
-                can_speak = await economy_service.check_quota(agent_id, "chat", db)
-                if not can_speak.allowed:
-                    logger.debug("Wakeup: agent %d quota denied: %s", agent_id, can_speak.reason)
-                    continue
-
-                logger.debug("Wakeup: generating reply for agent %d (%s)", agent_id, agent.name)
-
-                # 构建聊天历史给 runner
-                recent = await db.execute(
-                    select(Message)
-                    .options(joinedload(Message.agent))
-                    .order_by(Message.created_at.desc())
-                    .limit(10)
-                )
-                history = [
-                    {
-                        "name": m.agent.name if m.agent else "unknown",
-                        "content": m.content,
-                    }
-                    for m in reversed(recent.scalars().all())
-                ]
-
-                agents_to_reply.append({
-                    "agent_id": agent.id,
-                    "agent_name": agent.name,
-                    "persona": agent.persona,
-                    "model": agent.model,
-                    "personality_json": agent.personality_json,
-                    "history": history,
-                })
-        # 数据库会话已关闭，释放锁
-
-        # 第二阶段：LLM 调用（记忆注入需要短暂 db 访问）
-        for agent_info in agents_to_reply:
-            runner = runner_manager.get_or_create(
-                agent_info["agent_id"],
-                agent_info["agent_name"],
-                agent_info["persona"],
-                agent_info["model"],
-                agent_info.get("personality_json"),
-            )
+
+async def decide_wakeup(messages: list[Message]) -> list[dict]:
+    """第一阶段：选人 + 预检查，返回需要服务端生成回复的 agent 信息。
+
+    这一阶段不写库、不发消息（只动唤醒计数器），被新消息打断时可以直接取消。
+    """
+    agents_to_reply = []
+
+    # 读取数据（短时间持有数据库会话）
+    async with async_session() as db:
+        online_ids = event_bus.presence.online_ids()
+        logger.debug("Wakeup: online_ids=%s", online_ids)
+        wake_list = await wakeup_service.process(messages, online_ids, db)
+        logger.debug("Wakeup: wake_list=%s", wake_list)
+
+        for agent_id in wake_list:
+            # Bot 在线 → 跳过，Bot 自己会处理
+            if event_bus.presence.bot_online(agent_id):
+                logger.info("Agent %d has bot online, skipping server-side reply", agent_id)
+                continue
+
+            # Bot 不在线 → fallback 到服务端驱动
+            agent = await db.get(Agent, agent_id)
+            if not agent:
+                logger.warning("Wakeup: agent %d not found in db", agent_id)
+                continue
+
+            # 经济预检查
+            can_speak = await economy_service.check_quota(agent_id, "chat", db)
+            if not can_speak.allowed:
+                logger.debug("Wakeup: agent %d quota denied: %s", agent_id, can_speak.reason)
+                continue
+
+            logger.debug("Wakeup: generating reply for agent %d (%s)", agent_id, agent.name)
+
+            # 构建聊天历史给 runner
+            history = [
+                {"name": m.agent_name or "unknown", "content": m.content}
+                for m in await get_recent_messages(db, limit=10)
+            ]
+
+            agents_to_reply.append({
+                "agent_id": agent.id,
+                "agent_name": agent.name,
+                "persona": agent.persona,
+                "model": agent.model,
+                "personality_json": agent.personality_json,
+                "history": history,
+            })
+    # 数据库会话已关闭，释放锁
+    return agents_to_reply
+
+
+async def run_wakeup_replies(agents_to_reply: list[dict]):
+    """第二、三阶段：逐个生成回复并提交"""
+    # 第二阶段：LLM 调用（记忆注入需要短暂 db 访问）
+    for agent_info in agents_to_reply:
+        runner = runner_manager.get_or_create(
+            agent_info["agent_id"],
+            agent_info["agent_name"],
+            agent_info["persona"],
+            agent_info["model"],
+            agent_info.get("personality_json"),
+        )
+        stream = open_stream(agent_info["agent_id"], agent_info["agent_name"])
+        try:
             async with async_session() as mem_db:
                 reply, usage_info, used_memory_ids = await runner.generate_reply(
-                    agent_info["history"], db=mem_db
+                    agent_info["history"], db=mem_db, on_delta=stream.push if stream else None,
                 )
             logger.info("Agent %s generated reply", agent_info["agent_name"])
 
-            # 第三阶段：保存结果（创建新的数据库会话，一次性写入所有数据）
+            # 第三阶段：保存结果（交给组提交队列，与其他回复一起提交）
             if reply:
-                async with async_session() as db:
-                    msg = await send_agent_message(agent_info["agent_id"], agent_info["agent_name"], reply, db)
-                    await economy_service.deduct_quota(agent_info["agent_id"], db)
-                    if usage_info:
-                        from ..models.tables import LLMUsage
-                        record = LLMUsage(
-                            model=usage_info["model"],
-                            agent_id=usage_info["agent_id"],
-                            prompt_tokens=usage_info["prompt_tokens"],
-                            completion_tokens=usage_info["completion_tokens"],
-                            total_tokens=usage_info["total_tokens"],
-                            latency_ms=usage_info["latency_ms"],
-                        )
-                        db.add(record)
-                    # 写入记忆引用
-                    if used_memory_ids and msg:
-                        for mid in used_memory_ids:
-                            db.add(MemoryReference(message_id=msg.id, memory_id=mid))
-                    await db.commit()
-
-                # M2-4: 异步记忆提取（fire-and-forget）
-                # 将 Agent 回复追加到 history，确保摘要包含完整对话
-                agent_info["history"].append({"name": agent_info["agent_name"], "content": reply})
-                task = asyncio.create_task(
-                    _extract_memory(agent_info["agent_id"], agent_info["history"])
+                await submit_reply(
+                    agent_info["agent_id"], agent_info["agent_name"], reply, usage_info, used_memory_ids,
+                    draft_id=stream.draft_id if stream else None,
                 )
-                _background_tasks.add(task)
-                task.add_done_callback(_background_tasks.discard)
+        except Exception:
+            # 生成或落库失败：草稿不会被 new_message 取代，通知客户端丢弃
+            if stream:
+                await stream.abort()
+            raise
+
+        if not reply:
+            if stream:
+                await stream.abort()
+            continue
 
-    except Exception as e:
-        logger.error("Wakeup handling failed: %s", e, exc_info=True)
+        # M2-4: 异步记忆提取（fire-and-forget）
+        # 将 Agent 回复追加到 history，确保摘要包含完整对话
+        agent_info["history"].append({"name": agent_info["agent_name"], "content": reply})
+        task = asyncio.create_task(
+            _extract_memory(agent_info["agent_id"], agent_info["history"])
+        )
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
 
 
 @router.get("/messages", response_model=list[MessageOut])
 async def get_messages(
     limit: int = 50,
     since_id: int | None = None,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     query = select(Message).options(joinedload(Message.agent))
 
@@ -407,17 +590,41 @@ async def get_messages(
 
     query = query.limit(limit)
     result = await db.execute(query)
-    messages = result.scalars().all()
+    messages = list(result.scalars().all())
+
+    # 热库不够时从归档库补齐（归档行都比热库旧）
+    archived = []
+    if archive_service.archive_months():
+        messages_t = Message.__table__
+        if since_id is None and len(messages) < limit:
+            archived = await archive_service.fetch_archived(
+                select(messages_t).order_by(messages_t.c.created_at.desc()),
+                limit=limit - len(messages),
+            )
+        elif since_id is not None:
+            oldest_hot = (await db.execute(select(sa_func.min(Message.id)))).scalar()
+            if oldest_hot is None or since_id < oldest_hot - 1:
+                archived = await archive_service.fetch_archived(
+                    select(messages_t).where(messages_t.c.id > since_id).order_by(messages_t.c.id.asc()),
+                    limit=limit, newest_first=False,
+                )
 
     # since_id 模式已经是升序；默认模式需要 reverse
     if since_id is None:
-        messages = list(reversed(messages))
+        messages = list(reversed(messages + archived))
+    else:
+        messages = (archived + messages)[:limit]
+
+    names = {}
+    if archived:
+        names = {aid: name for name, aid in (await get_agent_name_map(db)).items()}
 
     return [
         MessageOut(
             id=msg.id,
             agent_id=msg.agent_id,
-            agent_name=msg.agent.name if msg.agent else "unknown",
+            agent_name=(msg.agent.name if msg.agent else "unknown") if isinstance(msg, Message)
+            else names.get(msg.agent_id, "unknown"),
             sender_type=msg.sender_type or "agent",
             message_type=msg.message_type or "chat",
             content=msg.content,
@@ -428,14 +635,28 @@ async def get_messages(
     ]
 
 
-async def _heartbeat(ws: WebSocket):
-    """定期发送 ping，检测僵尸连接"""
-    try:
-        while True:
-            await asyncio.sleep(HEARTBEAT_INTERVAL)
-            await ws.send_json({"type": "ping"})
-    except Exception:
-        pass  # 连接已断开，心跳自然停止
+def _send_ping(ws: WebSocket) -> bool:
+    """经发送队列发缓存的 ping 帧（与广播帧不并发写 socket）"""
+    sender = _senders.get(ws)
+    return sender is not None and sender.enqueue(sender.codec.const("ping"))
+
+
+def _evict_zombies(zombies: list[WebSocket]):
+    """心跳超时的连接：关闭 socket，发送队列的 on_failed 负责移出连接池"""
+    for ws in zombies:
+        sender = _senders.get(ws)
+        if sender is not None:
+            sender.fail("Heartbeat timeout", code=1001)
+
+
+# 所有连接共用一个心跳时间轮
+heartbeat = HeartbeatWheel(
+    interval=settings.ws_heartbeat_interval_s,
+    slots=settings.ws_heartbeat_slots,
+    timeout=settings.ws_heartbeat_timeout_s,
+    send_ping=_send_ping,
+    on_evict=_evict_zombies,
+)
 
 
 @router.websocket("/ws/{agent_id}")
@@ -443,6 +664,11 @@ async def websocket_endpoint(
     websocket: WebSocket,
     agent_id: int,
     token: str | None = Query(default=None),
+    since_seq: int | None = Query(default=None),
+    epoch: str | None = Query(default=None),
+    since_id: int | None = Query(default=None),
+    topics: str | None = Query(default=None),
+    proto: str | None = Query(default=None),
 ):
     # Bot 认证（需要先 accept 再 close，Starlette 不支持 accept 前 close）
     if agent_id != 0:
@@ -469,7 +695,15 @@ async def websocket_endpoint(
         conn_type = "human"
         agent_name = agent.name
 
-    await websocket.accept()
+    # 帧编码：?proto=msgpack 或子协议 botciv.msgpack，默认 JSON
+    try:
+        codec, subprotocol = negotiate(proto, websocket.scope.get("subprotocols") or [])
+    except ValueError as e:
+        await websocket.accept()
+        await websocket.close(code=4000, reason=str(e))
+        return
+
+    await websocket.accept(subprotocol=subprotocol)
 
     # 连接池管理
     if conn_type == "bot":
@@ -480,28 +714,51 @@ async def websocket_endpoint(
                 await old_ws.close(code=4001, reason="Replaced by new connection")
             except Exception:
                 pass
-        bot_connections[agent_id] = websocket
-    else:
-        # 人类支持多标签页
-        if agent_id not in human_connections:
-            human_connections[agent_id] = []
-        human_connections[agent_id].append(websocket)
+    # 初始订阅（逗号分隔），补发也按它过滤
+    initial_topics = None
+    if topics:
+        try:
+            initial_topics = parse_topics(topics.split(","))
+        except ValueError as e:
+            await websocket.close(code=4000, reason=str(e))
+            return
 
-    # 启动心跳
-    heartbeat_task = asyncio.create_task(_heartbeat(websocket))
+    # 断线补发：event_log 覆盖不到 since_seq（或 epoch 变了）时，先从 messages 表取漏掉的聊天消息
+    replay = since_seq is not None or since_id is not None
+    missed = None
+    if replay and not (since_seq is not None and event_log.covers(since_seq, epoch)):
+        missed = []
+        if since_id is not None:
+            async with async_read_session() as db:
+                missed = await get_messages(limit=settings.ws_replay_max_messages, since_id=since_id, db=db)
+
+    # 人类支持多标签页，bot 只保留最新连接（与补发之间不能有 await）
+    _register_connection(agent_id, websocket, conn_type, codec)
+    if initial_topics is not None:
+        topic_index.replace(websocket, initial_topics)
+    if replay:
+        _replay(websocket, since_seq, since_id, missed)
 
     # 广播上线通知
     await broadcast_system_event("agent_online", agent_id, agent_name)
 
     try:
         while True:
-            data = await websocket.receive_text()
-            payload = json.loads(data)
+            # 文本帧按 JSON、二进制帧按 MessagePack 解码，与本连接下行用哪种编码无关
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            heartbeat.touch(websocket)
+            payload = decode_frame(message)
 
             # 心跳 pong 响应，忽略
             if payload.get("type") == "pong":
                 continue
 
+            if payload.get("type") in ("subscribe", "unsubscribe"):
+                await _handle_subscription(websocket, payload)
+                continue
+
             # 向后兼容：旧格式 {"content": "..."} 自动识别为 chat_message
             msg_type = payload.get("type", "chat_message")
             content = payload.get("content", "")
@@ -516,59 +773,18 @@ async def websocket_endpoint(
             if sender_type == "human":
                 message_type = "work"
 
-            # 解析 @提及
-            async with async_session() as db:
-                name_map = await get_agent_name_map(db)
-                mentions = parse_mentions(content, name_map)
-
-                # 持久化消息
-                msg = Message(
-                    agent_id=agent_id,
-                    sender_type=sender_type,
-                    message_type=message_type,
-                    content=content,
-                    mentions=mentions,
-                )
-                db.add(msg)
-                await db.commit()
-                await db.refresh(msg)
-
-            # 广播新消息
-            await broadcast({
-                "type": "new_message",
-                "data": {
-                    "id": msg.id,
-                    "agent_id": agent_id,
-                    "agent_name": agent_name,
-                    "sender_type": sender_type,
-                    "message_type": message_type,
-                    "content": content,
-                    "mentions": mentions,
-                    "created_at": str(msg.created_at),
-                }
-            })
-
-            # 异步触发唤醒（不阻塞广播）
-            task = asyncio.create_task(handle_wakeup(msg))
-            _background_tasks.add(task)
-            task.add_done_callback(_background_tasks.discard)
+            # 微批写入：解析 @提及、持久化、广播、唤醒都按批进行，不阻塞本连接继续收帧
+            message_ingestor.submit(agent_id, agent_name, sender_type, message_type, content)
 
     except WebSocketDisconnect:
         pass
     finally:
-        heartbeat_task.cancel()
         # 清理连接
+        _remove_connection(agent_id, websocket)
+        sender = _senders.pop(websocket, None)
+        if sender is not None:
+            await sender.aclose()
         if conn_type == "bot":
-            if bot_connections.get(agent_id) is websocket:
-                bot_connections.pop(agent_id, None)
             runner_manager.remove(agent_id)
             _agent_reply_counts.pop(agent_id, None)
-        else:
-            if agent_id in human_connections:
-                try:
-                    human_connections[agent_id].remove(websocket)
-                except ValueError:
-                    pass
-                if not human_connections[agent_id]:
-                    human_connections.pop(agent_id, None)
         await broadcast_system_event("agent_offline", agent_id, agent_name)
@@ -24,7 +24,7 @@ import math
 from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel, Field, field_validator
 from sqlalchemy.ext.asyncio import AsyncSession
-from ..core import get_db
+from ..core import get_read_db, write_queue
 from ..services.city_service import (
     get_city_overview, get_buildings, get_building_detail,
     assign_worker, remove_worker, get_resources, eat_food, get_production_logs,
@@ -56,25 +56,27 @@ class TransferRequest(BaseModel):
 
 
 @router.get("/cities/{city}/overview")
-async def city_overview(city: str, db: AsyncSession = Depends(get_db)):
+async def city_overview(city: str, db: AsyncSession = Depends(get_read_db)):
     return await get_city_overview(city, db)
 
 
 @router.get("/cities/{city}/buildings")
-async def buildings_list(city: str, db: AsyncSession = Depends(get_db)):
+async def buildings_list(city: str, db: AsyncSession = Depends(get_read_db)):
     return await get_buildings(city, db)
 
 
 @router.post("/cities/{city}/buildings/construct")
-async def construct(city: str, req: ConstructRequest, db: AsyncSession = Depends(get_db)):
-    result = await construct_building(req.builder_id, req.building_type, req.name, city, db=db)
+async def construct(city: str, req: ConstructRequest):
+    result = await write_queue.submit_with_notices(lambda db, notices: construct_building(
+        req.builder_id, req.building_type, req.name, city, db=db, commit=False, notices=notices,
+    ))
     if not result["ok"]:
         raise HTTPException(400, result["reason"])
     return result
 
 
 @router.get("/cities/{city}/buildings/constructing")
-async def constructing_list(city: str, db: AsyncSession = Depends(get_db)):
+async def constructing_list(city: str, db: AsyncSession = Depends(get_read_db)):
     from ..models import Building
     from sqlalchemy import select
     from datetime import datetime, timezone
@@ -100,7 +102,7 @@ async def constructing_list(city: str, db: AsyncSession = Depends(get_db)):
 
 
 @router.get("/cities/{city}/buildings/{building_id}")
-async def building_detail(city: str, building_id: int, db: AsyncSession = Depends(get_db)):
+async def building_detail(city: str, building_id: int, db: AsyncSession = Depends(get_read_db)):
     result = await get_building_detail(city, building_id, db)
     if not result:
         raise HTTPException(404, "建筑不存在")
@@ -108,37 +110,43 @@ async def building_detail(city: str, building_id: int, db: AsyncSession = Depend
 
 
 @router.post("/cities/{city}/buildings/{building_id}/workers")
-async def add_worker(city: str, building_id: int, req: WorkerRequest, db: AsyncSession = Depends(get_db)):
-    return await assign_worker(city, building_id, req.agent_id, db)
+async def add_worker(city: str, building_id: int, req: WorkerRequest):
+    return await write_queue.submit_with_notices(lambda db, notices: assign_worker(
+        city, building_id, req.agent_id, db, commit=False, notices=notices,
+    ))
 
 
 @router.delete("/cities/{city}/buildings/{building_id}/workers/{agent_id}")
-async def del_worker(city: str, building_id: int, agent_id: int, db: AsyncSession = Depends(get_db)):
-    return await remove_worker(city, building_id, agent_id, db)
+async def del_worker(city: str, building_id: int, agent_id: int):
+    return await write_queue.submit_with_notices(lambda db, notices: remove_worker(
+        city, building_id, agent_id, db, commit=False, notices=notices,
+    ))
 
 
 @router.get("/cities/{city}/resources")
-async def resources_list(city: str, db: AsyncSession = Depends(get_db)):
+async def resources_list(city: str, db: AsyncSession = Depends(get_read_db)):
     return await get_resources(city, db)
 
 
 @router.post("/agents/{agent_id}/eat")
-async def agent_eat(agent_id: int, db: AsyncSession = Depends(get_db)):
-    return await eat_food(agent_id, db)
+async def agent_eat(agent_id: int):
+    return await write_queue.submit_with_notices(lambda db, notices: eat_food(
+        agent_id, db, commit=False, notices=notices,
+    ))
 
 
 @router.get("/cities/{city}/production-logs")
-async def production_logs(city: str, limit: int = Query(20, ge=1, le=100), db: AsyncSession = Depends(get_db)):
+async def production_logs(city: str, limit: int = Query(20, ge=1, le=100), db: AsyncSession = Depends(get_read_db)):
     return await get_production_logs(city, limit, db)
 
 
 @router.get("/agents/{agent_id}/resources")
-async def agent_resources(agent_id: int, db: AsyncSession = Depends(get_db)):
+async def agent_resources(agent_id: int, db: AsyncSession = Depends(get_read_db)):
     return await get_agent_resources(agent_id, db)
 
 
 @router.get("/agents/{agent_id}/attributes")
-async def agent_attributes(agent_id: int, db: AsyncSession = Depends(get_db)):
+async def agent_attributes(agent_id: int, db: AsyncSession = Depends(get_read_db)):
     from ..models import Agent
     agent = await db.get(Agent, agent_id)
     if not agent:
@@ -147,21 +155,27 @@ async def agent_attributes(agent_id: int, db: AsyncSession = Depends(get_db)):
 
 
 @router.post("/agents/transfer-resource")
-async def transfer(req: TransferRequest, db: AsyncSession = Depends(get_db)):
-    return await transfer_resource(req.from_agent_id, req.to_agent_id, req.resource_type, req.quantity, db)
+async def transfer(req: TransferRequest):
+    return await write_queue.submit_with_notices(lambda db, notices: transfer_resource(
+        req.from_agent_id, req.to_agent_id, req.resource_type, req.quantity, db, commit=False, notices=notices,
+    ))
 
 
 @router.post("/cities/{city}/production-tick")
-async def trigger_production(city: str, db: AsyncSession = Depends(get_db)):
+async def trigger_production(city: str):
     """[dev] 手动触发一次生产循环"""
-    await production_tick(city, db)
+    await write_queue.submit_with_notices(lambda db, notices: production_tick(
+        city, db, commit=False, notices=notices,
+    ))
     return {"ok": True}
 
 
 @router.post("/cities/{city}/daily-decay")
-async def trigger_daily_decay(city: str, db: AsyncSession = Depends(get_db)):
+async def trigger_daily_decay(city: str):
     """[dev] 手动触发一次每日属性结算"""
-    await daily_attribute_decay(db)
+    await write_queue.submit_with_notices(lambda db, notices: daily_attribute_decay(
+        db, commit=False, notices=notices,
+    ))
     return {"ok": True}
 
 
@@ -210,32 +224,36 @@ def _map_error_status(reason: str) -> int:
 
 
 @router.get("/market/orders")
-async def market_orders(status: list[str] | None = Query(None), db: AsyncSession = Depends(get_db)):
+async def market_orders(status: list[str] | None = Query(None), db: AsyncSession = Depends(get_read_db)):
     return await list_orders(db=db, status_filter=status)
 
 
 @router.post("/market/orders")
-async def create_market_order(req: CreateOrderRequest, db: AsyncSession = Depends(get_db)):
-    result = await create_order(
+async def create_market_order(req: CreateOrderRequest):
+    result = await write_queue.submit_with_notices(lambda db, notices: create_order(
         req.seller_id, req.sell_type, req.sell_amount,
-        req.buy_type, req.buy_amount, db=db,
-    )
+        req.buy_type, req.buy_amount, db=db, commit=False, notices=notices,
+    ))
     if not result["ok"]:
         raise HTTPException(_map_error_status(result["reason"]), result["reason"])
     return result
 
 
 @router.post("/market/orders/{order_id}/accept")
-async def accept_market_order(order_id: int, req: AcceptOrderRequest, db: AsyncSession = Depends(get_db)):
-    result = await accept_order(req.buyer_id, order_id, req.buy_ratio, db=db)
+async def accept_market_order(order_id: int, req: AcceptOrderRequest):
+    result = await write_queue.submit_with_notices(lambda db, notices: accept_order(
+        req.buyer_id, order_id, req.buy_ratio, db=db, commit=False, notices=notices,
+    ))
     if not result["ok"]:
         raise HTTPException(_map_error_status(result["reason"]), result["reason"])
     return result
 
 
 @router.post("/market/orders/{order_id}/cancel")
-async def cancel_market_order(order_id: int, req: CancelOrderRequest, db: AsyncSession = Depends(get_db)):
-    result = await cancel_order(req.seller_id, order_id, db=db)
+async def cancel_market_order(order_id: int, req: CancelOrderRequest):
+    result = await write_queue.submit_with_notices(lambda db, notices: cancel_order(
+        req.seller_id, order_id, db=db, commit=False, notices=notices,
+    ))
     if not result["ok"]:
         raise HTTPException(_map_error_status(result["reason"]), result["reason"])
     return result
@@ -245,6 +263,6 @@ async def cancel_market_order(order_id: int, req: CancelOrderRequest, db: AsyncS
 async def market_trade_logs(
     limit: int = Query(20, ge=1, le=100),
     offset: int = Query(0, ge=0),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     return await get_trade_logs(db=db, limit=limit, offset=offset)
@@ -3,6 +3,7 @@
 
 POST /api/dev/trigger — 模拟发送消息并触发唤醒流程
 POST /api/dev/trigger-autonomy — 手动触发一次 autonomy tick（含聊天+行为）
+GET  /api/dev/storage — 当前 SQLite 调优档位与 WAL 大小 / 最近一次 checkpoint
 仅用于开发测试，生产环境应禁用。
 """
 import asyncio
@@ -12,15 +13,18 @@ from pydantic import BaseModel
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update as sql_update
-from ..core import get_db
-from ..core.database import async_session
+from ..core import get_read_db, write_queue
+from ..core.config import settings
+from ..core.database import get_sqlite_profile
 from ..models import Agent, Message
 from .chat import (
-    parse_mentions, get_agent_name_map, broadcast, handle_wakeup,
+    parse_mentions, broadcast, handle_wakeup,
     _background_tasks,
 )
+from ..services.agent_directory import agent_directory
 from ..services.economy_service import economy_service
 from ..services import autonomy_service
+from ..services.wal_checkpointer import wal_checkpointer
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/dev", tags=["dev"])
@@ -47,7 +51,7 @@ class TriggerResponse(BaseModel):
 
 
 @router.post("/trigger", response_model=TriggerResponse)
-async def trigger_message(req: TriggerRequest, db: AsyncSession = Depends(get_db)):
+async def trigger_message(req: TriggerRequest, db: AsyncSession = Depends(get_read_db)):
     """模拟发送一条消息，走完整的持久化 + 广播 + 唤醒流程"""
     # 查找 sender agent
     result = await db.execute(select(Agent).where(Agent.name == req.sender))
@@ -58,20 +62,24 @@ async def trigger_message(req: TriggerRequest, db: AsyncSession = Depends(get_db
     sender_type = "human" if agent.id == 0 else "agent"
 
     # 解析 @提及
-    name_map = await get_agent_name_map(db)
-    mentions = parse_mentions(req.content, name_map)
+    await agent_directory.ensure_loaded(db)
+    mentions = parse_mentions(req.content)
 
     # 持久化
-    msg = Message(
-        agent_id=agent.id,
-        sender_type=sender_type,
-        message_type=req.message_type,
-        content=req.content,
-        mentions=mentions,
-    )
-    db.add(msg)
-    await db.commit()
-    await db.refresh(msg)
+    async def work(wdb: AsyncSession) -> Message:
+        msg = Message(
+            agent_id=agent.id,
+            sender_type=sender_type,
+            message_type=req.message_type,
+            content=req.content,
+            mentions=mentions,
+        )
+        wdb.add(msg)
+        await wdb.flush()
+        await wdb.refresh(msg)
+        return msg
+
+    msg = await write_queue.submit(work)
 
     # 广播
     await broadcast({
@@ -103,37 +111,44 @@ async def trigger_message(req: TriggerRequest, db: AsyncSession = Depends(get_db
 
 
 @router.post("/transfer")
-async def dev_transfer(req: TransferRequest, db: AsyncSession = Depends(get_db)):
+async def dev_transfer(req: TransferRequest):
     """开发用：Agent 间转账"""
-    ok = await economy_service.transfer_credits(req.from_id, req.to_id, req.amount, db)
+    ok = await write_queue.submit(
+        lambda db: economy_service.transfer_credits(req.from_id, req.to_id, req.amount, db)
+    )
     if not ok:
         raise HTTPException(400, "Transfer failed (insufficient credits or agent not found)")
-    await db.commit()
     return {"ok": True, "from_id": req.from_id, "to_id": req.to_id, "amount": req.amount}
 
 
 @router.post("/set-credits")
-async def dev_set_credits(agent_id: int, credits: int, quota_used: int | None = None, db: AsyncSession = Depends(get_db)):
+async def dev_set_credits(agent_id: int, credits: int, quota_used: int | None = None):
     """开发用：直接设置 Agent 信用点（用于测试经济边界条件）"""
     values = {"credits": credits}
     if quota_used is not None:
         values["quota_used_today"] = quota_used
-    result = await db.execute(
-        sql_update(Agent).where(Agent.id == agent_id).values(**values)
-    )
-    if result.rowcount == 0:
+
+    async def work(db: AsyncSession) -> int:
+        result = await db.execute(
+            sql_update(Agent).where(Agent.id == agent_id).values(**values)
+        )
+        return result.rowcount
+
+    if await write_queue.submit(work) == 0:
         raise HTTPException(404, "Agent not found")
-    await db.commit()
     return {"ok": True, "agent_id": agent_id, "credits": credits}
 
 
 @router.post("/set-resource")
-async def dev_set_resource(agent_id: int, resource_type: str, quantity: float, db: AsyncSession = Depends(get_db)):
+async def dev_set_resource(agent_id: int, resource_type: str, quantity: float):
     """开发用：直接设置 Agent 个人资源数量（用于 ST 环境准备）"""
     from ..services.city_service import _get_or_create_agent_resource
-    ar = await _get_or_create_agent_resource(agent_id, resource_type, db)
-    ar.quantity = quantity
-    await db.commit()
+
+    async def work(db: AsyncSession) -> None:
+        ar = await _get_or_create_agent_resource(agent_id, resource_type, db)
+        ar.quantity = quantity
+
+    await write_queue.submit(work)
     return {"ok": True, "agent_id": agent_id, "resource_type": resource_type, "quantity": quantity}
 
 
@@ -145,7 +160,7 @@ async def trigger_autonomy():
 
 
 @router.post("/probe-llm-decide")
-async def dev_probe_llm_decide(db: AsyncSession = Depends(get_db)):
+async def dev_probe_llm_decide(db: AsyncSession = Depends(get_read_db)):
     """开发用：调用一次 LLM decide()，返回原始输出 + 解析结果（T4 验证用）"""
     snapshot = await autonomy_service.build_world_snapshot(db)
     if not snapshot:
@@ -161,6 +176,17 @@ async def dev_probe_llm_decide(db: AsyncSession = Depends(get_db)):
 
 
 @router.post("/execute-strategies")
-async def dev_execute_strategies(db: AsyncSession = Depends(get_db)):
+async def dev_execute_strategies(db: AsyncSession = Depends(get_read_db)):
     """开发用：策略系统 dormant（DEV-40），返回空结果。"""
     return {"executed": 0, "skipped": 0, "completed": 0, "dormant": True}
+
+
+@router.get("/storage")
+async def storage_status():
+    """SQLite 存储状态：调优档位、WAL 文件大小、最近一次 checkpoint 结果"""
+    return {
+        "profile": settings.sqlite_profile,
+        "pragmas": get_sqlite_profile(),
+        "wal_bytes": wal_checkpointer.wal_size(),
+        "last_checkpoint": wal_checkpointer.last_report,
+    }
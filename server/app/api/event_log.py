@@ -0,0 +1,89 @@
+"""广播事件序号 + 内存环形缓冲，供 WebSocket 断线重连补发
+
+每条 broadcast 帧带单调递增的 seq 和它所属的 epoch（由事件总线分配：单进程时进程内计数，
+重启从 1 开始并换一个 epoch；多 worker 时为总线库的自增 id，各 worker 一致）。环形缓冲保留最近
+ws_replay_buffer_size 帧的编码结果；客户端带 since_seq + epoch 重连时，缓冲覆盖得到就原样补发，
+覆盖不到（断线太久，或 epoch 不同即服务端重启过）时退回 messages 表按 since_id 补发聊天消息。
+"""
+from collections import deque
+from dataclasses import dataclass, field
+
+from ..core.json_codec import dumps_str
+from .ws_protocol import WireCodec
+
+
+@dataclass(slots=True)
+class LoggedEvent:
+    seq: int
+    frame: str  # 已编码的整帧（JSON）
+    data: dict
+    message_id: int | None  # new_message 的消息 id，补发时与 messages 表去重
+    encoded: dict[str, bytes] = field(default_factory=dict, repr=False, compare=False)
+
+    def frame_for(self, codec: WireCodec) -> str | bytes:
+        """按连接的编码取帧；二进制编码第一次用到时编码并缓存，之后所有连接共用"""
+        if not codec.binary:
+            return self.frame
+        frame = self.encoded.get(codec.name)
+        if frame is None:
+            frame = self.encoded[codec.name] = codec.encode(self.data)
+        return frame
+
+
+class EventLog:
+
+    def __init__(self, capacity: int = 2048, epoch: str = ""):
+        self._ring: deque[LoggedEvent] = deque(maxlen=capacity)
+        self._seq = 0
+        self.epoch = epoch
+
+    def reset(self, epoch: str):
+        """换到新的 seq 编号空间（事件总线启动后拿到总线的 epoch）；旧缓冲作废"""
+        if epoch != self.epoch:
+            self._ring.clear()
+            self._seq = 0
+            self.epoch = epoch
+
+    @property
+    def last_seq(self) -> int:
+        return self._seq
+
+    @property
+    def first_seq(self) -> int:
+        """缓冲里最小的 seq（空缓冲时为下一个 seq）。
+
+        多 worker 时其他 worker 的事件经轮询到达，缓冲只是近似有序，所以取最小值而不是队头。
+        """
+        return min(e.seq for e in self._ring) if self._ring else self._seq + 1
+
+    def append(self, data: dict, seq: int | None = None) -> LoggedEvent:
+        """记录一帧并编码一次（seq 缺省时自行分配）；返回的 frame 直接用于广播"""
+        if seq is None:
+            seq = self._seq + 1
+        self._seq = max(self._seq, seq)
+        stamped = {**data, "seq": seq, "epoch": self.epoch}
+        message_id = None
+        if data.get("type") == "new_message":
+            message_id = (data.get("data") or {}).get("id")
+        event = LoggedEvent(seq, dumps_str(stamped), stamped, message_id)
+        self._ring.append(event)
+        return event
+
+    @staticmethod
+    def transient(data: dict) -> LoggedEvent:
+        """不记录、不带 seq 的一次性帧（断线丢了也不补发，比如流式草稿）"""
+        return LoggedEvent(0, dumps_str(data), data, None)
+
+    def covers(self, since_seq: int, epoch: str | None) -> bool:
+        """since_seq 之后的帧是否都还在缓冲里（epoch 不同的 seq 没有可比性）"""
+        return epoch == self.epoch and self.first_seq - 1 <= since_seq <= self._seq
+
+    def since(self, since_seq: int) -> list[LoggedEvent]:
+        """seq > since_seq 的帧，升序"""
+        if since_seq >= self._seq:
+            return []
+        return sorted((e for e in self._ring if e.seq > since_seq), key=lambda e: e.seq)
+
+    def messages_after(self, message_id: int) -> list[LoggedEvent]:
+        """缓冲里 id > message_id 的 new_message 帧（补齐 DB 查询之后才广播的消息）"""
+        return [e for e in self._ring if e.message_id is not None and e.message_id > message_id]
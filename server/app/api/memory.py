@@ -2,7 +2,7 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
-from ..core import get_db
+from ..core import get_read_db, write_queue
 from ..services.memory_admin_service import (
     list_memories, get_memory_detail, get_agent_memory_stats, get_message_memory_refs,
     create_memory, update_memory, delete_memory,
@@ -29,23 +29,22 @@ async def api_list_memories(
     keyword: str | None = Query(None),
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     return await list_memories(agent_id, memory_type, keyword, page, page_size, db)
 
 
 @router.post("")
-async def api_create_memory(
-    req: CreateMemoryRequest,
-    db: AsyncSession = Depends(get_db),
-):
-    return await create_memory(req.agent_id, req.memory_type, req.content, db)
+async def api_create_memory(req: CreateMemoryRequest):
+    return await write_queue.submit(
+        lambda db: create_memory(req.agent_id, req.memory_type, req.content, db, commit=False)
+    )
 
 
 @router.get("/stats")
 async def api_memory_stats(
     agent_id: int | None = Query(None),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     return await get_agent_memory_stats(agent_id, db)
 
@@ -53,7 +52,7 @@ async def api_memory_stats(
 @router.get("/{memory_id}")
 async def api_memory_detail(
     memory_id: int,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     result = await get_memory_detail(memory_id, db)
     if not result:
@@ -62,23 +61,18 @@ async def api_memory_detail(
 
 
 @router.put("/{memory_id}")
-async def api_update_memory(
-    memory_id: int,
-    req: UpdateMemoryRequest,
-    db: AsyncSession = Depends(get_db),
-):
-    result = await update_memory(memory_id, req.content, req.memory_type, db)
+async def api_update_memory(memory_id: int, req: UpdateMemoryRequest):
+    result = await write_queue.submit(
+        lambda db: update_memory(memory_id, req.content, req.memory_type, db, commit=False)
+    )
     if not result:
         raise HTTPException(status_code=404, detail="Memory not found")
     return result
 
 
 @router.delete("/{memory_id}")
-async def api_delete_memory(
-    memory_id: int,
-    db: AsyncSession = Depends(get_db),
-):
-    ok = await delete_memory(memory_id, db)
+async def api_delete_memory(memory_id: int):
+    ok = await write_queue.submit(lambda db: delete_memory(memory_id, db, commit=False))
     if not ok:
         raise HTTPException(status_code=404, detail="Memory not found")
     return {"ok": True}
@@ -87,6 +81,6 @@ async def api_delete_memory(
 @router.get("/messages/{message_id}/memory-refs")
 async def api_message_memory_refs(
     message_id: int,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     return await get_message_memory_refs(message_id, db)
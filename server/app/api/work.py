@@ -9,7 +9,7 @@ GET  /work/agents/{agent_id}/history   — 打卡记录
 from datetime import datetime
 from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
-from ..core import get_db
+from ..core import get_read_db, write_queue
 from ..models import Agent, Job
 from ..services.work_service import work_service
 from .schemas import JobOut, CheckInRequest, CheckInResult, CheckInOut
@@ -19,27 +19,32 @@ router = APIRouter(prefix="/work", tags=["work"])
 
 
 @router.get("/jobs", response_model=list[JobOut])
-async def list_jobs(db: AsyncSession = Depends(get_db)):
+async def list_jobs(db: AsyncSession = Depends(get_read_db)):
     """岗位列表，含当日在岗人数"""
     return await work_service.get_jobs(db)
 
 
 @router.post("/jobs/{job_id}/checkin", response_model=CheckInResult)
-async def checkin(job_id: int, req: CheckInRequest, db: AsyncSession = Depends(get_db)):
-    """打卡：先 commit 再 broadcast"""
-    result = await work_service.check_in(req.agent_id, job_id, db)
-    if result["ok"]:
-        await db.commit()
+async def checkin(job_id: int, req: CheckInRequest):
+    """打卡：经 write_queue 提交后再 broadcast"""
+    async def work(db: AsyncSession) -> tuple[dict, str, str]:
+        result = await work_service.check_in(req.agent_id, job_id, db)
+        if not result["ok"]:
+            return result, "", ""
         # 查询 agent 和 job 信息用于广播
         agent = await db.get(Agent, req.agent_id)
         job = await db.get(Job, job_id)
+        return result, agent.name if agent else "unknown", job.title if job else "unknown"
+
+    result, agent_name, job_title = await write_queue.submit(work)
+    if result["ok"]:
         await broadcast({
             "type": "system_event",
             "data": {
                 "event": "checkin",
                 "agent_id": req.agent_id,
-                "agent_name": agent.name if agent else "unknown",
-                "job_title": job.title if job else "unknown",
+                "agent_name": agent_name,
+                "job_title": job_title,
                 "reward": result["reward"],
                 "timestamp": datetime.now().isoformat(sep=" ", timespec="seconds"),
             }
@@ -48,12 +53,12 @@ async def checkin(job_id: int, req: CheckInRequest, db: AsyncSession = Depends(g
 
 
 @router.get("/agents/{agent_id}/today", response_model=CheckInOut | None)
-async def today_checkin(agent_id: int, db: AsyncSession = Depends(get_db)):
+async def today_checkin(agent_id: int, db: AsyncSession = Depends(get_read_db)):
     """今日打卡状态"""
     return await work_service.get_today_checkin(agent_id, db)
 
 
 @router.get("/agents/{agent_id}/history", response_model=list[CheckInOut])
-async def work_history(agent_id: int, days: int = 7, db: AsyncSession = Depends(get_db)):
+async def work_history(agent_id: int, days: int = 7, db: AsyncSession = Depends(get_read_db)):
     """打卡记录（默认最近 7 天）"""
     return await work_service.get_work_history(agent_id, db, days=days)
@@ -0,0 +1,105 @@
+"""集中式心跳：一个时间轮扫所有连接，代替每连接一个 sleep 任务
+
+连接登记时放进 slots 个桶中的一个（当前指针的前一格，即一整圈后才轮到）；
+时间轮每 interval / slots 秒前进一格，只处理这一格里的连接：
+最后一次收到客户端帧超过 timeout 的视为僵尸，整批交给 on_evict；其余发一帧 ping。
+每个连接恰好每 interval 秒被访问一次，空闲连接只占一个桶位和一个时间戳。
+"""
+import asyncio
+import logging
+import time
+from collections.abc import Callable
+
+from fastapi import WebSocket
+
+logger = logging.getLogger(__name__)
+
+
+class HeartbeatWheel:
+
+    def __init__(
+        self,
+        *,
+        interval: float = 30.0,
+        slots: int = 30,
+        timeout: float = 90.0,
+        send_ping: Callable[[WebSocket], bool],
+        on_evict: Callable[[list[WebSocket]], None],
+    ):
+        self.interval = interval
+        self.slots = slots
+        self.timeout = timeout  # 0 为不驱逐
+        self._send_ping = send_ping
+        self._on_evict = on_evict
+        self._buckets: list[set[WebSocket]] = [set() for _ in range(slots)]
+        self._slot_of: dict[WebSocket, int] = {}
+        self._last_seen: dict[WebSocket, float] = {}
+        self._cursor = 0
+        self._task: asyncio.Task | None = None
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+    def add(self, ws: WebSocket):
+        slot = (self._cursor - 1) % self.slots
+        self._buckets[slot].add(ws)
+        self._slot_of[ws] = slot
+        self._last_seen[ws] = time.monotonic()
+        self._ensure_running()
+
+    def touch(self, ws: WebSocket):
+        """收到客户端任意帧（含 pong）时调用"""
+        if ws in self._last_seen:
+            self._last_seen[ws] = time.monotonic()
+
+    def remove(self, ws: WebSocket):
+        slot = self._slot_of.pop(ws, None)
+        if slot is not None:
+            self._buckets[slot].discard(ws)
+        self._last_seen.pop(ws, None)
+
+    def tick(self, now: float | None = None) -> list[WebSocket]:
+        """前进一格：给这一格的连接发 ping，返回被驱逐的连接"""
+        now = time.monotonic() if now is None else now
+        bucket = self._buckets[self._cursor]
+        self._cursor = (self._cursor + 1) % self.slots
+
+        zombies = []
+        for ws in list(bucket):
+            if self.timeout and now - self._last_seen.get(ws, now) > self.timeout:
+                zombies.append(ws)
+            elif not self._send_ping(ws):
+                zombies.append(ws)  # 发送队列已关闭
+        for ws in zombies:
+            self.remove(ws)
+        if zombies:
+            self.evicted += len(zombies)
+            logger.info("Heartbeat: evicting %d zombie connections", len(zombies))
+            self._on_evict(zombies)
+        return zombies
+
+    def _ensure_running(self):
+        loop = asyncio.get_running_loop()
+        # 任务挂在已关闭的旧事件循环上（测试里每个 TestClient 一个循环）时重新起
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        step = self.interval / self.slots
+        while self._slot_of:
+            await asyncio.sleep(step)
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error("Heartbeat tick failed: %s", e, exc_info=True)
+        self._task = None
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,143 @@
+"""WebSocket 帧编码协商：JSON（默认）或 MessagePack 紧凑二进制帧
+
+bot 连接时带 ?proto=msgpack，或在 Sec-WebSocket-Protocol 里提供 botciv.msgpack，
+服务端发给该连接的帧改为二进制 MessagePack，常见字段名换成一两个字母的代码（KEY_CODES）；
+恰好与代码同名或以 ~ 开头的原字段名前面再加一个 ~，解码时去掉，保证一一对应。
+服务端未装 msgpack 或 ws_msgpack_enabled=False 时退回 JSON，客户端按帧类型（文本 / 二进制）判断即可，不需要额外握手。
+客户端发来的帧同样按帧类型解码，两种编码都收。
+
+压缩（permessage-deflate）由 uvicorn 的 websockets 实现在握手时自动协商，与编码无关。
+"""
+import logging
+from functools import lru_cache
+from typing import Any
+
+from ..core.config import settings
+from ..core.json_codec import const_frame, dumps_str, loads
+
+logger = logging.getLogger(__name__)
+
+try:
+    import msgpack
+except ImportError:  # 可选依赖
+    msgpack = None
+
+JSON = "json"
+MSGPACK = "msgpack"
+PROTOCOLS = (JSON, MSGPACK)
+SUBPROTOCOLS = {"botciv.json": JSON, "botciv.msgpack": MSGPACK}
+
+# 字段名 → 代码。已有的不能改（openclaw-plugin/src/protocol.ts 有同一张表）
+KEY_CODES: dict[str, str] = {
+    "type": "t", "data": "d", "seq": "s", "id": "i", "agent_id": "a", "agent_name": "n",
+    "sender_type": "st", "message_type": "mt", "content": "c", "mentions": "m",
+    "created_at": "ca", "event": "e", "timestamp": "ts", "status": "su", "activity": "ac",
+    "agents": "as", "topics": "tp", "reason": "r", "action": "x", "replayed": "rp",
+    "gap": "g", "name": "nm", "city": "cy", "amount": "am", "delta": "dt",
+    "epoch": "ep",
+}
+CODE_KEYS: dict[str, str] = {code: name for name, code in KEY_CODES.items()}
+_ESCAPE = "~"
+
+
+def _short_key(key: Any) -> str:
+    key = str(key)  # 非 str 键按 JSON 的语义转成 str
+    code = KEY_CODES.get(key)
+    if code is not None:
+        return code
+    if key in CODE_KEYS or key.startswith(_ESCAPE):
+        return _ESCAPE + key
+    return key
+
+
+def _long_key(key: str) -> str:
+    name = CODE_KEYS.get(key)
+    if name is not None:
+        return name
+    return key[1:] if key.startswith(_ESCAPE) else key
+
+
+def _shorten(obj: Any) -> Any:
+    if isinstance(obj, dict):
+        return {_short_key(k): _shorten(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_shorten(v) for v in obj]
+    return obj
+
+
+def _expand(obj: Any) -> Any:
+    if isinstance(obj, dict):
+        return {_long_key(k): _expand(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_expand(v) for v in obj]
+    return obj
+
+
+class JsonCodec:
+    name = JSON
+    binary = False
+
+    def encode(self, obj: Any) -> str:
+        return dumps_str(obj)
+
+    def decode(self, raw: str | bytes) -> Any:
+        return loads(raw)
+
+    def const(self, kind: str) -> str:
+        return const_frame(kind)
+
+
+class MsgpackCodec:
+    name = MSGPACK
+    binary = True
+
+    def encode(self, obj: Any) -> bytes:
+        return msgpack.packb(_shorten(obj), use_bin_type=True)
+
+    def decode(self, raw: bytes) -> Any:
+        return _expand(msgpack.unpackb(raw, raw=False))
+
+    @lru_cache(maxsize=64)
+    def const(self, kind: str) -> bytes:
+        return self.encode({"type": kind})
+
+
+WireCodec = JsonCodec | MsgpackCodec
+
+JSON_CODEC = JsonCodec()
+MSGPACK_CODEC = MsgpackCodec() if msgpack is not None else None
+
+
+def msgpack_available() -> bool:
+    return MSGPACK_CODEC is not None and settings.ws_msgpack_enabled
+
+
+def negotiate(proto: str | None, subprotocols: list[str]) -> tuple[WireCodec, str | None]:
+    """按 ?proto= 或客户端提供的子协议选编码，返回 (codec, 要回应的子协议)。
+
+    proto 取值非法时抛 ValueError；要求 msgpack 但不可用时退回 JSON。
+    """
+    if proto is not None and proto not in PROTOCOLS:
+        raise ValueError(f"未知的 proto: {proto}（可选 {', '.join(PROTOCOLS)}）")
+    offered = [SUBPROTOCOLS[p] for p in subprotocols if p in SUBPROTOCOLS]
+    wanted = proto or (offered[0] if offered else JSON)
+
+    codec = JSON_CODEC
+    if wanted == MSGPACK:
+        if msgpack_available():
+            codec = MSGPACK_CODEC
+        else:
+            logger.info("Client asked for msgpack frames but it is unavailable, using JSON")
+    # 只回应客户端提供过的子协议
+    subprotocol = next((p for p in subprotocols if SUBPROTOCOLS.get(p) == codec.name), None)
+    return codec, subprotocol
+
+
+def decode_frame(message: dict) -> Any:
+    """解码一条 websocket.receive 消息：文本帧按 JSON，二进制帧按 MessagePack"""
+    text = message.get("text")
+    if text is not None:
+        return JSON_CODEC.decode(text)
+    if MSGPACK_CODEC is None:
+        raise ValueError("收到二进制帧，但服务端未安装 msgpack")
+    return MSGPACK_CODEC.decode(message.get("bytes") or b"")
@@ -0,0 +1,164 @@
+"""WebSocket 每连接发送队列
+
+broadcast 只把编码好的帧放进每个连接自己的有界队列，由该连接的写任务顺序发送，
+一个慢客户端不会拖住其他接收者，也不会拖住持有数据库会话的调用方。
+
+队列满时的策略（settings.ws_overflow_policy）：
+- drop_oldest：丢弃队列里最旧的一帧状态事件
+- coalesce：状态类事件按 key 只保留最新一帧；满了且无可合并时同 drop_oldest
+- disconnect：直接断开该连接（客户端重连后按 since_seq 补拉）
+
+只有带 key 的状态事件会被丢弃（后来的帧会覆盖它）。聊天消息等增量帧从不丢：
+队列里全是增量帧时无论哪种策略都断开连接，由客户端重连补发，不会悄悄漏消息。
+"""
+import asyncio
+import logging
+from collections import deque
+from typing import Callable
+
+from fastapi import WebSocket
+
+from .ws_protocol import JSON_CODEC, WireCodec
+
+logger = logging.getLogger(__name__)
+
+DROP_OLDEST = "drop_oldest"
+COALESCE = "coalesce"
+DISCONNECT = "disconnect"
+OVERFLOW_POLICIES = (DROP_OLDEST, COALESCE, DISCONNECT)
+
+# 只描述"当前状态"的事件，新的一帧完全覆盖旧的，可合并；聊天消息等增量事件不可合并
+_STATE_EVENTS = {
+    "agent_status_change": "agent_id",
+    "agent_online": "agent_id",
+    "agent_offline": "agent_id",
+    "attribute_changed": None,
+    "production_settled": "city",
+}
+
+
+def coalesce_key(data: dict) -> tuple | None:
+    """可合并事件的 key，不可合并返回 None"""
+    if data.get("type") != "system_event":
+        return None
+    payload = data.get("data") or {}
+    event = payload.get("event")
+    if event not in _STATE_EVENTS:
+        return None
+    field = _STATE_EVENTS[event]
+    # 上线/下线是同一 agent 的同一个状态位
+    if event in ("agent_online", "agent_offline"):
+        event = "presence"
+    return (event, payload.get(field) if field else None)
+
+
+class ConnectionSender:
+    """单个 WebSocket 的有界发送队列 + 写任务"""
+
+    def __init__(
+        self,
+        ws: WebSocket,
+        *,
+        maxsize: int = 256,
+        policy: str = DROP_OLDEST,
+        on_failed: Callable[["ConnectionSender"], None] | None = None,
+        label: str = "",
+        codec: WireCodec = JSON_CODEC,
+    ):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"未知的 ws_overflow_policy: {policy}（可选 {', '.join(OVERFLOW_POLICIES)}）")
+        self.ws = ws
+        self.maxsize = maxsize
+        self.policy = policy
+        self.label = label
+        self.codec = codec  # 该连接协商的帧编码，调用方按它取帧
+        self.dropped = 0
+        self._on_failed = on_failed
+        self._frames: deque[tuple[tuple | None, str | bytes]] = deque()
+        self._wake = asyncio.Event()
+        self._closed = False
+        self._close_task: asyncio.Task | None = None
+        self._task = asyncio.create_task(self._run())
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @property
+    def pending(self) -> int:
+        return len(self._frames)
+
+    def enqueue(self, frame: str | bytes, key: tuple | None = None) -> bool:
+        """放入一帧（不等待发送）。返回 False 表示该帧被丢弃或连接已关闭"""
+        if self._closed:
+            return False
+
+        if key is not None and self.policy == COALESCE:
+            for i, (queued_key, _) in enumerate(self._frames):
+                if queued_key == key:
+                    del self._frames[i]
+                    self.dropped += 1
+                    break
+
+        if len(self._frames) >= self.maxsize:
+            victim = None
+            if self.policy != DISCONNECT:
+                victim = next((i for i, (queued_key, _) in enumerate(self._frames) if queued_key is not None), None)
+            if victim is None:
+                logger.warning("WS send queue full, disconnecting %s", self.label)
+                self.fail("Send queue overflow")
+                return False
+            del self._frames[victim]
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 100 == 0:
+                logger.warning("WS send queue full for %s, dropped %d state frames so far", self.label, self.dropped)
+
+        self._frames.append((key, frame))
+        self._wake.set()
+        return True
+
+    async def _run(self):
+        try:
+            while True:
+                if not self._frames:
+                    self._wake.clear()
+                    await self._wake.wait()
+                    continue
+                _, frame = self._frames.popleft()
+                if isinstance(frame, bytes):
+                    await self.ws.send_bytes(frame)
+                else:
+                    await self.ws.send_text(frame)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("WS send failed for %s: %s", self.label, e)
+            self.fail("Send failed")
+
+    def fail(self, reason: str, code: int = 1013):
+        """发送失败、按策略断开或心跳超时：停止写任务、关闭 socket、通知连接池移除"""
+        if self._closed:
+            return
+        self._closed = True
+        self._frames.clear()
+        if self._task is not asyncio.current_task():
+            self._task.cancel()
+        self._close_task = asyncio.create_task(self._close_socket(reason, code))
+        if self._on_failed:
+            self._on_failed(self)
+
+    async def _close_socket(self, reason: str, code: int):
+        try:
+            await self.ws.close(code=code, reason=reason)
+        except Exception:
+            pass
+
+    async def aclose(self):
+        """连接正常结束时调用：丢弃未发送的帧并等待写任务退出"""
+        self._closed = True
+        self._frames.clear()
+        self._task.cancel()
+        try:
+            await self._task
+        except (asyncio.CancelledError, Exception):
+            pass
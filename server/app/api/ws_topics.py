@@ -0,0 +1,135 @@
+"""WebSocket 主题订阅
+
+客户端连上后默认订阅全部（"*"，兼容旧前端）；发送
+    {"type": "subscribe", "topics": ["chat", "agent:3"]}
+后只接收这些主题的事件（替换原订阅），{"type": "unsubscribe", "topics": [...]} 退订。
+
+主题：
+- chat / status / city / market / bounty / economy / system：按事件类型划分
+- stream：流式回复的草稿增量（message_delta），只想要最终消息的 bot 不必订阅
+- agent:<id>：与该 agent 相关的事件（发送者、被 @、买卖双方、领取人等）
+"""
+from fastapi import WebSocket
+
+TOPIC_ALL = "*"
+TOPICS = ("chat", "stream", "status", "city", "market", "bounty", "economy", "system")
+_AGENT_PREFIX = "agent:"
+
+_EVENT_TOPICS = {
+    "agent_status_change": "status",
+    "agent_status_batch": "status",
+    "agent_online": "status",
+    "agent_offline": "status",
+    "agent_action": "status",
+    "agent_ate": "status",
+    "attribute_changed": "status",
+    "building_construction_started": "city",
+    "building_completed": "city",
+    "resource_transferred": "city",
+    "worker_assigned": "city",
+    "worker_unassigned": "city",
+    "production_settled": "city",
+    "order_created": "market",
+    "order_traded": "market",
+    "order_cancelled": "market",
+    "checkin": "economy",
+    "purchase": "economy",
+}
+
+# 事件负载中指向 agent 的字段
+_AGENT_FIELDS = ("agent_id", "builder_id", "from_agent_id", "to_agent_id", "seller_id", "buyer_id", "claimed_by")
+
+
+def agent_topic(agent_id: int) -> str:
+    return f"{_AGENT_PREFIX}{agent_id}"
+
+
+def parse_topics(raw) -> set[str]:
+    """校验客户端传来的主题列表，非法主题抛 ValueError"""
+    if not isinstance(raw, list):
+        raise ValueError("topics 必须是列表")
+    topics = set()
+    for t in raw:
+        if not isinstance(t, str):
+            raise ValueError(f"非法主题: {t!r}")
+        if t == TOPIC_ALL or t in TOPICS:
+            topics.add(t)
+        elif t.startswith(_AGENT_PREFIX) and t[len(_AGENT_PREFIX):].isdigit():
+            topics.add(agent_topic(int(t[len(_AGENT_PREFIX):])))
+        else:
+            raise ValueError(f"未知主题: {t}")
+    return topics
+
+
+def event_topics(data: dict) -> set[str]:
+    """一条广播帧所属的主题（"*" 订阅者总会收到，不在此列出）"""
+    payload = data.get("data") or {}
+    kind = data.get("type")
+    if kind == "new_message":
+        topics = {"chat"}
+        ids = [payload.get("agent_id"), *(payload.get("mentions") or [])]
+    elif kind == "message_delta":
+        topics = {"stream"}
+        ids = [payload.get("agent_id")]
+    elif kind == "system_event":
+        event = payload.get("event") or ""
+        topic = _EVENT_TOPICS.get(event)
+        if topic is None:
+            topic = "bounty" if event.startswith("bounty_") else "system"
+        topics = {topic}
+        ids = [payload.get(f) for f in _AGENT_FIELDS]
+        ids += [a.get("agent_id") for a in payload.get("agents") or () if isinstance(a, dict)]
+    else:
+        return {"system"}
+    topics.update(agent_topic(i) for i in ids if isinstance(i, int))
+    return topics
+
+
+class TopicIndex:
+    """主题 → 连接 的倒排索引，广播时只取感兴趣的连接"""
+
+    def __init__(self):
+        self._by_topic: dict[str, set[WebSocket]] = {}
+        self._by_ws: dict[WebSocket, set[str]] = {}
+
+    def add(self, ws: WebSocket):
+        """新连接默认订阅全部"""
+        self.replace(ws, {TOPIC_ALL})
+
+    def replace(self, ws: WebSocket, topics: set[str]):
+        """subscribe：用新主题集替换原订阅"""
+        self.remove(ws)
+        self._by_ws[ws] = set(topics)
+        for t in topics:
+            self._by_topic.setdefault(t, set()).add(ws)
+
+    def unsubscribe(self, ws: WebSocket, topics: set[str]):
+        current = self._by_ws.get(ws)
+        if current is None:
+            return
+        for t in topics & current:
+            current.discard(t)
+            subs = self._by_topic.get(t)
+            if subs is not None:
+                subs.discard(ws)
+                if not subs:
+                    del self._by_topic[t]
+
+    def remove(self, ws: WebSocket):
+        for t in self._by_ws.pop(ws, ()):
+            subs = self._by_topic.get(t)
+            if subs is not None:
+                subs.discard(ws)
+                if not subs:
+                    del self._by_topic[t]
+
+    def topics_of(self, ws: WebSocket) -> set[str]:
+        return set(self._by_ws.get(ws, ()))
+
+    def subscribers(self, topics: set[str]) -> set[WebSocket]:
+        result = set(self._by_topic.get(TOPIC_ALL, ()))
+        for t in topics:
+            subs = self._by_topic.get(t)
+            if subs:
+                result |= subs
+        return result
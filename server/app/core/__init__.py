@@ -1,4 +1,9 @@
 from .config import settings
-from .database import Base, engine, async_session, init_db, get_db
+from .database import (
+    Base, engine, async_session, async_read_session, init_db, get_db, get_read_db, write_queue,
+)
 
-__all__ = ["settings", "Base", "engine", "async_session", "init_db", "get_db"]
+__all__ = [
+    "settings", "Base", "engine", "async_session", "async_read_session",
+    "init_db", "get_db", "get_read_db", "write_queue",
+]
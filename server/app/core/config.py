@@ -11,6 +11,47 @@ class Settings(BaseSettings):
 
     # 数据库
     db_path: str = str(Path(__file__).parent.parent.parent / "data" / "openclaw.db")
+    write_batch_window_ms: int = 5  # 组提交攒批窗口（毫秒）
+    write_batch_max: int = 64  # 单批最多闭包数
+    ingest_batch_window_ms: float = 5  # 入站聊天消息微批窗口（毫秒），0 为逐条写入
+    ingest_batch_max: int = 128  # 单批最多消息数
+    wakeup_debounce_ms: float = 300  # 连发消息静默这么久后才做一次唤醒决策，0 为每批立即决策
+    wakeup_debounce_max_ms: float = 2000  # 连发不停时最长等这么久也要决策一次
+    wakeup_rank_enabled: bool = True  # 唤醒选人先走本地预排序，没把握再调小模型
+    wakeup_rank_min_score: float = 0.12  # 人类消息：第一名得分下限
+    wakeup_rank_agent_min_score: float = 0.25  # agent 消息：第一名得分下限（更严，避免 agent 之间刷屏）
+    wakeup_rank_margin: float = 0.06  # 第一名至少领先第二名这么多
+    wakeup_rank_recency_weight: float = 0.1  # 近期发过言的加分上限
+    wakeup_rank_penalty_weight: float = 0.05  # 每次无回应扣分
+    wakeup_model_deadline_s: float = 10.0  # 唤醒小模型整次调用（含排队、重试）的时限，超时按 NONE 处理
+    wakeup_model_max_retries: int = 1  # 唤醒小模型的重试次数（比网关默认少，选人宁可放弃也别拖）
+    agent_directory_ttl_s: float = 30.0  # 进程内 agent 名录最长多久从 DB 重新载入一次，0 为只在改名/增删后
+    write_behind_flush_interval_s: float = 2.0  # 写后缓冲落盘周期（秒）
+    write_behind_max_pending: int = 500  # 缓冲条目达到该数量立即落盘
+    sqlite_profile: str = "dev"  # 存储调优档位：dev / prod / bench（见 database.SQLITE_PROFILES）
+    wal_checkpoint_interval_s: float = 30.0  # 后台 PASSIVE checkpoint 周期（秒）
+    wal_truncate_threshold_mb: int = 64  # WAL 超过该大小时改用 TRUNCATE 收缩文件
+    sqlite_optimize_interval_s: float = 3600.0  # PRAGMA optimize 周期（秒）
+    archive_horizon_days: int = 30  # 日志类表超过该天数的行移入 archive_YYYYMM.db；0 关闭归档
+    archive_batch_size: int = 5000  # 归档每个写事务搬运的行数
+
+    # WebSocket 推送
+    json_backend: str = "auto"  # JSON 编码器：auto（有 orjson 就用）/ orjson / stdlib
+    ws_send_queue_size: int = 256  # 每连接发送队列上限（帧）
+    ws_overflow_policy: str = "drop_oldest"  # 队列满时丢哪帧状态事件：drop_oldest / coalesce / disconnect（聊天帧从不丢，满了断开重连补发）
+    ws_replay_buffer_size: int = 2048  # 重连补发用的最近广播帧数
+    ws_replay_max_messages: int = 500  # 缓冲覆盖不到时从 messages 表补发的上限
+    ws_heartbeat_interval_s: float = 30.0  # 每个连接的 ping 间隔
+    ws_heartbeat_slots: int = 30  # 心跳时间轮的桶数（每 interval/slots 秒扫一桶）
+    ws_heartbeat_timeout_s: float = 90.0  # 超过这么久没收到客户端任何帧视为僵尸，0 为不驱逐
+    ws_msgpack_enabled: bool = True  # 允许客户端协商 MessagePack 二进制帧（需安装 msgpack）
+
+    # 跨进程事件总线（--workers N 时用 sqlite）
+    event_bus_backend: str = "inprocess"  # inprocess / sqlite
+    event_bus_path: str = ""  # sqlite 总线库路径，默认与主库同目录的 event_bus.db
+    event_bus_poll_interval_s: float = 0.02  # 轮询其他 worker 事件的间隔
+    event_bus_retention_s: float = 300.0  # 总线事件保留时长
+    presence_ttl_s: float = 15.0  # worker 心跳超时，超时后其连接视为下线、leader 可被接管
 
     # === 供应商配置（{NAME}_AUTH_TOKEN + {NAME}_BASE_URL）===
     openrouter_auth_token: str = ""
@@ -34,6 +75,29 @@ class Settings(BaseSettings):
     # Agent 默认配置
     default_speak_interval: int = 60  # 默认发言间隔（秒）
     max_agents: int = 20
+    status_batch_window_s: float = 0.1  # 状态变更合并成 agent_status_batch 的窗口（秒），0 为立即发出
+
+    # LLM 网关（每个供应商各一份）
+    llm_max_concurrency: int = 8  # 同时在途的请求上限
+    llm_rate_per_s: float = 5.0  # 令牌桶速率（请求/秒），0 为不限速
+    llm_rate_burst: int = 10  # 令牌桶容量
+    llm_max_retries: int = 3  # 429 / 5xx / 连接错误的重试次数
+    llm_backoff_base_s: float = 0.5  # 指数退避基数（全抖动）
+    llm_backoff_max_s: float = 8.0  # 单次退避上限（Retry-After 也按此截断）
+    llm_pool_max_connections: int = 20  # 连接池上限
+    llm_pool_max_keepalive: int = 10  # 保持的空闲长连接数
+    llm_timeout_s: float = 60.0  # 单次请求超时（调用方可按次覆盖）
+    llm_http2: bool = True  # 使用 HTTP/2（需安装 h2，缺失时退回 HTTP/1.1）
+    stream_replies: bool = False  # 服务端生成的 agent 回复走流式接口，边生成边推 message_delta
+    stream_delta_interval_ms: float = 50  # message_delta 攒批间隔（毫秒），0 为每个增量一帧
+
+    # 供应商健康度（见 core/provider_health.py）
+    provider_ewma_alpha: float = 0.2  # 延迟 / 错误率 EWMA 的新样本权重
+    provider_failure_threshold: int = 5  # 连续失败这么多次熔断
+    provider_error_rate_threshold: float = 0.5  # 错误率 EWMA 超过该值熔断
+    provider_min_samples: int = 10  # 按错误率熔断前至少要有的样本数
+    provider_cooldown_s: float = 30.0  # 熔断后多久放一个探测请求；久未使用的供应商也按此间隔分一个请求
+    provider_switch_ratio: float = 1.5  # 后面的供应商得分好这么多倍才从前面的换过去
 
 
 settings = Settings()
@@ -61,12 +125,10 @@ class ModelEntry(BaseModel):
     display_name: str
     providers: list[ModelProvider]
 
-    def get_active_provider(self) -> ModelProvider | None:
-        """返回第一个有 token 的供应商"""
-        for p in self.providers:
-            if p.is_available():
-                return p
-        return None
+    def get_active_provider(self, probe: bool = True) -> ModelProvider | None:
+        """按健康度（延迟 EWMA、错误率、熔断状态）选一个有 token 的供应商；probe=False 只查看"""
+        from .provider_health import provider_health
+        return provider_health.pick(self.providers, probe=probe)
 
 
 # 模型注册表：key 是前端/数据库中存储的模型标识
@@ -121,7 +183,7 @@ def list_available_models() -> list[dict]:
     for key, entry in MODEL_REGISTRY.items():
         if key in ("wakeup-model", "memory-summary-model"):
             continue  # 内部模型不暴露给前端
-        provider = entry.get_active_provider()
+        provider = entry.get_active_provider(probe=False)
         result.append({
             "id": key,
             "name": entry.display_name,
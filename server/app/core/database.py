@@ -1,9 +1,17 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, TypeVar
+
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import DeclarativeBase
-from sqlalchemy import text, event
+from sqlalchemy import event
 from pathlib import Path
 from .config import settings
 
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
 
 # 确保 data 目录存在
 Path(settings.db_path).parent.mkdir(parents=True, exist_ok=True)
@@ -14,14 +22,58 @@ engine = create_async_engine(
 )
 
 
-@event.listens_for(engine.sync_engine, "connect")
-def _set_sqlite_pragma(dbapi_connection, connection_record):
-    """启用 WAL 模式和 BEGIN IMMEDIATE"""
+# --- 存储调优档位 ---
+# 由 settings.sqlite_profile 选择，每条新连接在 connect 钩子里应用。
+# wal_autocheckpoint 只是兜底：常规 checkpoint 由后台 WalCheckpointer 完成，
+# 避免提交时撞上自动 checkpoint 把停顿甩给随机的用户请求。
+SQLITE_PROFILES: dict[str, dict[str, int | str]] = {
+    "dev": {
+        "synchronous": "NORMAL",
+        "mmap_size": 0,
+        "cache_size": -8_000,  # 负数单位 KiB，约 8MB
+        "temp_store": "DEFAULT",
+        "wal_autocheckpoint": 1000,  # 页数，SQLite 默认值
+        "journal_size_limit": 64 * 1024 * 1024,
+    },
+    "prod": {
+        "synchronous": "NORMAL",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64_000,
+        "temp_store": "MEMORY",
+        "wal_autocheckpoint": 10_000,
+        "journal_size_limit": 64 * 1024 * 1024,
+    },
+    "bench": {
+        "synchronous": "OFF",
+        "mmap_size": 1024 * 1024 * 1024,
+        "cache_size": -256_000,
+        "temp_store": "MEMORY",
+        "wal_autocheckpoint": 10_000,
+        "journal_size_limit": 256 * 1024 * 1024,
+    },
+}
+
+
+def get_sqlite_profile(name: str | None = None) -> dict[str, int | str]:
+    name = name or settings.sqlite_profile
+    if name not in SQLITE_PROFILES:
+        raise ValueError(f"未知的 sqlite_profile: {name}（可选 {', '.join(SQLITE_PROFILES)}）")
+    return SQLITE_PROFILES[name]
+
+
+def _apply_sqlite_pragmas(dbapi_connection):
     cursor = dbapi_connection.cursor()
     cursor.execute("PRAGMA journal_mode=WAL")
     cursor.execute("PRAGMA busy_timeout=30000")
-    cursor.execute("PRAGMA synchronous=NORMAL")
+    for pragma, value in get_sqlite_profile().items():
+        cursor.execute(f"PRAGMA {pragma}={value}")
     cursor.close()
+
+
+@event.listens_for(engine.sync_engine, "connect")
+def _set_sqlite_pragma(dbapi_connection, connection_record):
+    """启用 WAL 模式和 BEGIN IMMEDIATE"""
+    _apply_sqlite_pragmas(dbapi_connection)
     # 设置为 IMMEDIATE 模式，所有事务都用 BEGIN IMMEDIATE
     dbapi_connection.isolation_level = "IMMEDIATE"
 
@@ -29,46 +81,219 @@ def _set_sqlite_pragma(dbapi_connection, connection_record):
 async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 
-class Base(DeclarativeBase):
-    pass
+# --- 只读引擎 ---
+# 读连接用 DEFERRED 事务 + query_only：WAL 下读者不取 RESERVED 锁，
+# 可与写入者并行，不再排在 LLM 回复的提交后面。
+read_engine = create_async_engine(
+    f"sqlite+aiosqlite:///{settings.db_path}",
+    echo=settings.debug,
+)
+
 
+@event.listens_for(read_engine.sync_engine, "connect")
+def _set_read_pragma(dbapi_connection, connection_record):
+    _apply_sqlite_pragmas(dbapi_connection)
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+    dbapi_connection.isolation_level = "DEFERRED"
 
-async def _migrate_bot_token(conn):
-    """M1.5 迁移：给 agents 表加 bot_token 字段（如果不存在）"""
-    result = await conn.execute(text("PRAGMA table_info(agents)"))
-    columns = [row[1] for row in result.fetchall()]
-    if "bot_token" not in columns:
-        await conn.execute(text("ALTER TABLE agents ADD COLUMN bot_token VARCHAR(64)"))
+
+async_read_session = async_sessionmaker(
+    read_engine, class_=AsyncSession, expire_on_commit=False, autoflush=False,
+)
+
+
+# --- 组提交队列 ---
+# 队列的写入者独占一条连接（pool_size=1），业务写入都以 unit-of-work 闭包交给它：
+# 聊天消息、写后缓冲、状态变更、城市/市场操作、autonomy tick、定时任务和各写路由。
+# engine 只剩写入者未启动时的内联兜底，以及 save_memory（事务里要等向量化的网络调用，不能占住写入者）。
+# pysqlite 不会为 SAVEPOINT 自动发 BEGIN，
+# 若由 SAVEPOINT 开启事务，RELEASE 即提交，组提交会退化成逐条提交；
+# 因此关闭驱动层自动事务，由 begin 事件显式发 BEGIN IMMEDIATE。
+writer_engine = create_async_engine(
+    f"sqlite+aiosqlite:///{settings.db_path}",
+    echo=settings.debug,
+    pool_size=1,
+    max_overflow=0,
+)
 
 
-async def _migrate_satiety_mood(conn):
-    """M5 迁移：给 agents 表加 satiety/mood/stamina 字段"""
-    result = await conn.execute(text("PRAGMA table_info(agents)"))
-    columns = [row[1] for row in result.fetchall()]
-    if "satiety" not in columns:
-        await conn.execute(text("ALTER TABLE agents ADD COLUMN satiety INTEGER DEFAULT 100"))
-    if "mood" not in columns:
-        await conn.execute(text("ALTER TABLE agents ADD COLUMN mood INTEGER DEFAULT 80"))
-    if "stamina" not in columns:
-        await conn.execute(text("ALTER TABLE agents ADD COLUMN stamina INTEGER DEFAULT 100"))
+@event.listens_for(writer_engine.sync_engine, "connect")
+def _set_writer_pragma(dbapi_connection, connection_record):
+    _apply_sqlite_pragmas(dbapi_connection)
+    dbapi_connection.isolation_level = None
 
 
-async def _migrate_personality_json(conn):
-    """M6.2 迁移：给 agents 表加 personality_json 字段"""
-    result = await conn.execute(text("PRAGMA table_info(agents)"))
-    columns = [row[1] for row in result.fetchall()]
-    if "personality_json" not in columns:
-        await conn.execute(text("ALTER TABLE agents ADD COLUMN personality_json JSON"))
+@event.listens_for(writer_engine.sync_engine, "begin")
+def _writer_begin(conn):
+    conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+writer_session = async_sessionmaker(writer_engine, class_=AsyncSession, expire_on_commit=False)
+
+
+class WriteQueue:
+    """组提交队列：库里的业务写入统一经由这里的写入者提交。
+
+    任意协程通过 submit() 提交一个 unit-of-work 闭包 `async def work(db) -> T`，
+    写入者任务在 batch_window 内攒批，每个闭包跑在独立 SAVEPOINT 中，
+    整批只 commit 一次（一次 fsync）。单个闭包失败只回滚自己的 SAVEPOINT。
+
+    闭包约定：只 add/flush，不要 commit/rollback（由写入者统一提交）。
+    写入者未启动时（测试、脚本）submit 退化为独立 session 内联执行并提交。
+    """
+
+    def __init__(self, batch_window: float = 0.005, max_batch: int = 64):
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+        logger.info("WriteQueue started (window=%.1fms, max_batch=%d)",
+                    self.batch_window * 1000, self.max_batch)
+
+    async def stop(self) -> None:
+        """停止写入者：已入队的闭包全部提交后才返回"""
+        if not self.running:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        self._queue = None
+        logger.info("WriteQueue stopped")
+
+    async def submit(self, work: Callable[[AsyncSession], Awaitable[T]]) -> T:
+        """提交写入闭包，等待其所在批次提交后返回闭包结果"""
+        if not self.running:
+            async with async_session() as db:
+                result = await work(db)
+                await db.commit()
+                return result
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((work, future))
+        return await future
+
+    async def submit_with_notices(self, work: Callable[[AsyncSession, list], Awaitable[T]]) -> T:
+        """submit 的变体：闭包签名 `async def work(db, notices) -> T`。
+
+        服务函数以 commit=False 调用并把广播攒进 notices，批次提交后按序发出；闭包失败则整体丢弃。
+        """
+        notices: list = []
+        result = await self.submit(lambda db: work(db, notices))
+        for notice in notices:
+            await notice()
+        return result
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._commit_batch(batch)
+        # 停止前把队列里剩余的闭包也提交掉
+        leftover = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not None:
+                leftover.append(item)
+        if leftover:
+            await self._commit_batch(leftover)
+
+    async def _commit_batch(self, batch: list) -> None:
+        outcomes = []
+        try:
+            async with writer_session() as db:
+                for work, future in batch:
+                    try:
+                        async with db.begin_nested():
+                            result = await work(db)
+                        outcomes.append((future, result, None))
+                    except Exception as e:
+                        logger.warning("WriteQueue: unit of work failed, savepoint rolled back: %s", e)
+                        outcomes.append((future, None, e))
+                await db.commit()
+        except Exception as e:
+            logger.error("WriteQueue: batch commit failed (%d items): %s", len(batch), e, exc_info=True)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future, result, exc in outcomes:
+            if future.done():
+                continue
+            if exc is not None:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+
+
+write_queue = WriteQueue(
+    batch_window=settings.write_batch_window_ms / 1000,
+    max_batch=settings.write_batch_max,
+)
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+async def ensure_write_transaction(db: AsyncSession):
+    """确保 session 已处于真实的 SQLite 写事务中。
+
+    pysqlite 只在 DML 前隐式 BEGIN，SAVEPOINT 前不会；若在事务外执行 begin_nested()，
+    最外层 RELEASE 会直接提交。需要"调用方持有事务 + 每步 SAVEPOINT"的代码先调用本函数。
+    """
+    conn = await db.connection()
+    raw = await conn.get_raw_connection()
+    if not raw.driver_connection.in_transaction:
+        await conn.exec_driver_sql("BEGIN IMMEDIATE")
 
 
 async def init_db():
-    async with engine.begin() as conn:
+    """建表 + 跑待执行的版本化迁移（见 migrations.py），整体在一个写事务里"""
+    from .migrations import run_migrations
+
+    # 走写入者引擎：显式 BEGIN IMMEDIATE，DDL 也在事务内，失败整体回滚
+    async with writer_engine.begin() as conn:
+        fresh = not await conn.run_sync(
+            lambda sync_conn: sync_conn.dialect.has_table(sync_conn, "agents")
+        )
         await conn.run_sync(Base.metadata.create_all)
-        await _migrate_bot_token(conn)
-        await _migrate_satiety_mood(conn)
-        await _migrate_personality_json(conn)
+        await run_migrations(conn, fresh=fresh)
 
 
 async def get_db():
     async with async_session() as session:
         yield session
+
+
+async def get_read_db():
+    """只读依赖，供 GET 路由使用；误写会被 query_only 拒绝"""
+    async with async_read_session() as session:
+        yield session
@@ -0,0 +1,420 @@
+"""跨进程事件总线 + 共享在线状态 / 计数器
+
+单进程时一切都在内存里（inprocess，默认）。`uvicorn --workers N` 时设
+event_bus_backend=sqlite：各 worker 通过同一个 SQLite 文件（与主库分开，WAL）交换事件，
+
+- publish：写入 events 表，自增 id 即全局 seq；本 worker 的连接立即投递，
+  其他 worker 轮询新行后投递给各自的 socket
+- epoch：seq 所在的编号空间。进程内总线每次启动一个新 epoch（seq 从 1 重来）；
+  sqlite 总线的 epoch 存在总线库里，与自增 id 同生命周期，各 worker 一致。
+  客户端重连时 epoch 对不上，说明 since_seq 不属于当前编号空间，按断档处理
+- presence：每个 worker 登记自己持有的连接，worker 定期续期心跳，超时的 worker 视为下线
+- counters：按名字分组的共享计数器，提供 dict 接口和原子 incr
+- leader：租约式选主，定时任务（午夜结算、autonomy tick）只在 leader 上跑
+
+总线库的 I/O 全部在一个专用线程里按提交顺序执行，事件循环不碰 SQLite（别的 worker 持锁时
+busy_timeout 最长会等 30 秒）：publish 是 async，等线程写完拿 seq；presence / counters 的写
+不等结果直接排队，读走本地缓存，每个轮询周期从总线库刷新一次。
+
+总线只共享上面几样。以下状态仍是每个 worker 各一份，多 worker 时要知道：
+- agent_directory（@提及名录）：本进程的提交会立即失效它，其他 worker 改名最多晚
+  agent_directory_ttl_s 才看得到
+- message_ingestor（入站微批）：只合并连到本 worker 的消息，不同 worker 的消息各自成批、各自广播
+- wakeup_debouncer（唤醒防抖）：一阵连发若分散在多个 worker 上，每个 worker 各做一次唤醒决策
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections.abc import Awaitable, Callable, Iterator, MutableMapping
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from .config import settings
+from .json_codec import dumps_str, loads
+
+logger = logging.getLogger(__name__)
+
+RemoteHandler = Callable[[dict, int], Awaitable[None]]
+
+INPROCESS = "inprocess"
+SQLITE = "sqlite"
+
+
+# ── 进程内 ──
+
+class LocalPresence:
+    """进程内在线表：{(agent_id, kind): 连接数}"""
+
+    def __init__(self):
+        self._conns: dict[tuple[int, str], int] = {}
+
+    def join(self, agent_id: int, kind: str):
+        self._conns[(agent_id, kind)] = self._conns.get((agent_id, kind), 0) + 1
+
+    def leave(self, agent_id: int, kind: str):
+        n = self._conns.get((agent_id, kind), 0) - 1
+        if n > 0:
+            self._conns[(agent_id, kind)] = n
+        else:
+            self._conns.pop((agent_id, kind), None)
+
+    def online_ids(self) -> set[int]:
+        return {aid for aid, _ in self._conns}
+
+    def bot_online(self, agent_id: int) -> bool:
+        return (agent_id, "bot") in self._conns
+
+
+class LocalCounters(dict):
+    """进程内计数器：普通 dict + incr"""
+
+    def incr(self, key: int, n: int = 1) -> int:
+        self[key] = self.get(key, 0) + n
+        return self[key]
+
+
+class InProcessBus:
+    backend = INPROCESS
+
+    def __init__(self):
+        self._seq = 0
+        self.epoch = uuid.uuid4().hex[:12]
+        self.presence = LocalPresence()
+
+    def counters(self, name: str) -> LocalCounters:
+        return LocalCounters()
+
+    async def publish(self, data: dict) -> int:
+        """分配 seq；进程内没有其他订阅者，投递由调用方完成"""
+        self._seq += 1
+        return self._seq
+
+    def is_leader(self) -> bool:
+        return True
+
+    async def start(self, on_remote: RemoteHandler):
+        pass
+
+    async def stop(self):
+        pass
+
+
+# ── 多进程（共享 SQLite） ──
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    origin TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS workers (
+    worker TEXT PRIMARY KEY,
+    heartbeat REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS presence (
+    worker TEXT NOT NULL,
+    agent_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    conns INTEGER NOT NULL,
+    PRIMARY KEY (worker, agent_id, kind)
+);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT NOT NULL,
+    key INTEGER NOT NULL,
+    value INTEGER NOT NULL,
+    PRIMARY KEY (name, key)
+);
+CREATE TABLE IF NOT EXISTS leader (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    worker TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class _SqliteStore:
+    """一个 worker 在总线库上的连接（自动提交，跨线程用锁串行）"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def execute(self, sql: str, params: tuple = ()) -> list[tuple]:
+        with self._lock:
+            return self._connect().execute(sql, params).fetchall()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class SqlitePresence:
+    """本 worker 的连接记在内存里（立即可见），写库交给 I/O 线程；
+    其他 worker 的在线情况读轮询时顺带刷新的快照（最多晚一个轮询周期）"""
+
+    def __init__(self, bus: "SqliteBus"):
+        self._bus = bus
+        self._local = LocalPresence()
+        self._remote: set[tuple[int, str]] = set()
+
+    def join(self, agent_id: int, kind: str):
+        self._local.join(agent_id, kind)
+        self._bus._submit(
+            "INSERT INTO presence (worker, agent_id, kind, conns) VALUES (?, ?, ?, 1) "
+            "ON CONFLICT (worker, agent_id, kind) DO UPDATE SET conns = conns + 1",
+            (self._bus.worker, agent_id, kind),
+        )
+
+    def leave(self, agent_id: int, kind: str):
+        self._local.leave(agent_id, kind)
+        self._bus._submit(
+            "UPDATE presence SET conns = conns - 1 WHERE worker = ? AND agent_id = ? AND kind = ?",
+            (self._bus.worker, agent_id, kind),
+        )
+        self._bus._submit("DELETE FROM presence WHERE conns <= 0")
+
+    def online_ids(self) -> set[int]:
+        return self._local.online_ids() | {aid for aid, _ in self._remote}
+
+    def bot_online(self, agent_id: int) -> bool:
+        return self._local.bot_online(agent_id) or (agent_id, "bot") in self._remote
+
+
+class SqliteCounters(MutableMapping):
+    """共享计数器，dict 接口（值为 int，缺省 0）。
+
+    读本地缓存（轮询时从总线库整表刷新），写先改缓存再交给 I/O 线程落库；
+    incr 在库里原子加，返回值是本地估计，其他 worker 同时加的部分下个轮询周期才看得到。
+    """
+
+    def __init__(self, bus: "SqliteBus", name: str):
+        self._bus = bus
+        self._name = name
+
+    @property
+    def _cache(self) -> dict[int, int]:
+        return self._bus._counter_cache.setdefault(self._name, {})
+
+    def __getitem__(self, key: int) -> int:
+        return self._cache[key]
+
+    def __setitem__(self, key: int, value: int):
+        self._cache[key] = value
+        self._bus._submit(
+            "INSERT INTO counters (name, key, value) VALUES (?, ?, ?) "
+            "ON CONFLICT (name, key) DO UPDATE SET value = excluded.value",
+            (self._name, key, value),
+        )
+
+    def __delitem__(self, key: int):
+        del self._cache[key]
+        self._bus._submit("DELETE FROM counters WHERE name = ? AND key = ?", (self._name, key))
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(list(self._cache))
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def incr(self, key: int, n: int = 1) -> int:
+        """原子加 n，返回新值（本地估计）"""
+        value = self._cache[key] = self._cache.get(key, 0) + n
+        self._bus._submit(
+            "INSERT INTO counters (name, key, value) VALUES (?, ?, ?) "
+            "ON CONFLICT (name, key) DO UPDATE SET value = value + excluded.value",
+            (self._name, key, n),
+        )
+        return value
+
+
+class SqliteBus:
+    backend = SQLITE
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        poll_interval: float = 0.02,
+        retention: float = 300.0,
+        presence_ttl: float = 15.0,
+    ):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.presence_ttl = presence_ttl
+        self.worker = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.epoch = uuid.uuid4().hex[:12]  # start() 后换成总线库里的 epoch
+        self._store = _SqliteStore(path)
+        # 所有总线库 I/O 在这一个线程里按提交顺序执行，事件循环从不等 SQLite 的锁
+        self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="event-bus")
+        self._writes = 0  # 已提交的写数，刷新缓存时用来判断快照是否过时
+        self.presence = SqlitePresence(self)
+        self._counter_cache: dict[str, dict[int, int]] = {}
+        self._last_id = 0
+        self._leader_until = 0.0
+        self._task: asyncio.Task | None = None
+
+    def counters(self, name: str) -> SqliteCounters:
+        return SqliteCounters(self, name)
+
+    def _submit(self, sql: str, params: tuple = ()):
+        """写操作不等结果：排进 I/O 线程，失败只记日志"""
+        self._writes += 1
+        self._io.submit(self._store.execute, sql, params).add_done_callback(_log_failure)
+
+    async def _run_io(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._io, fn, *args)
+
+    async def publish(self, data: dict) -> int:
+        rows = await self._run_io(
+            self._store.execute,
+            "INSERT INTO events (origin, payload, created_at) VALUES (?, ?, ?) RETURNING id",
+            (self.worker, dumps_str(data), time.time()),
+        )
+        return rows[0][0]
+
+    def is_leader(self) -> bool:
+        return time.time() < self._leader_until
+
+    async def start(self, on_remote: RemoteHandler):
+        if self._task is not None:
+            return
+        await self._run_io(self._register)
+        self._task = asyncio.create_task(self._run(on_remote))
+        logger.info("Event bus started (sqlite, worker=%s, path=%s)", self.worker, self.path)
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self._run_io(self._unregister)
+        await self._run_io(self._store.close)
+
+    def _register(self):
+        now = time.time()
+        # 只投递启动之后的事件；顺手清掉已死 worker 的在线记录
+        self._last_id = self._store.execute("SELECT COALESCE(MAX(id), 0) FROM events")[0][0]
+        self._store.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('epoch', ?)", (self.epoch,))
+        self.epoch = self._store.execute("SELECT value FROM meta WHERE key = 'epoch'")[0][0]
+        self._store.execute("INSERT OR REPLACE INTO workers (worker, heartbeat) VALUES (?, ?)", (self.worker, now))
+        self._store.execute(
+            "DELETE FROM presence WHERE worker IN (SELECT worker FROM workers WHERE heartbeat <= ?)",
+            (now - self.presence_ttl,),
+        )
+        self._store.execute("DELETE FROM workers WHERE heartbeat <= ?", (now - self.presence_ttl,))
+        self._heartbeat(now)
+
+    def _unregister(self):
+        self._store.execute("DELETE FROM presence WHERE worker = ?", (self.worker,))
+        self._store.execute("DELETE FROM workers WHERE worker = ?", (self.worker,))
+        self._store.execute("DELETE FROM leader WHERE worker = ?", (self.worker,))
+        self._leader_until = 0.0
+
+    def _heartbeat(self, now: float):
+        """续期 worker 心跳 + 抢/续 leader 租约 + 清理过期事件"""
+        self._store.execute("UPDATE workers SET heartbeat = ? WHERE worker = ?", (now, self.worker))
+        expires = now + self.presence_ttl
+        rows = self._store.execute(
+            "INSERT INTO leader (id, worker, expires) VALUES (1, ?, ?) "
+            "ON CONFLICT (id) DO UPDATE SET worker = excluded.worker, expires = excluded.expires "
+            "WHERE leader.worker = excluded.worker OR leader.expires < ? RETURNING worker",
+            (self.worker, expires, now),
+        )
+        self._leader_until = expires if rows else 0.0
+        self._store.execute("DELETE FROM events WHERE created_at < ?", (now - self.retention,))
+
+    def _poll(self) -> tuple[list[tuple[int, str, str]], set[tuple[int, str]], list[tuple[str, int, int]]]:
+        """新事件 + 其他存活 worker 的在线快照 + 计数器快照"""
+        rows = self._store.execute(
+            "SELECT id, origin, payload FROM events WHERE id > ? ORDER BY id", (self._last_id,)
+        )
+        if rows:
+            self._last_id = rows[-1][0]
+        remote = self._store.execute(
+            "SELECT DISTINCT agent_id, kind FROM presence WHERE worker != ? "
+            "AND worker IN (SELECT worker FROM workers WHERE heartbeat > ?)",
+            (self.worker, time.time() - self.presence_ttl),
+        )
+        counters = self._store.execute("SELECT name, key, value FROM counters")
+        return rows, {(aid, kind) for aid, kind in remote}, counters
+
+    def _refresh_counters(self, counters: list[tuple[str, int, int]]):
+        cache: dict[str, dict[int, int]] = {}
+        for name, key, value in counters:
+            cache.setdefault(name, {})[key] = value
+        self._counter_cache = cache
+
+    async def _run(self, on_remote: RemoteHandler):
+        beat_every = self.presence_ttl / 3
+        next_beat = time.time() + beat_every
+        while True:
+            try:
+                writes = self._writes
+                rows, remote, counters = await self._run_io(self._poll)
+                self.presence._remote = remote
+                # 快照查询期间本地又有计数写入：缓存里已有这些改动，等下一轮再刷新，免得被旧快照盖掉
+                if writes == self._writes:
+                    self._refresh_counters(counters)
+                for seq, origin, payload in rows:
+                    if origin != self.worker:
+                        await on_remote(loads(payload), seq)
+                now = time.time()
+                if now >= next_beat:
+                    await self._run_io(self._heartbeat, now)
+                    next_beat = now + beat_every
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Event bus poll failed: %s", e, exc_info=True)
+            await asyncio.sleep(self.poll_interval)
+
+
+def _log_failure(future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("Event bus write failed: %s", future.exception())
+
+
+def create_event_bus(backend: str | None = None) -> InProcessBus | SqliteBus:
+    backend = backend or settings.event_bus_backend
+    if backend == INPROCESS:
+        return InProcessBus()
+    if backend == SQLITE:
+        path = settings.event_bus_path or str(Path(settings.db_path).parent / "event_bus.db")
+        return SqliteBus(
+            path,
+            poll_interval=settings.event_bus_poll_interval_s,
+            retention=settings.event_bus_retention_s,
+            presence_ttl=settings.presence_ttl_s,
+        )
+    raise ValueError(f"未知的 event_bus_backend: {backend}（可选 {INPROCESS} / {SQLITE}）")
+
+
+event_bus = create_event_bus()
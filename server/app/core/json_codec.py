@@ -0,0 +1,69 @@
+"""JSON 编解码层：装了 orjson 就用 orjson，否则退回标准库
+
+广播事件在 broadcast 里只编码一次，所有连接共用同一帧；ping 等常量帧编码后缓存。
+REST 响应通过 FastJSONResponse 走同一个编码器。
+
+settings.json_backend: auto（默认，优先 orjson）/ orjson / stdlib
+"""
+import json
+import logging
+from functools import lru_cache
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+
+def _stdlib_dumps(obj: Any) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _select_backend(name: str) -> str:
+    if name not in ("auto", "orjson", "stdlib"):
+        raise ValueError(f"未知的 json_backend: {name}（可选 auto / orjson / stdlib）")
+    if name == "orjson" and orjson is None:
+        logger.warning("json_backend=orjson 但未安装 orjson，退回标准库")
+    if name == "stdlib" or orjson is None:
+        return "stdlib"
+    return "orjson"
+
+
+BACKEND = _select_backend(settings.json_backend)
+
+if BACKEND == "orjson":
+    _OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(obj: Any) -> bytes:
+        """编码为 UTF-8 JSON bytes"""
+        return orjson.dumps(obj, option=_OPTIONS)
+
+    loads = orjson.loads
+else:
+    dumps = _stdlib_dumps
+    loads = json.loads
+
+
+def dumps_str(obj: Any) -> str:
+    """编码为 str（WebSocket 文本帧）"""
+    return dumps(obj).decode("utf-8")
+
+
+@lru_cache(maxsize=64)
+def const_frame(kind: str) -> str:
+    """{"type": kind} 这类无负载常量帧，编码一次后缓存"""
+    return dumps_str({"type": kind})
+
+
+class FastJSONResponse(JSONResponse):
+    """用上面的编码器渲染的 JSONResponse，作为 app 的 default_response_class"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,173 @@
+"""版本化 schema 迁移
+
+schema_version 表记录已应用到的版本号，启动时只跑版本号更大的迁移步骤，
+全部步骤在同一个 BEGIN IMMEDIATE 事务里执行，任一步失败整体回滚。
+
+新增迁移：在文件末尾用 @migration(版本号, 说明) 注册一个 async 函数，版本号必须递增。
+- 加列 / 建索引：直接执行 ALTER TABLE ... ADD COLUMN / create_indexes()
+- 改列类型、删列、改约束等 SQLite 不支持的变更：用 rebuild_table() 只重建受影响的表
+"""
+import logging
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+from sqlalchemy import MetaData, Table, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.schema import CreateTable
+
+logger = logging.getLogger(__name__)
+
+MigrationFn = Callable[[AsyncConnection], Awaitable[None]]
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    fn: MigrationFn
+
+
+MIGRATIONS: list[Migration] = []
+
+
+def migration(version: int, description: str):
+    """注册一个迁移步骤"""
+    def decorator(fn: MigrationFn) -> MigrationFn:
+        if MIGRATIONS and version <= MIGRATIONS[-1].version:
+            raise ValueError(f"迁移版本号必须递增: {version} <= {MIGRATIONS[-1].version}")
+        MIGRATIONS.append(Migration(version, description, fn))
+        return fn
+    return decorator
+
+
+def latest_version() -> int:
+    return MIGRATIONS[-1].version if MIGRATIONS else 0
+
+
+async def get_schema_version(conn: AsyncConnection) -> int:
+    result = await conn.execute(text("SELECT version FROM schema_version"))
+    row = result.first()
+    return row[0] if row else 0
+
+
+async def _set_schema_version(conn: AsyncConnection, version: int):
+    await conn.execute(text("DELETE FROM schema_version"))
+    await conn.execute(text("INSERT INTO schema_version (version) VALUES (:v)"), {"v": version})
+
+
+async def run_migrations(conn: AsyncConnection, *, fresh: bool = False) -> list[int]:
+    """执行待跑的迁移，返回本次应用的版本号列表。
+
+    fresh=True 表示库是 create_all 刚建出来的，已是最新结构，直接记为最新版本。
+    调用方负责事务（init_db 在写入者连接的 BEGIN IMMEDIATE 里调用）。
+    """
+    await conn.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"))
+    current = await get_schema_version(conn)
+
+    if fresh and current == 0:
+        await _set_schema_version(conn, latest_version())
+        return []
+
+    applied = []
+    for m in MIGRATIONS:
+        if m.version <= current:
+            continue
+        logger.info("Schema migration %d: %s", m.version, m.description)
+        await m.fn(conn)
+        applied.append(m.version)
+
+    if applied:
+        await _set_schema_version(conn, applied[-1])
+    return applied
+
+
+# ── 迁移工具 ──────────────────────────────────────────────
+
+async def _table_columns(conn: AsyncConnection, table_name: str) -> list[str]:
+    result = await conn.execute(text(f"PRAGMA table_info({table_name})"))
+    return [row[1] for row in result.fetchall()]
+
+
+async def create_indexes(conn: AsyncConnection, table: Table):
+    """按模型定义补齐某张表的索引（已存在的跳过）"""
+    def _create(sync_conn):
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+    await conn.run_sync(_create)
+
+
+async def rebuild_table(
+    conn: AsyncConnection,
+    table: Table,
+    column_map: dict[str, str] | None = None,
+):
+    """按模型定义原地重建单张表（SQLite 官方 12 步流程的精简版）。
+
+    建 _new 表 → INSERT ... SELECT 搬数据 → 删旧表 → 改名 → 重建索引。
+    只动这一张表，不需要导出/导入整库。
+    column_map: {新列名: 旧表上的 SQL 表达式}，用于改名或转换的列；
+    其余同名列原样搬运，新表独有的列取默认值。
+    """
+    column_map = column_map or {}
+    name = table.name
+    tmp_name = f"_{name}_new"
+    old_columns = set(await _table_columns(conn, name))
+
+    tmp = table.to_metadata(MetaData(), name=tmp_name)
+    await conn.run_sync(lambda sync_conn: sync_conn.execute(CreateTable(tmp)))
+
+    targets, sources = [], []
+    for col in table.columns:
+        if col.name in column_map:
+            targets.append(col.name)
+            sources.append(column_map[col.name])
+        elif col.name in old_columns:
+            targets.append(col.name)
+            sources.append(col.name)
+    await conn.execute(text(
+        f"INSERT INTO {tmp_name} ({', '.join(targets)}) SELECT {', '.join(sources)} FROM {name}"
+    ))
+    await conn.execute(text(f"DROP TABLE {name}"))
+    await conn.execute(text(f"ALTER TABLE {tmp_name} RENAME TO {name}"))
+    await create_indexes(conn, table)
+
+
+# ── 迁移步骤 ──────────────────────────────────────────────
+# 1~3 是旧的 _migrate_* 探测，只在从无 schema_version 的老库升级时跑一次，
+# 老库可能已被旧探测加过部分列，所以这里保留存在性判断。
+
+@migration(1, "M1.5 agents.bot_token")
+async def _m001_bot_token(conn: AsyncConnection):
+    if "bot_token" not in await _table_columns(conn, "agents"):
+        await conn.execute(text("ALTER TABLE agents ADD COLUMN bot_token VARCHAR(64)"))
+
+
+@migration(2, "M5 agents.satiety/mood/stamina")
+async def _m002_satiety_mood(conn: AsyncConnection):
+    columns = await _table_columns(conn, "agents")
+    if "satiety" not in columns:
+        await conn.execute(text("ALTER TABLE agents ADD COLUMN satiety INTEGER DEFAULT 100"))
+    if "mood" not in columns:
+        await conn.execute(text("ALTER TABLE agents ADD COLUMN mood INTEGER DEFAULT 80"))
+    if "stamina" not in columns:
+        await conn.execute(text("ALTER TABLE agents ADD COLUMN stamina INTEGER DEFAULT 100"))
+
+
+@migration(3, "M6.2 agents.personality_json")
+async def _m003_personality_json(conn: AsyncConnection):
+    if "personality_json" not in await _table_columns(conn, "agents"):
+        await conn.execute(text("ALTER TABLE agents ADD COLUMN personality_json JSON"))
+
+
+@migration(4, "M7 热点查询索引")
+async def _m004_hot_indexes(conn: AsyncConnection):
+    from .database import Base
+    for table in Base.metadata.sorted_tables:
+        await create_indexes(conn, table)
+
+
+@migration(5, "M7 冷热分离：daily_rollups 表 + llm_usage 时间索引")
+async def _m005_archive_rollups(conn: AsyncConnection):
+    from .database import Base
+    # daily_rollups 由 init_db 的 create_all 建出，这里只需补老表上新增的索引
+    await create_indexes(conn, Base.metadata.tables["llm_usage"])
@@ -0,0 +1,184 @@
+"""供应商健康度：EWMA 延迟 + 错误率 + 熔断器，决定一个模型标识走哪个供应商
+
+每次经 llm_gateway 的逻辑调用回报一个结果（延迟、成功 / 失败；重试不重复计）。只有 429 / 5xx /
+连接错误 / 超时算供应商失败；400 之类的请求错误是调用方的问题，不计入。
+
+熔断器三态：
+- closed：正常接流量
+- open：连续失败 provider_failure_threshold 次，或样本足够时错误率 EWMA 超过阈值 → 熔断，
+  provider_cooldown_s 内不再选它
+- half_open：冷却期过后放一个探测请求过去；成功则恢复 closed，失败重新 open
+  （探测请求没有回报，比如被调用方取消，再过一个冷却期重新探测）
+
+选人：在 closed 的供应商里按注册顺序优先（主供应商在前），后面的供应商得分（延迟 EWMA × 错误率惩罚）
+要比当前最优好 provider_switch_ratio 倍才换过去，避免两个差不多的供应商来回抖。
+其余 closed 供应商超过冷却期没被用过时分到一个请求刷新统计：被换下的主供应商恢复了能换回来，
+没样本的备用供应商也有机会证明自己更快。
+全部熔断时不拒绝，退回注册顺序里第一个可用的（总比直接失败强）。
+
+状态按进程保存，以 (provider.name, model_id) 为键：同一供应商下不同模型的延迟和故障各自统计，
+一个模型挂了不会连累该供应商的其他模型。多 worker 各自统计。
+"""
+import logging
+import time
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_ERROR_WEIGHT = 4.0  # 错误率 100% 时得分放大到 5 倍
+
+
+@dataclass(slots=True)
+class ProviderStats:
+    latency: float | None = None  # 秒，EWMA；None 为还没有样本
+    error_rate: float = 0.0  # EWMA（每次调用记 0 / 1）
+    samples: int = 0
+    consecutive_failures: int = 0
+    state: str = CLOSED
+    opened_at: float = 0.0
+    last_used: float = 0.0
+
+    def score(self) -> float | None:
+        if self.latency is None:
+            return None
+        return self.latency * (1 + _ERROR_WEIGHT * self.error_rate)
+
+
+class ProviderHealth:
+
+    def __init__(
+        self,
+        *,
+        alpha: float = 0.2,
+        failure_threshold: int = 5,
+        error_rate_threshold: float = 0.5,
+        min_samples: int = 10,
+        cooldown: float = 30.0,
+        switch_ratio: float = 1.5,
+    ):
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.error_rate_threshold = error_rate_threshold
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        self.switch_ratio = switch_ratio
+        self._stats: dict[tuple[str, str], ProviderStats] = {}
+
+    def stats(self, provider) -> ProviderStats:
+        key = (provider.name, provider.model_id)
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = ProviderStats()
+        return stats
+
+    def reset(self):
+        self._stats.clear()
+
+    # ── 回报 ──
+
+    def _observe(self, stats: ProviderStats, latency: float | None, failed: bool):
+        a = self.alpha
+        if latency is not None:
+            stats.latency = latency if stats.latency is None else (1 - a) * stats.latency + a * latency
+        stats.error_rate = (1 - a) * stats.error_rate + a * float(failed)
+        stats.samples += 1
+
+    def record_success(self, provider, latency: float):
+        stats = self.stats(provider)
+        self._observe(stats, latency, False)
+        stats.consecutive_failures = 0
+        if stats.state != CLOSED:
+            logger.info("Provider %s/%s recovered (latency=%.2fs)", provider.name, provider.model_id, latency)
+            stats.state = CLOSED
+            stats.error_rate = 0.0
+
+    def record_failure(self, provider, latency: float | None = None):
+        stats = self.stats(provider)
+        self._observe(stats, latency, True)
+        stats.consecutive_failures += 1
+        if stats.state == HALF_OPEN or (stats.state == CLOSED and self._should_trip(stats)):
+            stats.state = OPEN
+            stats.opened_at = time.monotonic()
+            logger.warning(
+                "Provider %s/%s circuit open (failures=%d, error_rate=%.2f)",
+                provider.name, provider.model_id, stats.consecutive_failures, stats.error_rate,
+            )
+
+    def _should_trip(self, stats: ProviderStats) -> bool:
+        if stats.consecutive_failures >= self.failure_threshold:
+            return True
+        return stats.samples >= self.min_samples and stats.error_rate >= self.error_rate_threshold
+
+    # ── 选择 ──
+
+    def pick(self, providers: Sequence, probe: bool = True, explore: bool = True):
+        """选一个供应商。
+
+        probe=False 只查看不改状态（不占用半开探测、不记 last_used）；
+        explore=False 不把请求分给久未使用的供应商（调用方自己按顺序兜底时用）。
+        """
+        available = [p for p in providers if p.is_available()]
+        if not available:
+            return None
+        now = time.monotonic()
+
+        for p in available:
+            stats = self.stats(p)
+            if (
+                (stats.state == OPEN and now - stats.opened_at >= self.cooldown)
+                or (stats.state == HALF_OPEN and now - stats.last_used >= self.cooldown)
+            ):
+                # 冷却期过了：放一个探测请求过去
+                if probe:
+                    stats.state = HALF_OPEN
+                    stats.last_used = now
+                    logger.info("Provider %s/%s half-open, probing", p.name, p.model_id)
+                return p
+
+        closed = [p for p in available if self.stats(p).state == CLOSED]
+        if not closed:
+            return available[0]
+
+        best = closed[0]
+        best_score = self.stats(best).score()
+        for p in closed[1:]:
+            score = self.stats(p).score()
+            if score is not None and best_score is not None and score * self.switch_ratio < best_score:
+                best, best_score = p, score
+
+        if explore and self.stats(best).samples:
+            for p in closed:
+                if p is not best and now - self.stats(p).last_used >= self.cooldown:
+                    best = p
+                    break
+
+        if probe:
+            self.stats(best).last_used = now
+        return best
+
+    def rank(self, providers: Sequence) -> list:
+        """按选择优先级排好的全部可用供应商（fallback 链用）：首选在前，熔断中的垫底"""
+        available = [p for p in providers if p.is_available()]
+        first = self.pick(available, explore=False)
+        if first is None:
+            return []
+        rest = [p for p in available if p is not first]
+        rest.sort(key=lambda p: self.stats(p).state != CLOSED)  # 稳定排序，保留注册顺序
+        return [first, *rest]
+
+
+provider_health = ProviderHealth(
+    alpha=settings.provider_ewma_alpha,
+    failure_threshold=settings.provider_failure_threshold,
+    error_rate_threshold=settings.provider_error_rate_threshold,
+    min_samples=settings.provider_min_samples,
+    cooldown=settings.provider_cooldown_s,
+    switch_ratio=settings.provider_switch_ratio,
+)
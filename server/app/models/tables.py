@@ -1,6 +1,6 @@
 from sqlalchemy import (
     Column, Integer, String, Float, Boolean, DateTime, Date, Text, JSON,
-    ForeignKey, Enum, LargeBinary, CheckConstraint, UniqueConstraint,
+    ForeignKey, Enum, LargeBinary, CheckConstraint, UniqueConstraint, Index,
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -66,6 +66,10 @@ class Message(Base):
 
     agent = relationship("Agent", back_populates="messages")
 
+    __table_args__ = (
+        Index("ix_messages_created_at", "created_at"),
+    )
+
 
 # 记忆
 class Memory(Base):
@@ -82,6 +86,11 @@ class Memory(Base):
 
     agent = relationship("Agent", back_populates="memories")
 
+    __table_args__ = (
+        Index("ix_memories_agent_type_expires", "agent_id", "memory_type", "expires_at"),
+        Index("ix_memories_type_expires", "memory_type", "expires_at"),
+    )
+
 
 # 城市工作岗位
 class Job(Base):
@@ -104,6 +113,12 @@ class CheckIn(Base):
     reward = Column(Integer, nullable=False)
     checked_at = Column(DateTime, server_default=func.now())
 
+    __table_args__ = (
+        Index("ix_checkins_agent_checked", "agent_id", "checked_at"),
+        Index("ix_checkins_job_checked", "job_id", "checked_at"),
+        Index("ix_checkins_checked_at", "checked_at"),
+    )
+
 
 # 悬赏任务
 class Bounty(Base):
@@ -118,6 +133,11 @@ class Bounty(Base):
     created_at = Column(DateTime, server_default=func.now())
     completed_at = Column(DateTime, nullable=True)
 
+    __table_args__ = (
+        Index("ix_bounties_status_claimed", "status", "claimed_by"),
+        Index("ix_bounties_status_created", "status", "created_at"),
+    )
+
 
 # LLM 用量追踪
 class LLMUsage(Base):
@@ -133,6 +153,10 @@ class LLMUsage(Base):
     latency_ms = Column(Integer, default=0)
     created_at = Column(DateTime, server_default=func.now())
 
+    __table_args__ = (
+        Index("ix_llm_usage_created_at", "created_at"),
+    )
+
 
 class ItemType(str, enum.Enum):
     AVATAR_FRAME = "avatar_frame"
@@ -175,6 +199,10 @@ class MemoryReference(Base):
     memory_id = Column(Integer, ForeignKey("memories.id"), nullable=False)
     created_at = Column(DateTime, server_default=func.now())
 
+    __table_args__ = (
+        Index("ix_memory_references_message", "message_id"),
+    )
+
 
 # 城市建筑
 class Building(Base):
@@ -205,6 +233,7 @@ class BuildingWorker(Base):
 
     __table_args__ = (
         UniqueConstraint("building_id", "agent_id", name="uq_building_worker"),
+        Index("ix_building_workers_agent", "agent_id"),
     )
 
 
@@ -250,6 +279,10 @@ class ProductionLog(Base):
     output_qty = Column(Integer, default=0)
     tick_time = Column(DateTime, server_default=func.now())
 
+    __table_args__ = (
+        Index("ix_production_logs_tick_time", "tick_time"),
+    )
+
 
 # M5.2 交易市场 — 挂单
 class MarketOrder(Base):
@@ -266,6 +299,10 @@ class MarketOrder(Base):
     status = Column(String(16), default="open")          # open / partial / filled / cancelled
     created_at = Column(DateTime, server_default=func.now())
 
+    __table_args__ = (
+        Index("ix_market_orders_status_created", "status", "created_at"),
+    )
+
 
 # M5.2 交易市场 — 成交日志
 class TradeLog(Base):
@@ -280,3 +317,23 @@ class TradeLog(Base):
     buy_type = Column(String(32), nullable=False)
     buy_amount = Column(Float, nullable=False)           # 本次成交买入量
     created_at = Column(DateTime, server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_trade_logs_created_at", "created_at"),
+    )
+
+
+# M7 冷热分离 — 归档后留在热库里的按日汇总
+class DailyRollup(Base):
+    __tablename__ = "daily_rollups"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    source = Column(String(32), nullable=False)  # 来源表名：messages / trade_logs / ...
+    day = Column(Date, nullable=False)
+    dimension = Column(String(128), nullable=False, default="")  # 分组键，如 agent_id、sell_type->buy_type
+    row_count = Column(Integer, nullable=False, default=0)
+    metrics = Column(JSON, default=dict)  # 各数值列的汇总，如 {"reward": 120}
+
+    __table_args__ = (
+        UniqueConstraint("source", "day", "dimension", name="uq_daily_rollup"),
+    )
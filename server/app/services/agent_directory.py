@@ -0,0 +1,129 @@
+"""进程内 agent 名录：name → id，外加按名字编译的字典树，@提及一次扫描解析完
+
+入站消息、agent 发言都要解析 @提及，原先每次全表查 agents。现在名录只在需要时从 DB 载入：
+- 首次使用时；
+- 任何会话提交了 agent 的新增 / 删除 / 改名之后（ORM 会话事件自动失效，
+  覆盖 app/api/agents.py 的增删改，也覆盖种子脚本和测试里直接 add 的 Agent）；
+- 超过 agent_directory_ttl_s 未刷新时（多 worker 下其他进程改名的兜底）。
+
+提及规则与原正则 @([\\w\\u4e00-\\u9fff]+) 一致：@ 后的整段词必须恰好等于某个名字。
+"""
+import logging
+import time
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..models import Agent
+
+logger = logging.getLogger(__name__)
+
+_END = ""  # 字典树结点里的终止标记（单个字符不会是空串）
+_NAME_STMT = select(Agent.name, Agent.id)
+
+
+def _is_word(ch: str) -> bool:
+    """与正则 [\\w\\u4e00-\\u9fff] 等价"""
+    return ch.isalnum() or ch == "_" or "\u4e00" <= ch <= "\u9fff"
+
+
+class AgentDirectory:
+
+    def __init__(self, ttl: float = 30.0):
+        self.ttl = ttl  # 0 为只靠失效事件
+        self._ids: dict[str, int] = {}
+        self._trie: dict = {}
+        self._loaded_at: float | None = None
+        self.loads = 0
+
+    @property
+    def stale(self) -> bool:
+        if self._loaded_at is None:
+            return True
+        return bool(self.ttl) and time.monotonic() - self._loaded_at > self.ttl
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    async def ensure_loaded(self, db: AsyncSession):
+        if self.stale:
+            result = await db.execute(_NAME_STMT)
+            self.load(result.all())
+
+    def load(self, pairs):
+        """用 (name, id) 序列重建名录和字典树"""
+        self._ids = {name: aid for name, aid in pairs}
+        trie: dict = {}
+        for name, aid in self._ids.items():
+            if not name or not all(_is_word(ch) for ch in name):
+                continue  # 含空格等字符的名字无法被 @ 到
+            node = trie
+            for ch in name:
+                node = node.setdefault(ch, {})
+            node[_END] = aid
+        self._trie = trie
+        self._loaded_at = time.monotonic()
+        self.loads += 1
+
+    def name_map(self) -> dict[str, int]:
+        """{name: id}（只读，调用方不要修改）"""
+        return self._ids
+
+    def parse_mentions(self, content: str) -> list[int]:
+        """一次扫描解析 @提及，按出现顺序返回 agent_id（可重复）"""
+        found = []
+        n = len(content)
+        i = content.find("@")
+        while i != -1:
+            node = self._trie
+            j = i + 1
+            while j < n and _is_word(content[j]):
+                node = node.get(content[j])
+                if node is None:
+                    break
+                j += 1
+            # 整段词走完且停在某个名字的结尾
+            if node is not None and (j == n or not _is_word(content[j])) and _END in node:
+                found.append(node[_END])
+            i = content.find("@", j)
+        return found
+
+
+agent_directory = AgentDirectory(ttl=settings.agent_directory_ttl_s)
+
+
+# ── ORM 会话事件：提交了 agent 增删 / 改名后让名录失效 ──
+
+_DIRTY_KEY = "agent_directory_dirty"
+
+
+def _names_touched(session: Session) -> bool:
+    for obj in session.new:
+        if isinstance(obj, Agent):
+            return True
+    for obj in session.deleted:
+        if isinstance(obj, Agent):
+            return True
+    for obj in session.dirty:
+        if isinstance(obj, Agent) and inspect(obj).attrs.name.history.has_changes():
+            return True
+    return False
+
+
+@event.listens_for(Session, "before_flush")
+def _track_agent_changes(session, flush_context, instances):
+    if _names_touched(session):
+        session.info[_DIRTY_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    if session.info.pop(_DIRTY_KEY, False):
+        agent_directory.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _clear_on_rollback(session):
+    session.info.pop(_DIRTY_KEY, None)
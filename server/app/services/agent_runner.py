@@ -6,11 +6,11 @@ Phase 2：替换为 OpenClaw SDK（外部接口不变）
 """
 import logging
 import time
-from openai import AsyncOpenAI
+from collections.abc import Awaitable, Callable
 from sqlalchemy.ext.asyncio import AsyncSession
-from ..core.config import resolve_model
 from ..core.database import async_session as session_maker
 from ..models import MemoryType, Agent, AgentStatus
+from .llm_gateway import llm_gateway
 from .memory_service import memory_service
 from .status_helper import set_agent_status
 
@@ -82,12 +82,14 @@ class AgentRunner:
         self.personality_json = personality_json
 
     async def generate_reply(
-        self, chat_history: list[dict], db: AsyncSession | None = None
+        self, chat_history: list[dict], db: AsyncSession | None = None,
+        on_delta: Callable[[str], Awaitable[None]] | None = None,
     ) -> tuple[str | None, dict | None, list[int]]:
         """
         生成 Agent 回复。
         chat_history: [{"name": "Alice", "content": "xxx"}, ...]
         db: 传入时启用记忆注入
+        on_delta: 传入时走流式接口，每段 content 增量回调一次（见 reply_stream）
         返回: (reply, usage_info, used_memory_ids)
         """
         # 使用 chat_history 作为上下文（已从 DB 查询最新历史）
@@ -146,13 +148,16 @@ class AgentRunner:
                 })
 
         try:
-            resolved = resolve_model(self.model)
-            if not resolved:
+            provider = llm_gateway.route(self.model)
+            if not provider:
                 logger.warning("Model %s not configured or no API key", self.model)
                 return None, None, []
+            model_id = provider.model_id
 
-            base_url, api_key, model_id = resolved
-            client = AsyncOpenAI(api_key=api_key, base_url=base_url)
+            async def complete(**kwargs):
+                if on_delta is not None:
+                    return await llm_gateway.chat_stream(provider, on_delta, **kwargs)
+                return await llm_gateway.chat(provider, **kwargs)
 
             # F35: 状态 → THINKING
             agent_obj = None
@@ -161,7 +166,7 @@ class AgentRunner:
                     obj = await db.get(Agent, self.agent_id)
                     if isinstance(obj, Agent):
                         agent_obj = obj
-                        await set_agent_status(agent_obj, AgentStatus.THINKING, "正在思考回复…", db)
+                        await set_agent_status(agent_obj, AgentStatus.THINKING, "正在思考回复…", db, coalesce=True)
                 except Exception:
                     pass  # mock / test 环境下跳过状态更新
 
@@ -170,7 +175,6 @@ class AgentRunner:
             import json as _json
             tools = tool_registry.get_tools_for_llm()
             create_kwargs: dict = {
-                "model": model_id,
                 "messages": messages,
                 "max_tokens": 800,
             }
@@ -178,7 +182,7 @@ class AgentRunner:
                 create_kwargs["tools"] = tools
 
             start = time.time()
-            response = await client.chat.completions.create(**create_kwargs)
+            response = await complete(**create_kwargs)
 
             # M5.1: tool_call 处理（最多 1 轮）
             msg = response.choices[0].message
@@ -187,7 +191,7 @@ class AgentRunner:
                 for tc in msg.tool_calls:
                     # F35: 状态 → EXECUTING
                     if agent_obj:
-                        await set_agent_status(agent_obj, AgentStatus.EXECUTING, f"执行 {tc.function.name}…", db)
+                        await set_agent_status(agent_obj, AgentStatus.EXECUTING, f"执行 {tc.function.name}…", db, coalesce=True)
                     try:
                         args = _json.loads(tc.function.arguments)
                     except _json.JSONDecodeError:
@@ -217,9 +221,8 @@ class AgentRunner:
                 # 第二次调用：基于工具结果生成最终回复（不传 tools，防止再次触发）
                 # F35: 状态 → THINKING（继续思考）
                 if agent_obj:
-                    await set_agent_status(agent_obj, AgentStatus.THINKING, "正在整理回复…", db)
-                response = await client.chat.completions.create(
-                    model=model_id,
+                    await set_agent_status(agent_obj, AgentStatus.THINKING, "正在整理回复…", db, coalesce=True)
+                response = await complete(
                     messages=messages,
                     max_tokens=800,
                 )
@@ -253,7 +256,7 @@ class AgentRunner:
                 reply = reply.strip()
             # F35: 状态 → IDLE
             if agent_obj:
-                await set_agent_status(agent_obj, AgentStatus.IDLE, "", db)
+                await set_agent_status(agent_obj, AgentStatus.IDLE, "", db, coalesce=True)
             return reply, usage_info, used_memory_ids
         except Exception as e:
             logger.error("AgentRunner LLM call failed for %s: %s", self.name, e)
@@ -261,8 +264,8 @@ class AgentRunner:
             if db is not None:
                 try:
                     agent_obj = await db.get(Agent, self.agent_id)
-                    if agent_obj:
-                        await set_agent_status(agent_obj, AgentStatus.IDLE, "", db)
+                    if isinstance(agent_obj, Agent):
+                        await set_agent_status(agent_obj, AgentStatus.IDLE, "", db, coalesce=True)
                 except Exception:
                     pass
             return None, None, []
@@ -298,6 +301,7 @@ class AgentRunnerManager:
         """
         按模型分组并发调用 LLM。
         agents_info: [{"agent_id", "agent_name", "persona", "model", "history"}, ...]
+            可选 "on_delta"：该 agent 走流式生成
         返回 {agent_id: (reply, usage_info, used_memory_ids)}
         每个协程内部创建独立的 AsyncSession，避免并发共享。
         """
@@ -313,24 +317,24 @@ class AgentRunnerManager:
             )
             model_key = info["model"]
             prompts_by_model.setdefault(model_key, []).append(
-                (info["agent_id"], runner, info["history"])
+                (info["agent_id"], runner, info["history"], info.get("on_delta"))
             )
 
         # 2. 按模型分组并发调用（每个协程独立 session）
         results: dict[int, tuple[str | None, dict | None, list[int]]] = {}
 
-        async def _call_one(agent_id, runner, history):
+        async def _call_one(agent_id, runner, history, on_delta):
             try:
                 async with session_maker() as db:
-                    return agent_id, await runner.generate_reply(history, db=db)
+                    return agent_id, await runner.generate_reply(history, db=db, on_delta=on_delta)
             except Exception as e:
                 logger.error("Batch generate failed for agent %d: %s", agent_id, e)
                 return agent_id, (None, None, [])
 
         tasks = []
         for group in prompts_by_model.values():
-            for agent_id, runner, history in group:
-                tasks.append(_call_one(agent_id, runner, history))
+            for agent_id, runner, history, on_delta in group:
+                tasks.append(_call_one(agent_id, runner, history, on_delta))
 
         gather_results = await asyncio.gather(*tasks)
         for agent_id, result in gather_results:
@@ -0,0 +1,294 @@
+"""冷热分离：日志类表的历史行归档到按月的 archive_YYYYMM.db
+
+messages / trade_logs / production_logs / llm_usage / checkins 只增不减，
+按时间排序的查询要越过全部历史。每日调度把早于 archive_horizon_days 的行
+搬到与主库同目录的 archive_YYYYMM.db（ATTACH 后 INSERT ... SELECT + DELETE），
+并在热库 daily_rollups 留下按日汇总，热库保持小到工作集能常驻 page cache。
+
+搬运幂等：归档表与热表同主键，INSERT OR IGNORE；WAL 下跨库事务不保证原子，
+中途崩溃时重跑即可收敛。
+
+读取：热库结果不够时，调用方用 fetch_archived() 按月份从新到旧补齐，
+归档文件以只读方式直接打开，返回的 Row 与 ORM 对象一样可按列名取属性。
+月份列表首次读取时扫描一次目录并缓存，archive() 新建月份文件时更新缓存。
+"""
+import asyncio
+import logging
+import re
+import sqlite3
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import Column, Index, MetaData, Table, create_engine, event
+from sqlalchemy.dialects import sqlite as sqlite_dialect
+from sqlalchemy.engine import Engine, Row
+from sqlalchemy.pool import NullPool
+from sqlalchemy.schema import CreateIndex, CreateTable
+from sqlalchemy.sql import Select
+
+from ..core.config import settings
+from ..models import Message, TradeLog, ProductionLog, LLMUsage, CheckIn
+
+logger = logging.getLogger(__name__)
+
+_ARCHIVE_NAME = re.compile(r"^archive_(\d{6})\.db$")
+
+
+@dataclass(frozen=True)
+class ArchiveSpec:
+    """一张可归档的表：时间列 + 汇总到 daily_rollups 的分组键和数值列"""
+    table: Table
+    time_column: str
+    dimension_sql: str  # 归档表上的 SQL 表达式，结果为文本
+    metrics_sql: str  # json_object(...) 表达式
+
+    @property
+    def name(self) -> str:
+        return self.table.name
+
+
+ARCHIVE_SPECS: list[ArchiveSpec] = [
+    ArchiveSpec(
+        Message.__table__, "created_at",
+        "CAST(agent_id AS TEXT) || ':' || COALESCE(message_type, '')",
+        "json_object('chars', SUM(length(content)))",
+    ),
+    ArchiveSpec(
+        TradeLog.__table__, "created_at",
+        "sell_type || '->' || buy_type",
+        "json_object('sell_amount', SUM(sell_amount), 'buy_amount', SUM(buy_amount))",
+    ),
+    ArchiveSpec(
+        ProductionLog.__table__, "tick_time",
+        "CAST(building_id AS TEXT) || ':' || output_type",
+        "json_object('input_qty', SUM(input_qty), 'output_qty', SUM(output_qty))",
+    ),
+    ArchiveSpec(
+        LLMUsage.__table__, "created_at",
+        "model || ':' || COALESCE(CAST(agent_id AS TEXT), '')",
+        "json_object('prompt_tokens', SUM(prompt_tokens), 'completion_tokens', SUM(completion_tokens), "
+        "'total_tokens', SUM(total_tokens), 'cost', SUM(cost), 'avg_latency_ms', AVG(latency_ms))",
+    ),
+    ArchiveSpec(
+        CheckIn.__table__, "checked_at",
+        "CAST(agent_id AS TEXT) || ':' || CAST(job_id AS TEXT)",
+        "json_object('reward', SUM(reward))",
+    ),
+]
+
+
+def _archive_ddl(spec: ArchiveSpec, schema: str) -> list[str]:
+    """归档表 DDL：只保留列和主键（不带外键），外加时间列索引"""
+    cols = [Column(c.name, c.type, primary_key=c.primary_key) for c in spec.table.columns]
+    table = Table(spec.name, MetaData(), *cols, schema=schema)
+    index = Index(f"ix_{spec.name}_{spec.time_column}", table.c[spec.time_column])
+    dialect = sqlite_dialect.dialect()
+    return [
+        str(CreateTable(table, if_not_exists=True).compile(dialect=dialect)),
+        str(CreateIndex(index, if_not_exists=True).compile(dialect=dialect)),
+    ]
+
+
+def _month_bounds(month: str) -> tuple[str, str]:
+    """'202501' → ('2025-01-01 00:00:00', '2025-02-01 00:00:00')"""
+    year, mon = int(month[:4]), int(month[4:])
+    nxt = (year + 1, 1) if mon == 12 else (year, mon + 1)
+    return f"{year:04d}-{mon:02d}-01 00:00:00", f"{nxt[0]:04d}-{nxt[1]:02d}-01 00:00:00"
+
+
+class ArchiveService:
+
+    def __init__(self, db_path: str, horizon_days: int = 30, batch_size: int = 5000):
+        self.db_path = db_path
+        self.archive_dir = Path(db_path).parent
+        self.horizon_days = horizon_days
+        self.batch_size = batch_size
+        self._engines: dict[Path, Engine] = {}
+        self._months: list[str] | None = None
+        self._lock = asyncio.Lock()
+
+    def archive_path(self, month: str) -> Path:
+        return self.archive_dir / f"archive_{month}.db"
+
+    def archive_months(self) -> list[str]:
+        """已存在的归档月份，升序（缓存，首次调用时扫描目录）"""
+        if self._months is None:
+            if not self.archive_dir.exists():
+                return []
+            self._months = sorted(
+                m.group(1) for p in self.archive_dir.iterdir() if (m := _ARCHIVE_NAME.match(p.name))
+            )
+        return list(self._months)
+
+    def may_hold(self, since: datetime) -> bool:
+        """since 之后的行是否可能已在归档库（早于归档分界才需要查归档）。
+
+        分界是 UTC 日期的零点，这里多留一天，本地时区的 since 也不会漏查。
+        未开启归档时不设分界：以前归档出去的文件照查。
+        """
+        if self.horizon_days <= 0:
+            return True
+        return since < datetime.now() - timedelta(days=self.horizon_days - 1)
+
+    # ── 归档（写） ──
+
+    async def archive(self) -> dict[str, int]:
+        """把早于 horizon 的行搬进归档库，返回 {表名: 搬运行数}"""
+        if self.horizon_days <= 0:
+            return {}
+        async with self._lock:
+            moved = await asyncio.to_thread(self._archive_sync)
+        if any(moved.values()):
+            logger.info("Archived rows older than %d days: %s", self.horizon_days, moved)
+        return moved
+
+    def _archive_sync(self) -> dict[str, int]:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA busy_timeout=30000")
+            cutoff = conn.execute(
+                "SELECT datetime(date('now', ?))", (f"-{self.horizon_days} days",)
+            ).fetchone()[0]
+
+            months: dict[str, list[ArchiveSpec]] = {}
+            for spec in ARCHIVE_SPECS:
+                ts = spec.time_column
+                rows = conn.execute(
+                    f"SELECT DISTINCT strftime('%Y%m', {ts}) FROM {spec.name} WHERE {ts} < ?", (cutoff,)
+                ).fetchall()
+                for (month,) in rows:
+                    if month:
+                        months.setdefault(month, []).append(spec)
+
+            moved = {spec.name: 0 for spec in ARCHIVE_SPECS}
+            for month in sorted(months):
+                start, end = _month_bounds(month)
+                upper = min(end, cutoff)
+                conn.execute("ATTACH DATABASE ? AS arch", (str(self.archive_path(month)),))
+                try:
+                    # 每个归档库都建齐所有表，读取时不必区分某月有没有某张表
+                    for spec in ARCHIVE_SPECS:
+                        for ddl in _archive_ddl(spec, "arch"):
+                            conn.execute(ddl)
+                    if self._months is not None and month not in self._months:
+                        self._months = sorted([*self._months, month])
+                    for spec in months[month]:
+                        moved[spec.name] += self._move_range(conn, spec, start, upper)
+                        self._rollup_range(conn, spec, start, upper)
+                finally:
+                    conn.execute("DETACH DATABASE arch")
+            return moved
+        finally:
+            conn.close()
+
+    def _move_range(self, conn: sqlite3.Connection, spec: ArchiveSpec, start: str, upper: str) -> int:
+        """分批搬运 [start, upper) 的行，每批一个短写事务，不长时间占住写锁。
+
+        始终保留 id 最大的一行：表没有 AUTOINCREMENT，热表清空后 rowid 会从 1 重新分配，
+        与归档库里的主键撞车。
+        """
+        cols = ", ".join(c.name for c in spec.table.columns)
+        ts = spec.time_column
+        batch_ids = (
+            f"SELECT id FROM main.{spec.name} WHERE {ts} >= ? AND {ts} < ? "
+            f"AND id < (SELECT MAX(id) FROM main.{spec.name}) ORDER BY id LIMIT ?"
+        )
+        params = (start, upper, self.batch_size)
+        total = 0
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    f"INSERT OR IGNORE INTO arch.{spec.name} ({cols}) "
+                    f"SELECT {cols} FROM main.{spec.name} WHERE id IN ({batch_ids})", params,
+                )
+                n = conn.execute(f"DELETE FROM main.{spec.name} WHERE id IN ({batch_ids})", params).rowcount
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            total += n
+            if n < self.batch_size:
+                return total
+
+    def _rollup_range(self, conn: sqlite3.Connection, spec: ArchiveSpec, start: str, upper: str):
+        """从归档表重算这些天的汇总（含以前归档过的行），覆盖写回热库"""
+        ts = spec.time_column
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                f"INSERT INTO main.daily_rollups (source, day, dimension, row_count, metrics) "
+                f"SELECT ?, date({ts}), COALESCE({spec.dimension_sql}, ''), COUNT(*), {spec.metrics_sql} "
+                f"FROM arch.{spec.name} WHERE {ts} >= ? AND {ts} < ? "
+                f"GROUP BY date({ts}), COALESCE({spec.dimension_sql}, '') "
+                f"ON CONFLICT (source, day, dimension) DO UPDATE SET "
+                f"row_count = excluded.row_count, metrics = excluded.metrics",
+                (spec.name, start, upper),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    # ── 读取 ──
+
+    def _engine(self, path: Path) -> Engine:
+        eng = self._engines.get(path)
+        if eng is None:
+            eng = create_engine(
+                f"sqlite:///{path}", poolclass=NullPool,
+                connect_args={"check_same_thread": False},
+            )
+
+            @event.listens_for(eng, "connect")
+            def _readonly(dbapi_connection, connection_record):
+                dbapi_connection.execute("PRAGMA query_only=ON")
+
+            self._engines[path] = eng
+        return eng
+
+    async def fetch_archived(
+        self,
+        stmt: Select,
+        *,
+        limit: int | None = None,
+        offset: int = 0,
+        since: datetime | None = None,
+        newest_first: bool = True,
+    ) -> list[Row]:
+        """在归档库上执行一条 Core 查询，按月份顺序拼接结果，凑够 limit 即停（None 为不限）。
+
+        stmt 只能引用可归档的表（归档库里没有 agents、buildings 等），
+        并自带与 newest_first 一致的 ORDER BY；since 用于跳过更早月份的文件。
+        """
+        months = self.archive_months()
+        if since is not None:
+            months = [m for m in months if m >= since.strftime("%Y%m")]
+        if newest_first:
+            months.reverse()
+        if not months or (limit is not None and limit <= 0):
+            return []
+        return await asyncio.to_thread(self._fetch_sync, stmt, months, limit, offset)
+
+    def _fetch_sync(self, stmt: Select, months: list[str], limit: int | None, offset: int) -> list[Row]:
+        rows: list[Row] = []
+        skip = offset
+        for month in months:
+            query = stmt if limit is None else stmt.limit(skip + limit - len(rows))
+            with self._engine(self.archive_path(month)).connect() as conn:
+                batch = conn.execute(query).all()
+            if skip:
+                dropped = min(skip, len(batch))
+                batch, skip = batch[dropped:], skip - dropped
+            rows.extend(batch)
+            if limit is not None and len(rows) >= limit:
+                break
+        return rows if limit is None else rows[:limit]
+
+
+archive_service = ArchiveService(
+    settings.db_path,
+    horizon_days=settings.archive_horizon_days,
+    batch_size=settings.archive_batch_size,
+)
@@ -8,24 +8,25 @@ import logging
 import asyncio
 import random
 from datetime import datetime, timezone
+from functools import partial
 
-from openai import AsyncOpenAI
 from sqlalchemy import select, func as sa_func
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import joinedload
 
-from ..core.config import resolve_model
-from ..core.database import async_session
-from ..models import Agent, Message, Job, CheckIn, VirtualItem, AgentItem, Building, BuildingWorker, AgentResource, AgentStatus
+from ..core.database import async_read_session, ensure_write_transaction, write_queue
+from ..models import Agent, Job, CheckIn, VirtualItem, AgentItem, Building, BuildingWorker, AgentResource, AgentStatus
 from ..models.tables import Bounty
-from .work_service import work_service
+from .work_service import work_service, checked_in_today
 from .shop_service import shop_service
 from .economy_service import economy_service
 from .agent_runner import runner_manager
+from .llm_gateway import llm_gateway
+from .reply_stream import open_stream
+from .wakeup_service import get_recent_messages
 from .city_service import assign_worker, remove_worker, eat_food, get_agent_resources, construct_building, BUILDING_RECIPES
 # 策略系统 dormant（DEV-40: 调度架构不匹配，冻结等待事件驱动重做）
 # from .strategy_engine import Strategy, StrategyType, parse_strategies, update_strategies, get_strategies
-from .status_helper import set_agent_status
+from .status_helper import announce_status, set_agent_status, set_all_agents_status
 
 logger = logging.getLogger(__name__)
 
@@ -62,7 +63,6 @@ params: checkin={}, purchase={"item_id": <int>}, chat={}, rest={}, assign_buildi
 async def build_world_snapshot(db: AsyncSession) -> str:
     """构建世界状态快照，返回结构化文本。"""
     now = datetime.now(timezone.utc)
-    today_utc = sa_func.date("now")
 
     # 1. 所有非人类 Agent
     result = await db.execute(select(Agent).where(Agent.id != 0))
@@ -73,7 +73,7 @@ async def build_world_snapshot(db: AsyncSession) -> str:
     # 2. 每个 Agent 的今日打卡状态
     checkin_result = await db.execute(
         select(CheckIn.agent_id)
-        .where(sa_func.date(CheckIn.checked_at) == today_utc)
+        .where(checked_in_today())
     )
     checked_in_agents = {row[0] for row in checkin_result.all()}
 
@@ -119,15 +119,9 @@ async def build_world_snapshot(db: AsyncSession) -> str:
         )
 
     # 5. 最近 10 条聊天
-    msg_result = await db.execute(
-        select(Message)
-        .options(joinedload(Message.agent))
-        .order_by(Message.created_at.desc())
-        .limit(10)
-    )
-    messages = list(reversed(msg_result.scalars().all()))
+    messages = await get_recent_messages(db, limit=10)
     msg_lines = [
-        f"- {m.agent.name if m.agent else '?'}: {m.content[:80]}"
+        f"- {m.agent_name or '?'}: {m.content[:80]}"
         for m in messages
     ] or ["(无)"]
 
@@ -254,18 +248,15 @@ async def decide(snapshot: str) -> list[dict]:
     if not snapshot:
         return []
 
-    resolved = resolve_model(AUTONOMY_MODEL)
-    if not resolved:
+    provider = llm_gateway.route(AUTONOMY_MODEL)
+    if not provider:
         logger.warning("Autonomy model not configured")
         return []
 
-    base_url, api_key, model_id = resolved
-
     raw = ""
     try:
-        client = AsyncOpenAI(api_key=api_key, base_url=base_url)
-        response = await client.chat.completions.create(
-            model=model_id,
+        response = await llm_gateway.chat(
+            provider,
             messages=[
                 {"role": "user", "content": SYSTEM_PROMPT + "\n\n" + snapshot},
             ],
@@ -353,9 +344,24 @@ def _validate_actions(raw_list: list) -> list[dict]:
 
 
 async def execute_decisions(decisions: list[dict], db: AsyncSession, snapshot: str = "") -> dict:
-    """逐条执行决策，返回统计。"""
-    from ..api.chat import broadcast, send_agent_message
+    """逐条执行决策，返回统计。
+
+    整个 tick 一个事务：服务函数以 commit=False 调用，每条决策包在自己的 SAVEPOINT 里，
+    失败只回滚该条；循环结束统一提交一次。
+    状态变更和 agent_action 等事件先按决策攒着，SAVEPOINT 回滚的整条丢弃，
+    其余等提交成功后再广播，客户端不会看到回滚掉的动作。
+    本函数在调用方的 session 上提交（测试、脚本）；tick 把执行阶段交给 write_queue。
+    """
+    notices: list = []
+    stats, chat_tasks, round_log = await _apply_decisions(decisions, db, notices)
+    await db.commit()
+    return await _settle_decisions(stats, chat_tasks, round_log, notices, db, snapshot)
 
+
+async def _apply_decisions(
+    decisions: list[dict], db: AsyncSession, notices: list,
+) -> tuple[dict, list[dict], list[dict]]:
+    """执行阶段：只写库不提交，提交后要发的广播（partial 协程函数）追加到 notices"""
     stats = {"success": 0, "failed": 0, "skipped": 0}
     chat_tasks: list[dict] = []
     round_log: list[dict] = []
@@ -364,6 +370,8 @@ async def execute_decisions(decisions: list[dict], db: AsyncSession, snapshot: s
     result = await db.execute(select(Agent.id, Agent.name).where(Agent.id != 0))
     agent_names = {aid: name for aid, name in result.all()}
 
+    await ensure_write_transaction(db)
+
     for dec in decisions:
         aid = dec.get("agent_id")
         action = dec.get("action", "rest")
@@ -376,224 +384,238 @@ async def execute_decisions(decisions: list[dict], db: AsyncSession, snapshot: s
             stats["skipped"] += 1
             continue
 
-        # F35: 状态 → EXECUTING
-        # TODO: set_agent_status 内部 commit 会提前提交 session 中的 pending 变更，
-        #       破坏 flush-not-commit 的事务隔离意图。后续重构应改为 flush 或独立 session。
         agent_obj = await db.get(Agent, aid)
-        if agent_obj and action != "rest":
-            await set_agent_status(agent_obj, AgentStatus.EXECUTING, f"执行 {action}…", db)
+        pending: list = []
 
         try:
-            if action == "rest":
-                stats["skipped"] += 1
-                round_log.append({"agent_id": aid, "agent_name": agent_name, "action": "rest", "reason": reason})
-                # F35: rest 时立即恢复 IDLE（不等最终兜底）
+            async with db.begin_nested():
+                # F35: 状态 → EXECUTING（rest 时立即恢复 IDLE，不等最终兜底）
                 if agent_obj:
-                    await set_agent_status(agent_obj, AgentStatus.IDLE, "", db)
-                continue
+                    status, activity = (
+                        (AgentStatus.IDLE, "") if action == "rest" else (AgentStatus.EXECUTING, f"执行 {action}…")
+                    )
+                    await set_agent_status(agent_obj, status, activity, db, commit=False, notify=False)
+                    pending.append(partial(announce_status, aid, agent_name, status, activity, coalesce=True))
 
-            if action == "checkin":
-                # 自动选岗位：用 params 中的 job_id，否则随机选一个有空位的
-                job_id = params.get("job_id")
-                if not job_id:
-                    jobs = await work_service.get_jobs(db)
-                    available = [j for j in jobs if j["max_workers"] == 0 or j["today_workers"] < j["max_workers"]]
-                    if available:
-                        job_id = random.choice(available)["id"]
-                if job_id:
-                    res = await work_service.check_in(aid, job_id, db)
-                    if res["ok"]:
-                        stats["success"] += 1
-                        await _broadcast_action(agent_name, aid, "checkin", reason)
+                if action == "rest":
+                    stats["skipped"] += 1
+
+                elif action == "checkin":
+                    # 自动选岗位：用 params 中的 job_id，否则随机选一个有空位的
+                    job_id = params.get("job_id")
+                    if not job_id:
+                        jobs = await work_service.get_jobs(db)
+                        available = [j for j in jobs if j["max_workers"] == 0 or j["today_workers"] < j["max_workers"]]
+                        if available:
+                            job_id = random.choice(available)["id"]
+                    if job_id:
+                        res = await work_service.check_in(aid, job_id, db)
+                        if res["ok"]:
+                            stats["success"] += 1
+                            pending.append(partial(_broadcast_action, agent_name, aid, "checkin", reason))
+                        else:
+                            logger.info("Autonomy checkin failed for %s: %s", agent_name, res["reason"])
+                            stats["failed"] += 1
                     else:
-                        logger.info("Autonomy checkin failed for %s: %s", agent_name, res["reason"])
                         stats["failed"] += 1
-                else:
-                    stats["failed"] += 1
 
-            elif action == "purchase":
-                item_id = params.get("item_id")
-                if item_id:
-                    res = await shop_service.purchase(aid, item_id, db)
-                    if res["ok"]:
-                        stats["success"] += 1
-                        await _broadcast_action(agent_name, aid, "purchase", reason)
+                elif action == "purchase":
+                    item_id = params.get("item_id")
+                    if item_id:
+                        res = await shop_service.purchase(aid, item_id, db)
+                        if res["ok"]:
+                            stats["success"] += 1
+                            pending.append(partial(_broadcast_action, agent_name, aid, "purchase", reason))
+                        else:
+                            logger.info("Autonomy purchase failed for %s: %s", agent_name, res["reason"])
+                            stats["failed"] += 1
                     else:
-                        logger.info("Autonomy purchase failed for %s: %s", agent_name, res["reason"])
                         stats["failed"] += 1
-                else:
-                    stats["failed"] += 1
-
-            elif action == "chat":
-                # 经济预检查
-                can_speak = await economy_service.check_quota(aid, "chat", db)
-                if can_speak.allowed:
-                    agent = await db.get(Agent, aid)
-                    if agent:
-                        chat_tasks.append({
-                            "agent_id": aid,
-                            "agent_name": agent_name,
-                            "persona": agent.persona,
-                            "model": agent.model,
-                            "personality_json": agent.personality_json,
-                            "reason": reason,
-                        })
-                else:
-                    logger.info("Autonomy chat quota denied for %s", agent_name)
-                    stats["skipped"] += 1
 
-            elif action == "assign_building":
-                building_id = params.get("building_id")
-                if building_id:
-                    res = await assign_worker("长安", building_id, aid, db)
-                    if res["ok"]:
-                        stats["success"] += 1
-                        await _broadcast_action(agent_name, aid, "assign_building", reason)
+                elif action == "chat":
+                    # 经济预检查
+                    can_speak = await economy_service.check_quota(aid, "chat", db)
+                    if can_speak.allowed:
+                        agent = await db.get(Agent, aid)
+                        if agent:
+                            chat_tasks.append({
+                                "agent_id": aid,
+                                "agent_name": agent_name,
+                                "persona": agent.persona,
+                                "model": agent.model,
+                                "personality_json": agent.personality_json,
+                                "reason": reason,
+                            })
+                    else:
+                        logger.info("Autonomy chat quota denied for %s", agent_name)
+                        stats["skipped"] += 1
+
+                elif action == "assign_building":
+                    building_id = params.get("building_id")
+                    if building_id:
+                        res = await assign_worker("长安", building_id, aid, db, commit=False, notices=pending)
+                        if res["ok"]:
+                            stats["success"] += 1
+                            pending.append(partial(_broadcast_action, agent_name, aid, "assign_building", reason))
+                        else:
+                            logger.info("Autonomy assign_building failed for %s: %s", agent_name, res["reason"])
+                            stats["failed"] += 1
                     else:
-                        logger.info("Autonomy assign_building failed for %s: %s", agent_name, res["reason"])
                         stats["failed"] += 1
-                else:
-                    stats["failed"] += 1
 
-            elif action == "unassign_building":
-                # TDD: 自动查找 agent 当前所在建筑，不需要 LLM 传 building_id
-                bw_result = await db.execute(
-                    select(BuildingWorker).where(BuildingWorker.agent_id == aid)
-                )
-                bw = bw_result.scalar()
-                if bw:
-                    res = await remove_worker("长安", bw.building_id, aid, db)
-                    if res["ok"]:
-                        stats["success"] += 1
-                        await _broadcast_action(agent_name, aid, "unassign_building", reason)
+                elif action == "unassign_building":
+                    # TDD: 自动查找 agent 当前所在建筑，不需要 LLM 传 building_id
+                    bw_result = await db.execute(
+                        select(BuildingWorker).where(BuildingWorker.agent_id == aid)
+                    )
+                    bw = bw_result.scalar()
+                    if bw:
+                        res = await remove_worker("长安", bw.building_id, aid, db, commit=False, notices=pending)
+                        if res["ok"]:
+                            stats["success"] += 1
+                            pending.append(partial(_broadcast_action, agent_name, aid, "unassign_building", reason))
+                        else:
+                            logger.info("Autonomy unassign_building failed for %s: %s", agent_name, res["reason"])
+                            stats["failed"] += 1
                     else:
-                        logger.info("Autonomy unassign_building failed for %s: %s", agent_name, res["reason"])
+                        logger.info("Autonomy unassign_building: %s not assigned to any building", agent_name)
                         stats["failed"] += 1
-                else:
-                    logger.info("Autonomy unassign_building: %s not assigned to any building", agent_name)
-                    stats["failed"] += 1
-
-            elif action == "eat":
-                res = await eat_food(aid, db)
-                if res["ok"]:
-                    stats["success"] += 1
-                    await _broadcast_action(agent_name, aid, "eat", reason)
-                else:
-                    logger.info("Autonomy eat failed for %s: %s", agent_name, res["reason"])
-                    stats["failed"] += 1
-
-            elif action == "transfer_resource":
-                to_id = params.get("to_agent_id")
-                res_type = params.get("resource_type")
-                qty = params.get("quantity")
-                if to_id and res_type and qty:
-                    from .city_service import transfer_resource
-                    res = await transfer_resource(aid, to_id, res_type, qty, db)
+
+                elif action == "eat":
+                    res = await eat_food(aid, db, commit=False, notices=pending)
                     if res["ok"]:
                         stats["success"] += 1
-                        await _broadcast_action(agent_name, aid, "transfer_resource", reason)
+                        pending.append(partial(_broadcast_action, agent_name, aid, "eat", reason))
                     else:
-                        logger.info("Autonomy transfer_resource failed for %s: %s", agent_name, res["reason"])
+                        logger.info("Autonomy eat failed for %s: %s", agent_name, res["reason"])
                         stats["failed"] += 1
-                else:
-                    stats["failed"] += 1
-
-            elif action == "create_market_order":
-                sell_type = params.get("sell_type")
-                sell_amount = params.get("sell_amount")
-                buy_type = params.get("buy_type")
-                buy_amount = params.get("buy_amount")
-                if sell_type and sell_amount and buy_type and buy_amount:
-                    from .market_service import create_order
-                    res = await create_order(aid, sell_type, sell_amount, buy_type, buy_amount, db=db)
-                    if res["ok"]:
-                        stats["success"] += 1
-                        await _broadcast_action(agent_name, aid, "create_market_order", reason)
+
+                elif action == "transfer_resource":
+                    to_id = params.get("to_agent_id")
+                    res_type = params.get("resource_type")
+                    qty = params.get("quantity")
+                    if to_id and res_type and qty:
+                        from .city_service import transfer_resource
+                        res = await transfer_resource(aid, to_id, res_type, qty, db, commit=False, notices=pending)
+                        if res["ok"]:
+                            stats["success"] += 1
+                            pending.append(partial(_broadcast_action, agent_name, aid, "transfer_resource", reason))
+                        else:
+                            logger.info("Autonomy transfer_resource failed for %s: %s", agent_name, res["reason"])
+                            stats["failed"] += 1
                     else:
-                        logger.info("Autonomy create_market_order failed for %s: %s", agent_name, res["reason"])
                         stats["failed"] += 1
-                else:
-                    stats["failed"] += 1
-
-            elif action == "accept_market_order":
-                order_id = params.get("order_id")
-                buy_ratio = params.get("buy_ratio", 1.0)
-                if order_id:
-                    from .market_service import accept_order
-                    res = await accept_order(aid, order_id, buy_ratio, db=db)
-                    if res["ok"]:
-                        stats["success"] += 1
-                        await _broadcast_action(agent_name, aid, "accept_market_order", reason)
+
+                elif action == "create_market_order":
+                    sell_type = params.get("sell_type")
+                    sell_amount = params.get("sell_amount")
+                    buy_type = params.get("buy_type")
+                    buy_amount = params.get("buy_amount")
+                    if sell_type and sell_amount and buy_type and buy_amount:
+                        from .market_service import create_order
+                        res = await create_order(
+                            aid, sell_type, sell_amount, buy_type, buy_amount, db=db, commit=False, notices=pending,
+                        )
+                        if res["ok"]:
+                            stats["success"] += 1
+                            pending.append(partial(_broadcast_action, agent_name, aid, "create_market_order", reason))
+                        else:
+                            logger.info("Autonomy create_market_order failed for %s: %s", agent_name, res["reason"])
+                            stats["failed"] += 1
                     else:
-                        logger.info("Autonomy accept_market_order failed for %s: %s", agent_name, res["reason"])
                         stats["failed"] += 1
-                else:
-                    stats["failed"] += 1
-
-            elif action == "cancel_market_order":
-                order_id = params.get("order_id")
-                if order_id:
-                    from .market_service import cancel_order
-                    res = await cancel_order(aid, order_id, db=db)
-                    if res["ok"]:
-                        stats["success"] += 1
-                        await _broadcast_action(agent_name, aid, "cancel_market_order", reason)
+
+                elif action == "accept_market_order":
+                    order_id = params.get("order_id")
+                    buy_ratio = params.get("buy_ratio", 1.0)
+                    if order_id:
+                        from .market_service import accept_order
+                        res = await accept_order(aid, order_id, buy_ratio, db=db, commit=False, notices=pending)
+                        if res["ok"]:
+                            stats["success"] += 1
+                            pending.append(partial(_broadcast_action, agent_name, aid, "accept_market_order", reason))
+                        else:
+                            logger.info("Autonomy accept_market_order failed for %s: %s", agent_name, res["reason"])
+                            stats["failed"] += 1
                     else:
-                        logger.info("Autonomy cancel_market_order failed for %s: %s", agent_name, res["reason"])
                         stats["failed"] += 1
-                else:
-                    stats["failed"] += 1
-
-            elif action == "construct_building":
-                building_type = params.get("building_type")
-                bname = params.get("name")
-                if building_type and bname:
-                    res = await construct_building(aid, building_type, bname, "长安", db=db)
-                    if res["ok"]:
-                        stats["success"] += 1
-                        await _broadcast_action(agent_name, aid, "construct_building", reason)
+
+                elif action == "cancel_market_order":
+                    order_id = params.get("order_id")
+                    if order_id:
+                        from .market_service import cancel_order
+                        res = await cancel_order(aid, order_id, db=db, commit=False, notices=pending)
+                        if res["ok"]:
+                            stats["success"] += 1
+                            pending.append(partial(_broadcast_action, agent_name, aid, "cancel_market_order", reason))
+                        else:
+                            logger.info("Autonomy cancel_market_order failed for %s: %s", agent_name, res["reason"])
+                            stats["failed"] += 1
                     else:
-                        logger.info("Autonomy construct_building failed for %s: %s", agent_name, res["reason"])
                         stats["failed"] += 1
-                else:
-                    stats["failed"] += 1
-
-            elif action == "claim_bounty":
-                bounty_id = params.get("bounty_id")
-                if bounty_id:
-                    from .bounty_service import claim_bounty
-                    res = await claim_bounty(
-                        agent_id=aid, bounty_id=bounty_id, db=db,
-                    )
-                    if res["ok"]:
-                        stats["success"] += 1
-                        await _broadcast_action(
-                            agent_name, aid, "claim_bounty", reason,
+
+                elif action == "construct_building":
+                    building_type = params.get("building_type")
+                    bname = params.get("name")
+                    if building_type and bname:
+                        res = await construct_building(
+                            aid, building_type, bname, "长安", db=db, commit=False, notices=pending,
                         )
-                        await _broadcast_bounty_event("bounty_claimed", {
-                            "bounty_id": res["bounty_id"],
-                            "title": res["title"],
-                            "reward": res["reward"],
-                            "claimed_by": aid,
-                            "claimed_by_name": agent_name,
-                        })
+                        if res["ok"]:
+                            stats["success"] += 1
+                            pending.append(partial(_broadcast_action, agent_name, aid, "construct_building", reason))
+                        else:
+                            logger.info("Autonomy construct_building failed for %s: %s", agent_name, res["reason"])
+                            stats["failed"] += 1
                     else:
-                        logger.info(
-                            "Autonomy claim_bounty failed for %s: %s",
-                            agent_name, res["reason"],
+                        stats["failed"] += 1
+
+                elif action == "claim_bounty":
+                    bounty_id = params.get("bounty_id")
+                    if bounty_id:
+                        from .bounty_service import claim_bounty
+                        res = await claim_bounty(
+                            agent_id=aid, bounty_id=bounty_id, db=db,
                         )
+                        if res["ok"]:
+                            stats["success"] += 1
+                            pending.append(partial(
+                                _broadcast_action, agent_name, aid, "claim_bounty", reason,
+                            ))
+                            pending.append(partial(_broadcast_bounty_event, "bounty_claimed", {
+                                "bounty_id": res["bounty_id"],
+                                "title": res["title"],
+                                "reward": res["reward"],
+                                "claimed_by": aid,
+                                "claimed_by_name": agent_name,
+                            }))
+                        else:
+                            logger.info(
+                                "Autonomy claim_bounty failed for %s: %s",
+                                agent_name, res["reason"],
+                            )
+                            stats["failed"] += 1
+                    else:
                         stats["failed"] += 1
-                else:
-                    stats["failed"] += 1
 
-            round_log.append({"agent_id": aid, "agent_name": agent_name, "action": action, "reason": reason})
+                round_log.append({"agent_id": aid, "agent_name": agent_name, "action": action, "reason": reason})
+            notices.extend(pending)
 
         except Exception as e:
             logger.error("Autonomy execute failed for agent %s action %s: %s", agent_name, action, e)
             stats["failed"] += 1
             round_log.append({"agent_id": aid, "agent_name": agent_name, "action": action, "reason": f"执行失败: {e}"})
 
-    await db.commit()
+    return stats, chat_tasks, round_log
+
+
+async def _settle_decisions(
+    stats: dict, chat_tasks: list[dict], round_log: list[dict], notices: list,
+    db: AsyncSession, snapshot: str = "",
+) -> dict:
+    """提交之后：发广播、生成聊天（LLM 调用，不占写事务）、记录本轮日志"""
+    for notice in notices:
+        await notice()
 
     # 聊天统一走 batch_generate
     if chat_tasks:
@@ -615,18 +637,12 @@ async def _execute_chats(
     snapshot: str = "",
 ):
     """批量生成聊天并发送。"""
-    from ..api.chat import send_agent_message, broadcast
+    from ..api.chat import submit_reply
 
     # 构建聊天历史
-    msg_result = await db.execute(
-        select(Message)
-        .options(joinedload(Message.agent))
-        .order_by(Message.created_at.desc())
-        .limit(10)
-    )
     history = [
-        {"name": m.agent.name if m.agent else "unknown", "content": m.content}
-        for m in reversed(msg_result.scalars().all())
+        {"name": m.agent_name or "unknown", "content": m.content}
+        for m in await get_recent_messages(db, limit=10)
     ]
 
     # 构建游戏上下文（去掉聊天和指令部分，避免与 history 重复）
@@ -645,6 +661,7 @@ async def _execute_chats(
             lines.append(line)
         game_context = "\n".join(lines).strip()
 
+    streams = {}
     agents_info = []
     for task in chat_tasks:
         h = list(history)
@@ -656,29 +673,29 @@ async def _execute_chats(
             ctx_parts.append(f"你刚刚的行为：{task['reason']}")
         if ctx_parts:
             h.append({"name": "系统", "content": "\n".join(ctx_parts)})
-        agents_info.append({**task, "history": h})
+        info = {**task, "history": h}
+        stream = open_stream(task["agent_id"], task["agent_name"])
+        if stream:
+            streams[task["agent_id"]] = stream
+            info["on_delta"] = stream.push
+        agents_info.append(info)
 
     results = await runner_manager.batch_generate(agents_info)
 
     # 并行错开发送
     async def _delayed_chat_send(task, reply, usage_info, delay):
         await asyncio.sleep(delay)
+        stream = streams.get(task["agent_id"])
         try:
-            async with async_session() as send_db:
-                await send_agent_message(task["agent_id"], task["agent_name"], reply, send_db)
-                await economy_service.deduct_quota(task["agent_id"], send_db)
-                if usage_info:
-                    from ..models.tables import LLMUsage
-                    record = LLMUsage(
-                        model=usage_info["model"],
-                        agent_id=usage_info["agent_id"],
-                        prompt_tokens=usage_info["prompt_tokens"],
-                        completion_tokens=usage_info["completion_tokens"],
-                        total_tokens=usage_info["total_tokens"],
-                        latency_ms=usage_info["latency_ms"],
-                    )
-                    send_db.add(record)
-                await send_db.commit()
+            try:
+                await submit_reply(
+                    task["agent_id"], task["agent_name"], reply, usage_info,
+                    draft_id=stream.draft_id if stream else None,
+                )
+            except Exception:
+                if stream:
+                    await stream.abort()  # 没落库：草稿不会被 new_message 取代，通知客户端丢弃
+                raise
             await _broadcast_action(task["agent_name"], task["agent_id"], "chat", "主动发言")
             stats["success"] += 1
             # 更新 round_log 中对应条目
@@ -694,9 +711,12 @@ async def _execute_chats(
         aid = task["agent_id"]
         reply, usage_info, _mem_ids = results.get(aid, (None, None, []))
         if not reply:
+            if aid in streams:
+                await streams[aid].abort()
             stats["failed"] += 1
             continue
-        delay = random.uniform(3, 20)
+        # 流式时草稿已经逐字推给客户端，不再错开，生成完立即落库
+        delay = 0 if aid in streams else random.uniform(3, 20)
         send_tasks.append(asyncio.create_task(
             _delayed_chat_send(task, reply, usage_info, delay)
         ))
@@ -858,6 +878,12 @@ async def execute_strategies(db: AsyncSession) -> dict:
     return stats
 
 
+async def _set_all_status(status: AgentStatus, activity: str):
+    await write_queue.submit_with_notices(
+        lambda db, notices: set_all_agents_status(status, activity, db, commit=False, notices=notices)
+    )
+
+
 async def tick():
     """一次完整的自主行为循环。
 
@@ -866,27 +892,25 @@ async def tick():
     """
     logger.info("Autonomy tick: starting")
     try:
-        async with async_session() as db:
+        async with async_read_session() as db:
             snapshot = await build_world_snapshot(db)
 
         if not snapshot:
             logger.info("Autonomy tick: no agents, skipping")
             return
 
-        # F35: 所有 agent → THINKING（LLM 决策中）
-        async with async_session() as db:
-            agents_result = await db.execute(select(Agent).where(Agent.id != 0))
-            all_agents = agents_result.scalars().all()
-            for agent in all_agents:
-                await set_agent_status(agent, AgentStatus.THINKING, "正在分析环境…", db)
+        # F35: 所有 agent → THINKING（LLM 决策中），一条 UPDATE + 一帧 batch
+        await _set_all_status(AgentStatus.THINKING, "正在分析环境…")
 
         actions = await decide(snapshot)
 
-        # 执行立即行为
+        # 执行立即行为：写库部分作为一个 unit of work 交给 write_queue，聊天生成在提交之后
         if actions:
             logger.info("Autonomy tick: executing %d actions", len(actions))
-            async with async_session() as db:
-                stats = await execute_decisions(actions, db, snapshot)
+            notices: list = []
+            stats, chat_tasks, round_log = await write_queue.submit(partial(_apply_decisions, actions, notices=notices))
+            async with async_read_session() as db:
+                await _settle_decisions(stats, chat_tasks, round_log, notices, db, snapshot)
             logger.info("Autonomy tick: actions done — %s", stats)
         else:
             logger.info("Autonomy tick: no actions")
@@ -894,18 +918,12 @@ async def tick():
         # 策略自动机 dormant（DEV-40）
 
         # F35: 所有 agent → IDLE
-        async with async_session() as db:
-            agents_result = await db.execute(select(Agent).where(Agent.id != 0))
-            for agent in agents_result.scalars().all():
-                await set_agent_status(agent, AgentStatus.IDLE, "", db)
+        await _set_all_status(AgentStatus.IDLE, "")
 
     except Exception as e:
         logger.error("Autonomy tick failed: %s", e, exc_info=True)
         # F35: 异常时也恢复 IDLE
         try:
-            async with async_session() as db:
-                agents_result = await db.execute(select(Agent).where(Agent.id != 0))
-                for agent in agents_result.scalars().all():
-                    await set_agent_status(agent, AgentStatus.IDLE, "", db)
+            await _set_all_status(AgentStatus.IDLE, "")
         except Exception:
             pass
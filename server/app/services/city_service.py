@@ -1,9 +1,16 @@
-"""城市经济服务"""
+"""城市经济服务
+
+写操作的 commit=True 先提交再广播；commit=False（调用方持有事务）时传入 notices，
+事件以 partial 协程函数追加进去，由调用方提交成功后再发，回滚掉的操作不会推给客户端。
+"""
 import logging
 from datetime import datetime, timezone
-from sqlalchemy import select, update
+from functools import partial
+from sqlalchemy import select, update, bindparam, case
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
 from ..models import Agent, Building, BuildingWorker, Resource, AgentResource, ProductionLog
+from .archive_service import archive_service
 
 HUMAN_ID = 0
 logger = logging.getLogger(__name__)
@@ -35,8 +42,17 @@ async def _broadcast_city_event(event: str, data: dict):
     })
 
 
+async def _emit_city_event(notices: list | None, event: str, data: dict):
+    """notices 为 None 时立即广播，否则留给调用方提交后再发"""
+    if notices is None:
+        await _broadcast_city_event(event, data)
+    else:
+        notices.append(partial(_broadcast_city_event, event, data))
+
+
 async def construct_building(
-    builder_id: int, building_type: str, name: str, city: str, *, db: AsyncSession
+    builder_id: int, building_type: str, name: str, city: str, *, db: AsyncSession, commit: bool = True,
+    notices: list | None = None,
 ) -> dict:
     """发起建造：校验配方 → 扣资源 → 创建 constructing 状态建筑"""
     recipe = BUILDING_RECIPES.get(building_type)
@@ -74,9 +90,12 @@ async def construct_building(
     await db.flush()
 
     estimated = recipe["construction_days"]
-    await db.commit()
+    if commit:
+        await db.commit()
+    else:
+        await db.flush()
 
-    await _broadcast_city_event("building_construction_started", {
+    await _emit_city_event(notices, "building_construction_started", {
         "building_id": building.id,
         "building_type": building_type,
         "name": name,
@@ -92,7 +111,7 @@ async def construct_building(
     }
 
 
-async def check_construction_progress(city: str, db: AsyncSession):
+async def check_construction_progress(city: str, db: AsyncSession, notices: list | None = None):
     """检查 constructing 建筑，工期到了改为 active"""
     now = datetime.now(timezone.utc)
     result = await db.execute(
@@ -108,7 +127,7 @@ async def check_construction_progress(city: str, db: AsyncSession):
         if elapsed_days >= building.construction_days:
             building.status = "active"
             logger.info("建造完成: %s (ID=%d)，工期 %d 天", building.name, building.id, building.construction_days)
-            await _broadcast_city_event("building_completed", {
+            await _emit_city_event(notices, "building_completed", {
                 "building_id": building.id,
                 "name": building.name,
                 "building_type": building.building_type,
@@ -117,11 +136,17 @@ async def check_construction_progress(city: str, db: AsyncSession):
     await db.flush()
 
 
+# 每次碰资源都会查一次，预构建语句避免反复构建 select()
+_AGENT_RESOURCE_STMT = select(AgentResource).where(
+    AgentResource.agent_id == bindparam("agent_id"),
+    AgentResource.resource_type == bindparam("resource_type"),
+)
+
+
 async def _get_or_create_agent_resource(agent_id: int, resource_type: str, db: AsyncSession) -> AgentResource:
     """获取或创建 agent 个人资源记录"""
     result = await db.execute(
-        select(AgentResource)
-        .where(AgentResource.agent_id == agent_id, AgentResource.resource_type == resource_type)
+        _AGENT_RESOURCE_STMT, {"agent_id": agent_id, "resource_type": resource_type}
     )
     ar = result.scalar()
     if not ar:
@@ -142,7 +167,10 @@ async def get_agent_resources(agent_id: int, db: AsyncSession) -> list[dict]:
     ]
 
 
-async def transfer_resource(from_agent_id: int, to_agent_id: int, resource_type: str, quantity: float, db: AsyncSession) -> dict:
+async def transfer_resource(
+    from_agent_id: int, to_agent_id: int, resource_type: str, quantity: float, db: AsyncSession,
+    *, commit: bool = True, notices: list | None = None,
+) -> dict:
     """在两个 agent 之间转移资源"""
     if quantity <= 0:
         return {"ok": False, "reason": "数量必须大于 0"}
@@ -155,12 +183,15 @@ async def transfer_resource(from_agent_id: int, to_agent_id: int, resource_type:
     to_res = await _get_or_create_agent_resource(to_agent_id, resource_type, db)
     from_res.quantity -= quantity
     to_res.quantity += quantity
-    await db.commit()
+    if commit:
+        await db.commit()
+    else:
+        await db.flush()
 
     # M5.1: 广播转赠事件
     from_agent = await db.get(Agent, from_agent_id)
     to_agent = await db.get(Agent, to_agent_id)
-    await _broadcast_city_event("resource_transferred", {
+    await _emit_city_event(notices, "resource_transferred", {
         "from_agent_id": from_agent_id,
         "from_agent_name": from_agent.name if from_agent else f"Agent#{from_agent_id}",
         "to_agent_id": to_agent_id,
@@ -244,7 +275,9 @@ async def get_building_detail(city: str, building_id: int, db: AsyncSession) ->
     }
 
 
-async def assign_worker(city: str, building_id: int, agent_id: int, db: AsyncSession) -> dict:
+async def assign_worker(
+    city: str, building_id: int, agent_id: int, db: AsyncSession, *, commit: bool = True, notices: list | None = None,
+) -> dict:
     """分配工人到建筑"""
     b = await db.get(Building, building_id)
     if not b or b.city != city:
@@ -270,14 +303,19 @@ async def assign_worker(city: str, building_id: int, agent_id: int, db: AsyncSes
         return {"ok": False, "reason": "已在其他建筑工作，请先离职"}
 
     db.add(BuildingWorker(building_id=building_id, agent_id=agent_id))
-    await db.commit()
-    await _broadcast_city_event("worker_assigned", {
+    if commit:
+        await db.commit()
+    else:
+        await db.flush()
+    await _emit_city_event(notices, "worker_assigned", {
         "agent_id": agent_id, "building_id": building_id,
     })
     return {"ok": True, "reason": "分配成功"}
 
 
-async def remove_worker(city: str, building_id: int, agent_id: int, db: AsyncSession) -> dict:
+async def remove_worker(
+    city: str, building_id: int, agent_id: int, db: AsyncSession, *, commit: bool = True, notices: list | None = None,
+) -> dict:
     """移除建筑工人"""
     result = await db.execute(
         select(BuildingWorker)
@@ -287,8 +325,11 @@ async def remove_worker(city: str, building_id: int, agent_id: int, db: AsyncSes
     if not bw:
         return {"ok": False, "reason": "该工人不在此建筑"}
     await db.delete(bw)
-    await db.commit()
-    await _broadcast_city_event("worker_unassigned", {
+    if commit:
+        await db.commit()
+    else:
+        await db.flush()
+    await _emit_city_event(notices, "worker_unassigned", {
         "agent_id": agent_id, "building_id": building_id,
     })
     return {"ok": True, "reason": "移除成功"}
@@ -305,7 +346,7 @@ async def get_resources(city: str, db: AsyncSession) -> list[dict]:
     ]
 
 
-async def eat_food(agent_id: int, db: AsyncSession) -> dict:
+async def eat_food(agent_id: int, db: AsyncSession, *, commit: bool = True, notices: list | None = None) -> dict:
     """Agent 吃饭：消耗个人 1 面粉，饱腹度+30，心情+10，体力+20"""
     agent = await db.get(Agent, agent_id)
     if not agent:
@@ -319,35 +360,57 @@ async def eat_food(agent_id: int, db: AsyncSession) -> dict:
     agent.satiety = min(100, agent.satiety + 30)
     agent.mood = min(100, agent.mood + 10)
     agent.stamina = min(100, agent.stamina + 20)
-    await db.commit()
-    await _broadcast_city_event("agent_ate", {
+    if commit:
+        await db.commit()
+    else:
+        await db.flush()
+    await _emit_city_event(notices, "agent_ate", {
         "agent_id": agent_id, "satiety": agent.satiety, "mood": agent.mood, "stamina": agent.stamina,
     })
     return {"ok": True, "reason": "吃饱了", "satiety": agent.satiety, "mood": agent.mood, "stamina": agent.stamina}
 
 
-async def daily_attribute_decay(db: AsyncSession):
+async def daily_attribute_decay(db: AsyncSession, *, commit: bool = True, notices: list | None = None):
     """每日属性结算（从 production_tick 拆出）。
     - satiety -= 15（下限 0）
     - stamina += 15（上限 100）
     - mood: 饱腹度=0 时 -20，饱腹度<30 时 -10，否则不变（下限 0）
+
+    单条 UPDATE ... CASE ... RETURNING 完成，不把 Agent 逐个加载进 ORM；
+    SET 里引用的都是旧值，所以 mood 按旧 satiety 换算阈值（新值 0 ⇔ 旧值 ≤15，新值 <30 ⇔ 旧值 <45）。
+    新值随一次聚合广播推送。
     """
-    agents_result = await db.execute(
-        select(Agent).where(Agent.id != HUMAN_ID)
+    satiety_after = case((Agent.satiety > 15, Agent.satiety - 15), else_=0)
+    stamina_after = case((Agent.stamina < 85, Agent.stamina + 15), else_=100)
+    mood_after = case(
+        (Agent.satiety <= 15, case((Agent.mood > 20, Agent.mood - 20), else_=0)),
+        (Agent.satiety < 45, case((Agent.mood > 10, Agent.mood - 10), else_=0)),
+        else_=Agent.mood,
+    )
+    result = await db.execute(
+        update(Agent)
+        .where(Agent.id != HUMAN_ID)
+        .values(satiety=satiety_after, stamina=stamina_after, mood=mood_after)
+        .returning(Agent.id, Agent.satiety, Agent.stamina, Agent.mood)
+        .execution_options(synchronize_session=False)
     )
-    for agent in agents_result.scalars().all():
-        agent.satiety = max(0, agent.satiety - 15)
-        agent.stamina = min(100, agent.stamina + 15)
-        if agent.satiety == 0:
-            agent.mood = max(0, agent.mood - 20)
-        elif agent.satiety < 30:
-            agent.mood = max(0, agent.mood - 10)
-    await db.commit()
-    logger.info("每日属性结算完成")
-    await _broadcast_city_event("attribute_changed", {"reason": "daily_decay"})
-
-
-async def production_tick(city: str, db: AsyncSession):
+    changed = [
+        {"agent_id": aid, "satiety": satiety, "stamina": stamina, "mood": mood}
+        for aid, satiety, stamina, mood in result.all()
+    ]
+    # 本 session 已加载的 Agent 直接写入 RETURNING 的新值（不 expire，避免异步下的懒加载）
+    by_id = {c["agent_id"]: c for c in changed}
+    for obj in list(db.identity_map.values()):
+        if isinstance(obj, Agent) and obj.id in by_id:
+            for attr in ("satiety", "stamina", "mood"):
+                set_committed_value(obj, attr, by_id[obj.id][attr])
+    if commit:
+        await db.commit()
+    logger.info("每日属性结算完成: %d 个 Agent", len(changed))
+    await _emit_city_event(notices, "attribute_changed", {"reason": "daily_decay", "agents": changed})
+
+
+async def production_tick(city: str, db: AsyncSession, *, commit: bool = True, notices: list | None = None):
     """每天执行一次的生产循环（不再做属性衰减）
 
     - 农田：每个工人产出 10 小麦（加到工人个人资源）
@@ -355,8 +418,9 @@ async def production_tick(city: str, db: AsyncSession):
     - 官府田：每个工人直接产出 5 面粉（虚空造币，无需原料）
     - 体力检查：stamina < 20 跳过生产；生产后 stamina -= 15
     """
-    # M6.1: 先检查建造进度
-    await check_construction_progress(city, db)
+    # M6.1: 先检查建造进度（建成事件等提交后再发）
+    pending: list = []
+    await check_construction_progress(city, db, pending)
 
     # 1. 农田生产
     farm_result = await db.execute(
@@ -426,20 +490,37 @@ async def production_tick(city: str, db: AsyncSession):
         ))
         logger.info("生产: 官府田 %s 工人 %d 产出 5 面粉", building.name, worker.agent_id)
 
-    await db.commit()
+    if commit:
+        await db.commit()
     logger.info("生产循环完成: %s", city)
-    await _broadcast_city_event("production_settled", {"city": city})
+    pending.append(partial(_broadcast_city_event, "production_settled", {"city": city}))
+    if notices is not None:
+        notices.extend(pending)
+        return
+    for notice in pending:
+        await notice()
 
 
 async def get_production_logs(city: str, limit: int, db: AsyncSession) -> list[dict]:
-    """返回最近的生产日志"""
+    """返回最近的生产日志；热库不足 limit 条时从归档库补齐"""
     result = await db.execute(
-        select(ProductionLog, Building)
+        select(ProductionLog)
         .join(Building, ProductionLog.building_id == Building.id)
         .where(Building.city == city)
         .order_by(ProductionLog.tick_time.desc())
         .limit(limit)
     )
+    logs = list(result.scalars().all())
+    if len(logs) < limit and archive_service.archive_months():
+        # 归档库里没有 buildings，先在热库解析出该城市的建筑
+        building_ids = (await db.execute(select(Building.id).where(Building.city == city))).scalars().all()
+        production_logs = ProductionLog.__table__
+        logs += await archive_service.fetch_archived(
+            select(production_logs)
+            .where(production_logs.c.building_id.in_(building_ids))
+            .order_by(production_logs.c.tick_time.desc()),
+            limit=limit - len(logs),
+        )
     return [
         {
             "id": log.id, "building_id": log.building_id,
@@ -448,5 +529,5 @@ async def get_production_logs(city: str, limit: int, db: AsyncSession) -> list[d
             "output_type": log.output_type, "output_qty": log.output_qty,
             "tick_time": str(log.tick_time),
         }
-        for log, _ in result.all()
+        for log in logs
     ]
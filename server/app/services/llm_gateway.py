@@ -0,0 +1,377 @@
+"""LLM 网关：所有模型调用的唯一出口，按 MODEL_REGISTRY 的供应商（provider.name）管理
+
+- 连接池：每个供应商一个长驻的 AsyncOpenAI（底层共享一个 httpx.AsyncClient，keep-alive 复用连接；
+  装了 h2 时走 HTTP/2 多路复用），不再每次调用新建客户端、重新握手
+- 并发上限：每个供应商一个信号量，同时在途的请求不超过 llm_max_concurrency
+- 限速：每个供应商一个令牌桶（llm_rate_per_s / llm_rate_burst），重试也消耗令牌
+- 重试：429 / 5xx / 连接错误按指数退避 + 全抖动重试；有 Retry-After 时按它等。
+  SDK 自带的重试关闭（max_retries=0），避免两层叠加。调用方可按次传 max_retries，
+  或用 deadline 限定整次调用（排队、限流、重试、退避全算在内）的总时长
+- 健康度：每次逻辑调用向 provider_health 回报一个结果（成功记延迟，流式记到第一个分片；
+  重试全部失败、被换走或 deadline 到期记失败），供 ModelEntry 选供应商（见 core/provider_health.py）。
+  重试前按健康度重新选供应商，同一模型标识下有未熔断的备用供应商就换过去
+- 流式：chat_stream 边收边回调 content 增量，结束后拼成与 chat 相同形状的 ChatCompletion；
+  只在收到第一个分片前重试（已推给客户端的增量撤不回来）
+
+httpx 连接绑定事件循环，事件循环变了（测试里每个用例一个循环）就整体重建池子和限流状态。
+被换掉的旧池子（换了循环，或 .env 改了地址 / token）在上面的请求都结束后关闭。
+"""
+import asyncio
+import importlib.util
+import logging
+import random
+import time
+from collections.abc import Awaitable, Callable
+
+import httpx
+from openai import APIConnectionError, APIStatusError, AsyncOpenAI
+from openai.types.chat import ChatCompletion, ChatCompletionMessage
+from openai.types.chat.chat_completion import Choice
+from openai.types.chat.chat_completion_message_tool_call import ChatCompletionMessageToolCall, Function
+
+from ..core import config
+from ..core.config import ModelProvider, settings
+from ..core.provider_health import CLOSED, ProviderHealth, provider_health
+
+logger = logging.getLogger(__name__)
+
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+class TokenBucket:
+    """令牌桶：rate 个/秒匀速补充，最多攒 burst 个；rate <= 0 为不限速"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._stamp = time.monotonic()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class _ProviderPool:
+    """单个供应商的客户端 + 并发 / 限流状态"""
+
+    def __init__(self, provider: ModelProvider, gateway: "LLMGateway"):
+        self.key = (provider.get_base_url(), provider.get_auth_token())
+        self.http = httpx.AsyncClient(
+            http2=gateway.http2,
+            limits=httpx.Limits(
+                max_connections=gateway.pool_max_connections,
+                max_keepalive_connections=gateway.pool_max_keepalive,
+            ),
+            timeout=gateway.timeout,
+        )
+        self.client = AsyncOpenAI(
+            api_key=self.key[1],
+            base_url=self.key[0] or None,
+            http_client=self.http,
+            max_retries=0,
+        )
+        self.semaphore = asyncio.Semaphore(gateway.max_concurrency)
+        self.bucket = TokenBucket(gateway.rate_per_s, gateway.rate_burst)
+        self.active = 0  # 在途的逻辑调用数（含排队、退避中的）
+        self.retired = False
+
+    async def aclose(self):
+        await self.http.aclose()
+
+
+def _retry_after(e: APIStatusError) -> float | None:
+    try:
+        value = e.response.headers.get("retry-after")
+        return float(value) if value is not None else None
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def _retryable(e: Exception) -> bool:
+    if isinstance(e, APIStatusError):
+        return e.status_code == 429 or e.status_code >= 500
+    return isinstance(e, APIConnectionError)  # 含 APITimeoutError
+
+
+async def _assemble(stream, on_delta: Callable[[str], Awaitable[None]], started: list) -> ChatCompletion:
+    """消费流式分片：content 增量回调 on_delta，tool_calls / reasoning / usage 累积，拼成完整响应"""
+    content: list[str] = []
+    reasoning: list[str] = []
+    calls: dict[int, dict] = {}
+    usage = None
+    finish_reason = None
+    meta = {"id": "", "created": 0, "model": ""}
+    async for chunk in stream:
+        if not started:
+            started.append(time.monotonic())
+        if not meta["id"]:
+            meta = {"id": chunk.id, "created": chunk.created, "model": chunk.model}
+        if chunk.usage:
+            usage = chunk.usage
+        for choice in chunk.choices:
+            if choice.index != 0:
+                continue
+            delta = choice.delta
+            if delta.content:
+                content.append(delta.content)
+                await on_delta(delta.content)
+            piece = getattr(delta, "reasoning", None) or getattr(delta, "reasoning_content", None)
+            if piece:
+                reasoning.append(piece)
+            for tc in delta.tool_calls or ():
+                slot = calls.setdefault(tc.index, {"id": "", "name": "", "arguments": ""})
+                slot["id"] = tc.id or slot["id"]
+                if tc.function:
+                    slot["name"] += tc.function.name or ""
+                    slot["arguments"] += tc.function.arguments or ""
+            if choice.finish_reason:
+                finish_reason = choice.finish_reason
+
+    extra = {"reasoning": "".join(reasoning)} if reasoning else {}
+    message = ChatCompletionMessage.model_construct(
+        role="assistant",
+        content="".join(content) or None,
+        tool_calls=[
+            ChatCompletionMessageToolCall.model_construct(
+                id=c["id"], type="function", function=Function.model_construct(name=c["name"], arguments=c["arguments"]),
+            )
+            for _, c in sorted(calls.items())
+        ] or None,
+        **extra,
+    )
+    return ChatCompletion.model_construct(
+        **meta,
+        object="chat.completion",
+        choices=[Choice.model_construct(index=0, finish_reason=finish_reason or "stop", message=message)],
+        usage=usage,
+    )
+
+
+class LLMGateway:
+
+    def __init__(
+        self,
+        *,
+        max_concurrency: int = 8,
+        rate_per_s: float = 5.0,
+        rate_burst: int = 10,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        pool_max_connections: int = 20,
+        pool_max_keepalive: int = 10,
+        timeout: float = 60.0,
+        http2: bool = True,
+        health: ProviderHealth = provider_health,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.rate_per_s = rate_per_s
+        self.rate_burst = rate_burst
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.pool_max_connections = pool_max_connections
+        self.pool_max_keepalive = pool_max_keepalive
+        self.timeout = timeout
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.health = health
+        self._pools: dict[str, _ProviderPool] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._closing: set[asyncio.Task] = set()
+        self.calls = 0
+        self.retries = 0
+
+    def route(self, model_key: str) -> ModelProvider | None:
+        """模型标识 → 当前最健康的可用供应商；未注册或没有 token 返回 None"""
+        entry = config.MODEL_REGISTRY.get(model_key)
+        return entry.get_active_provider() if entry else None
+
+    def _pool(self, provider: ModelProvider) -> _ProviderPool:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            pools, self._pools = self._pools, {}  # 旧循环上的连接已不可用
+            for old in pools.values():
+                self._retire(old)
+        pool = self._pools.get(provider.name)
+        if pool is None or pool.key != (provider.get_base_url(), provider.get_auth_token()):
+            # 首次使用，或 .env 改了该供应商的地址 / token
+            if pool is not None:
+                self._retire(pool)
+            pool = _ProviderPool(provider, self)
+            self._pools[provider.name] = pool
+        return pool
+
+    def _retire(self, pool: _ProviderPool):
+        """换下旧池子：没有在途请求就立即关闭，否则等最后一个请求结束时关"""
+        pool.retired = True
+        if not pool.active:
+            self._close_later(pool)
+
+    def _close_later(self, pool: _ProviderPool):
+        task = asyncio.get_running_loop().create_task(self._close_pool(pool))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _close_pool(pool: _ProviderPool):
+        try:
+            await pool.aclose()
+        except Exception as e:  # 旧事件循环上的连接可能已经关不掉了
+            logger.debug("Retired LLM pool close failed: %s", e)
+
+    def _backoff(self, attempt: int, e: Exception) -> float:
+        hinted = _retry_after(e) if isinstance(e, APIStatusError) else None
+        if hinted is not None:
+            return min(hinted, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def chat(
+        self,
+        provider: ModelProvider,
+        *,
+        max_retries: int | None = None,
+        deadline: float | None = None,
+        repick: bool = True,
+        **kwargs,
+    ):
+        """chat.completions.create 的统一入口（model 取自 provider.model_id），返回 SDK 的响应对象。
+
+        max_retries 覆盖网关的重试次数；deadline（秒）限定整次调用的总时长，超时抛 TimeoutError。
+        重试时可能换到同一模型标识下更健康的供应商；repick=False（调用方自己走 fallback 链）
+        或显式传了 model 时不换。
+        """
+        return await self._call(
+            provider,
+            lambda client, p: client.chat.completions.create(**{"model": p.model_id, **kwargs}),
+            max_retries=max_retries,
+            deadline=deadline,
+            repick=repick and "model" not in kwargs,
+        )
+
+    async def chat_stream(self, provider: ModelProvider, on_delta: Callable[[str], Awaitable[None]], **kwargs):
+        """流式版 chat：content 增量依次 await on_delta(text)，返回拼好的 ChatCompletion"""
+        kwargs["stream"] = True
+        kwargs.setdefault("stream_options", {"include_usage": True})
+        started: list[float] = []  # 第一个分片到达的时刻
+
+        async def call(client, p):
+            stream = await client.chat.completions.create(**{"model": p.model_id, **kwargs})
+            return await _assemble(stream, on_delta, started)
+
+        return await self._call(
+            provider, call, lambda: not started, first_chunk=started, repick="model" not in kwargs,
+        )
+
+    def _candidates(self, provider: ModelProvider) -> list[ModelProvider]:
+        """provider 所属模型标识的全部供应商（不是 route 出来的就只有它自己，不换）"""
+        for entry in config.MODEL_REGISTRY.values():
+            if any(p is provider for p in entry.providers):
+                return entry.providers
+        return [provider]
+
+    def _repick(self, candidates: list[ModelProvider], failed: ModelProvider) -> ModelProvider:
+        """一次尝试失败后按健康度重选：有别的未熔断供应商就换过去，否则留在原供应商重试"""
+        others = [p for p in candidates if p is not failed and self.health.stats(p).state == CLOSED]
+        return self.health.pick(others, explore=False) or failed
+
+    async def _call(
+        self,
+        provider: ModelProvider,
+        call,
+        can_retry: Callable[[], bool] = lambda: True,
+        *,
+        max_retries: int | None = None,
+        deadline: float | None = None,
+        first_chunk: list[float] | None = None,
+        repick: bool = True,
+    ):
+        """一次逻辑调用：可重试的错误按退避重试，重试前按健康度重新选供应商。
+
+        每个用到的供应商只回报一个结果：成功记延迟（流式记到第一个分片），换走或放弃时记一次失败；
+        deadline 到期时正在请求的供应商也记失败。
+        """
+        candidates = self._candidates(provider) if repick else [provider]
+        max_retries = self.max_retries if max_retries is None else max_retries
+        in_flight: ModelProvider | None = None  # 正在请求的供应商（deadline 到期时记它失败）
+        timeout = asyncio.timeout(deadline)
+        try:
+            async with timeout:
+                attempt = 0
+                while True:
+                    pool = self._pool(provider)
+                    pool.active += 1
+                    try:
+                        async with pool.semaphore:
+                            await pool.bucket.acquire()
+                            self.calls += 1
+                            start = time.monotonic()
+                            in_flight = provider
+                            try:
+                                result = await call(pool.client, provider)
+                            except Exception as e:
+                                in_flight = None
+                                if not _retryable(e):
+                                    raise  # 请求本身的问题，不算供应商失败
+                                if attempt >= max_retries or not can_retry():
+                                    self.health.record_failure(provider)
+                                    raise
+                                error, delay = e, self._backoff(attempt, e)
+                            else:
+                                in_flight = None
+                                end = first_chunk[0] if first_chunk else time.monotonic()
+                                self.health.record_success(provider, end - start)
+                                return result
+                    finally:
+                        pool.active -= 1
+                        if pool.retired and not pool.active:
+                            self._close_later(pool)
+
+                    attempt += 1
+                    self.retries += 1
+                    nxt = self._repick(candidates, provider)
+                    if nxt is not provider:
+                        self.health.record_failure(provider)  # 换走：它在这次调用里的唯一一次回报
+                    logger.warning(
+                        "LLM call to %s failed (%s), retry %d/%d on %s in %.2fs",
+                        provider.name, error, attempt, max_retries, nxt.name, delay,
+                    )
+                    provider = nxt
+                    await asyncio.sleep(delay)  # 退避期间不占并发名额
+        except TimeoutError:
+            if timeout.expired() and in_flight is not None:
+                self.health.record_failure(in_flight)
+            raise
+
+    async def aclose(self):
+        pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            try:
+                await pool.aclose()
+            except Exception as e:
+                logger.warning("LLM pool close failed: %s", e)
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+
+
+llm_gateway = LLMGateway(
+    max_concurrency=settings.llm_max_concurrency,
+    rate_per_s=settings.llm_rate_per_s,
+    rate_burst=settings.llm_rate_burst,
+    max_retries=settings.llm_max_retries,
+    backoff_base=settings.llm_backoff_base_s,
+    backoff_max=settings.llm_backoff_max_s,
+    pool_max_connections=settings.llm_pool_max_connections,
+    pool_max_keepalive=settings.llm_pool_max_keepalive,
+    timeout=settings.llm_timeout_s,
+    http2=settings.llm_http2,
+)
@@ -1,9 +1,14 @@
-"""M5.2 交易市场核心服务 — 挂单/接单/撤单"""
+"""M5.2 交易市场核心服务 — 挂单/接单/撤单
+
+事件在提交之后才广播；commit=False 时传入 notices，事件留给调用方提交成功后再发（同 city_service）。
+"""
 import logging
-from sqlalchemy import select
+from functools import partial
+from sqlalchemy import select, func, bindparam
 from sqlalchemy.ext.asyncio import AsyncSession
 from ..models import AgentResource
 from ..models.tables import MarketOrder, TradeLog
+from .archive_service import archive_service
 
 logger = logging.getLogger(__name__)
 
@@ -18,11 +23,25 @@ async def _broadcast_market_event(event: str, data: dict):
     })
 
 
+async def _emit_market_event(notices: list | None, event: str, data: dict):
+    """notices 为 None 时立即广播，否则留给调用方提交后再发"""
+    if notices is None:
+        await _broadcast_market_event(event, data)
+    else:
+        notices.append(partial(_broadcast_market_event, event, data))
+
+
+# 每次碰资源都会查一次，预构建语句避免反复构建 select()
+_AGENT_RESOURCE_STMT = select(AgentResource).where(
+    AgentResource.agent_id == bindparam("agent_id"),
+    AgentResource.resource_type == bindparam("resource_type"),
+)
+
+
 async def _get_or_create_agent_resource(agent_id: int, resource_type: str, db: AsyncSession) -> AgentResource:
     """获取或创建 agent 个人资源记录（复用 city_service 逻辑，带 frozen_amount 默认值）"""
     result = await db.execute(
-        select(AgentResource)
-        .where(AgentResource.agent_id == agent_id, AgentResource.resource_type == resource_type)
+        _AGENT_RESOURCE_STMT, {"agent_id": agent_id, "resource_type": resource_type}
     )
     ar = result.scalar()
     if not ar:
@@ -36,7 +55,8 @@ async def _get_or_create_agent_resource(agent_id: int, resource_type: str, db: A
 
 async def create_order(
     seller_id: int, sell_type: str, sell_amount: float,
-    buy_type: str, buy_amount: float, *, db: AsyncSession,
+    buy_type: str, buy_amount: float, *, db: AsyncSession, commit: bool = True,
+    notices: list | None = None,
 ) -> dict:
     """创建挂单：冻结卖出资源"""
     if sell_amount <= 0 or buy_amount <= 0:
@@ -62,21 +82,22 @@ async def create_order(
     )
     db.add(order)
     await db.flush()
+    if commit:
+        await db.commit()
 
-    await _broadcast_market_event("order_created", {
+    await _emit_market_event(notices, "order_created", {
         "order_id": order.id, "seller_id": seller_id,
         "sell_type": sell_type, "sell_amount": sell_amount,
         "buy_type": buy_type, "buy_amount": buy_amount,
     })
-
-    await db.commit()
     return {"ok": True, "order_id": order.id}
 
 
 # ── 接单 ──────────────────────────────────────────────────
 
 async def accept_order(
-    buyer_id: int, order_id: int, buy_ratio: float, *, db: AsyncSession,
+    buyer_id: int, order_id: int, buy_ratio: float, *, db: AsyncSession, commit: bool = True,
+    notices: list | None = None,
 ) -> dict:
     """接单（支持部分购买）：buy_ratio 0~1 表示接多少比例"""
     if buy_ratio <= 0 or buy_ratio > 1.0:
@@ -146,20 +167,22 @@ async def accept_order(
     )
     db.add(log)
     await db.flush()
+    if commit:
+        await db.commit()
 
-    await _broadcast_market_event("order_traded", {
+    await _emit_market_event(notices, "order_traded", {
         "order_id": order.id, "seller_id": order.seller_id, "buyer_id": buyer_id,
         "sell_type": order.sell_type, "sell_amount": trade_sell,
         "buy_type": order.buy_type, "buy_amount": trade_buy,
     })
-
-    await db.commit()
     return {"ok": True, "trade_sell": trade_sell, "trade_buy": trade_buy, "order_status": order.status}
 
 
 # ── 撤单 ──────────────────────────────────────────────────
 
-async def cancel_order(seller_id: int, order_id: int, *, db: AsyncSession) -> dict:
+async def cancel_order(
+    seller_id: int, order_id: int, *, db: AsyncSession, commit: bool = True, notices: list | None = None,
+) -> dict:
     """撤单：归还剩余冻结资源"""
     result = await db.execute(
         select(MarketOrder).where(MarketOrder.id == order_id).with_for_update()
@@ -179,12 +202,12 @@ async def cancel_order(seller_id: int, order_id: int, *, db: AsyncSession) -> di
 
     order.status = "cancelled"
     await db.flush()
+    if commit:
+        await db.commit()
 
-    await _broadcast_market_event("order_cancelled", {
+    await _emit_market_event(notices, "order_cancelled", {
         "order_id": order.id, "seller_id": seller_id,
     })
-
-    await db.commit()
     return {"ok": True}
 
 
@@ -210,10 +233,18 @@ async def list_orders(*, db: AsyncSession, status_filter: list[str] | None = Non
 
 
 async def get_trade_logs(*, db: AsyncSession, limit: int = 20, offset: int = 0) -> list[dict]:
-    """返回成交日志"""
+    """返回成交日志；翻到热库之外时从归档库接着往前取"""
     result = await db.execute(
         select(TradeLog).order_by(TradeLog.created_at.desc()).offset(offset).limit(limit)
     )
+    logs = list(result.scalars().all())
+    if len(logs) < limit and archive_service.archive_months():
+        hot_total = (await db.execute(select(func.count()).select_from(TradeLog))).scalar()
+        trade_logs = TradeLog.__table__
+        logs += await archive_service.fetch_archived(
+            select(trade_logs).order_by(trade_logs.c.created_at.desc()),
+            limit=limit - len(logs), offset=max(0, offset - hot_total),
+        )
     return [
         {
             "id": t.id, "order_id": t.order_id,
@@ -222,5 +253,5 @@ async def get_trade_logs(*, db: AsyncSession, limit: int = 20, offset: int = 0)
             "buy_type": t.buy_type, "buy_amount": t.buy_amount,
             "created_at": str(t.created_at),
         }
-        for t in result.scalars().all()
+        for t in logs
     ]
@@ -83,12 +83,15 @@ async def get_agent_memory_stats(agent_id: int | None, db: AsyncSession) -> dict
 
 
 async def create_memory(
-    agent_id: int, memory_type: str, content: str, db: AsyncSession,
+    agent_id: int, memory_type: str, content: str, db: AsyncSession, *, commit: bool = True,
 ) -> dict:
-    """手动创建一条记忆"""
+    """手动创建一条记忆；commit=False 时只 flush，由调用方提交"""
     m = Memory(agent_id=agent_id, memory_type=memory_type, content=content)
     db.add(m)
-    await db.commit()
+    if commit:
+        await db.commit()
+    else:
+        await db.flush()
     await db.refresh(m)
     return {
         "id": m.id, "agent_id": m.agent_id,
@@ -100,9 +103,9 @@ async def create_memory(
 
 
 async def update_memory(
-    memory_id: int, content: str | None, memory_type: str | None, db: AsyncSession,
+    memory_id: int, content: str | None, memory_type: str | None, db: AsyncSession, *, commit: bool = True,
 ) -> dict | None:
-    """更新记忆内容/类型"""
+    """更新记忆内容/类型；commit=False 时只 flush，由调用方提交"""
     m = await db.get(Memory, memory_id)
     if not m:
         return None
@@ -110,7 +113,10 @@ async def update_memory(
         m.content = content
     if memory_type is not None:
         m.memory_type = memory_type
-    await db.commit()
+    if commit:
+        await db.commit()
+    else:
+        await db.flush()
     await db.refresh(m)
     return {
         "id": m.id, "agent_id": m.agent_id,
@@ -121,11 +127,14 @@ async def update_memory(
     }
 
 
-async def delete_memory(memory_id: int, db: AsyncSession) -> bool:
-    """删除一条记忆，返回是否成功"""
+async def delete_memory(memory_id: int, db: AsyncSession, *, commit: bool = True) -> bool:
+    """删除一条记忆，返回是否成功；commit=False 时只 flush，由调用方提交"""
     m = await db.get(Memory, memory_id)
     if not m:
         return False
     await db.delete(m)
-    await db.commit()
+    if commit:
+        await db.commit()
+    else:
+        await db.flush()
     return True
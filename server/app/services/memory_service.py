@@ -3,6 +3,7 @@ from datetime import datetime, timedelta, timezone
 
 from sqlalchemy import select, delete
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
 
 from ..models import Memory, MemoryType
 from . import vector_store
@@ -67,19 +68,29 @@ class MemoryService:
             orphans = [mid for mid in memory_ids if mid not in found_ids]
             logger.warning("Vector/SQLite mismatch: orphan memory_ids=%s", orphans)
 
-        for mem in rows:
-            mem.access_count += 1
-            if mem.memory_type == MemoryType.SHORT and mem.access_count >= PROMOTE_THRESHOLD:
-                mem.memory_type = MemoryType.LONG
-                mem.expires_at = None
+        from .write_behind import write_behind
+        if write_behind.running:
+            # 计数交给写后缓冲合并落盘；返回对象上同步展示新值但不标脏，避免重复写
+            write_behind.record_memory_access([m.id for m in rows])
+            for mem in rows:
+                set_committed_value(mem, "access_count", (mem.access_count or 0) + 1)
+                if mem.memory_type == MemoryType.SHORT and mem.access_count >= PROMOTE_THRESHOLD:
+                    set_committed_value(mem, "memory_type", MemoryType.LONG)
+                    set_committed_value(mem, "expires_at", None)
+        else:
+            for mem in rows:
+                mem.access_count += 1
+                if mem.memory_type == MemoryType.SHORT and mem.access_count >= PROMOTE_THRESHOLD:
+                    mem.memory_type = MemoryType.LONG
+                    mem.expires_at = None
 
-        await db.commit()
+            await db.commit()
 
         # Preserve vector similarity ranking
         row_map = {m.id: m for m in rows}
         return [row_map[mid] for mid in memory_ids if mid in row_map]
 
-    async def cleanup_expired(self, db: AsyncSession) -> int:
+    async def cleanup_expired(self, db: AsyncSession, *, commit: bool = True) -> int:
         now = datetime.now(timezone.utc)
         stmt = select(Memory).where(
             Memory.memory_type == MemoryType.SHORT,
@@ -90,7 +101,10 @@ class MemoryService:
         for mem in expired:
             await db.delete(mem)
 
-        await db.commit()
+        if commit:
+            await db.commit()
+        else:
+            await db.flush()
         return len(expired)
 
 
@@ -0,0 +1,166 @@
+"""入站聊天消息微批：几毫秒内到达的消息（跨所有连接）合成一批
+
+@提及由进程内名录解析（不查 agents 表），用一条多行 INSERT ... RETURNING 写入，
+经 write_queue 与其他写入一起提交（一次 commit），提交后按到达顺序广播，
+再把整批交给唤醒防抖（wakeup_debouncer），一阵连发只做一次选人。
+
+批次串行处理（同一时刻只有一个 drain 任务），广播顺序与到达顺序一致。
+整批写入失败时退回逐条写入，一条坏消息不会连累同批的其他消息；逐条仍失败的只记日志。
+只有写入（write_queue.submit）失败才重试；提交之后的广播、唤醒出错只记日志，不会重复落库。
+"""
+import asyncio
+import logging
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import settings
+from ..core.database import write_queue
+from ..models import Message
+from .agent_directory import agent_directory
+from .wakeup_debouncer import wakeup_debouncer
+
+logger = logging.getLogger(__name__)
+
+
+class MessageIngestor:
+
+    def __init__(self, window: float = 0.005, max_batch: int = 128):
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: list[dict] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._drain_task: asyncio.Task | None = None
+        self.batches = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def submit(self, agent_id: int, agent_name: str, sender_type: str, message_type: str, content: str):
+        """登记一条入站消息（不等待写入）"""
+        self._pending.append({
+            "agent_id": agent_id,
+            "agent_name": agent_name,
+            "sender_type": sender_type,
+            "message_type": message_type,
+            "content": content,
+        })
+        loop = asyncio.get_running_loop()
+        if self.window <= 0 or len(self._pending) >= self.max_batch:
+            self._kick()
+        # 定时器挂在已关闭的旧事件循环上（测试里每个用例一个循环）时重新挂
+        elif self._timer is None or self._loop is not loop:
+            self._loop = loop
+            self._timer = loop.call_later(self.window, self._kick)
+
+    def _kick(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        task = self._drain_task
+        if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            self._drain_task = asyncio.create_task(self._drain())
+
+    async def _drain(self):
+        while self._pending:
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+            try:
+                messages = await self._persist(batch)
+            except Exception as e:
+                if len(batch) == 1:
+                    self._log_lost(batch[0], e)
+                    continue
+                logger.warning("Message batch ingest failed (%d messages), writing one by one: %s", len(batch), e)
+                for m in batch:
+                    try:
+                        single = await self._persist([m])
+                    except Exception as e:
+                        self._log_lost(m, e)
+                        continue
+                    await self._publish([m], single)
+                continue
+            await self._publish(batch, messages)
+
+    @staticmethod
+    def _log_lost(m: dict, e: Exception):
+        logger.error(
+            "Message ingest failed (agent=%s, %d chars): %s",
+            m["agent_name"], len(m["content"]), e, exc_info=True,
+        )
+
+    async def flush(self):
+        """立即写入积压的消息，等当前批次处理完（测试、停机时用）"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        task = self._drain_task
+        if task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop():
+            await task
+        await self._drain()
+
+    async def stop(self):
+        await self.flush()
+
+    async def _persist(self, batch: list[dict]) -> list[Message]:
+        from ..api.chat import parse_mentions
+
+        async def work(db: AsyncSession) -> list[Message]:
+            await agent_directory.ensure_loaded(db)
+            rows = [
+                {
+                    "agent_id": m["agent_id"],
+                    "sender_type": m["sender_type"],
+                    "message_type": m["message_type"],
+                    "content": m["content"],
+                    "mentions": parse_mentions(m["content"]),
+                }
+                for m in batch
+            ]
+            result = await db.execute(
+                insert(Message).returning(Message.id, Message.created_at, sort_by_parameter_order=True),
+                rows,
+            )
+            return [
+                Message(id=row.id, created_at=row.created_at, **values)
+                for row, values in zip(result.all(), rows)
+            ]
+
+        messages = await write_queue.submit(work)
+        self.batches += 1
+        return messages
+
+    async def _publish(self, batch: list[dict], messages: list[Message]):
+        """已提交的消息：按序广播后交给唤醒防抖。这里出错只记日志，消息已落库，不能再写一遍"""
+        from ..api.chat import broadcast
+
+        for m, msg in zip(batch, messages):
+            try:
+                await broadcast({
+                    "type": "new_message",
+                    "data": {
+                        "id": msg.id,
+                        "agent_id": msg.agent_id,
+                        "agent_name": m["agent_name"],
+                        "sender_type": msg.sender_type,
+                        "message_type": msg.message_type,
+                        "content": msg.content,
+                        "mentions": msg.mentions,
+                        "created_at": str(msg.created_at),
+                    }
+                })
+            except Exception as e:
+                logger.error("Message broadcast failed (id=%s): %s", msg.id, e, exc_info=True)
+
+        try:
+            wakeup_debouncer.submit(messages)
+        except Exception as e:
+            logger.error("Wakeup submit failed (%d messages): %s", len(messages), e, exc_info=True)
+
+
+message_ingestor = MessageIngestor(
+    window=settings.ingest_batch_window_ms / 1000,
+    max_batch=settings.ingest_batch_max,
+)
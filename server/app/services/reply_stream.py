@@ -0,0 +1,67 @@
+"""Agent 回复的流式草稿：token 到达时推 message_delta，落库后由 new_message 取代
+
+帧格式（主题 stream + agent:<id>）：
+    {"type": "message_delta", "data": {"draft_id", "agent_id", "agent_name", "delta"}}
+    {"type": "message_delta", "data": {"draft_id", "agent_id", "agent_name", "aborted": true}}  生成失败，丢弃草稿
+最终的 new_message 带同一个 draft_id，客户端用它原地替换草稿。
+
+草稿帧只投递给本 worker 的连接（deliver_local）：不占 seq、不进补发缓冲、不经事件总线。
+断线期间的草稿不补发，重连后由补发的 new_message 取代；其他 worker 的连接只看到最终消息。
+
+增量按 stream_delta_interval_ms 攒批再推，避免一个 token 一帧。
+"""
+import time
+import uuid
+
+from ..core.config import settings
+
+
+class ReplyStream:
+
+    def __init__(self, agent_id: int, agent_name: str, interval: float | None = None):
+        self.agent_id = agent_id
+        self.agent_name = agent_name
+        self.interval = settings.stream_delta_interval_ms / 1000 if interval is None else interval
+        self.draft_id = f"draft-{uuid.uuid4().hex[:12]}"
+        self._buf: list[str] = []
+        self._flushed_at = 0.0
+        self.frames = 0
+
+    async def push(self, text: str):
+        """作为 on_delta 回调传给 generate_reply"""
+        self._buf.append(text)
+        if time.monotonic() - self._flushed_at >= self.interval:
+            await self.flush()
+
+    async def flush(self):
+        if not self._buf:
+            return
+        delta = "".join(self._buf)
+        self._buf.clear()
+        self._flushed_at = time.monotonic()
+        await self._send({"delta": delta})
+
+    async def abort(self):
+        """回复没生成出来：通知客户端丢弃草稿（一帧都没推过时什么也不做）"""
+        self._buf.clear()
+        if self.frames:
+            await self._send({"aborted": True})
+
+    async def _send(self, fields: dict):
+        from ..api.chat import deliver_local
+
+        self.frames += 1
+        deliver_local({
+            "type": "message_delta",
+            "data": {
+                "draft_id": self.draft_id,
+                "agent_id": self.agent_id,
+                "agent_name": self.agent_name,
+                **fields,
+            },
+        })
+
+
+def open_stream(agent_id: int, agent_name: str) -> ReplyStream | None:
+    """开启了 stream_replies 时返回新草稿，否则 None（走非流式）"""
+    return ReplyStream(agent_id, agent_name) if settings.stream_replies else None
@@ -0,0 +1,157 @@
+"""唤醒选人的本地预排序：不调模型，按人格向量和消息的相似度直接选人
+
+每个候选 agent 的 名字 + persona + personality_json（价值观 / 风格 / 领域 / 情感 / 口头禅）
+编码成一个向量并缓存（人格改了才重算）；新消息编码后与所有候选做余弦相似度，再叠加：
+- 近期活跃加分：最近消息里越晚发过言，加得越多（正在对话中的人更可能接话）
+- 无回应扣分：_no_response_count 每次扣 penalty_weight
+
+第一名得分够高、且领先第二名足够多时直接返回；否则返回 None，由调用方退回唤醒小模型。
+
+向量是字符 n-gram 的特征哈希（单字 + 相邻双字 + 英文单词，crc32 分桶，次线性词频，L2 归一化），
+纯 NumPy 计算，不依赖 embedding 接口，单条消息微秒级、零 token。
+"""
+import logging
+import zlib
+from collections.abc import Mapping, Sequence
+
+import numpy as np
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+DIM = 4096
+_UNIGRAM_WEIGHT = 0.3
+_PROFILE_FIELDS = ("values", "knowledge_domains", "speaking_style", "emotional_tendency", "catchphrases")
+
+
+def _is_word(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+def _segments(text: str) -> list[str]:
+    segs, cur = [], []
+    for ch in text.lower():
+        if _is_word(ch):
+            cur.append(ch)
+        elif cur:
+            segs.append("".join(cur))
+            cur = []
+    if cur:
+        segs.append("".join(cur))
+    return segs
+
+
+def embed_text(text: str) -> np.ndarray:
+    """字符 n-gram 特征哈希向量（float32，L2 归一化；空文本为零向量）"""
+    vec = np.zeros(DIM, dtype=np.float32)
+    for seg in _segments(text):
+        if seg.isascii():
+            vec[zlib.crc32(seg.encode()) % DIM] += 1.0
+            continue
+        for i, ch in enumerate(seg):
+            vec[zlib.crc32(ch.encode()) % DIM] += _UNIGRAM_WEIGHT
+            if i + 1 < len(seg):
+                vec[zlib.crc32(seg[i:i + 2].encode()) % DIM] += 1.0
+    np.sqrt(vec, out=vec)
+    norm = float(np.linalg.norm(vec))
+    if norm > 0:
+        vec /= norm
+    return vec
+
+
+def profile_text(agent) -> str:
+    parts = [agent.name or "", agent.persona or ""]
+    pj = agent.personality_json or {}
+    for field in _PROFILE_FIELDS:
+        value = pj.get(field)
+        if isinstance(value, list):
+            parts.extend(str(v) for v in value)
+        elif value:
+            parts.append(str(value))
+    return "\n".join(parts)
+
+
+class ResponderRanker:
+
+    def __init__(
+        self,
+        *,
+        min_score: float = 0.12,
+        margin: float = 0.06,
+        recency_weight: float = 0.1,
+        penalty_weight: float = 0.05,
+    ):
+        self.min_score = min_score
+        self.margin = margin
+        self.recency_weight = recency_weight
+        self.penalty_weight = penalty_weight
+        self._profiles: dict[int, tuple[str, np.ndarray]] = {}
+        self.decided = 0
+        self.deferred = 0
+
+    def _profile(self, agent) -> np.ndarray:
+        key = profile_text(agent)
+        cached = self._profiles.get(agent.id)
+        if cached is None or cached[0] != key:
+            cached = (key, embed_text(key))
+            self._profiles[agent.id] = cached
+        return cached[1]
+
+    def scores(
+        self,
+        content: str,
+        candidates: Sequence,
+        recent: Sequence = (),
+        no_response: Mapping[int, int] | None = None,
+    ) -> np.ndarray:
+        """每个候选的综合得分（与 candidates 同序）"""
+        if not candidates:
+            return np.zeros(0, dtype=np.float32)
+        matrix = np.stack([self._profile(a) for a in candidates])
+        scores = matrix @ embed_text(content)
+
+        if recent and self.recency_weight:
+            last_pos = {m.agent_id: i for i, m in enumerate(recent)}
+            n = len(recent)
+            scores += np.array(
+                [(last_pos[a.id] + 1) / n if a.id in last_pos else 0.0 for a in candidates],
+                dtype=np.float32,
+            ) * self.recency_weight
+        if no_response and self.penalty_weight:
+            scores -= np.array(
+                [no_response.get(a.id, 0) for a in candidates], dtype=np.float32,
+            ) * self.penalty_weight
+        return scores
+
+    def pick(
+        self,
+        content: str,
+        candidates: Sequence,
+        recent: Sequence = (),
+        no_response: Mapping[int, int] | None = None,
+        min_score: float | None = None,
+    ) -> int | None:
+        """有把握时返回 agent_id；得分太低或前两名太接近时返回 None（交给小模型）"""
+        scores = self.scores(content, candidates, recent, no_response)
+        if not len(scores):
+            return None
+        order = np.argsort(scores)[::-1]
+        top = float(scores[order[0]])
+        runner_up = float(scores[order[1]]) if len(order) > 1 else float("-inf")
+        threshold = self.min_score if min_score is None else min_score
+        if top >= threshold and top - runner_up >= self.margin:
+            self.decided += 1
+            agent = candidates[int(order[0])]
+            logger.debug("Ranker picked %s (score=%.3f, margin=%.3f)", agent.name, top, top - runner_up)
+            return agent.id
+        self.deferred += 1
+        return None
+
+
+responder_ranker = ResponderRanker(
+    min_score=settings.wakeup_rank_min_score,
+    margin=settings.wakeup_rank_margin,
+    recency_weight=settings.wakeup_rank_recency_weight,
+    penalty_weight=settings.wakeup_rank_penalty_weight,
+)
@@ -1,9 +1,11 @@
 """
 定时任务调度器
 
-- 每日 00:00：信用点发放 + 过期记忆清理
+- 每日 00:00：信用点发放 + 过期记忆清理 + 日志类表冷数据归档
 - 每小时：autonomy tick（行为决策 + 聊天，统一循环）
 - 使用 asyncio.sleep 实现，无外部依赖
+- 多 worker 时只在事件总线的 leader 上执行
+- 写库任务经 write_queue 提交；传入 db_session_maker 时（测试）在其 session 上直接提交
 """
 import asyncio
 import logging
@@ -11,7 +13,8 @@ from datetime import datetime, timezone, timedelta
 
 from sqlalchemy import update
 
-from ..core.database import async_session
+from ..core.database import write_queue
+from ..core.event_bus import event_bus
 from ..models import Agent
 from .memory_service import memory_service
 from . import autonomy_service
@@ -22,23 +25,30 @@ DAILY_CREDIT_GRANT = 10
 HUMAN_ID = 0
 
 
+async def _grant(db) -> int:
+    result = await db.execute(
+        update(Agent)
+        .where(Agent.id != HUMAN_ID)
+        .values(credits=Agent.credits + DAILY_CREDIT_GRANT)
+    )
+    return result.rowcount
+
+
 async def daily_grant(db_session_maker=None) -> int:
     """每日信用点发放，返回受影响的 Agent 数量"""
-    maker = db_session_maker or async_session
-    async with maker() as db:
-        result = await db.execute(
-            update(Agent)
-            .where(Agent.id != HUMAN_ID)
-            .values(credits=Agent.credits + DAILY_CREDIT_GRANT)
-        )
+    if db_session_maker is None:
+        return await write_queue.submit(_grant)
+    async with db_session_maker() as db:
+        count = await _grant(db)
         await db.commit()
-        return result.rowcount
+        return count
 
 
 async def daily_memory_cleanup(db_session_maker=None) -> int:
     """清理过期短期记忆"""
-    maker = db_session_maker or async_session
-    async with maker() as db:
+    if db_session_maker is None:
+        return await write_queue.submit(lambda db: memory_service.cleanup_expired(db, commit=False))
+    async with db_session_maker() as db:
         count = await memory_service.cleanup_expired(db)
         return count
 
@@ -56,6 +66,9 @@ async def scheduler_loop():
         wait = _seconds_until_midnight()
         logger.info("Scheduler: next run in %.0f seconds", wait)
         await asyncio.sleep(wait)
+        if not event_bus.is_leader():
+            logger.info("Scheduler: not the leader worker, skipping daily jobs")
+            continue
         try:
             granted = await daily_grant()
             logger.info("Daily grant: %d agents received %d credits", granted, DAILY_CREDIT_GRANT)
@@ -68,18 +81,25 @@ async def scheduler_loop():
             logger.error("Memory cleanup failed: %s", e)
         try:
             from .city_service import daily_attribute_decay
-            async with async_session() as db:
-                await daily_attribute_decay(db)
+            await write_queue.submit_with_notices(
+                lambda db, notices: daily_attribute_decay(db, commit=False, notices=notices)
+            )
             logger.info("Daily attribute decay completed")
         except Exception as e:
             logger.error("Daily attribute decay failed: %s", e)
         try:
             from .city_service import production_tick
-            async with async_session() as db:
-                await production_tick("长安", db)
+            await write_queue.submit_with_notices(
+                lambda db, notices: production_tick("长安", db, commit=False, notices=notices)
+            )
             logger.info("Daily production tick completed")
         except Exception as e:
             logger.error("Production tick failed: %s", e)
+        try:
+            from .archive_service import archive_service
+            await archive_service.archive()
+        except Exception as e:
+            logger.error("Archive failed: %s", e)
 
 
 AUTONOMY_INTERVAL = 3600  # 1 小时
@@ -93,6 +113,10 @@ async def autonomy_loop():
     """
     await asyncio.sleep(60)
     while True:
+        if not event_bus.is_leader():
+            logger.info("autonomy_loop: not the leader worker, skipping tick")
+            await asyncio.sleep(AUTONOMY_INTERVAL)
+            continue
         try:
             await autonomy_service.tick()
         except Exception as e:
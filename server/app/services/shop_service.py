@@ -1,6 +1,7 @@
 from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
+from ..core.database import ensure_write_transaction
 from ..models import Agent, VirtualItem, AgentItem
 
 
@@ -29,7 +30,7 @@ class ShopService:
         成功：写 AgentItem + Agent.credits -= price
         返回：{"ok": True/False, "reason": str}
 
-        flush 后 IntegrityError 兜底：
+        SAVEPOINT 提交时 IntegrityError 兜底：
         - UNIQUE 约束 → already_owned（并发重复购买）
         - CHECK 约束 → insufficient_credits（并发购买不同商品导致余额为负）
         """
@@ -54,14 +55,13 @@ class ShopService:
         if agent.credits < item.price:
             return {"ok": False, "reason": "insufficient_credits"}
 
-        # 扣费 + 写入库存
-        agent.credits -= item.price
-        agent_item = AgentItem(agent_id=agent_id, item_id=item_id)
-        db.add(agent_item)
+        # 扣费 + 写入库存（放在 SAVEPOINT 里，冲突时只回滚本次购买，不影响调用方事务里的其他写入）
+        await ensure_write_transaction(db)
         try:
-            await db.flush()
+            async with db.begin_nested():
+                agent.credits -= item.price
+                db.add(AgentItem(agent_id=agent_id, item_id=item_id))
         except IntegrityError as e:
-            await db.rollback()
             err = str(e).lower()
             if "unique" in err or "uq_agent_item" in err:
                 return {"ok": False, "reason": "already_owned"}
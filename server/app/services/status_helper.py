@@ -1,31 +1,171 @@
-"""Agent 状态变更 + WebSocket 广播（F35）"""
+"""Agent 状态变更 + WebSocket 广播（F35）
+
+autonomy tick 和 AgentRunner 每轮会在几毫秒内把同一批 agent 切换好几次状态，
+逐条广播会产生几十帧 agent_status_change。coalesce=True 的变更交给 status_aggregator，
+窗口内每个 agent 只保留最终状态，合并成一帧 agent_status_batch；
+set_all_agents_status 用一条 UPDATE 完成"所有 agent → X"，同样只发一帧。
+单条状态的 commit=True 写入经 write_queue 提交，不在调用方的 session 上写。
+"""
+import asyncio
 import logging
 from datetime import datetime, timezone
+from functools import partial
 
+from sqlalchemy import update
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
 
-from ..models import AgentStatus
+from ..core.config import settings
+from ..core.database import write_queue
+from ..models import Agent, AgentStatus
 
 logger = logging.getLogger(__name__)
 
+HUMAN_ID = 0
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+class StatusAggregator:
+    """窗口内合并状态变更：每个 agent 只保留最后一次，到期后广播一帧 agent_status_batch"""
+
+    def __init__(self, window: float):
+        self.window = window
+        self._pending: dict[int, dict] = {}
+        self._timer: asyncio.TimerHandle | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def record(self, agent_id: int, agent_name: str, status: str, activity: str):
+        # 重新插入，保证帧内顺序是各 agent 最后一次变更的顺序
+        self._pending.pop(agent_id, None)
+        self._pending[agent_id] = {
+            "agent_id": agent_id, "agent_name": agent_name, "status": status, "activity": activity,
+        }
+        loop = asyncio.get_running_loop()
+        # 定时器挂在已关闭的旧事件循环上（测试里每个用例一个循环）时重新挂
+        if self.window > 0 and (self._timer is None or self._loop is not loop):
+            self._loop = loop
+            self._timer = loop.call_later(self.window, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        task = asyncio.create_task(self.flush())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def flush(self):
+        """立即发出积压的变更（无积压时不发）"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        agents = list(self._pending.values())
+        self._pending.clear()
+
+        from ..api.chat import broadcast
+        await broadcast({
+            "type": "system_event",
+            "data": {"event": "agent_status_batch", "agents": agents, "timestamp": _now()},
+        })
+
+
+status_aggregator = StatusAggregator(settings.status_batch_window_s)
+
 
 async def set_agent_status(
-    agent, status: AgentStatus, activity: str, db: AsyncSession
+    agent, status: AgentStatus, activity: str, db: AsyncSession, *,
+    commit: bool = True, coalesce: bool = False, notify: bool = True,
 ):
-    """更新 Agent 状态 + activity，写入 DB 并广播 WebSocket 事件。"""
-    agent.status = status.value
-    agent.activity = activity
-    await db.commit()
+    """更新 Agent 状态 + activity，写入 DB 并广播 WebSocket 事件。
+
+    commit=True 时经 write_queue 提交，agent 对象只同步新值、不标脏；
+    commit=False 时只 flush，由调用方统一提交（autonomy tick 的单事务模式）。
+    coalesce=True 时不单独广播 agent_status_change，交给 status_aggregator 合并。
+    notify=False 时只写不发，调用方提交成功后自己调 announce_status。
+    """
+    if commit:
+        await write_queue.submit(partial(_write_status, agent.id, status.value, activity))
+        set_committed_value(agent, "status", status.value)
+        set_committed_value(agent, "activity", activity)
+    else:
+        agent.status = status.value
+        agent.activity = activity
+        await db.flush()
+
+    if notify:
+        await announce_status(agent.id, agent.name, status, activity, coalesce=coalesce)
+
+
+async def _write_status(agent_id: int, status: str, activity: str, db: AsyncSession):
+    await db.execute(
+        update(Agent).where(Agent.id == agent_id).values(status=status, activity=activity)
+    )
+
+
+async def announce_status(agent_id: int, agent_name: str, status: AgentStatus, activity: str, *, coalesce: bool = False):
+    """广播一次状态变更（不写库）"""
+    if coalesce:
+        status_aggregator.record(agent_id, agent_name, status.value, activity)
+        if status_aggregator.window <= 0:
+            await status_aggregator.flush()
+        return
 
     from ..api.chat import broadcast
     await broadcast({
         "type": "system_event",
         "data": {
             "event": "agent_status_change",
-            "agent_id": agent.id,
-            "agent_name": agent.name,
+            "agent_id": agent_id,
+            "agent_name": agent_name,
             "status": status.value,
             "activity": activity,
-            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "timestamp": _now(),
         },
     })
+
+
+async def set_all_agents_status(
+    status: AgentStatus, activity: str, db: AsyncSession, *, commit: bool = True,
+    notices: list | None = None,
+) -> int:
+    """所有非人类 agent → status：一条 UPDATE ... RETURNING，连同积压的变更发一帧 batch。
+
+    传入 notices 时这一帧留给调用方提交后再发。返回更新的 agent 数。
+    """
+    result = await db.execute(
+        update(Agent)
+        .where(Agent.id != HUMAN_ID)
+        .values(status=status.value, activity=activity)
+        .returning(Agent.id, Agent.name)
+        .execution_options(synchronize_session=False)
+    )
+    rows = result.all()
+
+    # 同步会话里已加载的 Agent 对象（不触发过期后的懒加载）
+    for obj in db.identity_map.values():
+        if isinstance(obj, Agent) and obj.id != HUMAN_ID:
+            set_committed_value(obj, "status", status.value)
+            set_committed_value(obj, "activity", activity)
+
+    if commit:
+        await db.commit()
+
+    if notices is None:
+        await _announce_all(rows, status, activity)
+    else:
+        notices.append(partial(_announce_all, rows, status, activity))
+    return len(rows)
+
+
+async def _announce_all(rows: list, status: AgentStatus, activity: str):
+    for agent_id, name in rows:
+        status_aggregator.record(agent_id, name, status.value, activity)
+    await status_aggregator.flush()
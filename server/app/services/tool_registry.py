@@ -2,12 +2,15 @@
 Tool Use 框架 (M5.1)
 
 注册工具定义 → agent_runner 调用 LLM 时传入 tools 参数 → LLM 返回 tool_call → 执行工具 → 返回结果
+写操作类工具经 write_queue 提交（服务函数 commit=False），不在 context["db"] 上写。
 """
 import json
 import logging
 from dataclasses import dataclass
 from typing import Any, Callable, Awaitable
 
+from ..core.database import write_queue
+
 logger = logging.getLogger(__name__)
 
 
@@ -58,12 +61,13 @@ class ToolRegistry:
 async def _handle_transfer_resource(arguments: dict, context: dict) -> dict:
     """transfer_resource 工具的 handler。from_agent_id 从 context 取，Agent 不能伪造身份。"""
     from .city_service import transfer_resource
-    db = context["db"]
     from_agent_id = context["agent_id"]
     to_agent_id = arguments["to_agent_id"]
     resource_type = arguments["resource_type"]
     quantity = arguments["quantity"]
-    return await transfer_resource(from_agent_id, to_agent_id, resource_type, quantity, db)
+    return await write_queue.submit_with_notices(lambda db, notices: transfer_resource(
+        from_agent_id, to_agent_id, resource_type, quantity, db, commit=False, notices=notices,
+    ))
 
 
 TRANSFER_RESOURCE_TOOL = ToolDefinition(
@@ -91,35 +95,34 @@ tool_registry.register(TRANSFER_RESOURCE_TOOL)
 async def _handle_create_market_order(arguments: dict, context: dict) -> dict:
     """create_market_order handler。seller_id 从 context 取。"""
     from .market_service import create_order
-    db = context["db"]
     seller_id = context["agent_id"]
-    return await create_order(
+    return await write_queue.submit_with_notices(lambda db, notices: create_order(
         seller_id=seller_id,
         sell_type=arguments["sell_type"], sell_amount=arguments["sell_amount"],
         buy_type=arguments["buy_type"], buy_amount=arguments["buy_amount"],
-        db=db,
-    )
+        db=db, commit=False, notices=notices,
+    ))
 
 
 async def _handle_accept_market_order(arguments: dict, context: dict) -> dict:
     """accept_market_order handler。buyer_id 从 context 取。"""
     from .market_service import accept_order
-    db = context["db"]
     buyer_id = context["agent_id"]
-    return await accept_order(
+    return await write_queue.submit_with_notices(lambda db, notices: accept_order(
         buyer_id=buyer_id,
         order_id=arguments["order_id"],
         buy_ratio=arguments.get("buy_ratio", 1.0),
-        db=db,
-    )
+        db=db, commit=False, notices=notices,
+    ))
 
 
 async def _handle_cancel_market_order(arguments: dict, context: dict) -> dict:
     """cancel_market_order handler。seller_id 从 context 取。"""
     from .market_service import cancel_order
-    db = context["db"]
     seller_id = context["agent_id"]
-    return await cancel_order(seller_id=seller_id, order_id=arguments["order_id"], db=db)
+    return await write_queue.submit_with_notices(lambda db, notices: cancel_order(
+        seller_id=seller_id, order_id=arguments["order_id"], db=db, commit=False, notices=notices,
+    ))
 
 
 CREATE_MARKET_ORDER_TOOL = ToolDefinition(
@@ -175,15 +178,14 @@ tool_registry.register(CANCEL_MARKET_ORDER_TOOL)
 async def _handle_construct_building(arguments: dict, context: dict) -> dict:
     """construct_building handler。builder_id 从 context 取。"""
     from .city_service import construct_building
-    db = context["db"]
     builder_id = context["agent_id"]
-    return await construct_building(
+    return await write_queue.submit_with_notices(lambda db, notices: construct_building(
         builder_id=builder_id,
         building_type=arguments["building_type"],
         name=arguments["name"],
         city="长安",
-        db=db,
-    )
+        db=db, commit=False, notices=notices,
+    ))
 
 
 CONSTRUCT_BUILDING_TOOL = ToolDefinition(
@@ -206,14 +208,13 @@ tool_registry.register(CONSTRUCT_BUILDING_TOOL)
 # --- M6.2 悬赏接取工具 ---
 
 async def _handle_claim_bounty(arguments: dict, context: dict) -> dict:
-    """claim_bounty handler。agent_id 从 context 取。不自行 commit，由调用方控制事务边界。"""
+    """claim_bounty handler。agent_id 从 context 取。claim_bounty 不自行 commit，随 write_queue 批次提交。"""
     from .bounty_service import claim_bounty
-    db = context["db"]
     agent_id = context["agent_id"]
     bounty_id = arguments["bounty_id"]
-    return await claim_bounty(
+    return await write_queue.submit(lambda db: claim_bounty(
         agent_id=agent_id, bounty_id=bounty_id, db=db,
-    )
+    ))
 
 
 CLAIM_BOUNTY_TOOL = ToolDefinition(
@@ -0,0 +1,124 @@
+"""唤醒防抖：一阵连发消息只做一次唤醒决策
+
+入站消息批次交给 submit() 后不立即选人，而是等 window 秒没有新消息（最长等 max_wait 秒）再对
+整段连发做一次 decide_wakeup（@提及全部必唤，选人只针对最新的消息，最近消息作为上下文）。
+决策过程中又来了新消息：取消进行中的决策，把它的消息并入新一段重新计时。
+决策完成后的回复生成（run_wakeup_replies）不再取消，在后台跑。
+
+聊天室目前只有一个频道，所以只有一个 burst；window=0 时退回每批立即决策、互不取消。
+"""
+import asyncio
+import logging
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class WakeupDebouncer:
+
+    def __init__(self, window: float = 0.3, max_wait: float = 2.0):
+        self.window = window
+        self.max_wait = max_wait
+        self._pending: list = []
+        self._in_flight: list = []
+        self._deadline: float | None = None
+        self._timer: asyncio.TimerHandle | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._decision: asyncio.Task | None = None
+        self._tasks: set[asyncio.Task] = set()
+        self.decisions = 0
+        self.cancelled = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending) + len(self._in_flight)
+
+    def submit(self, messages: list):
+        if not messages:
+            return
+        if self.window <= 0:
+            self._spawn(self._decide(list(messages)))
+            return
+
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # 上一个事件循环（测试里每个用例一个）留下的状态直接作废
+            self._reset()
+            self._loop = loop
+
+        if self._decision is not None and not self._decision.done():
+            # 进行中的决策已过时：取消，消息并回这一段
+            self._decision.cancel()
+            self.cancelled += 1
+            self._pending = self._in_flight + self._pending
+            self._in_flight = []
+            self._decision = None
+
+        self._pending.extend(messages)
+        now = loop.time()
+        if self._deadline is None:
+            self._deadline = now + self.max_wait
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = loop.call_at(min(now + self.window, self._deadline), self._fire)
+
+    def _fire(self):
+        self._timer = None
+        self._deadline = None
+        self._in_flight, self._pending = self._pending, []
+        self._decision = self._spawn(self._decide(self._in_flight))
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _decide(self, burst: list):
+        from ..api.chat import decide_wakeup, run_wakeup_replies
+
+        try:
+            agents_to_reply = await decide_wakeup(burst)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Wakeup decision failed (%d messages): %s", len(burst), e, exc_info=True)
+            return
+        finally:
+            if self._in_flight is burst:
+                self._in_flight = []
+        self.decisions += 1
+        if agents_to_reply:
+            self._spawn(self._reply(run_wakeup_replies, agents_to_reply))
+
+    @staticmethod
+    async def _reply(run_wakeup_replies, agents_to_reply: list[dict]):
+        try:
+            await run_wakeup_replies(agents_to_reply)
+        except Exception as e:
+            logger.error("Wakeup handling failed: %s", e, exc_info=True)
+
+    def _reset(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = None
+        self._deadline = None
+        self._pending = []
+        self._in_flight = []
+        self._decision = None
+
+    async def stop(self):
+        """停机：丢弃还没决策的消息，取消进行中的决策和回复"""
+        self._reset()
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+wakeup_debouncer = WakeupDebouncer(
+    window=settings.wakeup_debounce_ms / 1000,
+    max_wait=settings.wakeup_debounce_max_ms / 1000,
+)
@@ -3,15 +3,20 @@
 
 两种触发方式：
 1. @提及 → 必定唤醒
-2. 人类/Agent 消息 → 小模型选人
+2. 人类/Agent 消息 → 本地预排序选人，没把握时再调小模型
 （定时聊天已合并到 autonomy_service）
 """
 import logging
-import httpx
-from sqlalchemy import select
+from collections import OrderedDict
+
+from sqlalchemy import select, bindparam, Integer
+from sqlalchemy.engine import Row
 from sqlalchemy.ext.asyncio import AsyncSession
 from ..models import Agent, Message
-from ..core.config import resolve_model
+from ..core.config import settings
+from ..core.event_bus import event_bus
+from .llm_gateway import llm_gateway
+from .responder_ranker import responder_ranker
 
 logger = logging.getLogger(__name__)
 
@@ -30,46 +35,68 @@ WAKEUP_PROMPT = """你是一个聊天室管理员。根据以下信息，选择
 只返回名称，不要解释。"""
 
 
+# 模块级预构建语句：参数全部走 bindparam，每次调用不再重建 select()，
+# 编译结果由引擎的 compiled cache 复用
+_RECENT_MESSAGES_STMT = (
+    select(
+        Message.id, Message.agent_id, Agent.name.label("agent_name"),
+        Message.content, Message.created_at,
+    )
+    .outerjoin(Agent, Message.agent_id == Agent.id)
+    .order_by(Message.created_at.desc())
+    .limit(bindparam("limit", type_=Integer))
+)
+
+
+async def get_recent_messages(db: AsyncSession, limit: int = 10) -> list[Row]:
+    """最近 N 条消息（时间升序）。
+
+    热路径（每次唤醒、每轮 autonomy）只需要发送者名和内容，返回 Core 行而非 ORM 实体。
+    行字段：id / agent_id / agent_name / content / created_at
+    """
+    result = await db.execute(_RECENT_MESSAGES_STMT, {"limit": limit})
+    rows = list(result.all())
+    rows.reverse()
+    return rows
+
+
 async def call_wakeup_model(prompt: str) -> str:
     """调用小模型进行唤醒选人"""
-    resolved = resolve_model("wakeup-model")
-    if not resolved:
-        print("[WAKEUP] model not configured, returning NONE", flush=True)
+    provider = llm_gateway.route("wakeup-model")
+    if not provider:
+        logger.debug("Wakeup model not configured, returning NONE")
         return "NONE"
 
-    base_url, api_key, model_id = resolved
-
     try:
-        async with httpx.AsyncClient(timeout=15) as client:
-            response = await client.post(
-                f"{base_url}/chat/completions",
-                headers={"Authorization": f"Bearer {api_key}"},
-                json={
-                    "model": model_id,
-                    "messages": [{"role": "user", "content": prompt}],
-                    "max_tokens": 800,
-                },
-            )
-            response.raise_for_status()
-            data = response.json()
-            msg = data["choices"][0]["message"]
-            content = (msg.get("content") or "").strip()
-            # 某些推理模型把答案放在 reasoning 末尾，content 为空
-            if not content and msg.get("reasoning"):
-                # 取 reasoning 最后一行作为答案
-                lines = msg["reasoning"].strip().splitlines()
-                content = lines[-1].strip() if lines else ""
-            print(f"[WAKEUP] model returned: {content!r}", flush=True)
-            return content
+        response = await llm_gateway.chat(
+            provider,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=800,
+            timeout=settings.wakeup_model_deadline_s,
+            max_retries=settings.wakeup_model_max_retries,
+            deadline=settings.wakeup_model_deadline_s,
+        )
+        msg = response.choices[0].message
+        content = (msg.content or "").strip()
+        # 某些推理模型把答案放在 reasoning 末尾，content 为空
+        reasoning = getattr(msg, "reasoning", None)
+        if not content and reasoning:
+            # 取 reasoning 最后一行作为答案
+            lines = reasoning.strip().splitlines()
+            content = lines[-1].strip() if lines else ""
+        logger.debug("Wakeup model returned: %r", content)
+        return content
     except Exception as e:
-        print(f"[WAKEUP] model call failed: {e}", flush=True)
         logger.error("Wakeup model call failed: %s", e, exc_info=True)
         return "NONE"
 
 
 class WakeupService:
     def __init__(self) -> None:
-        self._no_response_count: dict[int, int] = {}  # {agent_id: 连续无回应次数}
+        # {agent_id: 连续无回应次数}，多 worker 共享
+        self._no_response_count = event_bus.counters("wakeup_no_response")
+        # {message.id: agent_id}：哪条消息的决策已经记过无回应（防抖取消后重新处理时撤销，只计一次）
+        self._counted: OrderedDict[int, int] = OrderedDict()
 
     def record_response(self, agent_id: int) -> None:
         """有人回应时重置计数器"""
@@ -77,28 +104,51 @@ class WakeupService:
 
     def record_no_response(self, agent_id: int) -> None:
         """无人回应时计数器+1"""
-        self._no_response_count[agent_id] = self._no_response_count.get(agent_id, 0) + 1
+        self._no_response_count.incr(agent_id)
+
+    def _mark_counted(self, message: Message) -> None:
+        if message.id is None:
+            return
+        self._counted[message.id] = message.agent_id
+        while len(self._counted) > 256:
+            self._counted.popitem(last=False)
+
+    def _undo_counted(self, burst: list[Message]) -> None:
+        """连发被防抖取消后整段重新处理：撤销上一次（已作废的）决策记的无回应"""
+        for m in burst:
+            agent_id = self._counted.pop(m.id, None) if m.id is not None else None
+            if agent_id is not None and self._no_response_count.incr(agent_id, -1) <= 0:
+                self._no_response_count.pop(agent_id, None)
 
     async def process(
-        self, message: Message, online_agent_ids: set[int], db: AsyncSession
+        self, message: Message | list[Message], online_agent_ids: set[int], db: AsyncSession
     ) -> list[int]:
         """
-        处理消息，返回需要唤醒的 agent_id 列表。
+        处理一条消息或一段连发（burst），返回需要唤醒的 agent_id 列表。
         不包含发送者自身，不包含 Human Agent (id=0)。
+        连发时每条的 @提及都必唤；选人只做一次，针对最后一条人类消息（没有则最后一条）。
         """
-        print(f"[WAKEUP:process] sender_type={message.sender_type!r} agent_id={message.agent_id} content={message.content[:50]!r}", flush=True)
+        burst = list(message) if isinstance(message, (list, tuple)) else [message]
+        message = next((m for m in reversed(burst) if m.sender_type == "human"), burst[-1])
+        self._undo_counted(burst)
+        logger.debug(
+            "Wakeup process: burst=%d sender_type=%r agent_id=%s content=%r",
+            len(burst), message.sender_type, message.agent_id, message.content[:50],
+        )
         # 频率控制：人类说话 → 重置所有 agent 计数
-        if message.sender_type == "human":
+        if any(m.sender_type == "human" for m in burst):
             for aid in list(self._no_response_count):
                 self.record_response(aid)
 
         wake_list: list[int] = []
 
         # 1. @提及必唤（不要求在线，Agent 由服务端驱动回复）
-        mentions = message.mentions or []
-        for aid in mentions:
-            if aid != message.agent_id and aid != 0:
-                wake_list.append(aid)
+        mentioned = False
+        for m in burst:
+            mentioned = mentioned or bool(m.mentions)
+            for aid in m.mentions or []:
+                if aid != m.agent_id and aid != 0 and aid not in wake_list:
+                    wake_list.append(aid)
 
         # 2. 人类消息且无 @提及 → 小模型选 1 个 Agent
         if message.sender_type == "human" and not wake_list:
@@ -107,7 +157,7 @@ class WakeupService:
                 wake_list.append(selected)
 
         # 3. 普通 Agent 消息（无 @提及）→ 小模型判断
-        elif not mentions:
+        elif not mentioned:
             selected = await self._maybe_trigger(message, online_agent_ids, db)
             if selected:
                 wake_list.append(selected)
@@ -115,26 +165,32 @@ class WakeupService:
         # 频率控制：agent 消息触发了新唤醒 → 记录无回应
         if message.sender_type == "agent" and wake_list:
             self.record_no_response(message.agent_id)
+            self._mark_counted(message)
 
         return wake_list
 
     async def _select_responder(
         self, message: Message, online_agent_ids: set[int], db: AsyncSession
     ) -> int | None:
-        """小模型选人：人类消息时选择最合适的回复者"""
+        """人类消息时选择最合适的回复者：本地预排序有把握就直接定，否则小模型选人"""
         candidates = await self._get_candidates(online_agent_ids, message.agent_id, db)
-        print(f"[WAKEUP:select] candidates={[(c.id, c.name) for c in candidates]}", flush=True)
+        logger.debug("Wakeup select: candidates=%s", [(c.id, c.name) for c in candidates])
         if not candidates:
             return None
 
         recent = await self._get_recent_messages(db, limit=10)
+        if settings.wakeup_rank_enabled:
+            picked = responder_ranker.pick(message.content, candidates, recent, self._no_response_count)
+            logger.debug("Wakeup select: ranker picked=%s", picked)
+            if picked is not None:
+                return picked
         agent_list = "\n".join(
             f"- {a.name}: {a.persona[:80]}"
             + ("（最近发言较多，建议让其他人说话）" if self._no_response_count.get(a.id, 0) >= 3 else "")
             for a in candidates
         )
         recent_text = "\n".join(
-            f"{m.agent.name if m.agent else 'unknown'}: {m.content[:100]}"
+            f"{m.agent_name or 'unknown'}: {m.content[:100]}"
             for m in recent
         )
 
@@ -144,27 +200,33 @@ class WakeupService:
             new_message=message.content[:200],
         )
 
-        print(f"[WAKEUP:select] calling wakeup model...", flush=True)
         result = await call_wakeup_model(prompt)
-        print(f"[WAKEUP:select] model result={result!r}", flush=True)
+        logger.debug("Wakeup select: model result=%r", result)
         return self._resolve_name(result, candidates)
 
     async def _maybe_trigger(
         self, message: Message, online_agent_ids: set[int], db: AsyncSession
     ) -> int | None:
-        """Agent 消息时，小概率触发另一个 Agent 参与对话"""
+        """Agent 消息时，小概率触发另一个 Agent 参与对话（同样先走本地预排序，门槛更高）"""
         candidates = await self._get_candidates(online_agent_ids, message.agent_id, db)
         if not candidates:
             return None
 
         recent = await self._get_recent_messages(db, limit=10)
+        if settings.wakeup_rank_enabled:
+            picked = responder_ranker.pick(
+                message.content, candidates, recent, self._no_response_count,
+                min_score=settings.wakeup_rank_agent_min_score,
+            )
+            if picked is not None:
+                return picked
         agent_list = "\n".join(
             f"- {a.name}: {a.persona[:80]}"
             + ("（最近发言较多，建议让其他人说话）" if self._no_response_count.get(a.id, 0) >= 3 else "")
             for a in candidates
         )
         recent_text = "\n".join(
-            f"{m.agent.name if m.agent else 'unknown'}: {m.content[:100]}"
+            f"{m.agent_name or 'unknown'}: {m.content[:100]}"
             for m in recent
         )
 
@@ -192,19 +254,9 @@ class WakeupService:
 
     async def _get_recent_messages(
         self, db: AsyncSession, limit: int = 10
-    ) -> list[Message]:
-        """获取最近 N 条消息（带 agent 关系）"""
-        from sqlalchemy.orm import joinedload
-
-        result = await db.execute(
-            select(Message)
-            .options(joinedload(Message.agent))
-            .order_by(Message.created_at.desc())
-            .limit(limit)
-        )
-        messages = list(result.scalars().all())
-        messages.reverse()
-        return messages
+    ) -> list[Row]:
+        """获取最近 N 条消息（Core 行，带 agent_name）"""
+        return await get_recent_messages(db, limit=limit)
 
     def _resolve_name(self, name: str, candidates: list[Agent]) -> int | None:
         """将模型返回的名称解析为 agent_id"""
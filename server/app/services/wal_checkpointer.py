@@ -0,0 +1,142 @@
+"""后台 WAL checkpoint + PRAGMA optimize
+
+长时间运行时 WAL 文件只增不减，自动 checkpoint 又发生在某次提交里，
+停顿会落到随机的用户请求上。这里改由后台任务按周期执行：
+- 平时 PASSIVE：不等待读者/写者，能搬多少搬多少
+- WAL 超过 wal_truncate_threshold_mb 时 TRUNCATE：搬完后把 WAL 截断为 0 字节
+- 每隔 sqlite_optimize_interval_s 经写队列执行一次 PRAGMA optimize
+
+checkpoint 在线程里用独立的 sqlite3 连接执行，不占用写入者连接，也不阻塞事件循环。
+每次执行结果记录在 last_report，/api/dev/storage 的 last_checkpoint 字段会带上。
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import settings
+from ..core.database import write_queue
+
+logger = logging.getLogger(__name__)
+
+
+class WalCheckpointer:
+
+    def __init__(
+        self,
+        db_path: str,
+        interval: float = 30.0,
+        truncate_threshold_bytes: int = 64 * 1024 * 1024,
+        optimize_interval: float = 3600.0,
+        busy_timeout_ms: int = 5000,
+    ):
+        self.db_path = db_path
+        self.interval = interval
+        self.truncate_threshold_bytes = truncate_threshold_bytes
+        self.optimize_interval = optimize_interval
+        self.busy_timeout_ms = busy_timeout_ms
+        self.last_report: dict | None = None
+        self._last_optimize = 0.0
+        self._task: asyncio.Task | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def wal_size(self) -> int:
+        try:
+            return os.path.getsize(f"{self.db_path}-wal")
+        except FileNotFoundError:
+            return 0
+
+    # ── 生命周期 ──
+
+    async def start(self):
+        if self.running:
+            return
+        self._last_optimize = time.monotonic()
+        self._task = asyncio.create_task(self._run())
+        logger.info("WalCheckpointer started (interval=%.0fs, truncate>=%dMB)",
+                    self.interval, self.truncate_threshold_bytes // (1024 * 1024))
+
+    async def stop(self):
+        """停止定时器，最后做一次 TRUNCATE（应在写队列停止之后调用）"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.checkpoint("TRUNCATE")
+        except Exception as e:
+            logger.warning("Final WAL checkpoint failed: %s", e)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.checkpoint()
+                if time.monotonic() - self._last_optimize >= self.optimize_interval:
+                    await self.optimize()
+            except Exception as e:
+                logger.error("WAL maintenance failed: %s", e)
+
+    # ── 维护操作 ──
+
+    async def checkpoint(self, mode: str | None = None) -> dict:
+        """执行一次 checkpoint；mode 为空时按 WAL 大小在 PASSIVE / TRUNCATE 间选择"""
+        wal_before = self.wal_size()
+        if mode is None:
+            mode = "TRUNCATE" if wal_before >= self.truncate_threshold_bytes else "PASSIVE"
+
+        started = time.perf_counter()
+        busy, log_frames, checkpointed = await asyncio.to_thread(self._checkpoint_sync, mode)
+        report = {
+            "mode": mode,
+            "busy": bool(busy),
+            "log_frames": log_frames,
+            "checkpointed_frames": checkpointed,
+            "wal_bytes_before": wal_before,
+            "wal_bytes": self.wal_size(),
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+        self.last_report = report
+
+        if busy:
+            logger.warning("WAL checkpoint(%s) busy: %d/%d frames, wal=%d bytes",
+                           mode, checkpointed, log_frames, report["wal_bytes"])
+        elif mode != "PASSIVE":
+            logger.info("WAL checkpoint(%s): %d -> %d bytes in %.1fms",
+                        mode, wal_before, report["wal_bytes"], report["duration_ms"])
+        return report
+
+    def _checkpoint_sync(self, mode: str) -> tuple[int, int, int]:
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout_ms / 1000)
+        try:
+            row = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+        finally:
+            conn.close()
+        return row[0], row[1], row[2]
+
+    async def optimize(self):
+        """在写入者的长连接上跑 PRAGMA optimize（它依赖该连接的查询历史）"""
+        async def work(db: AsyncSession):
+            await db.execute(text("PRAGMA optimize"))
+
+        await write_queue.submit(work)
+        self._last_optimize = time.monotonic()
+        logger.info("PRAGMA optimize done")
+
+
+wal_checkpointer = WalCheckpointer(
+    settings.db_path,
+    interval=settings.wal_checkpoint_interval_s,
+    truncate_threshold_bytes=settings.wal_truncate_threshold_mb * 1024 * 1024,
+    optimize_interval=settings.sqlite_optimize_interval_s,
+)
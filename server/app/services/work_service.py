@@ -1,21 +1,33 @@
 from datetime import datetime
-from sqlalchemy import select, func as sa_func
+from sqlalchemy import select, and_, func as sa_func
 from sqlalchemy.ext.asyncio import AsyncSession
 from ..models import Agent, Job, CheckIn
+from .archive_service import archive_service
+
+
+def checked_in_today():
+    """今日（UTC）打卡条件。
+
+    用 [date('now'), date('now', '+1 day')) 区间代替 date(checked_at) = date('now')，
+    保持与 CURRENT_TIMESTAMP (UTC) 一致的同时能命中 checked_at 索引。
+    """
+    return and_(
+        CheckIn.checked_at >= sa_func.date("now"),
+        CheckIn.checked_at < sa_func.date("now", "+1 day"),
+    )
+
 
 class WorkService:
 
     async def get_jobs(self, db: AsyncSession) -> list[dict]:
         """岗位列表，含当日在岗人数"""
-        # 用 date('now') 保持与 CURRENT_TIMESTAMP (UTC) 一致
-        today_utc = sa_func.date("now")
         # 子查询：当日每个岗位的打卡人数
         checkin_counts = (
             select(
                 CheckIn.job_id,
                 sa_func.count(CheckIn.id).label("today_workers")
             )
-            .where(sa_func.date(CheckIn.checked_at) == today_utc)
+            .where(checked_in_today())
             .group_by(CheckIn.job_id)
             .subquery()
         )
@@ -51,13 +63,12 @@ class WorkService:
         job = await db.get(Job, job_id)
         if not job:
             return {"ok": False, "reason": "job_not_found", "reward": 0}
-        # 今日是否已打卡（任意岗位）— 用 date('now') 与 UTC 时间戳对齐
-        today_utc = sa_func.date("now")
+        # 今日是否已打卡（任意岗位）
         existing = await db.execute(
             select(CheckIn)
             .where(
                 CheckIn.agent_id == agent_id,
-                sa_func.date(CheckIn.checked_at) == today_utc,
+                checked_in_today(),
             )
             .limit(1)
         )
@@ -70,7 +81,7 @@ class WorkService:
                 select(sa_func.count(CheckIn.id))
                 .where(
                     CheckIn.job_id == job_id,
-                    sa_func.date(CheckIn.checked_at) == today_utc,
+                    checked_in_today(),
                 )
             )
             if today_count.scalar() >= job.max_workers:
@@ -98,12 +109,11 @@ class WorkService:
         self, agent_id: int, db: AsyncSession
     ) -> dict | None:
         """查询 Agent 今日打卡记录，无则返回 None"""
-        today_utc = sa_func.date("now")
         result = await db.execute(
             select(CheckIn)
             .where(
                 CheckIn.agent_id == agent_id,
-                sa_func.date(CheckIn.checked_at) == today_utc,
+                checked_in_today(),
             )
             .limit(1)
         )
@@ -120,7 +130,7 @@ class WorkService:
     async def get_work_history(
         self, agent_id: int, db: AsyncSession, days: int = 7
     ) -> list[dict]:
-        """最近 N 天打卡记录"""
+        """最近 N 天打卡记录（起点早于归档分界时连同归档库一起查）"""
         from datetime import timedelta
         since = datetime.now() - timedelta(days=days)
         result = await db.execute(
@@ -128,6 +138,15 @@ class WorkService:
             .where(CheckIn.agent_id == agent_id, CheckIn.checked_at >= since)
             .order_by(CheckIn.checked_at.desc())
         )
+        checkins = list(result.scalars().all())
+        if archive_service.may_hold(since):
+            checkins_t = CheckIn.__table__
+            checkins += await archive_service.fetch_archived(
+                select(checkins_t)
+                .where(checkins_t.c.agent_id == agent_id, checkins_t.c.checked_at >= since)
+                .order_by(checkins_t.c.checked_at.desc()),
+                since=since,
+            )
         return [
             {
                 "checkin_id": c.id,
@@ -135,7 +154,7 @@ class WorkService:
                 "reward": c.reward,
                 "checked_at": str(c.checked_at),
             }
-            for c in result.scalars().all()
+            for c in checkins
         ]
 
 work_service = WorkService()
@@ -0,0 +1,196 @@
+"""写后缓冲（write-behind）：高频低价值写入先进内存，定时/攒够量后批量落盘
+
+覆盖三类写入：
+- 记忆命中计数：按 memory_id 合并累加，落盘时顺带执行短期→长期晋升
+- LLMUsage 用量行
+- MemoryReference 记忆引用行
+
+未 start() 时 running=False，调用方应走原来的内联写入路径（测试、脚本场景）。
+落盘统一经 write_queue 提交，不与其他写入者抢锁；stop() 时最后一次 flush。
+整批失败时逐行重试，单独仍失败的行记日志丢弃；一行都写不进去时放回缓冲，
+连续 max_retries 次后整批丢弃，缓冲不会无限增长。
+"""
+import asyncio
+import logging
+from collections import Counter
+from functools import partial
+
+from sqlalchemy import bindparam, insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import settings
+from ..core.database import write_queue
+from ..models import Memory, MemoryType, LLMUsage, MemoryReference
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+
+    def __init__(self, flush_interval: float = 2.0, max_pending: int = 500, max_retries: int = 3):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self._failed_flushes = 0
+        self._access_counts: Counter[int] = Counter()
+        self._usage_rows: list[dict] = []
+        self._ref_rows: list[dict] = []
+        self._task: asyncio.Task | None = None
+        self._wake: asyncio.Event | None = None
+        self._flush_lock = asyncio.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def pending(self) -> int:
+        return len(self._access_counts) + len(self._usage_rows) + len(self._ref_rows)
+
+    # ── 记录 ──
+
+    def record_memory_access(self, memory_ids: list[int]):
+        self._access_counts.update(memory_ids)
+        self._maybe_wake()
+
+    def record_llm_usage(self, usage_info: dict):
+        self._usage_rows.append({
+            "model": usage_info["model"],
+            "agent_id": usage_info["agent_id"],
+            "prompt_tokens": usage_info["prompt_tokens"],
+            "completion_tokens": usage_info["completion_tokens"],
+            "total_tokens": usage_info["total_tokens"],
+            "latency_ms": usage_info["latency_ms"],
+        })
+        self._maybe_wake()
+
+    def record_memory_refs(self, message_id: int, memory_ids: list[int]):
+        self._ref_rows.extend({"message_id": message_id, "memory_id": mid} for mid in memory_ids)
+        self._maybe_wake()
+
+    def _maybe_wake(self):
+        if self._wake is not None and self.pending >= self.max_pending:
+            self._wake.set()
+
+    # ── 生命周期 ──
+
+    async def start(self):
+        if self.running:
+            return
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止定时器并把剩余缓冲落盘"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._wake = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("Write-behind flush failed, will retry: %s", e)
+
+    # ── 落盘 ──
+
+    async def flush(self) -> int:
+        """把当前缓冲一次性批量写入，返回写入的条目数。
+
+        整批失败时逐行重试；一行都没写进去时数据放回缓冲并抛出原异常（连续失败过多则丢弃）。
+        """
+        async with self._flush_lock:
+            counts, usage, refs = self._access_counts, self._usage_rows, self._ref_rows
+            if not (counts or usage or refs):
+                return 0
+            self._access_counts, self._usage_rows, self._ref_rows = Counter(), [], []
+            total = len(counts) + len(usage) + len(refs)
+
+            try:
+                await write_queue.submit(partial(_apply, counts=counts, usage=usage, refs=refs))
+            except Exception as e:
+                logger.warning("Write-behind batch failed (%d items), retrying row by row: %s", total, e)
+                written = await _apply_row_by_row(counts, usage, refs)
+                if written:
+                    self._failed_flushes = 0
+                    return written
+                self._failed_flushes += 1
+                if self._failed_flushes >= self.max_retries:
+                    logger.error(
+                        "Write-behind: %d consecutive failed flushes, dropping %d items",
+                        self._failed_flushes, total,
+                    )
+                    self._failed_flushes = 0
+                else:
+                    self._access_counts.update(counts)
+                    self._usage_rows[:0] = usage
+                    self._ref_rows[:0] = refs
+                raise
+            self._failed_flushes = 0
+            return total
+
+
+async def _apply_row_by_row(counts: Counter, usage: list[dict], refs: list[dict]) -> int:
+    """每行一个 unit of work 并发提交（写入者仍会攒成一批，各行独立 SAVEPOINT）。
+
+    有行写成功时，失败的行视为坏数据，记日志丢弃；返回写入的行数。
+    """
+    singles = (
+        [("memory_access", {"memory_id": mid, "n": n}, Counter({mid: n}), [], []) for mid, n in counts.items()]
+        + [("llm_usage", row, Counter(), [row], []) for row in usage]
+        + [("memory_ref", row, Counter(), [], [row]) for row in refs]
+    )
+    results = await asyncio.gather(
+        *[write_queue.submit(partial(_apply, counts=c, usage=u, refs=r)) for _, _, c, u, r in singles],
+        return_exceptions=True,
+    )
+    written = sum(1 for res in results if not isinstance(res, BaseException))
+    if written:
+        for (kind, row, *_), res in zip(singles, results):
+            if isinstance(res, BaseException):
+                logger.error("Write-behind: dropping %s row %s: %s", kind, row, res)
+    return written
+
+
+async def _apply(db: AsyncSession, *, counts: Counter, usage: list[dict], refs: list[dict]):
+    if counts:
+        memories = Memory.__table__
+        await db.execute(
+            update(memories)
+            .where(memories.c.id == bindparam("mid"))
+            .values(access_count=memories.c.access_count + bindparam("n")),
+            [{"mid": mid, "n": n} for mid, n in counts.items()],
+        )
+        # 与 MemoryService.search 内联路径一致的晋升规则
+        from .memory_service import PROMOTE_THRESHOLD
+        await db.execute(
+            update(memories)
+            .where(
+                memories.c.id.in_(list(counts)),
+                memories.c.memory_type == MemoryType.SHORT,
+                memories.c.access_count >= PROMOTE_THRESHOLD,
+            )
+            .values(memory_type=MemoryType.LONG, expires_at=None)
+        )
+    if usage:
+        await db.execute(insert(LLMUsage.__table__), usage)
+    if refs:
+        await db.execute(insert(MemoryReference.__table__), refs)
+
+
+write_behind = WriteBehindBuffer(
+    flush_interval=settings.write_behind_flush_interval_s,
+    max_pending=settings.write_behind_max_pending,
+)
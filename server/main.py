@@ -16,11 +16,19 @@ from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy import select, func as sa_func
 from app.core import init_db
 from app.core.config import settings
-from app.core.database import async_session
+from app.core.json_codec import FastJSONResponse
+from app.core.event_bus import event_bus
+from app.core.database import async_session, write_queue
 from app.models import Agent, Job, VirtualItem, Building, Resource, Memory, MemoryType
 from app.api import agents_router, chat_router, dev_router, bounties_router, work_router, shop_router, memory_router, city_router
+from app.api.chat import deliver, event_log
 from app.services.vector_store import init_vector_store, close_vector_store, upsert_memory
 from app.services.scheduler import scheduler_loop, autonomy_loop
+from app.services.write_behind import write_behind
+from app.services.message_ingest import message_ingestor
+from app.services.wakeup_debouncer import wakeup_debouncer
+from app.services.wal_checkpointer import wal_checkpointer
+from app.services.llm_gateway import llm_gateway
 
 logger = logging.getLogger(__name__)
 
@@ -130,6 +138,11 @@ async def lifespan(app: FastAPI):
     await seed_city_buildings()
     await init_vector_store()
     await seed_public_memories()
+    await write_queue.start()
+    await write_behind.start()
+    await wal_checkpointer.start()
+    await event_bus.start(deliver)  # 多 worker 时转发其他 worker 的广播
+    event_log.reset(event_bus.epoch)  # sqlite 总线启动后才知道共享的 epoch
     scheduler_task = asyncio.create_task(scheduler_loop())
     autonomy_task = asyncio.create_task(autonomy_loop())
     yield
@@ -143,10 +156,20 @@ async def lifespan(app: FastAPI):
         await autonomy_task
     except asyncio.CancelledError:
         pass
+    await message_ingestor.stop()  # 积压的入站消息先写入并广播
+    await wakeup_debouncer.stop()
+    await event_bus.stop()
+    await write_behind.stop()  # 先把缓冲经写队列落盘，再停写队列
+    await write_queue.stop()
+    await wal_checkpointer.stop()  # 写入全部落盘后截断 WAL
     await close_vector_store()
+    await llm_gateway.aclose()
 
 
-app = FastAPI(title="OpenClaw Community", version="0.1.0", lifespan=lifespan)
+app = FastAPI(
+    title="OpenClaw Community", version="0.1.0", lifespan=lifespan,
+    default_response_class=FastJSONResponse,
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+午夜批任务基准：10k Agent 下 daily_attribute_decay / daily_grant 耗时
+
+用法:
+  cd server && python scripts/bench_daily_jobs.py              # 默认 10000 个 Agent
+  cd server && python scripts/bench_daily_jobs.py --agents 50000
+
+临时文件库（WAL，与线上同样的 PRAGMA），对比改造前逐个 ORM 对象结算的写法。
+"""
+import argparse
+import asyncio
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import AsyncMock, patch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import event, insert, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from app.core.database import Base, _apply_sqlite_pragmas
+from app.models import Agent
+from app.services.city_service import daily_attribute_decay
+from app.services.scheduler import daily_grant
+
+
+async def decay_before(db: AsyncSession):
+    """改造前：逐个加载 Agent 在 Python 里改"""
+    agents = await db.execute(select(Agent).where(Agent.id != 0))
+    for agent in agents.scalars().all():
+        agent.satiety = max(0, agent.satiety - 15)
+        agent.stamina = min(100, agent.stamina + 15)
+        if agent.satiety == 0:
+            agent.mood = max(0, agent.mood - 20)
+        elif agent.satiety < 30:
+            agent.mood = max(0, agent.mood - 10)
+    await db.commit()
+
+
+async def _seed(engine, n: int):
+    rng = random.Random(42)
+    rows = [
+        {
+            "id": i, "name": f"Agent{i}", "persona": "p",
+            "satiety": rng.randint(0, 100), "mood": rng.randint(0, 100), "stamina": rng.randint(0, 100),
+            "credits": 100,
+        }
+        for i in range(1, n + 1)
+    ]
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(Agent.__table__).values(id=0, name="Human", persona="human", model="none"))
+        await conn.execute(insert(Agent.__table__), rows)
+
+
+async def _timed(fn) -> float:
+    t0 = time.perf_counter()
+    await fn()
+    return (time.perf_counter() - t0) * 1000
+
+
+async def main(n: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{Path(tmp) / 'bench.db'}")
+        event.listen(engine.sync_engine, "connect", lambda dbapi_conn, _: _apply_sqlite_pragmas(dbapi_conn))
+        maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+        async def run_decay_before():
+            async with maker() as db:
+                await decay_before(db)
+
+        async def run_decay_after():
+            async with maker() as db:
+                await daily_attribute_decay(db)
+
+        print(f"agents={n}")
+        with patch("app.api.chat.broadcast", new_callable=AsyncMock):
+            await _seed(engine, n)
+            print(f"  daily_attribute_decay  before (ORM 逐个) {await _timed(run_decay_before):>9.1f} ms")
+            await _seed(engine, n)
+            print(f"  daily_attribute_decay  after  (UPDATE)   {await _timed(run_decay_after):>9.1f} ms")
+            print(f"  daily_grant                              "
+                  f"{await _timed(lambda: daily_grant(db_session_maker=maker)):>9.1f} ms")
+
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="午夜批任务基准")
+    parser.add_argument("--agents", type=int, default=10000)
+    args = parser.parse_args()
+    asyncio.run(main(args.agents))
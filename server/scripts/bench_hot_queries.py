@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+热点查询单次调用开销微基准：每次重建 select() vs 模块级预构建语句 / Core 行
+
+用法:
+  cd server && python scripts/bench_hot_queries.py            # 默认每项 2000 次
+  cd server && python scripts/bench_hot_queries.py -n 5000
+
+内存库 + 20 个 Agent + 200 条消息，逐项输出 before / after 的 µs/次。
+before 是改造前的写法（每次调用构建新语句，最近消息走 ORM + joinedload）。
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import joinedload
+
+from app.core.database import Base
+from app.models import Agent, AgentResource, Message
+from app.api.chat import get_agent_name_map
+from app.services.city_service import _get_or_create_agent_resource
+from app.services.wakeup_service import get_recent_messages
+
+
+# ── 改造前的写法 ──
+
+async def name_map_before(db):
+    result = await db.execute(select(Agent.name, Agent.id))
+    return {name: aid for name, aid in result.all()}
+
+
+async def resource_before(agent_id, resource_type, db):
+    result = await db.execute(
+        select(AgentResource)
+        .where(AgentResource.agent_id == agent_id, AgentResource.resource_type == resource_type)
+    )
+    return result.scalar()
+
+
+async def recent_before(db, limit=10):
+    result = await db.execute(
+        select(Message)
+        .options(joinedload(Message.agent))
+        .order_by(Message.created_at.desc())
+        .limit(limit)
+    )
+    return [(m.agent.name if m.agent else "unknown", m.content) for m in reversed(result.scalars().all())]
+
+
+async def recent_after(db, limit=10):
+    return [(m.agent_name or "unknown", m.content) for m in await get_recent_messages(db, limit=limit)]
+
+
+async def _bench(label: str, fn, n: int) -> float:
+    for _ in range(50):  # 预热：填充编译缓存
+        await fn()
+    t0 = time.perf_counter()
+    for _ in range(n):
+        await fn()
+    return (time.perf_counter() - t0) / n * 1e6
+
+
+async def main(n: int):
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with maker() as db:
+        for i in range(1, 21):
+            db.add(Agent(id=i, name=f"Agent{i}", persona="p"))
+            db.add(AgentResource(agent_id=i, resource_type="wheat", quantity=5.0, frozen_amount=0.0))
+        for i in range(200):
+            db.add(Message(agent_id=i % 20 + 1, sender_type="agent", content=f"消息 {i}"))
+        await db.commit()
+
+    cases = [
+        ("get_agent_name_map", lambda db: name_map_before(db), lambda db: get_agent_name_map(db)),
+        ("_get_or_create_agent_resource",
+         lambda db: resource_before(7, "wheat", db),
+         lambda db: _get_or_create_agent_resource(7, "wheat", db)),
+        ("recent messages (10)", lambda db: recent_before(db), lambda db: recent_after(db)),
+    ]
+
+    print(f"{'query':<32}{'before µs':>12}{'after µs':>12}{'speedup':>10}")
+    async with maker() as db:
+        for label, before, after in cases:
+            t_before = await _bench(label, lambda: before(db), n)
+            t_after = await _bench(label, lambda: after(db), n)
+            print(f"{label:<32}{t_before:>12.1f}{t_after:>12.1f}{t_before / t_after:>9.2f}x")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="热点查询微基准")
+    parser.add_argument("-n", type=int, default=2000, help="每项调用次数")
+    args = parser.parse_args()
+    asyncio.run(main(args.n))
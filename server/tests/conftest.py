@@ -1,7 +1,15 @@
 import pytest
 import pytest_asyncio
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
-from app.core.database import Base
+from app.core.database import Base, write_queue
+from app.core.provider_health import provider_health
+
+
+@pytest.fixture(autouse=True)
+def reset_provider_health():
+    """供应商健康度是进程级状态，用例之间清空，避免前一个用例的延迟 / 熔断影响选择"""
+    provider_health.reset()
+    yield
 
 
 @pytest_asyncio.fixture
@@ -13,3 +21,13 @@ async def db():
     async with session_maker() as session:
         yield session
     await engine.dispose()
+
+
+@pytest.fixture
+def write_through(db, monkeypatch):
+    """write_queue.submit 改在测试 session 上执行：闭包跑在 SAVEPOINT 里，不提交，断言时能直接看到写入"""
+    async def submit(work):
+        async with db.begin_nested():
+            return await work(db)
+
+    monkeypatch.setattr(write_queue, "submit", submit)
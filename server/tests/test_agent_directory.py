@@ -0,0 +1,47 @@
+"""进程内 agent 名录：字典树解析 @提及，与原正则实现逐条对照"""
+import re
+
+import pytest
+from sqlalchemy import select
+
+from app.models import Agent
+from app.services.agent_directory import AgentDirectory, agent_directory
+
+NAMES = {"Alice": 1, "Al": 2, "小明": 3, "Bob_2": 4, "Bob Smith": 5}
+
+
+def _regex_mentions(content: str) -> list[int]:
+    """原实现"""
+    return [NAMES[n] for n in re.findall(r'@([\w\u4e00-\u9fff]+)', content) if n in NAMES]
+
+
+@pytest.mark.parametrize("content", [
+    "@Alice hi", "@Al, @Alice", "@Alic", "@Alicex", "hey@Alice!", "@@Al", "@小明你好",
+    "@小明 和 @Bob_2", "@Bob Smith", "@Alice@Al", "no mention", "@", "@Al@", "邮件 a@Al.com",
+])
+def test_matches_regex_semantics(content):
+    directory = AgentDirectory()
+    directory.load(NAMES.items())
+    assert directory.parse_mentions(content) == _regex_mentions(content)
+
+
+@pytest.mark.asyncio
+async def test_reloads_only_after_agent_changes(db):
+    db.add_all([Agent(id=1, name="Alice", persona="p"), Agent(id=2, name="Bob", persona="p")])
+    await db.commit()
+    await agent_directory.ensure_loaded(db)
+    loads = agent_directory.loads
+    assert agent_directory.parse_mentions("@Bob @Alice") == [2, 1]
+
+    # 非名字字段的变更不让名录失效
+    bob = (await db.execute(select(Agent).where(Agent.id == 2))).scalar_one()
+    bob.persona = "changed"
+    await db.commit()
+    await agent_directory.ensure_loaded(db)
+    assert agent_directory.loads == loads
+
+    bob.name = "Robert"
+    await db.commit()
+    assert agent_directory.stale
+    await agent_directory.ensure_loaded(db)
+    assert agent_directory.parse_mentions("@Bob @Robert") == [2]
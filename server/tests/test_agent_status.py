@@ -37,16 +37,18 @@ def test_status_enum_count():
 # ---------------------------------------------------------------------------
 
 def _make_agent(agent_id=1, name="Alice"):
-    agent = MagicMock(spec=Agent)
-    agent.id = agent_id
-    agent.name = name
-    agent.status = AgentStatus.IDLE.value
-    agent.activity = ""
-    return agent
+    return Agent(id=agent_id, name=name, persona="p", status=AgentStatus.IDLE.value, activity="")
+
+
+@pytest.fixture(autouse=True)
+def mock_submit():
+    """commit=True 的状态写入经 write_queue 提交，这里只断言提交过"""
+    with patch("app.services.status_helper.write_queue.submit", new_callable=AsyncMock) as submit:
+        yield submit
 
 
 @pytest.mark.asyncio
-async def test_set_agent_status_updates_fields():
+async def test_set_agent_status_updates_fields(mock_submit):
     """调用 set_agent_status 后 agent.status 和 agent.activity 正确更新"""
     agent = _make_agent()
     db = AsyncMock()
@@ -56,7 +58,8 @@ async def test_set_agent_status_updates_fields():
 
     assert agent.status == "thinking"
     assert agent.activity == "正在思考…"
-    db.commit.assert_awaited_once()
+    mock_submit.assert_awaited_once()
+    db.commit.assert_not_awaited()
 
 
 @pytest.mark.asyncio
@@ -0,0 +1,177 @@
+"""冷热分离归档测试：搬运到 archive_YYYYMM.db、daily_rollups 汇总、读接口跨库补齐"""
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, patch
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from app.core.database import Base
+from app.models import Agent, Building, CheckIn, DailyRollup, Job, LLMUsage, Message, ProductionLog, TradeLog
+from app.services.archive_service import archive_service
+
+OLD_JAN = datetime(2024, 1, 15, 8, 0, 0)
+OLD_FEB = datetime(2024, 2, 10, 9, 30, 0)
+
+
+@pytest_asyncio.fixture
+async def hot(tmp_path, monkeypatch):
+    """临时热库 + 指向它的 archive_service"""
+    path = tmp_path / "hot.db"
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    now = datetime.utcnow()
+    async with maker() as db:
+        db.add_all([
+            Agent(id=0, name="Human", persona="human", model="none"),
+            Agent(id=1, name="Alice", persona="p"),
+            Agent(id=2, name="Bob", persona="p"),
+            Job(id=1, title="矿工", daily_reward=10, max_workers=5),
+            Building(id=1, name="农田", building_type="farm", city="长安"),
+        ])
+        for i, ts in enumerate([OLD_JAN, OLD_JAN + timedelta(hours=1), OLD_FEB, now], start=1):
+            db.add(Message(id=i, agent_id=1, sender_type="agent", content=f"m{i}", created_at=ts))
+            db.add(TradeLog(id=i, order_id=1, seller_id=1, buyer_id=2, sell_type="wheat", sell_amount=2.0,
+                            buy_type="flour", buy_amount=1.0, created_at=ts))
+            db.add(ProductionLog(id=i, building_id=1, agent_id=1, output_type="wheat", output_qty=5, tick_time=ts))
+            db.add(CheckIn(id=i, agent_id=1, job_id=1, reward=10, checked_at=ts))
+            db.add(LLMUsage(id=i, model="m", agent_id=1, total_tokens=100, created_at=ts))
+        await db.commit()
+
+    monkeypatch.setattr(archive_service, "db_path", str(path))
+    monkeypatch.setattr(archive_service, "archive_dir", tmp_path)
+    monkeypatch.setattr(archive_service, "horizon_days", 30)
+    monkeypatch.setattr(archive_service, "batch_size", 2)
+    monkeypatch.setattr(archive_service, "_engines", {})
+    monkeypatch.setattr(archive_service, "_months", None)
+
+    yield maker
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_archive_moves_old_rows_by_month(hot):
+    moved = await archive_service.archive()
+    assert moved == {name: 3 for name in moved}
+    assert archive_service.archive_months() == ["202401", "202402"]
+
+    async with hot() as db:
+        for model in (Message, TradeLog, ProductionLog, CheckIn, LLMUsage):
+            ids = (await db.execute(select(model.id))).scalars().all()
+            assert ids == [4], model.__tablename__
+
+
+@pytest.mark.asyncio
+async def test_archive_leaves_daily_rollups(hot):
+    await archive_service.archive()
+    async with hot() as db:
+        rollups = (await db.execute(
+            select(DailyRollup).where(DailyRollup.source == "trade_logs").order_by(DailyRollup.day)
+        )).scalars().all()
+    assert [(str(r.day), r.dimension, r.row_count) for r in rollups] == [
+        ("2024-01-15", "wheat->flour", 2),
+        ("2024-02-10", "wheat->flour", 1),
+    ]
+    assert rollups[0].metrics == {"sell_amount": 4.0, "buy_amount": 2.0}
+
+
+@pytest.mark.asyncio
+async def test_archive_is_idempotent(hot):
+    await archive_service.archive()
+    assert not any((await archive_service.archive()).values())
+    async with hot() as db:
+        count = (await db.execute(select(func.count()).select_from(DailyRollup))).scalar()
+    assert count == 2 * 5
+
+
+@pytest.mark.asyncio
+async def test_archive_keeps_max_id_row(hot):
+    """热表最后一行即使过期也保留，避免 rowid 从 1 重新分配"""
+    async with hot() as db:
+        await db.execute(Message.__table__.delete().where(Message.id == 4))
+        await db.commit()
+    await archive_service.archive()
+    async with hot() as db:
+        ids = (await db.execute(select(Message.id))).scalars().all()
+    assert ids == [3]
+
+
+@pytest.mark.asyncio
+async def test_archive_months_cached_and_refreshed_by_archive(hot, tmp_path):
+    """月份列表只扫描一次目录；archive() 新建的月份文件直接进缓存"""
+    assert archive_service.archive_months() == []
+    (tmp_path / "archive_202312.db").touch()  # 绕过 archive() 放进来的文件不会被看到
+    assert archive_service.archive_months() == []
+
+    await archive_service.archive()
+    assert archive_service.archive_months() == ["202401", "202402"]
+
+
+@pytest.mark.asyncio
+async def test_disabled_when_horizon_zero(hot, monkeypatch):
+    monkeypatch.setattr(archive_service, "horizon_days", 0)
+    assert await archive_service.archive() == {}
+    assert archive_service.archive_months() == []
+
+
+# ── 读接口跨库 ──
+
+@pytest.mark.asyncio
+async def test_trade_logs_page_into_archive(hot):
+    from app.services.market_service import get_trade_logs
+    await archive_service.archive()
+    async with hot() as db:
+        first = await get_trade_logs(db=db, limit=2)
+        second = await get_trade_logs(db=db, limit=2, offset=2)
+    assert [t["id"] for t in first] == [4, 3]
+    assert [t["id"] for t in second] == [2, 1]
+
+
+@pytest.mark.asyncio
+async def test_production_logs_span_archive(hot):
+    from app.services.city_service import get_production_logs
+    await archive_service.archive()
+    async with hot() as db:
+        logs = await get_production_logs("长安", 10, db)
+        other = await get_production_logs("洛阳", 10, db)
+    assert [log["id"] for log in logs] == [4, 3, 2, 1]
+    assert other == []
+
+
+@pytest.mark.asyncio
+async def test_work_history_spans_archive_only_when_asked(hot):
+    from app.services.work_service import work_service
+    await archive_service.archive()
+    async with hot() as db:
+        recent = await work_service.get_work_history(1, db, days=7)
+        full = await work_service.get_work_history(1, db, days=3650)
+    assert [c["checkin_id"] for c in recent] == [4]
+    assert [c["checkin_id"] for c in full] == [4, 3, 2, 1]
+
+
+@pytest.mark.asyncio
+async def test_work_history_skips_archive_inside_horizon(hot):
+    from app.services.work_service import work_service
+    with patch.object(archive_service, "fetch_archived", new_callable=AsyncMock, return_value=[]) as fetch:
+        async with hot() as db:
+            await work_service.get_work_history(1, db, days=7)
+        fetch.assert_not_awaited()
+        async with hot() as db:
+            await work_service.get_work_history(1, db, days=60)
+        fetch.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_messages_span_archive(hot):
+    from app.api.chat import get_messages
+    await archive_service.archive()
+    async with hot() as db:
+        latest = await get_messages(limit=3, since_id=None, db=db)
+        since = await get_messages(limit=2, since_id=1, db=db)
+    assert [m.id for m in latest] == [2, 3, 4]
+    assert all(m.agent_name == "Alice" for m in latest)
+    assert [m.id for m in since] == [2, 3]
@@ -5,6 +5,7 @@ import pytest
 import pytest_asyncio
 from unittest.mock import AsyncMock, MagicMock, patch
 
+from app.core.config import ModelProvider
 from app.core.database import Base, engine, async_session
 from app.models import Agent, Job, VirtualItem, Message
 
@@ -78,9 +79,9 @@ async def test_decide_valid_json():
     mock_client = AsyncMock()
     mock_client.chat.completions.create = AsyncMock(return_value=mock_response)
 
-    with patch("app.services.autonomy_service.resolve_model",
-               return_value=("http://fake", "sk-fake", "test-model")), \
-         patch("app.services.autonomy_service.AsyncOpenAI",
+    with patch("app.services.llm_gateway.llm_gateway.route",
+               return_value=ModelProvider(name="fake", model_id="test-model")), \
+         patch("app.services.llm_gateway.AsyncOpenAI",
                return_value=mock_client):
         decisions = await decide("fake snapshot")
 
@@ -105,9 +106,9 @@ async def test_decide_invalid_json():
     mock_client = AsyncMock()
     mock_client.chat.completions.create = AsyncMock(return_value=mock_response)
 
-    with patch("app.services.autonomy_service.resolve_model",
-               return_value=("http://fake", "sk-fake", "test-model")), \
-         patch("app.services.autonomy_service.AsyncOpenAI",
+    with patch("app.services.llm_gateway.llm_gateway.route",
+               return_value=ModelProvider(name="fake", model_id="test-model")), \
+         patch("app.services.llm_gateway.AsyncOpenAI",
                return_value=mock_client):
         decisions = await decide("fake snapshot")
 
@@ -242,6 +243,77 @@ async def test_execute_failure_isolation():
         assert agent2.credits == 20  # 不变
 
 
+async def test_execute_broadcasts_after_commit():
+    """事件在提交后才广播；SAVEPOINT 回滚的决策不广播。"""
+    from sqlalchemy import func, select
+
+    from app.models import CheckIn
+    from app.services.autonomy_service import execute_decisions
+
+    decisions = [
+        {"agent_id": 2, "action": "purchase", "params": {"item_id": 1}, "reason": "买金框"},
+        {"agent_id": 1, "action": "checkin", "params": {}, "reason": "上班"},
+    ]
+    committed = []
+
+    async def check(agent_name, agent_id, action, reason):
+        async with async_session() as other:
+            committed.append((action, await other.scalar(select(func.count()).select_from(CheckIn))))
+
+    with patch("app.services.autonomy_service._broadcast_action", side_effect=check), \
+         patch("app.services.autonomy_service.shop_service.purchase", side_effect=RuntimeError("boom")):
+        async with async_session() as db:
+            stats = await execute_decisions(decisions, db)
+
+    assert stats == {"success": 1, "failed": 1, "skipped": 0}
+    assert committed == [("checkin", 1)]
+
+
+async def test_rolled_back_decision_emits_no_city_or_market_event():
+    """服务函数成功后决策的后续步骤抛错：SAVEPOINT 回滚，它的城市 / 交易事件一帧都不发。"""
+    import functools
+
+    from sqlalchemy import select
+
+    from app.models import AgentResource
+    from app.services.autonomy_service import execute_decisions
+
+    async with async_session() as db:
+        db.add(AgentResource(agent_id=1, resource_type="wheat", quantity=10.0, frozen_amount=0.0))
+        db.add(AgentResource(agent_id=2, resource_type="wheat", quantity=10.0, frozen_amount=0.0))
+        await db.commit()
+
+    decisions = [
+        {"agent_id": 1, "action": "transfer_resource", "reason": "送小麦",
+         "params": {"to_agent_id": 2, "resource_type": "wheat", "quantity": 3}},
+        {"agent_id": 2, "action": "create_market_order", "reason": "卖小麦",
+         "params": {"sell_type": "wheat", "sell_amount": 5, "buy_type": "flour", "buy_amount": 2}},
+    ]
+    real_partial = functools.partial
+    action = AsyncMock()
+
+    def flaky_partial(func, *args, **kwargs):
+        if func is action and args[2] == "transfer_resource":
+            raise RuntimeError("boom")  # 转账已执行，决策的后续步骤失败
+        return real_partial(func, *args, **kwargs)
+
+    with patch("app.services.city_service._broadcast_city_event", new_callable=AsyncMock) as city_events, \
+         patch("app.services.market_service._broadcast_market_event", new_callable=AsyncMock) as market_events, \
+         patch("app.services.autonomy_service._broadcast_action", action), \
+         patch("app.services.autonomy_service.partial", side_effect=flaky_partial):
+        async with async_session() as db:
+            stats = await execute_decisions(decisions, db)
+
+    assert stats["failed"] == 1
+    city_events.assert_not_awaited()
+    assert [c.args[0] for c in market_events.await_args_list] == ["order_created"]
+    async with async_session() as db:
+        wheat = (await db.execute(
+            select(AgentResource.quantity).where(AgentResource.agent_id == 1, AgentResource.resource_type == "wheat")
+        )).scalar()
+    assert wheat == 10.0  # 转账随 SAVEPOINT 回滚
+
+
 # ---------- 9. AC-M4-10: 连续 3 轮人格差异验证 ----------
 
 async def test_personality_variance_three_rounds():
@@ -264,23 +336,25 @@ async def test_personality_variance_three_rounds():
         ]),
     ]
 
-    all_decisions = []
-
-    for i, reply_text in enumerate(round_replies):
+    responses = []
+    for reply_text in round_replies:
         mock_choice = MagicMock()
         mock_choice.message.content = reply_text
         mock_response = MagicMock()
         mock_response.choices = [mock_choice]
+        responses.append(mock_response)
 
-        mock_client = AsyncMock()
-        mock_client.chat.completions.create = AsyncMock(return_value=mock_response)
+    # 网关按供应商复用同一个客户端，3 轮依次返回不同回复
+    mock_client = AsyncMock()
+    mock_client.chat.completions.create = AsyncMock(side_effect=responses)
 
-        with patch("app.services.autonomy_service.resolve_model",
-                   return_value=("http://fake", "sk-fake", "test-model")), \
-             patch("app.services.autonomy_service.AsyncOpenAI",
-                   return_value=mock_client):
-            decisions = await decide("fake snapshot")
-            all_decisions.append(decisions)
+    all_decisions = []
+    with patch("app.services.llm_gateway.llm_gateway.route",
+               return_value=ModelProvider(name="fake", model_id="test-model")), \
+         patch("app.services.llm_gateway.AsyncOpenAI",
+               return_value=mock_client):
+        for _ in round_replies:
+            all_decisions.append(await decide("fake snapshot"))
 
     # 验证 3 轮都产生了有效决策
     assert len(all_decisions) == 3
@@ -348,9 +422,9 @@ async def test_performance_baseline():
     mock_client = AsyncMock()
     mock_client.chat.completions.create = AsyncMock(return_value=mock_response)
 
-    with patch("app.services.autonomy_service.resolve_model",
-               return_value=("http://fake", "sk-fake", "test-model")), \
-         patch("app.services.autonomy_service.AsyncOpenAI",
+    with patch("app.services.llm_gateway.llm_gateway.route",
+               return_value=ModelProvider(name="fake", model_id="test-model")), \
+         patch("app.services.llm_gateway.AsyncOpenAI",
                return_value=mock_client), \
          patch("app.services.autonomy_service._broadcast_action", new_callable=AsyncMock):
 
@@ -606,7 +680,7 @@ async def test_autonomy_execute_claim_bounty_failure_isolation():
 # ---------- 18. P3: tool_registry claim_bounty 集成 ----------
 
 async def test_claim_bounty_via_tool_registry():
-    """tool_registry 注册了 claim_bounty 工具，handler 不自行 commit，调用方控制事务。"""
+    """tool_registry 注册了 claim_bounty 工具，handler 经 write_queue 提交，不依赖调用方 commit。"""
     from app.services.tool_registry import tool_registry
     from app.models.tables import Bounty
 
@@ -618,7 +692,7 @@ async def test_claim_bounty_via_tool_registry():
         db.add(Bounty(id=600, title="工具测试悬赏", reward=25, status="open"))
         await db.commit()
 
-    # 通过 tool_registry.execute 调用，调用方负责 commit
+    # 通过 tool_registry.execute 调用，调用方的 session 不提交
     async with async_session() as db:
         result = await tool_registry.execute(
             "claim_bounty",
@@ -628,8 +702,6 @@ async def test_claim_bounty_via_tool_registry():
         assert result["ok"] is True
         assert result["result"]["ok"] is True
         assert result["result"]["bounty_id"] == 600
-        # 调用方 commit（与 agent_runner 行为一致）
-        await db.commit()
 
     # 验证 DB 状态
     async with async_session() as db:
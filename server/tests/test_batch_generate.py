@@ -7,6 +7,7 @@ from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
+from app.core.config import ModelProvider
 from app.services.agent_runner import AgentRunnerManager
 
 
@@ -14,12 +15,12 @@ from app.services.agent_runner import AgentRunnerManager
 # Helpers
 # ---------------------------------------------------------------------------
 
-RESOLVE_MODEL = "app.services.agent_runner.resolve_model"
+ROUTE = "app.services.llm_gateway.llm_gateway.route"
 MEMORY_SEARCH = "app.services.agent_runner.memory_service.search"
 
 
 def _mock_llm(reply_text="batch回复"):
-    """返回 resolve_model + AsyncOpenAI 的 patch，使 LLM 调用成功。"""
+    """返回 网关路由 + AsyncOpenAI 的 patch，使 LLM 调用成功。"""
     mock_choice = MagicMock()
     mock_choice.message.content = reply_text
     mock_response = MagicMock()
@@ -32,8 +33,8 @@ def _mock_llm(reply_text="batch回复"):
     mock_client.chat.completions.create = AsyncMock(return_value=mock_response)
 
     return (
-        patch(RESOLVE_MODEL, return_value=("http://fake", "sk-fake", "test-model")),
-        patch("app.services.agent_runner.AsyncOpenAI", return_value=mock_client),
+        patch(ROUTE, return_value=ModelProvider(name="fake", model_id="test-model")),
+        patch("app.services.llm_gateway.AsyncOpenAI", return_value=mock_client),
     )
 
 
@@ -141,8 +142,8 @@ async def test_batch_generate_partial_failure():
     mock_client = AsyncMock()
     mock_client.chat.completions.create = AsyncMock(side_effect=_side_effect)
 
-    with patch(RESOLVE_MODEL, return_value=("http://fake", "sk-fake", "m1")):
-        with patch("app.services.agent_runner.AsyncOpenAI", return_value=mock_client):
+    with patch(ROUTE, return_value=ModelProvider(name="fake", model_id="m1")):
+        with patch("app.services.llm_gateway.AsyncOpenAI", return_value=mock_client):
             with patch(MEMORY_SEARCH, new_callable=AsyncMock, return_value=[]):
                 with patch("app.services.agent_runner.session_maker", return_value=AsyncMock()):
                     results = await mgr.batch_generate(agents_info)
@@ -170,7 +171,7 @@ async def test_batch_generate_empty_list():
 SEND_AGENT_MSG = "app.api.chat.send_agent_message"
 DEDUCT_QUOTA = "app.api.chat.economy_service.deduct_quota"
 EXTRACT_MEMORY = "app.api.chat._extract_memory"
-CHAT_ASYNC_SESSION = "app.api.chat.async_session"
+CHAT_ASYNC_SESSION = "app.core.database.async_session"  # write_queue 未启动时内联执行
 
 
 def _mock_db_session():
@@ -191,3 +191,128 @@ def test_since_id_incremental_fetch(bot_agent_sync):
     incremental = r2.json()
     assert all(m["id"] > first_id for m in incremental)
     assert len(incremental) == len(all_msgs) - 1
+
+
+# --- 主题订阅 ---
+def test_bot_subscribe_chat_only(bot_agent_sync):
+    """订阅 chat 后不再收到其他连接的上线事件，只收聊天消息"""
+    aid, token, sync_client = bot_agent_sync
+    with sync_client.websocket_connect(f"/api/ws/{aid}?token={token}") as ws:
+        ws.receive_json()  # 上线事件
+        ws.send_json({"type": "subscribe", "topics": ["chat"]})
+        ack = ws.receive_json()
+        assert ack == {"type": "subscribed", "data": {"topics": ["chat"]}}
+
+        with sync_client.websocket_connect("/api/ws/0") as human:
+            human.receive_json()  # human 自己的上线事件
+            ws.send_json({"type": "chat_message", "content": "only chat"})
+            msg = ws.receive_json()
+            assert msg["type"] == "new_message"
+            assert msg["data"]["content"] == "only chat"
+
+
+def test_bot_subscribe_unknown_topic(bot_agent_sync):
+    aid, token, sync_client = bot_agent_sync
+    with sync_client.websocket_connect(f"/api/ws/{aid}?token={token}") as ws:
+        ws.receive_json()
+        ws.send_json({"type": "subscribe", "topics": ["weather"]})
+        msg = ws.receive_json()
+        assert msg["type"] == "error"
+
+
+# --- 断线重连补发 ---
+def _until_replay_done(ws) -> list[dict]:
+    frames = []
+    while True:
+        frame = ws.receive_json()
+        if frame["type"] == "replay_done":
+            return frames + [frame]
+        frames.append(frame)
+
+
+def test_reconnect_since_seq_replays_missed_events(bot_agent_sync):
+    """带 since_seq 重连：按 seq 补发断线期间的全部帧，再转实时"""
+    aid, token, sync_client = bot_agent_sync
+    with sync_client.websocket_connect(f"/api/ws/{aid}?token={token}") as ws:
+        first = ws.receive_json()
+        last_seq, epoch = first["seq"], first["epoch"]
+
+    with sync_client.websocket_connect("/api/ws/0") as human:
+        human.receive_json()
+        human.send_json({"type": "chat_message", "content": "while bot away"})
+        human.receive_json()
+
+    with sync_client.websocket_connect(f"/api/ws/{aid}?token={token}&since_seq={last_seq}&epoch={epoch}") as ws:
+        frames = _until_replay_done(ws)
+        done = frames.pop()
+        seqs = [f["seq"] for f in frames]
+        assert seqs == sorted(seqs) and seqs[0] == last_seq + 1
+        assert {f["epoch"] for f in frames} == {epoch}
+        assert [f["data"]["content"] for f in frames if f["type"] == "new_message"] == ["while bot away"]
+        assert done["data"] == {"seq": seqs[-1], "epoch": epoch, "replayed": len(frames), "gap": False}
+        # 补发完才是本次连接的实时帧
+        assert ws.receive_json()["data"]["event"] == "agent_online"
+
+
+def test_reconnect_other_epoch_is_a_gap(bot_agent_sync):
+    """since_seq 来自重启前（epoch 不同）：不按 seq 补发，退回 messages 表并标记 gap"""
+    from app.api.chat import event_log
+
+    aid, token, sync_client = bot_agent_sync
+    event_log.reset("new-boot")  # 模拟重启：缓冲清空，seq 从头编号
+    with sync_client.websocket_connect("/api/ws/0") as human:
+        human.receive_json()
+        human.send_json({"type": "chat_message", "content": "after restart"})
+        msg = human.receive_json()
+
+    since_id = msg["data"]["id"] - 1
+    with sync_client.websocket_connect(
+        f"/api/ws/{aid}?token={token}&since_seq=1&epoch=old-boot&since_id={since_id}&topics=chat"
+    ) as ws:
+        frames = _until_replay_done(ws)
+    done = frames.pop()
+    assert [f["data"]["content"] for f in frames] == ["after restart"]
+    assert done["data"]["gap"] is True and done["data"]["epoch"] == "new-boot"
+
+
+def test_reconnect_since_id_falls_back_to_messages(bot_agent_sync):
+    """只带 since_id（缓冲覆盖不到时同理）：从 messages 表补发聊天消息"""
+    aid, token, sync_client = bot_agent_sync
+    with sync_client.websocket_connect("/api/ws/0") as human:
+        human.receive_json()
+        for i in range(3):
+            human.send_json({"type": "chat_message", "content": f"m{i}"})
+            human.receive_json()
+    first_id = min(m["id"] for m in sync_client.get("/api/messages").json())
+
+    with sync_client.websocket_connect(
+        f"/api/ws/{aid}?token={token}&since_id={first_id}&topics=chat"
+    ) as ws:
+        frames = _until_replay_done(ws)
+    assert [f["data"]["content"] for f in frames[:-1]] == ["m1", "m2"]
+    assert frames[-1]["data"]["replayed"] == 2
+
+
+# --- MessagePack 帧 ---
+def test_bot_msgpack_frames(bot_agent_sync):
+    """?proto=msgpack：下行二进制帧，上行两种编码都收"""
+    pytest.importorskip("msgpack")
+    from app.api.ws_protocol import MSGPACK_CODEC as codec
+    aid, token, sync_client = bot_agent_sync
+    with sync_client.websocket_connect(f"/api/ws/{aid}?token={token}&proto=msgpack") as ws:
+        online = codec.decode(ws.receive_bytes())
+        assert online["data"]["event"] == "agent_online" and online["seq"] >= 1
+
+        ws.send_bytes(codec.encode({"type": "chat_message", "content": "packed"}))
+        msg = codec.decode(ws.receive_bytes())
+        assert msg["type"] == "new_message" and msg["data"]["content"] == "packed"
+
+        ws.send_json({"type": "chat_message", "content": "text"})
+        assert codec.decode(ws.receive_bytes())["data"]["content"] == "text"
+
+
+def test_bot_unknown_proto_rejected(bot_agent_sync):
+    aid, token, sync_client = bot_agent_sync
+    with sync_client.websocket_connect(f"/api/ws/{aid}?token={token}&proto=xml") as ws:
+        with pytest.raises(Exception):
+            ws.receive_json()
@@ -0,0 +1,95 @@
+"""午夜批任务：daily_attribute_decay 集合式 UPDATE 与逐个结算结果一致，10k Agent 语句数与 Agent 数无关"""
+import random
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from sqlalchemy import event, insert, select
+
+from app.models import Agent
+from app.services.city_service import daily_attribute_decay
+
+pytestmark = pytest.mark.asyncio
+
+
+def _expected(satiety: int, mood: int, stamina: int) -> tuple[int, int, int]:
+    """改造前的逐个结算逻辑"""
+    satiety = max(0, satiety - 15)
+    stamina = min(100, stamina + 15)
+    if satiety == 0:
+        mood = max(0, mood - 20)
+    elif satiety < 30:
+        mood = max(0, mood - 10)
+    return satiety, mood, stamina
+
+
+async def _seed(db, n: int) -> dict[int, tuple[int, int, int]]:
+    rng = random.Random(7)
+    attrs = {i: (rng.randint(0, 100), rng.randint(0, 100), rng.randint(0, 100)) for i in range(1, n + 1)}
+    await db.execute(insert(Agent.__table__).values(id=0, name="Human", persona="human", model="none",
+                                                    satiety=50, mood=50, stamina=50))
+    await db.execute(insert(Agent.__table__), [
+        {"id": i, "name": f"A{i}", "persona": "p", "satiety": s, "mood": m, "stamina": st}
+        for i, (s, m, st) in attrs.items()
+    ])
+    await db.commit()
+    return attrs
+
+
+async def test_bulk_decay_matches_per_agent_logic(db):
+    attrs = await _seed(db, 300)
+    # 覆盖阈值边界：旧 satiety 15/16/44/45，mood 低于扣减量
+    edge = {1: (15, 5, 90), 2: (16, 60, 85), 3: (44, 8, 0), 4: (45, 60, 100)}
+    for aid, (s, m, st) in edge.items():
+        agent = await db.get(Agent, aid)
+        agent.satiety, agent.mood, agent.stamina = s, m, st
+    attrs.update(edge)
+    await db.commit()
+
+    with patch("app.api.chat.broadcast", new_callable=AsyncMock) as mock_bc:
+        await daily_attribute_decay(db)
+
+    rows = (await db.execute(select(Agent.id, Agent.satiety, Agent.mood, Agent.stamina))).all()
+    for aid, satiety, mood, stamina in rows:
+        if aid == 0:
+            assert (satiety, mood, stamina) == (50, 50, 50)
+        else:
+            assert (satiety, mood, stamina) == _expected(*attrs[aid]), aid
+
+    mock_bc.assert_awaited_once()
+    data = mock_bc.await_args.args[0]["data"]
+    assert data["event"] == "attribute_changed"
+    pushed = {a["agent_id"]: (a["satiety"], a["mood"], a["stamina"]) for a in data["agents"]}
+    assert len(pushed) == 300
+    assert pushed[1] == _expected(*edge[1])
+
+
+async def test_bulk_decay_refreshes_loaded_agents(db):
+    """同一 session 里已加载的 Agent 在 UPDATE 后看到新值"""
+    await _seed(db, 2)
+    agent = await db.get(Agent, 1)
+    before = (agent.satiety, agent.mood, agent.stamina)
+    with patch("app.api.chat.broadcast", new_callable=AsyncMock):
+        await daily_attribute_decay(db)
+    assert (agent.satiety, agent.mood, agent.stamina) == _expected(*before)
+
+
+async def test_daily_decay_10k_agents_single_statement(db):
+    """10k Agent 一条 UPDATE 结算（改造前逐个 ORM 结算，每个 Agent 一条 UPDATE）"""
+    await _seed(db, 10_000)
+    statements = []
+
+    def _capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "UPDATE")):
+            statements.append(statement)
+
+    sync_engine = db.bind.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", _capture)
+    try:
+        with patch("app.api.chat.broadcast", new_callable=AsyncMock) as mock_bc:
+            await daily_attribute_decay(db)
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", _capture)
+
+    assert len(statements) == 1, statements
+    assert statements[0].lstrip().upper().startswith("UPDATE")
+    assert len(mock_bc.await_args.args[0]["data"]["agents"]) == 10_000
@@ -7,6 +7,7 @@ from unittest.mock import AsyncMock, MagicMock, patch
 from httpx import AsyncClient, ASGITransport
 from starlette.testclient import TestClient
 
+from app.core.config import ModelProvider
 from app.core.database import Base, engine, async_session
 from app.models import Agent, Job, VirtualItem
 
@@ -43,7 +44,7 @@ MOCK_DECISIONS_CHECKIN_AGAIN = json.dumps([
 
 
 def _mock_llm(reply_text: str):
-    """返回 resolve_model + AsyncOpenAI 的 patch，使 LLM 返回指定文本。"""
+    """返回 网关路由 + AsyncOpenAI 的 patch，使 LLM 返回指定文本。"""
     mock_choice = MagicMock()
     mock_choice.message.content = reply_text
     mock_response = MagicMock()
@@ -56,9 +57,9 @@ def _mock_llm(reply_text: str):
     mock_client.chat.completions.create = AsyncMock(return_value=mock_response)
 
     return (
-        patch("app.services.autonomy_service.resolve_model",
-              return_value=("http://fake", "sk-fake", "test-model")),
-        patch("app.services.autonomy_service.AsyncOpenAI",
+        patch("app.services.llm_gateway.llm_gateway.route",
+              return_value=ModelProvider(name="fake", model_id="test-model")),
+        patch("app.services.llm_gateway.AsyncOpenAI",
               return_value=mock_client),
     )
 
@@ -160,9 +161,9 @@ async def test_e2e_autonomy_websocket_event(client: AsyncClient):
                 r = await client.post("/api/dev/trigger-autonomy")
                 assert r.json()["ok"] is True
 
-            # 收到 agent_action 事件（跳过 agent_status_change 事件）
+            # 收到 agent_action 事件（跳过 agent_status_change / agent_status_batch 事件）
             event = ws.receive_json()
-            while event.get("data", {}).get("event") == "agent_status_change":
+            while event.get("data", {}).get("event") in ("agent_status_change", "agent_status_batch"):
                 event = ws.receive_json()
             assert event["type"] == "system_event"
             assert event["data"]["event"] == "agent_action"
@@ -0,0 +1,136 @@
+"""跨进程事件总线：同一总线库上的两个 SqliteBus 模拟两个 worker"""
+import asyncio
+import sqlite3
+import time
+
+import pytest
+import pytest_asyncio
+
+from app.core.event_bus import InProcessBus, LocalCounters, SqliteBus, create_event_bus
+
+
+@pytest_asyncio.fixture
+async def workers(tmp_path):
+    path = str(tmp_path / "bus.db")
+    a = SqliteBus(path, poll_interval=0.005, presence_ttl=5)
+    b = SqliteBus(path, poll_interval=0.005, presence_ttl=5)
+    received = {"a": [], "b": []}
+
+    def handler(name):
+        async def on_remote(data, seq):
+            received[name].append((seq, data))
+        return on_remote
+
+    await a.start(handler("a"))
+    await b.start(handler("b"))
+    yield a, b, received
+    await a.stop()
+    await b.stop()
+
+
+async def _wait_for(cond, timeout=1.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not cond():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.005)
+
+
+@pytest.mark.asyncio
+async def test_events_relayed_to_other_workers_only(workers):
+    a, b, received = workers
+    s1 = await a.publish({"type": "new_message", "data": {"id": 1}})
+    s2 = await b.publish({"type": "system_event", "data": {"event": "agent_online"}})
+    assert s2 > s1  # 全局 seq
+
+    await _wait_for(lambda: received["a"] and received["b"])
+    await asyncio.sleep(0.02)
+    assert received["b"] == [(s1, {"type": "new_message", "data": {"id": 1}})]
+    assert received["a"] == [(s2, {"type": "system_event", "data": {"event": "agent_online"}})]
+
+
+@pytest.mark.asyncio
+async def test_presence_shared_across_workers(workers):
+    a, b, _ = workers
+    a.presence.join(7, "bot")
+    b.presence.join(0, "human")
+    b.presence.join(0, "human")
+    assert a.presence.online_ids() == {7} and b.presence.online_ids() == {0}  # 本 worker 的立即可见
+    await _wait_for(lambda: a.presence.online_ids() == b.presence.online_ids() == {0, 7})
+    assert b.presence.bot_online(7)
+
+    b.presence.leave(0, "human")
+    await asyncio.sleep(0.05)
+    assert 0 in a.presence.online_ids()
+    b.presence.leave(0, "human")
+    await _wait_for(lambda: a.presence.online_ids() == {7})
+
+    # worker 退出后它的连接不再算在线
+    await a.stop()
+    await _wait_for(lambda: not b.presence.bot_online(7))
+
+
+@pytest.mark.asyncio
+async def test_counters_shared_and_dict_like(workers):
+    a, b, _ = workers
+    ca, cb = a.counters("replies"), b.counters("replies")
+    assert ca.incr(1) == 1
+    await _wait_for(lambda: cb.get(1) == 1)
+    assert cb.incr(1) == 2
+    cb[2] = 4
+    await _wait_for(lambda: dict(ca) == {1: 2, 2: 4})
+    ca.pop(1, None)
+    assert 1 not in ca
+    await _wait_for(lambda: 1 not in cb)
+    assert b.counters("other").get(2, 0) == 0
+
+
+@pytest.mark.asyncio
+async def test_bus_io_does_not_block_event_loop(workers, tmp_path):
+    """另一个进程持有总线库写锁时，publish / presence 写入在 I/O 线程里等，事件循环照常运行"""
+    a, _, _ = workers
+    locker = sqlite3.connect(str(tmp_path / "bus.db"), isolation_level=None)
+    locker.execute("BEGIN IMMEDIATE")
+    try:
+        publish = asyncio.create_task(a.publish({"type": "x"}))
+        a.presence.join(3, "bot")  # 不等结果
+        a.counters("c").incr(1)
+        ticks = 0
+        for _ in range(10):
+            await asyncio.sleep(0.01)
+            ticks += 1
+        assert ticks == 10 and not publish.done()
+        assert a.presence.bot_online(3) and a.counters("c")[1] == 1
+    finally:
+        locker.execute("COMMIT")
+        locker.close()
+    assert await publish > 0
+
+
+@pytest.mark.asyncio
+async def test_single_leader(workers):
+    a, b, _ = workers
+    assert a.is_leader() != b.is_leader()
+    leader, follower = (a, b) if a.is_leader() else (b, a)
+    await leader.stop()
+    follower._heartbeat(time.time())
+    assert follower.is_leader()
+
+
+@pytest.mark.asyncio
+async def test_epoch_shared_by_workers_and_kept_across_restart(workers, tmp_path):
+    a, b, _ = workers
+    assert a.epoch == b.epoch
+    c = SqliteBus(str(tmp_path / "bus.db"))
+    await c.start(lambda data, seq: None)
+    assert c.epoch == a.epoch  # 同一个总线库，seq 接着编号
+    await c.stop()
+
+
+def test_inprocess_defaults():
+    bus = create_event_bus("inprocess")
+    assert isinstance(bus, InProcessBus) and bus.is_leader()
+    assert bus.epoch != InProcessBus().epoch  # 每次启动一个新 epoch
+    assert asyncio.run(bus.publish({})) == 1 and asyncio.run(bus.publish({})) == 2
+    assert isinstance(bus.counters("x"), LocalCounters)
+    with pytest.raises(ValueError):
+        create_event_bus("redis")
@@ -0,0 +1,54 @@
+"""广播事件序号 + 环形缓冲"""
+import json
+
+from app.api.event_log import EventLog
+
+
+def _msg(mid: int) -> dict:
+    return {"type": "new_message", "data": {"id": mid, "content": f"m{mid}"}}
+
+
+def test_append_stamps_seq_and_encodes_once():
+    log = EventLog(capacity=4, epoch="e1")
+    event = log.append(_msg(1))
+    assert event.seq == 1 == log.last_seq
+    assert json.loads(event.frame)["seq"] == 1
+    assert json.loads(event.frame)["epoch"] == "e1"
+    assert event.message_id == 1
+    assert log.append({"type": "system_event", "data": {"event": "x"}}).message_id is None
+
+
+def test_ring_coverage():
+    log = EventLog(capacity=3, epoch="e1")
+    assert log.covers(0, "e1")
+    for i in range(1, 6):
+        log.append(_msg(i))
+    # 缓冲里只剩 seq 3..5
+    assert [e.seq for e in log.since(3)] == [4, 5]
+    assert log.covers(2, "e1") and log.covers(5, "e1")
+    assert not log.covers(1, "e1")
+    assert not log.covers(6, "e1")  # 比当前还新
+    assert log.since(5) == []
+
+
+def test_other_epoch_never_covered():
+    """服务端重启后 seq 从头编号：旧 epoch 的 since_seq 即使落在范围内也不算覆盖"""
+    log = EventLog(capacity=8, epoch="boot-2")
+    for i in range(1, 6):
+        log.append(_msg(i))
+    assert not log.covers(3, "boot-1")
+    assert not log.covers(3, None)
+
+    log.reset("bus")
+    assert log.epoch == "bus" and log.last_seq == 0 and log.since(0) == []
+    log.reset("bus")  # 同一个 epoch：什么也不做
+    log.append(_msg(6))
+    assert log.covers(0, "bus")
+
+
+def test_messages_after():
+    log = EventLog()
+    log.append(_msg(10))
+    log.append({"type": "system_event", "data": {"event": "agent_online"}})
+    log.append(_msg(11))
+    assert [e.message_id for e in log.messages_after(10)] == [11]
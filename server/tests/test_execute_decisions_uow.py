@@ -0,0 +1,115 @@
+"""execute_decisions 单事务 + 每条决策 SAVEPOINT 测试"""
+from unittest.mock import AsyncMock, patch
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import event, select
+
+from app.core.database import Base, engine, async_session
+from app.models import Agent, AgentResource, AgentItem, Job, VirtualItem, Message
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest_asyncio.fixture(autouse=True)
+async def setup_db():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with async_session() as db:
+        db.add(Agent(id=0, name="Human", persona="human", model="none", status="idle"))
+        db.add(Agent(id=1, name="Alice", persona="p", model="test", credits=50, satiety=40))
+        db.add(Agent(id=2, name="Bob", persona="p", model="test", credits=20))
+        db.add(Agent(id=3, name="Carol", persona="p", model="test", credits=20))
+        db.add(Job(id=1, title="矿工", description="挖矿", daily_reward=10, max_workers=5))
+        db.add(VirtualItem(id=1, name="金框", item_type="avatar_frame", price=8, description="t"))
+        db.add(AgentResource(agent_id=1, resource_type="flour", quantity=3.0, frozen_amount=0.0))
+        db.add(AgentResource(agent_id=2, resource_type="wood", quantity=10.0, frozen_amount=0.0))
+        db.add(Message(agent_id=0, sender_type="human", message_type="chat", content="大家好"))
+        await db.commit()
+
+    yield
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+
+
+@pytest.fixture
+def commit_counter():
+    counter = {"n": 0}
+
+    def _on_commit(conn):
+        counter["n"] += 1
+
+    event.listen(engine.sync_engine, "commit", _on_commit)
+    yield counter
+    event.remove(engine.sync_engine, "commit", _on_commit)
+
+
+@pytest.fixture(autouse=True)
+def _mute_broadcast():
+    with patch("app.api.chat.broadcast", new_callable=AsyncMock):
+        yield
+
+
+async def test_tick_commits_once(commit_counter):
+    """多条决策（含 rest / 状态变更）整轮只提交一次"""
+    from app.services.autonomy_service import execute_decisions
+
+    decisions = [
+        {"agent_id": 1, "action": "eat", "params": {}, "reason": "饿了"},
+        {"agent_id": 2, "action": "transfer_resource",
+         "params": {"to_agent_id": 3, "resource_type": "wood", "quantity": 4}, "reason": "送木头"},
+        {"agent_id": 3, "action": "purchase", "params": {"item_id": 1}, "reason": "买框"},
+        {"agent_id": 1, "action": "rest", "params": {}, "reason": "休息"},
+    ]
+    async with async_session() as db:
+        stats = await execute_decisions(decisions, db)
+
+    assert stats == {"success": 3, "failed": 0, "skipped": 1}
+    assert commit_counter["n"] == 1
+
+    async with async_session() as db:
+        alice = await db.get(Agent, 1)
+        carol = await db.get(Agent, 3)
+        wood = (await db.execute(
+            select(AgentResource.quantity).where(AgentResource.agent_id == 3, AgentResource.resource_type == "wood")
+        )).scalar()
+    assert alice.satiety == 70
+    assert alice.status == "idle"
+    assert carol.credits == 12
+    assert wood == 4.0
+
+
+async def test_failed_action_rolls_back_only_its_savepoint():
+    """某条决策中途抛异常：它已 flush 的写入回滚，前后其他决策照常提交"""
+    from app.services import autonomy_service
+
+    async def eat_then_crash(agent_id, db, *, commit=True):
+        agent = await db.get(Agent, agent_id)
+        agent.satiety = 100
+        await db.flush()
+        raise RuntimeError("boom")
+
+    decisions = [
+        {"agent_id": 2, "action": "purchase", "params": {"item_id": 1}, "reason": "买框"},
+        {"agent_id": 1, "action": "eat", "params": {}, "reason": "饿了"},
+        {"agent_id": 3, "action": "checkin", "params": {"job_id": 1}, "reason": "上班"},
+    ]
+    with patch.object(autonomy_service, "eat_food", eat_then_crash):
+        async with async_session() as db:
+            stats = await autonomy_service.execute_decisions(decisions, db)
+
+    assert stats["success"] == 2
+    assert stats["failed"] == 1
+    async with async_session() as db:
+        alice = await db.get(Agent, 1)
+        bob = await db.get(Agent, 2)
+        carol = await db.get(Agent, 3)
+        items = (await db.execute(select(AgentItem))).scalars().all()
+    assert alice.satiety == 40
+    assert bob.credits == 12
+    assert carol.credits == 30
+    assert len(items) == 1
+
@@ -0,0 +1,44 @@
+"""热点查询预构建语句测试：绑定参数逐次生效，返回 Core 行"""
+import pytest
+
+from app.models import Agent, AgentResource, Message
+
+
+@pytest.mark.asyncio
+async def test_recent_messages_core_rows_respect_limit(db):
+    from app.services.wakeup_service import get_recent_messages
+    db.add_all([Agent(id=1, name="Alice", persona="p"), Agent(id=2, name="Bob", persona="p")])
+    for i in range(5):
+        db.add(Message(id=i + 1, agent_id=1 if i % 2 == 0 else 2, content=f"m{i + 1}"))
+    db.add(Message(id=6, agent_id=99, content="孤儿消息"))
+    await db.commit()
+
+    rows = await get_recent_messages(db, limit=3)
+    assert [r.content for r in rows] == ["m4", "m5", "孤儿消息"]
+    assert [r.agent_name for r in rows] == ["Bob", "Alice", None]
+    assert not isinstance(rows[0], Message)
+
+    assert len(await get_recent_messages(db, limit=5)) == 5
+
+
+@pytest.mark.asyncio
+async def test_agent_resource_stmt_binds_each_call(db):
+    from app.services.city_service import _get_or_create_agent_resource
+    db.add_all([
+        AgentResource(agent_id=1, resource_type="wheat", quantity=3.0, frozen_amount=0.0),
+        AgentResource(agent_id=2, resource_type="wheat", quantity=7.0, frozen_amount=0.0),
+    ])
+    await db.commit()
+
+    assert (await _get_or_create_agent_resource(1, "wheat", db)).quantity == 3.0
+    assert (await _get_or_create_agent_resource(2, "wheat", db)).quantity == 7.0
+    created = await _get_or_create_agent_resource(2, "flour", db)
+    assert created.quantity == 0.0 and created.id is not None
+
+
+@pytest.mark.asyncio
+async def test_agent_name_map(db):
+    from app.api.chat import get_agent_name_map
+    db.add_all([Agent(id=1, name="Alice", persona="p"), Agent(id=2, name="Bob", persona="p")])
+    await db.commit()
+    assert await get_agent_name_map(db) == {"Alice": 1, "Bob": 2}
@@ -0,0 +1,46 @@
+"""JSON 编码层测试：两种后端输出一致、常量帧缓存、REST 响应走同一编码器"""
+import json
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.core import json_codec
+from app.core.json_codec import FastJSONResponse, const_frame, dumps, dumps_str, loads
+
+
+def test_roundtrip_keeps_unicode():
+    data = {"type": "new_message", "data": {"content": "你好 @Alice", "id": 3, "ok": True}}
+    text = dumps_str(data)
+    assert "你好" in text
+    assert loads(text) == data
+    assert isinstance(dumps(data), bytes)
+
+
+def test_backends_agree():
+    data = {"a": [1, 2.5, None], "b": "长安", "c": {"d": False}}
+    assert json.loads(json_codec._stdlib_dumps(data)) == json.loads(dumps(data))
+
+
+def test_const_frame_cached():
+    assert const_frame("ping") is const_frame("ping")
+    assert json.loads(const_frame("ping")) == {"type": "ping"}
+
+
+def test_unknown_backend_rejected():
+    with pytest.raises(ValueError):
+        json_codec._select_backend("simdjson")
+
+
+def test_response_class_renders_with_codec():
+    resp = FastJSONResponse({"city": "长安", "n": 1})
+    assert resp.body == dumps({"city": "长安", "n": 1})
+    assert resp.headers["content-type"] == "application/json"
+
+
+@pytest.mark.asyncio
+async def test_app_uses_fast_response():
+    from main import app
+    assert app.router.default_response_class is FastJSONResponse
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        resp = await client.get("/api/health")
+    assert resp.json() == {"status": "ok"}
@@ -0,0 +1,153 @@
+"""LLM 网关：按供应商复用客户端、并发上限、令牌桶限速、429/5xx 抖动退避重试"""
+import asyncio
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import httpx
+import pytest
+from openai import BadRequestError, InternalServerError, RateLimitError
+
+from app.core.config import ModelProvider
+from app.services.llm_gateway import LLMGateway, TokenBucket
+
+OPENAI = "app.services.llm_gateway.AsyncOpenAI"
+PROVIDER = ModelProvider(name="fake", model_id="fake-model")
+
+
+def _error(cls, status: int, headers: dict | None = None):
+    response = httpx.Response(status, headers=headers, request=httpx.Request("POST", "http://fake/chat/completions"))
+    return cls("boom", response=response, body=None)
+
+
+def _client(side_effect=None):
+    client = MagicMock()
+    client.chat.completions.create = AsyncMock(side_effect=side_effect, return_value="ok")
+    return client
+
+
+@pytest.mark.asyncio
+async def test_client_pooled_per_provider():
+    gateway = LLMGateway(rate_per_s=0)
+    other = ModelProvider(name="other", model_id="m2")
+    with patch(OPENAI, side_effect=lambda **kw: _client()) as factory:
+        await gateway.chat(PROVIDER, messages=[])
+        await gateway.chat(PROVIDER, messages=[])
+        await gateway.chat(other, messages=[])
+    assert factory.call_count == 2
+    assert factory.call_args.kwargs["max_retries"] == 0  # 重试由网关负责
+    await gateway.aclose()
+
+
+@pytest.mark.asyncio
+async def test_model_filled_from_provider():
+    gateway = LLMGateway(rate_per_s=0)
+    client = _client()
+    with patch(OPENAI, return_value=client):
+        assert await gateway.chat(PROVIDER, messages=[], max_tokens=5) == "ok"
+    client.chat.completions.create.assert_awaited_once_with(messages=[], max_tokens=5, model="fake-model")
+
+
+@pytest.mark.asyncio
+async def test_retries_429_and_5xx_then_succeeds():
+    gateway = LLMGateway(rate_per_s=0, max_retries=3, backoff_base=0)
+    client = _client([_error(RateLimitError, 429), _error(InternalServerError, 503), "ok"])
+    with patch(OPENAI, return_value=client):
+        assert await gateway.chat(PROVIDER, messages=[]) == "ok"
+    assert client.chat.completions.create.await_count == 3
+    assert gateway.retries == 2
+
+
+@pytest.mark.asyncio
+async def test_gives_up_after_max_retries_and_skips_4xx():
+    gateway = LLMGateway(rate_per_s=0, max_retries=1, backoff_base=0)
+    client = _client([_error(RateLimitError, 429)] * 2)
+    with patch(OPENAI, return_value=client):
+        with pytest.raises(RateLimitError):
+            await gateway.chat(PROVIDER, messages=[])
+    assert client.chat.completions.create.await_count == 2
+
+    gateway = LLMGateway(rate_per_s=0, max_retries=3, backoff_base=0)
+    client = _client([_error(BadRequestError, 400)])
+    with patch(OPENAI, return_value=client):
+        with pytest.raises(BadRequestError):
+            await gateway.chat(PROVIDER, messages=[])
+    assert client.chat.completions.create.await_count == 1
+
+
+def test_backoff_honors_retry_after_and_jitter_bound():
+    gateway = LLMGateway(backoff_base=1.0, backoff_max=4.0)
+    assert gateway._backoff(0, _error(RateLimitError, 429, {"retry-after": "2"})) == 2.0
+    assert gateway._backoff(0, _error(RateLimitError, 429, {"retry-after": "60"})) == 4.0
+    delays = [gateway._backoff(5, _error(InternalServerError, 500)) for _ in range(50)]
+    assert all(0 <= d <= 4.0 for d in delays) and len(set(delays)) > 1
+
+
+@pytest.mark.asyncio
+async def test_concurrency_capped_per_provider():
+    gateway = LLMGateway(rate_per_s=0, max_concurrency=2)
+    in_flight = peak = 0
+
+    async def create(**kwargs):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return "ok"
+
+    with patch(OPENAI, return_value=_client(create)):
+        await asyncio.gather(*(gateway.chat(PROVIDER, messages=[]) for _ in range(6)))
+    assert peak == 2
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=50, burst=2)
+    start = time.monotonic()
+    for _ in range(4):
+        await bucket.acquire()
+    # 前 2 个立即拿到，后 2 个按 50/s 补充，至少约 40ms
+    assert time.monotonic() - start >= 0.03
+
+
+@pytest.mark.asyncio
+async def test_per_call_retries_and_deadline():
+    gateway = LLMGateway(rate_per_s=0, max_retries=3, backoff_base=0)
+    client = _client([_error(RateLimitError, 429)] * 4)
+    with patch(OPENAI, return_value=client):
+        with pytest.raises(RateLimitError):
+            await gateway.chat(PROVIDER, messages=[], max_retries=0)
+    assert client.chat.completions.create.await_count == 1
+
+    gateway = LLMGateway(rate_per_s=0, max_retries=3, backoff_base=10, backoff_max=10)
+    client = _client([_error(RateLimitError, 429)] * 4)
+    start = time.monotonic()
+    with patch(OPENAI, return_value=client):
+        with pytest.raises(TimeoutError):
+            await gateway.chat(PROVIDER, messages=[], deadline=0.05)  # 退避期间超时，不会等满 10 秒
+    assert time.monotonic() - start < 1
+
+
+@pytest.mark.asyncio
+async def test_replaced_pool_closed_after_in_flight_calls():
+    gateway = LLMGateway(rate_per_s=0)
+    gate = asyncio.Event()
+
+    async def create(**kwargs):
+        await gate.wait()
+        return "ok"
+
+    with patch(OPENAI, side_effect=lambda **kw: _client(create)):
+        pending = asyncio.create_task(gateway.chat(PROVIDER, messages=[]))
+        await asyncio.sleep(0)
+        old = gateway._pools["fake"]
+        with patch.object(ModelProvider, "get_auth_token", return_value="rotated"):
+            gateway._pool(PROVIDER)  # .env 换了 token：旧池子还有在途请求，先不关
+        await asyncio.sleep(0)
+        assert old.retired and not old.http.is_closed
+
+        gate.set()
+        assert await pending == "ok"
+        await asyncio.sleep(0)
+        assert old.http.is_closed
+    await gateway.aclose()
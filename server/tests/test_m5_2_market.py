@@ -367,7 +367,7 @@ async def test_t16_tool_registry_has_market_tools():
 
 
 # T17: create_market_order handler 正确调用 market_service
-async def test_t17_tool_create_order(db):
+async def test_t17_tool_create_order(db, write_through):
     await _seed_agent(db, id=1, name="Alice")
     await _seed_resource(db, 1, "wheat", 20)
 
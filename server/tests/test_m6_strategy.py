@@ -5,6 +5,7 @@ import pytest
 import pytest_asyncio
 from unittest.mock import AsyncMock, MagicMock, patch
 
+from app.core.config import ModelProvider
 from app.core.database import Base, engine, async_session
 from app.models import Agent, Job, Building, BuildingWorker, AgentResource
 from app.models.tables import MarketOrder
@@ -145,9 +146,9 @@ async def test_decide_new_format():
     mock_client = AsyncMock()
     mock_client.chat.completions.create = AsyncMock(return_value=mock_response)
 
-    with patch("app.services.autonomy_service.resolve_model",
-               return_value=("http://fake", "sk-fake", "test-model")), \
-         patch("app.services.autonomy_service.AsyncOpenAI",
+    with patch("app.services.llm_gateway.llm_gateway.route",
+               return_value=ModelProvider(name="fake", model_id="test-model")), \
+         patch("app.services.llm_gateway.AsyncOpenAI",
                return_value=mock_client):
         actions = await decide("fake snapshot")
 
@@ -170,9 +171,9 @@ async def test_decide_legacy_fallback():
     mock_client = AsyncMock()
     mock_client.chat.completions.create = AsyncMock(return_value=mock_response)
 
-    with patch("app.services.autonomy_service.resolve_model",
-               return_value=("http://fake", "sk-fake", "test-model")), \
-         patch("app.services.autonomy_service.AsyncOpenAI",
+    with patch("app.services.llm_gateway.llm_gateway.route",
+               return_value=ModelProvider(name="fake", model_id="test-model")), \
+         patch("app.services.llm_gateway.AsyncOpenAI",
                return_value=mock_client):
         actions = await decide("fake snapshot")
 
@@ -195,9 +196,9 @@ async def test_decide_reasoning_field_fallback():
     mock_client = AsyncMock()
     mock_client.chat.completions.create = AsyncMock(return_value=mock_response)
 
-    with patch("app.services.autonomy_service.resolve_model",
-               return_value=("http://fake", "sk-fake", "test-model")), \
-         patch("app.services.autonomy_service.AsyncOpenAI",
+    with patch("app.services.llm_gateway.llm_gateway.route",
+               return_value=ModelProvider(name="fake", model_id="test-model")), \
+         patch("app.services.llm_gateway.AsyncOpenAI",
                return_value=mock_client):
         actions = await decide("fake snapshot")
 
@@ -6,6 +6,7 @@ from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
+from app.core.config import ModelProvider
 from app.models import MemoryType
 
 
@@ -32,12 +33,12 @@ HISTORY = [
     {"name": "Alice", "content": "今天天气不错"},
 ]
 
-RESOLVE_MODEL = "app.services.agent_runner.resolve_model"
+ROUTE = "app.services.llm_gateway.llm_gateway.route"
 MEMORY_SEARCH = "app.services.agent_runner.memory_service.search"
 
 
 def _patch_llm_success(reply_text="测试回复"):
-    """返回一个 patch 好的 resolve_model + AsyncOpenAI，使 LLM 调用成功返回。"""
+    """返回一个 patch 好的 网关路由 + AsyncOpenAI，使 LLM 调用成功返回。"""
     mock_choice = MagicMock()
     mock_choice.message.content = reply_text
     mock_response = MagicMock()
@@ -50,8 +51,8 @@ def _patch_llm_success(reply_text="测试回复"):
     mock_client.chat.completions.create = AsyncMock(return_value=mock_response)
 
     return (
-        patch(RESOLVE_MODEL, return_value=("http://fake", "sk-fake", "test-model")),
-        patch("app.services.agent_runner.AsyncOpenAI", return_value=mock_client),
+        patch(ROUTE, return_value=ModelProvider(name="fake", model_id="test-model")),
+        patch("app.services.llm_gateway.AsyncOpenAI", return_value=mock_client),
     )
 
 
@@ -7,6 +7,7 @@ import pytest
 # 被测模块路径
 CHAT = "app.api.chat"
 CONFIG = "app.core.config"
+GATEWAY = "app.services.llm_gateway"
 
 
 # --- _truncation_fallback ---
@@ -81,7 +82,7 @@ async def test_llm_summarize_success():
     )
 
     with patch(f"{CONFIG}.MODEL_REGISTRY", {"memory-summary-model": entry}), \
-         patch(f"{CHAT}.AsyncOpenAI", return_value=mock_client):
+         patch(f"{GATEWAY}.AsyncOpenAI", return_value=mock_client):
         result = await _llm_summarize("张三: 我喜欢吃苹果\n李四: 明天我带水果来")
 
     assert result is not None
@@ -103,7 +104,7 @@ async def test_llm_summarize_respects_100_char_limit():
     )
 
     with patch(f"{CONFIG}.MODEL_REGISTRY", {"memory-summary-model": entry}), \
-         patch(f"{CHAT}.AsyncOpenAI", return_value=mock_client):
+         patch(f"{GATEWAY}.AsyncOpenAI", return_value=mock_client):
         result = await _llm_summarize("测试对话")
 
     assert result is not None
@@ -123,7 +124,7 @@ async def test_llm_summarize_no_useful_memory():
     )
 
     with patch(f"{CONFIG}.MODEL_REGISTRY", {"memory-summary-model": entry}), \
-         patch(f"{CHAT}.AsyncOpenAI", return_value=mock_client):
+         patch(f"{GATEWAY}.AsyncOpenAI", return_value=mock_client):
         result = await _llm_summarize("你好\n你好啊")
 
     assert result is None
@@ -157,13 +158,17 @@ async def test_llm_summarize_primary_timeout_fallback_to_secondary():
             return mock_client_slow
         return mock_client_ok
 
+    from app.core.provider_health import provider_health
+
+    provider_health.reset()
     with patch(f"{CONFIG}.MODEL_REGISTRY", {"memory-summary-model": entry}), \
-         patch(f"{CHAT}.AsyncOpenAI", side_effect=mock_openai_factory), \
+         patch(f"{GATEWAY}.AsyncOpenAI", side_effect=mock_openai_factory), \
          patch(f"{CHAT}.MEMORY_SUMMARY_TIMEOUT", 0.1):  # 缩短超时加速测试
         result = await _llm_summarize("测试对话")
 
     assert result is not None
     assert not result.startswith("对话摘要:")
+    assert provider_health.stats(p1).consecutive_failures == 1  # 超时记主供应商一次失败
 
 
 @pytest.mark.asyncio
@@ -178,7 +183,7 @@ async def test_llm_summarize_all_providers_fail_truncation_fallback():
     mock_client = _make_async_client(create_side_effect=Exception("API error"))
 
     with patch(f"{CONFIG}.MODEL_REGISTRY", {"memory-summary-model": entry}), \
-         patch(f"{CHAT}.AsyncOpenAI", return_value=mock_client):
+         patch(f"{GATEWAY}.AsyncOpenAI", return_value=mock_client):
         result = await _llm_summarize("测试对话内容")
 
     assert result is not None
@@ -208,7 +213,7 @@ async def test_llm_summarize_validation_fail_tries_next():
         )
 
     with patch(f"{CONFIG}.MODEL_REGISTRY", {"memory-summary-model": entry}), \
-         patch(f"{CHAT}.AsyncOpenAI", side_effect=mock_openai_factory):
+         patch(f"{GATEWAY}.AsyncOpenAI", side_effect=mock_openai_factory):
         result = await _llm_summarize("测试对话")
 
     assert result is not None
@@ -238,7 +243,7 @@ async def test_llm_summarize_validation_fail_short_text():
         )
 
     with patch(f"{CONFIG}.MODEL_REGISTRY", {"memory-summary-model": entry}), \
-         patch(f"{CHAT}.AsyncOpenAI", side_effect=mock_openai_factory):
+         patch(f"{GATEWAY}.AsyncOpenAI", side_effect=mock_openai_factory):
         result = await _llm_summarize("测试对话")
 
     assert result is not None
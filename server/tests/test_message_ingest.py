@@ -0,0 +1,118 @@
+"""入站聊天消息微批：一批一次 INSERT、按到达顺序广播、整批交给唤醒防抖"""
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+
+from app.core.database import Base, engine, async_session
+from app.models import Agent, Message
+from app.services.message_ingest import MessageIngestor
+
+
+@pytest_asyncio.fixture(autouse=True)
+async def setup_db():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_session() as db:
+        db.add(Agent(id=0, name="Human", persona="human", model="none"))
+        db.add(Agent(id=1, name="Alice", persona="p", model="m"))
+        await db.commit()
+    yield
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+
+
+@pytest.fixture
+def sinks():
+    with patch("app.api.chat.broadcast", new_callable=AsyncMock) as broadcast, \
+         patch("app.services.message_ingest.wakeup_debouncer") as wakeup:
+        yield broadcast, wakeup
+
+
+@pytest.mark.asyncio
+async def test_burst_ingested_as_one_batch(sinks):
+    broadcast, wakeup = sinks
+    ingestor = MessageIngestor(window=0.05)
+    ingestor.submit(0, "Human", "human", "work", "hi @Alice")
+    ingestor.submit(1, "Alice", "agent", "chat", "hello")
+    ingestor.submit(0, "Human", "human", "work", "third")
+    assert ingestor.pending == 3
+    await ingestor.stop()
+
+    assert ingestor.batches == 1 and ingestor.pending == 0
+    async with async_session() as db:
+        rows = (await db.execute(select(Message).order_by(Message.id))).scalars().all()
+    assert [(m.content, m.mentions) for m in rows] == [("hi @Alice", [1]), ("hello", []), ("third", [])]
+
+    frames = [c.args[0]["data"] for c in broadcast.await_args_list]
+    assert [f["id"] for f in frames] == [m.id for m in rows]
+    assert frames[0]["agent_name"] == "Human" and frames[0]["mentions"] == [1]
+    assert frames[0]["created_at"] == str(rows[0].created_at)
+
+    wakeup.submit.assert_called_once()
+    assert [m.id for m in wakeup.submit.call_args.args[0]] == [m.id for m in rows]
+
+
+@pytest.mark.asyncio
+async def test_max_batch_splits_and_keeps_order(sinks):
+    broadcast, wakeup = sinks
+    ingestor = MessageIngestor(window=10, max_batch=2)
+    for i in range(5):
+        ingestor.submit(0, "Human", "human", "work", f"m{i}")
+    await asyncio.sleep(0)
+    await ingestor.stop()
+
+    assert ingestor.batches == 3
+    assert [c.args[0]["data"]["content"] for c in broadcast.await_args_list] == [f"m{i}" for i in range(5)]
+    assert wakeup.submit.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_falls_back_to_single_writes(sinks):
+    from app.core.database import write_queue
+
+    broadcast, wakeup = sinks
+    real_submit = write_queue.submit
+    calls = []
+
+    async def flaky(work):
+        calls.append(work)
+        if len(calls) in (1, 3):  # 整批失败，逐条时第二条也失败
+            raise RuntimeError("disk I/O error")
+        return await real_submit(work)
+
+    ingestor = MessageIngestor(window=10)
+    for i in range(3):
+        ingestor.submit(0, "Human", "human", "work", f"m{i}")
+    with patch("app.services.message_ingest.write_queue.submit", side_effect=flaky):
+        await ingestor.stop()
+
+    assert len(calls) == 4
+    async with async_session() as db:
+        rows = (await db.execute(select(Message.content).order_by(Message.id))).scalars().all()
+    assert rows == ["m0", "m2"]
+    assert [c.args[0]["data"]["content"] for c in broadcast.await_args_list] == ["m0", "m2"]
+    assert ingestor.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_publish_errors_do_not_rewrite_batch(sinks):
+    """提交后广播 / 唤醒出错只记日志：不重试写入，其余消息照常广播"""
+    broadcast, wakeup = sinks
+    broadcast.side_effect = [RuntimeError("ws gone"), None, None]
+    wakeup.submit.side_effect = RuntimeError("debouncer down")
+
+    ingestor = MessageIngestor(window=10)
+    for i in range(3):
+        ingestor.submit(0, "Human", "human", "work", f"m{i}")
+    await ingestor.stop()
+
+    assert ingestor.batches == 1
+    async with async_session() as db:
+        rows = (await db.execute(select(Message.content).order_by(Message.id))).scalars().all()
+    assert rows == ["m0", "m1", "m2"]
+    assert broadcast.await_count == 3
+    wakeup.submit.assert_called_once()
@@ -0,0 +1,140 @@
+"""版本化迁移（schema_version）测试"""
+import pytest
+import pytest_asyncio
+from sqlalchemy import Column, Integer, MetaData, String, Table, Index, event, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core import migrations
+from app.core.database import Base
+import app.models  # noqa: F401  注册所有表到 Base.metadata
+from app.core.migrations import Migration, latest_version, rebuild_table, run_migrations
+
+
+@pytest_asyncio.fixture
+async def engine(tmp_path):
+    """与 writer_engine 相同的事务语义：显式 BEGIN IMMEDIATE，DDL 也在事务内"""
+    eng = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'mig.db'}")
+
+    @event.listens_for(eng.sync_engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(eng.sync_engine, "begin")
+    def _begin(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    yield eng
+    await eng.dispose()
+
+
+async def _columns(eng, table: str) -> list[str]:
+    async with eng.connect() as conn:
+        rows = (await conn.execute(text(f"PRAGMA table_info({table})"))).fetchall()
+    return [r[1] for r in rows]
+
+
+async def _version(eng) -> int:
+    async with eng.connect() as conn:
+        return (await conn.execute(text("SELECT version FROM schema_version"))).scalar()
+
+
+async def _create_legacy_agents(eng):
+    """M1 时代的 agents 表：没有 bot_token/satiety/personality_json，也没有 schema_version"""
+    async with eng.begin() as conn:
+        await conn.execute(text(
+            "CREATE TABLE agents (id INTEGER PRIMARY KEY, name VARCHAR(64) UNIQUE NOT NULL, "
+            "persona TEXT NOT NULL, model VARCHAR(64), avatar VARCHAR(256), status VARCHAR(16), "
+            "activity VARCHAR(256), credits INTEGER, speak_interval INTEGER, "
+            "daily_free_quota INTEGER, quota_used_today INTEGER, quota_reset_date DATE, "
+            "created_at DATETIME)"
+        ))
+        await conn.execute(text("INSERT INTO agents (id, name, persona) VALUES (1, 'Alice', 'p')"))
+
+
+@pytest.mark.asyncio
+async def test_fresh_db_is_stamped_latest(engine):
+    """新库 create_all 后直接记为最新版本，不跑任何步骤"""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        applied = await run_migrations(conn, fresh=True)
+    assert applied == []
+    assert await _version(engine) == latest_version()
+
+
+@pytest.mark.asyncio
+async def test_legacy_db_upgrades_once(engine):
+    """老库补齐所有步骤；再次启动不重复执行"""
+    await _create_legacy_agents(engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        applied = await run_migrations(conn)
+    assert applied == [m.version for m in migrations.MIGRATIONS]
+    assert await _version(engine) == latest_version()
+
+    cols = await _columns(engine, "agents")
+    for col in ("bot_token", "satiety", "mood", "stamina", "personality_json"):
+        assert col in cols
+    async with engine.connect() as conn:
+        idx = (await conn.execute(text("SELECT name FROM sqlite_master WHERE type='index'"))).scalars().all()
+    assert "ix_messages_created_at" in idx
+
+    async with engine.begin() as conn:
+        assert await run_migrations(conn) == []
+
+
+@pytest.mark.asyncio
+async def test_failed_step_rolls_back_whole_batch(engine, monkeypatch):
+    """任一步失败，之前的 DDL 和版本号一起回滚"""
+    async def add_column(conn):
+        await conn.execute(text("ALTER TABLE agents ADD COLUMN nickname VARCHAR(32)"))
+
+    async def boom(conn):
+        raise RuntimeError("boom")
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await run_migrations(conn, fresh=True)
+    base = latest_version()
+
+    monkeypatch.setattr(migrations, "MIGRATIONS", migrations.MIGRATIONS + [
+        Migration(base + 1, "add nickname", add_column),
+        Migration(base + 2, "boom", boom),
+    ])
+    with pytest.raises(RuntimeError):
+        async with engine.begin() as conn:
+            await run_migrations(conn)
+
+    assert "nickname" not in await _columns(engine, "agents")
+    assert await _version(engine) == base
+
+
+@pytest.mark.asyncio
+async def test_rebuild_table_keeps_rows_and_applies_new_schema(engine):
+    """rebuild_table 只重建一张表：搬运数据、转换列、重建索引"""
+    async with engine.begin() as conn:
+        await conn.execute(text("CREATE TABLE notes (id INTEGER PRIMARY KEY, body TEXT, legacy TEXT)"))
+        await conn.execute(text("INSERT INTO notes (id, body, legacy) VALUES (1, 'hello', 'x'), (2, 'world', 'y')"))
+
+    notes = Table(
+        "notes", MetaData(),
+        Column("id", Integer, primary_key=True),
+        Column("title", String(32), nullable=False),
+        Column("body", String(64)),
+        Index("ix_notes_title", "title"),
+    )
+    async with engine.begin() as conn:
+        await rebuild_table(conn, notes, column_map={"title": "upper(body)"})
+
+    assert await _columns(engine, "notes") == ["id", "title", "body"]
+    async with engine.connect() as conn:
+        rows = (await conn.execute(text("SELECT id, title, body FROM notes ORDER BY id"))).all()
+        idx = (await conn.execute(text(
+            "SELECT name FROM sqlite_master WHERE type='index' AND tbl_name='notes'"
+        ))).scalars().all()
+    assert rows == [(1, "HELLO", "hello"), (2, "WORLD", "world")]
+    assert "ix_notes_title" in idx
+
+
+def test_versions_must_increase():
+    with pytest.raises(ValueError):
+        migrations.migration(1, "duplicate")(lambda conn: None)
@@ -0,0 +1,191 @@
+"""供应商健康度：EWMA 延迟选最快、熔断 / 半开探测、网关调用回报"""
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import httpx
+import pytest
+from openai import InternalServerError
+
+from app.core.config import ModelEntry, ModelProvider
+from app.core.provider_health import CLOSED, HALF_OPEN, OPEN, ProviderHealth
+from app.services.llm_gateway import LLMGateway
+
+CLOCK = "app.core.provider_health.time.monotonic"
+
+
+class _P:
+    def __init__(self, name, available=True, model_id="m"):
+        self.name = name
+        self.model_id = model_id
+        self.available = available
+
+    def is_available(self):
+        return self.available
+
+
+PRIMARY, BACKUP = _P("primary"), _P("backup")
+
+
+@pytest.fixture
+def clock():
+    now = [1000.0]
+    with patch(CLOCK, side_effect=lambda: now[0]):
+        yield now
+
+
+def test_registry_order_without_samples():
+    health = ProviderHealth()
+    assert health.pick([PRIMARY, BACKUP]) is PRIMARY
+    assert health.pick([_P("primary", available=False), BACKUP]).name == "backup"
+    assert health.pick([_P("x", available=False)]) is None
+
+
+def test_switches_to_faster_provider_with_hysteresis(clock):
+    health = ProviderHealth(alpha=1.0, switch_ratio=1.5, cooldown=30)
+    health.record_success(PRIMARY, 1.0)
+    health.record_success(BACKUP, 0.8)  # 只快一点：不换
+    assert health.pick([PRIMARY, BACKUP], explore=False) is PRIMARY
+
+    health.record_success(PRIMARY, 6.0)  # 主供应商变慢
+    assert health.pick([PRIMARY, BACKUP], explore=False) is BACKUP
+
+
+def test_demoted_provider_explored_after_cooldown(clock):
+    health = ProviderHealth(alpha=1.0, cooldown=30)
+    health.record_success(PRIMARY, 6.0)
+    health.record_success(BACKUP, 1.0)
+    health.stats(PRIMARY).last_used = clock[0]
+    assert health.pick([PRIMARY, BACKUP]) is BACKUP
+
+    clock[0] += 31  # 主供应商 30 秒没用过：分它一个请求刷新延迟
+    assert health.pick([PRIMARY, BACKUP]) is PRIMARY
+    assert health.pick([PRIMARY, BACKUP]) is BACKUP
+
+
+def test_circuit_trips_probes_and_recovers(clock):
+    health = ProviderHealth(failure_threshold=3, cooldown=30)
+    for _ in range(3):
+        health.record_failure(PRIMARY)
+    assert health.stats(PRIMARY).state == OPEN
+    assert health.pick([PRIMARY, BACKUP]) is BACKUP
+
+    clock[0] += 31
+    assert health.pick([PRIMARY, BACKUP]) is PRIMARY  # 半开探测
+    assert health.stats(PRIMARY).state == HALF_OPEN
+    assert health.pick([PRIMARY, BACKUP]) is BACKUP  # 同时只放一个探测
+
+    health.record_failure(PRIMARY)  # 探测失败 → 重新熔断
+    assert health.stats(PRIMARY).state == OPEN
+    assert health.pick([PRIMARY, BACKUP]) is BACKUP
+
+    clock[0] += 31
+    assert health.pick([PRIMARY, BACKUP]) is PRIMARY
+    health.record_success(PRIMARY, 0.5)
+    assert health.stats(PRIMARY).state == CLOSED
+    assert health.pick([PRIMARY, BACKUP], explore=False) is PRIMARY
+
+
+def test_error_rate_trips_and_all_open_falls_back(clock):
+    health = ProviderHealth(alpha=0.5, failure_threshold=100, error_rate_threshold=0.5, min_samples=4)
+    health.record_failure(PRIMARY)
+    health.record_success(PRIMARY, 1.0)
+    health.record_failure(PRIMARY)
+    assert health.stats(PRIMARY).state == CLOSED  # 样本不够，不按错误率熔断
+    health.record_failure(PRIMARY)
+    assert health.stats(PRIMARY).state == OPEN
+
+    for _ in range(5):
+        health.record_failure(BACKUP)
+    assert health.pick([PRIMARY, BACKUP]) is PRIMARY  # 全部熔断：退回第一个可用的
+    assert health.pick([PRIMARY, BACKUP], probe=False) is PRIMARY
+
+
+def test_rank_puts_tripped_last(clock):
+    health = ProviderHealth(failure_threshold=1)
+    third = _P("third")
+    health.record_failure(PRIMARY)
+    assert [p.name for p in health.rank([PRIMARY, BACKUP, third])] == ["backup", "third", "primary"]
+
+
+def test_model_entry_uses_health():
+    from app.core.provider_health import provider_health
+
+    entry = ModelEntry(display_name="x", providers=[
+        ModelProvider(name="openrouter", model_id="a"),
+        ModelProvider(name="siliconflow", model_id="b"),
+    ])
+    with patch("app.core.config.settings.openrouter_auth_token", "t1"), \
+         patch("app.core.config.settings.siliconflow_auth_token", "t2"):
+        assert entry.get_active_provider().name == "openrouter"
+        for _ in range(provider_health.failure_threshold):
+            provider_health.record_failure(entry.providers[0])
+        assert entry.get_active_provider().name == "siliconflow"
+
+
+@pytest.mark.asyncio
+async def test_gateway_reports_outcomes():
+    health = ProviderHealth(alpha=1.0)
+    gateway = LLMGateway(rate_per_s=0, max_retries=1, backoff_base=0, health=health)
+    response = httpx.Response(503, request=httpx.Request("POST", "http://fake"))
+    client = MagicMock()
+    client.chat.completions.create = AsyncMock(side_effect=[InternalServerError("down", response=response, body=None), "ok"])
+    provider = ModelProvider(name="fake", model_id="m")
+    with patch("app.services.llm_gateway.AsyncOpenAI", return_value=client):
+        assert await gateway.chat(provider, messages=[]) == "ok"
+
+    stats = health.stats(provider)
+    assert stats.samples == 1 and stats.consecutive_failures == 0  # 一次逻辑调用只回报一个结果
+    assert stats.error_rate == 0.0 and stats.latency is not None
+
+
+def test_stats_keyed_by_model():
+    health = ProviderHealth(failure_threshold=1)
+    broken, other = _P("openrouter", model_id="a"), _P("openrouter", model_id="b")
+    health.record_failure(broken)
+    assert health.stats(broken).state == OPEN
+    assert health.stats(other).state == CLOSED  # 同一供应商的其他模型不受牵连
+
+
+@pytest.mark.asyncio
+async def test_gateway_repicks_provider_between_attempts():
+    health = ProviderHealth(alpha=1.0)
+    gateway = LLMGateway(rate_per_s=0, max_retries=2, backoff_base=0, health=health)
+    primary = ModelProvider(name="openrouter", model_id="a")
+    backup = ModelProvider(name="siliconflow", model_id="b")
+    response = httpx.Response(503, request=httpx.Request("POST", "http://fake"))
+    down, up = MagicMock(), MagicMock()
+    down.chat.completions.create = AsyncMock(side_effect=InternalServerError("down", response=response, body=None))
+    up.chat.completions.create = AsyncMock(return_value="ok")
+    clients = {"openrouter": down, "siliconflow": up}
+
+    def factory(**kwargs):
+        return clients["openrouter" if "openrouter" in kwargs["base_url"] else "siliconflow"]
+
+    entry = ModelEntry(display_name="x", providers=[primary, backup])
+    with patch.dict("app.core.config.MODEL_REGISTRY", {"x": entry}), \
+         patch("app.core.config.settings.openrouter_auth_token", "t1"), \
+         patch("app.core.config.settings.siliconflow_auth_token", "t2"), \
+         patch("app.services.llm_gateway.AsyncOpenAI", side_effect=factory):
+        assert await gateway.chat(primary, messages=[]) == "ok"
+
+    assert down.chat.completions.create.await_count == 1
+    assert up.chat.completions.create.call_args.kwargs["model"] == "b"
+    assert health.stats(primary).samples == 1 and health.stats(primary).error_rate == 1.0
+    assert health.stats(backup).samples == 1 and health.stats(backup).consecutive_failures == 0
+
+
+@pytest.mark.asyncio
+async def test_gateway_deadline_counts_as_failure():
+    import asyncio
+
+    health = ProviderHealth()
+    gateway = LLMGateway(rate_per_s=0, health=health)
+    async def hang(**kwargs):
+        await asyncio.sleep(10)
+
+    client = MagicMock()
+    client.chat.completions.create = hang
+    provider = ModelProvider(name="fake", model_id="m")
+    with patch("app.services.llm_gateway.AsyncOpenAI", return_value=client):
+        with pytest.raises(TimeoutError):
+            await gateway.chat(provider, messages=[], deadline=0.02)
+    assert health.stats(provider).consecutive_failures == 1
@@ -0,0 +1,184 @@
+"""热点查询 EXPLAIN QUERY PLAN 回归测试
+
+直接调用 service 层函数，抓取实际执行的 SQL，再逐条跑 EXPLAIN QUERY PLAN。
+任何热点表退化为全表扫描（SCAN <table>，不带索引）即失败。
+"""
+import re
+from datetime import date
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from app.core.database import Base
+from app.models import Agent, Job, Message, Building, Bounty
+
+_FULL_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$")
+
+
+@pytest_asyncio.fixture
+async def engine():
+    eng = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with eng.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield eng
+    await eng.dispose()
+
+
+@pytest_asyncio.fixture
+async def db(engine):
+    session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with session_maker() as session:
+        session.add_all([
+            Agent(id=0, name="Human", persona="human", model="none"),
+            Agent(id=1, name="Alice", persona="p", quota_reset_date=date.today()),
+            Job(id=1, title="矿工", daily_reward=10, max_workers=5),
+            Building(id=1, name="农田", building_type="farm", city="长安", max_workers=3),
+            Message(id=1, agent_id=0, sender_type="human", content="hi"),
+            Bounty(id=1, title="修桥", reward=50),
+        ])
+        await session.commit()
+        yield session
+
+
+@pytest.fixture
+def captured(engine):
+    """记录 service 调用期间执行的 SELECT/UPDATE/DELETE 语句"""
+    statements = []
+
+    def _capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            statements.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", _capture)
+    yield statements
+    event.remove(engine.sync_engine, "before_cursor_execute", _capture)
+
+
+async def _plans_touching(engine, statements, table: str) -> list[list[str]]:
+    """对引用了 table 的语句逐条 EXPLAIN，返回每条的 plan detail 列表"""
+    pattern = re.compile(rf"\b(FROM|JOIN|UPDATE)\s+{table}\b")
+    plans = []
+    async with engine.connect() as conn:
+        for sql, params in statements:
+            if not pattern.search(sql):
+                continue
+            rows = (await conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql, params)).all()
+            plans.append([row[-1] for row in rows])
+    return plans
+
+
+async def _assert_indexed(engine, statements, table: str, index: str):
+    plans = await _plans_touching(engine, statements, table)
+    assert plans, f"没有抓到访问 {table} 的语句"
+    for detail in plans:
+        full_scans = [d for d in detail if (m := _FULL_SCAN.match(d)) and m.group(1) == table]
+        assert not full_scans, f"{table} 全表扫描: {detail}"
+    assert any(index in d for detail in plans for d in detail), f"{table} 未使用 {index}: {plans}"
+
+
+# ── messages ──
+
+@pytest.mark.asyncio
+async def test_recent_messages_use_created_at_index(engine, db, captured):
+    from app.services.wakeup_service import WakeupService
+    await WakeupService()._get_recent_messages(db, limit=10)
+    await _assert_indexed(engine, captured, "messages", "ix_messages_created_at")
+
+
+# ── checkins ──
+
+@pytest.mark.asyncio
+async def test_check_in_queries_use_checkin_indexes(engine, db, captured):
+    from app.services.work_service import work_service
+    await work_service.check_in(1, 1, db)
+    await work_service.get_today_checkin(1, db)
+    await work_service.get_work_history(1, db)
+    await _assert_indexed(engine, captured, "checkins", "ix_checkins_agent_checked")
+
+
+@pytest.mark.asyncio
+async def test_job_capacity_query_uses_job_index(engine, db, captured):
+    from app.services.work_service import work_service
+    await work_service.check_in(1, 1, db)
+    await _assert_indexed(engine, captured, "checkins", "ix_checkins_job_checked")
+
+
+@pytest.mark.asyncio
+async def test_jobs_today_workers_uses_checked_at_range(engine, db, captured):
+    from app.services.work_service import work_service
+    await work_service.get_jobs(db)
+    await _assert_indexed(engine, captured, "checkins", "ix_checkins_")
+
+
+@pytest.mark.asyncio
+async def test_world_snapshot_checkins_indexed(engine, db, captured):
+    from app.services.autonomy_service import build_world_snapshot
+    await build_world_snapshot(db)
+    await _assert_indexed(engine, captured, "checkins", "ix_checkins_")
+    await _assert_indexed(engine, captured, "messages", "ix_messages_created_at")
+
+
+# ── memories ──
+
+@pytest.mark.asyncio
+async def test_cleanup_expired_uses_type_expires_index(engine, db, captured):
+    from app.services.memory_service import memory_service
+    await memory_service.cleanup_expired(db)
+    await _assert_indexed(engine, captured, "memories", "ix_memories_type_expires")
+
+
+@pytest.mark.asyncio
+async def test_memory_list_by_agent_uses_agent_index(engine, db, captured):
+    from app.services.memory_admin_service import list_memories
+    await list_memories(1, "short", None, 1, 20, db)
+    await _assert_indexed(engine, captured, "memories", "ix_memories_agent_type_expires")
+
+
+@pytest.mark.asyncio
+async def test_memory_refs_use_message_index(engine, db, captured):
+    from app.services.memory_admin_service import get_message_memory_refs
+    await get_message_memory_refs(1, db)
+    await _assert_indexed(engine, captured, "memory_references", "ix_memory_references_message")
+
+
+# ── 交易市场 ──
+
+@pytest.mark.asyncio
+async def test_list_orders_uses_status_index(engine, db, captured):
+    from app.services.market_service import list_orders
+    await list_orders(db=db)
+    await _assert_indexed(engine, captured, "market_orders", "ix_market_orders_status_created")
+
+
+@pytest.mark.asyncio
+async def test_trade_logs_use_created_at_index(engine, db, captured):
+    from app.services.market_service import get_trade_logs
+    await get_trade_logs(db=db, limit=20)
+    await _assert_indexed(engine, captured, "trade_logs", "ix_trade_logs_created_at")
+
+
+# ── 城市 ──
+
+@pytest.mark.asyncio
+async def test_assign_worker_uses_agent_index(engine, db, captured):
+    from app.services.city_service import assign_worker
+    await assign_worker("长安", 1, 1, db)
+    await _assert_indexed(engine, captured, "building_workers", "ix_building_workers_agent")
+
+
+@pytest.mark.asyncio
+async def test_production_logs_use_tick_time_index(engine, db, captured):
+    from app.services.city_service import get_production_logs
+    await get_production_logs("长安", 20, db)
+    await _assert_indexed(engine, captured, "production_logs", "ix_production_logs_tick_time")
+
+
+# ── 悬赏 ──
+
+@pytest.mark.asyncio
+async def test_claim_bounty_uses_status_claimed_index(engine, db, captured):
+    from app.services.bounty_service import claim_bounty
+    await claim_bounty(1, 1, db=db)
+    await _assert_indexed(engine, captured, "bounties", "ix_bounties_status_claimed")
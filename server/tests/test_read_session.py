@@ -0,0 +1,83 @@
+"""只读引擎（read_engine）测试：query_only 拒写、读到已提交数据、GET 路由走只读依赖"""
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app.core.database import Base, engine, async_session, async_read_session, get_db, get_read_db
+from app.models import Agent
+from main import app
+
+
+@pytest_asyncio.fixture(autouse=True)
+async def setup_db():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_session() as db:
+        db.add(Agent(id=0, name="Human", persona="human", model="none"))
+        await db.commit()
+    yield
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+
+
+@pytest.mark.asyncio
+async def test_read_session_rejects_writes():
+    """只读连接上的写入被 SQLite 拒绝"""
+    async with async_read_session() as db:
+        db.add(Agent(name="Intruder", persona="x"))
+        with pytest.raises(OperationalError, match="readonly"):
+            await db.flush()
+
+
+@pytest.mark.asyncio
+async def test_read_session_sees_committed_rows():
+    """写连接提交后，只读连接能读到"""
+    async with async_session() as db:
+        db.add(Agent(name="Alice", persona="p"))
+        await db.commit()
+
+    async with async_read_session() as db:
+        names = (await db.execute(text("SELECT name FROM agents ORDER BY id"))).scalars().all()
+    assert names == ["Human", "Alice"]
+
+
+@pytest.mark.asyncio
+async def test_read_does_not_block_open_write_transaction():
+    """写事务持锁期间，只读连接仍可读取（WAL + DEFERRED）"""
+    async with async_session() as writer:
+        writer.add(Agent(name="Pending", persona="p"))
+        await writer.flush()  # 已持有 RESERVED 锁，未提交
+
+        async with async_read_session() as reader:
+            count = (await reader.execute(text("SELECT COUNT(*) FROM agents"))).scalar()
+        assert count == 1
+
+        await writer.commit()
+
+
+@pytest.mark.parametrize("module", ["agents", "bounties", "chat", "city", "memory", "shop", "work"])
+def test_get_routes_use_read_dependency(module):
+    """所有 GET 路由依赖 get_read_db，不再占用写连接"""
+    import importlib
+    router = importlib.import_module(f"app.api.{module}").router
+    for route in router.routes:
+        if "GET" not in getattr(route, "methods", set()):
+            continue
+        calls = {d.call for d in route.dependant.dependencies}
+        assert get_db not in calls, route.path
+
+
+@pytest.mark.asyncio
+async def test_get_endpoint_via_read_session():
+    async with async_session() as db:
+        db.add(Agent(name="Alice", persona="p"))
+        await db.commit()
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        r = await client.get("/api/agents/")
+    assert r.status_code == 200
+    assert [a["name"] for a in r.json()] == ["Alice"]
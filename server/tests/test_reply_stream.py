@@ -0,0 +1,240 @@
+"""流式回复：网关拼装流式分片、message_delta 草稿帧、new_message 带 draft_id 替换草稿"""
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import httpx
+import pytest
+import pytest_asyncio
+from openai import RateLimitError
+from openai.types.chat import ChatCompletionChunk
+
+from app.api.ws_topics import event_topics
+from app.core.config import ModelProvider
+from app.core.database import Base, engine, async_session
+from app.models import Agent
+from app.services.agent_runner import AgentRunner
+from app.services.llm_gateway import LLMGateway
+from app.services.reply_stream import ReplyStream
+
+OPENAI = "app.services.llm_gateway.AsyncOpenAI"
+BROADCAST = "app.api.chat.broadcast"
+DELIVER_LOCAL = "app.api.chat.deliver_local"
+PROVIDER = ModelProvider(name="fake", model_id="fake-model")
+
+
+def _chunk(content=None, *, tool_call=None, finish=None, usage=None):
+    choices = []
+    if content is not None or tool_call is not None or finish is not None:
+        delta = {"content": content}
+        if tool_call is not None:
+            delta["tool_calls"] = [tool_call]
+        choices.append({"index": 0, "delta": delta, "finish_reason": finish})
+    return ChatCompletionChunk.model_validate({
+        "id": "c1", "object": "chat.completion.chunk", "created": 1, "model": "fake-model",
+        "choices": choices, "usage": usage,
+    })
+
+
+def _stream(*chunks):
+    async def gen():
+        for c in chunks:
+            yield c
+    return gen()
+
+
+def _client(*streams):
+    client = MagicMock()
+    client.chat.completions.create = AsyncMock(side_effect=list(streams))
+    return client
+
+
+@pytest.mark.asyncio
+async def test_chat_stream_assembles_completion():
+    gateway = LLMGateway(rate_per_s=0)
+    deltas = []
+
+    async def on_delta(text):
+        deltas.append(text)
+
+    usage = {"prompt_tokens": 3, "completion_tokens": 2, "total_tokens": 5}
+    client = _client(_stream(_chunk("你"), _chunk("好"), _chunk(finish="stop"), _chunk(usage=usage)))
+    with patch(OPENAI, return_value=client):
+        response = await gateway.chat_stream(PROVIDER, on_delta, messages=[], max_tokens=5)
+
+    assert deltas == ["你", "好"]
+    assert response.choices[0].message.content == "你好"
+    assert response.choices[0].message.tool_calls is None
+    assert response.usage.total_tokens == 5
+    kwargs = client.chat.completions.create.call_args.kwargs
+    assert kwargs["stream"] is True and kwargs["model"] == "fake-model"
+
+
+@pytest.mark.asyncio
+async def test_chat_stream_accumulates_tool_calls():
+    gateway = LLMGateway(rate_per_s=0)
+    client = _client(_stream(
+        _chunk(tool_call={"index": 0, "id": "t1", "type": "function", "function": {"name": "check", "arguments": '{"a"'}}),
+        _chunk(tool_call={"index": 0, "function": {"arguments": ": 1}"}}, finish="tool_calls"),
+    ))
+    with patch(OPENAI, return_value=client):
+        response = await gateway.chat_stream(PROVIDER, AsyncMock(), messages=[])
+    (tc,) = response.choices[0].message.tool_calls
+    assert (tc.id, tc.function.name, tc.function.arguments) == ("t1", "check", '{"a": 1}')
+
+
+@pytest.mark.asyncio
+async def test_chat_stream_retries_only_before_first_chunk():
+    gateway = LLMGateway(rate_per_s=0, backoff_base=0)
+    request = httpx.Request("POST", "http://fake")
+    limited = RateLimitError("slow down", response=httpx.Response(429, request=request), body=None)
+    client = _client(limited, _stream(_chunk("ok")))
+    with patch(OPENAI, return_value=client):
+        response = await gateway.chat_stream(PROVIDER, AsyncMock(), messages=[])
+    assert response.choices[0].message.content == "ok" and gateway.retries == 1
+
+    async def broken():
+        yield _chunk("半")
+        raise limited
+
+    gateway = LLMGateway(rate_per_s=0, backoff_base=0)
+    client = _client(broken(), _stream(_chunk("不该重试")))
+    with patch(OPENAI, return_value=client):
+        with pytest.raises(RateLimitError):
+            await gateway.chat_stream(PROVIDER, AsyncMock(), messages=[])
+    assert client.chat.completions.create.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_reply_stream_batches_deltas_and_aborts():
+    with patch(DELIVER_LOCAL) as deliver:
+        stream = ReplyStream(1, "Alice", interval=60)
+        await stream.abort()
+        assert deliver.call_count == 0  # 没推过草稿，不必通知丢弃
+
+        await stream.push("a")  # 第一段立即推出
+        await stream.push("b")
+        await stream.push("c")
+        await stream.flush()
+        await stream.abort()
+
+    frames = [c.args[0] for c in deliver.call_args_list]
+    assert [f["data"].get("delta") for f in frames] == ["a", "bc", None]
+    assert frames[-1]["data"]["aborted"] is True
+    assert {f["data"]["draft_id"] for f in frames} == {stream.draft_id}
+    assert event_topics(frames[0]) == {"stream", "agent:1"}
+
+
+@pytest.mark.asyncio
+async def test_runner_streams_through_on_delta():
+    runner = AgentRunner(1, "Alice", "p", "m")
+    stream = ReplyStream(1, "Alice", interval=0)
+    client = _client(_stream(_chunk("你好"), _chunk("呀")))
+    with patch("app.services.llm_gateway.llm_gateway.route", return_value=PROVIDER), \
+         patch(OPENAI, return_value=client), \
+         patch(DELIVER_LOCAL) as deliver:
+        reply, _usage, _mem = await runner.generate_reply([{"name": "Bob", "content": "hi"}], on_delta=stream.push)
+
+    assert reply == "你好呀"
+    assert [c.args[0]["data"]["delta"] for c in deliver.call_args_list] == ["你好", "呀"]
+
+
+@pytest_asyncio.fixture
+async def db():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_session() as session:
+        session.add(Agent(id=1, name="Alice", persona="p", model="m"))
+        await session.commit()
+        yield session
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+
+
+@pytest.mark.asyncio
+async def test_final_message_carries_draft_id(db):
+    from app.api.chat import send_agent_message
+
+    with patch(BROADCAST, new_callable=AsyncMock) as broadcast:
+        await send_agent_message(1, "Alice", "完整回复", db, draft_id="draft-x")
+        await send_agent_message(1, "Alice", "普通回复", db)
+
+    with_draft, plain = (c.args[0]["data"] for c in broadcast.await_args_list)
+    assert with_draft["draft_id"] == "draft-x" and with_draft["content"] == "完整回复"
+    assert "draft_id" not in plain
+
+
+@pytest.mark.asyncio
+async def test_reply_broadcast_after_commit(db):
+    from sqlalchemy import func, select
+
+    from app.api.chat import submit_reply
+    from app.models import Message
+
+    seen = []
+
+    async def check(frame):
+        async with async_session() as other:  # 另一个连接能读到，说明已经提交
+            seen.append(await other.scalar(select(func.count()).select_from(Message)))
+
+    with patch(BROADCAST, side_effect=check):
+        await submit_reply(1, "Alice", "回复", None, draft_id="draft-y")
+    assert seen == [1]
+
+
+@pytest.mark.asyncio
+async def test_draft_frames_skip_log_and_bus():
+    from app.api import chat
+
+    ws, sender = object(), MagicMock()
+    sender.codec = chat.JSON_CODEC
+    last_seq = chat.event_log.last_seq
+    with patch.dict(chat._senders, {ws: sender}), \
+         patch.object(chat.topic_index, "subscribers", return_value={ws}), \
+         patch.object(chat.event_bus, "publish", new_callable=AsyncMock) as publish:
+        stream = ReplyStream(1, "Alice", interval=0)
+        await stream.push("半句")
+
+    publish.assert_not_awaited()
+    assert chat.event_log.last_seq == last_seq  # 不占 seq、不进补发缓冲
+    (frame,), _ = sender.enqueue.call_args
+    assert '"delta":"半句"' in frame.replace(" ", "") and '"seq"' not in frame
+
+
+@pytest.mark.asyncio
+async def test_draft_aborted_when_persist_fails():
+    from app.api.chat import run_wakeup_replies
+
+    async def generate(history, db=None, on_delta=None):
+        await on_delta("半句")
+        return "半句话", None, []
+
+    runner = MagicMock()
+    runner.generate_reply = generate
+    info = {"agent_id": 1, "agent_name": "Alice", "persona": "p", "model": "m", "history": []}
+    with patch("app.api.chat.runner_manager.get_or_create", return_value=runner), \
+         patch("app.api.chat.open_stream", return_value=ReplyStream(1, "Alice", interval=0)), \
+         patch("app.api.chat.submit_reply", AsyncMock(side_effect=RuntimeError("database is locked"))), \
+         patch(DELIVER_LOCAL) as deliver:
+        with pytest.raises(RuntimeError):
+            await run_wakeup_replies([info])
+
+    frames = [c.args[0]["data"] for c in deliver.call_args_list]
+    assert frames[0]["delta"] == "半句" and frames[-1]["aborted"] is True
+
+
+@pytest.mark.asyncio
+async def test_stream_latency_measured_to_first_chunk():
+    import asyncio
+
+    from app.core.provider_health import ProviderHealth
+
+    health = ProviderHealth(alpha=1.0)
+    gateway = LLMGateway(rate_per_s=0, health=health)
+
+    async def slow_client_side(text):
+        await asyncio.sleep(0.1)  # 推草稿慢不算供应商慢
+
+    client = _client(_stream(_chunk("a"), _chunk("b")))
+    with patch(OPENAI, return_value=client):
+        await gateway.chat_stream(PROVIDER, slow_client_side, messages=[])
+    assert health.stats(PROVIDER).latency < 0.05
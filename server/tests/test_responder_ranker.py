@@ -0,0 +1,66 @@
+"""唤醒选人本地预排序：有把握时不调小模型，模棱两可时退回小模型"""
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import numpy as np
+import pytest
+
+from app.models import Agent, Message
+from app.services.responder_ranker import ResponderRanker, embed_text
+from app.services.wakeup_service import WakeupService
+
+
+def _agent(aid, name, persona, pj=None):
+    return SimpleNamespace(id=aid, name=name, persona=persona, personality_json=pj)
+
+
+CHEF = _agent(1, "老王", "厨师，擅长川菜和火锅，喜欢聊美食做饭", {"knowledge_domains": ["烹饪", "美食"]})
+CODER = _agent(2, "小李", "程序员，写 Python 和数据库，爱聊编程和 bug")
+
+
+def test_embedding_is_normalized_and_stable():
+    v = embed_text("今天吃火锅")
+    assert v.dtype == np.float32 and abs(float(np.linalg.norm(v)) - 1) < 1e-5
+    assert np.array_equal(v, embed_text("今天吃火锅"))
+    assert not embed_text("").any()
+
+
+def test_picks_clear_winner():
+    ranker = ResponderRanker(min_score=0.1, margin=0.05)
+    assert ranker.pick("晚上吃什么？想做个川菜", [CHEF, CODER]) == 1
+    assert ranker.pick("这个 Python bug 怎么修", [CHEF, CODER]) == 2
+    assert ranker.decided == 2
+
+
+def test_ambiguous_defers():
+    ranker = ResponderRanker(min_score=0.1, margin=0.05)
+    assert ranker.pick("大家好", [CHEF, CODER]) is None
+    assert ranker.deferred == 1
+
+
+def test_recency_and_penalty():
+    ranker = ResponderRanker(min_score=0.0, margin=0.0, recency_weight=0.5, penalty_weight=0.5)
+    recent = [SimpleNamespace(agent_id=2), SimpleNamespace(agent_id=0)]
+    base = ranker.scores("嗯", [CHEF, CODER])
+    boosted = ranker.scores("嗯", [CHEF, CODER], recent, {1: 2})
+    assert boosted[1] - base[1] == pytest.approx(0.25)  # 倒数第二条：(0+1)/2 * 0.5
+    assert boosted[0] - base[0] == pytest.approx(-1.0)
+
+
+@pytest.mark.asyncio
+async def test_wakeup_skips_model_when_ranker_is_confident(db):
+    db.add_all([
+        Agent(id=1, name="老王", persona=CHEF.persona, personality_json=CHEF.personality_json),
+        Agent(id=2, name="小李", persona=CODER.persona),
+    ])
+    await db.commit()
+    svc = WakeupService()
+    model = AsyncMock(return_value="小李")
+    with patch("app.services.wakeup_service.call_wakeup_model", model):
+        msg = Message(agent_id=0, sender_type="human", content="今晚做川菜还是吃火锅？", mentions=[])
+        assert await svc.process(msg, set(), db) == [1]
+        model.assert_not_awaited()
+
+        msg = Message(agent_id=0, sender_type="human", content="在吗", mentions=[])
+        assert await svc.process(msg, set(), db) == [2]
+        model.assert_awaited_once()
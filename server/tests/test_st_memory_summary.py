@@ -6,6 +6,7 @@ import pytest
 
 CHAT = "app.api.chat"
 CONFIG = "app.core.config"
+GATEWAY = "app.services.llm_gateway"
 
 
 def _make_mock_provider(name="openrouter", available=True):
@@ -78,7 +79,7 @@ async def test_st_memory_content_is_llm_generated():
     entry = _make_mock_entry([provider])
 
     with patch(f"{CONFIG}.MODEL_REGISTRY", {"memory-summary-model": entry}), \
-         patch(f"{CHAT}.AsyncOpenAI", return_value=mock_client), \
+         patch(f"{GATEWAY}.AsyncOpenAI", return_value=mock_client), \
          patch(f"{CHAT}.async_session", return_value=mock_session), \
          patch(f"{CHAT}.memory_service") as mock_mem_svc:
         mock_mem_svc.save_memory = AsyncMock(side_effect=capture_save)
@@ -122,7 +123,7 @@ async def test_st_fallback_chain_no_error_no_block():
     entry = _make_mock_entry([provider])
 
     with patch(f"{CONFIG}.MODEL_REGISTRY", {"memory-summary-model": entry}), \
-         patch(f"{CHAT}.AsyncOpenAI", return_value=mock_client), \
+         patch(f"{GATEWAY}.AsyncOpenAI", return_value=mock_client), \
          patch(f"{CHAT}.async_session", return_value=mock_session), \
          patch(f"{CHAT}.memory_service") as mock_mem_svc:
         mock_mem_svc.save_memory = AsyncMock(side_effect=capture_save)
@@ -0,0 +1,76 @@
+"""状态变更合并：窗口内每个 agent 只保留最终状态，"所有 agent → X" 一条 UPDATE + 一帧 batch"""
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from sqlalchemy import select
+
+from app.models import Agent, AgentStatus
+from app.services import status_helper
+from app.services.status_helper import StatusAggregator, set_agent_status, set_all_agents_status
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+def aggregator(monkeypatch):
+    """独立的合并器，不受其他测试残留的积压影响"""
+    agg = StatusAggregator(window=60)
+    monkeypatch.setattr(status_helper, "status_aggregator", agg)
+    return agg
+
+
+async def test_window_collapses_to_final_state():
+    agg = StatusAggregator(window=0.02)
+    with patch("app.api.chat.broadcast", new_callable=AsyncMock) as mock_bc:
+        for status in ("thinking", "executing", "idle"):
+            agg.record(1, "Alice", status, "")
+        agg.record(2, "Bob", "thinking", "分析中")
+        assert agg.pending == 2
+        mock_bc.assert_not_awaited()
+
+        await asyncio.sleep(0.05)
+
+    mock_bc.assert_awaited_once()
+    data = mock_bc.await_args.args[0]["data"]
+    assert data["event"] == "agent_status_batch"
+    assert [(a["agent_id"], a["status"]) for a in data["agents"]] == [(1, "idle"), (2, "thinking")]
+    assert agg.pending == 0
+
+
+async def test_coalesced_set_agent_status_skips_single_event(db, aggregator, write_through):
+    db.add(Agent(id=1, name="Alice", persona="p"))
+    await db.commit()
+    agent = await db.get(Agent, 1)
+
+    with patch("app.api.chat.broadcast", new_callable=AsyncMock) as mock_bc:
+        await set_agent_status(agent, AgentStatus.THINKING, "思考中…", db, coalesce=True)
+        await set_agent_status(agent, AgentStatus.IDLE, "", db, coalesce=True)
+        mock_bc.assert_not_awaited()
+        assert aggregator.pending == 1
+        await aggregator.flush()
+
+    mock_bc.assert_awaited_once()
+    assert mock_bc.await_args.args[0]["data"]["agents"] == [
+        {"agent_id": 1, "agent_name": "Alice", "status": "idle", "activity": ""},
+    ]
+
+
+async def test_set_all_agents_status_one_frame(db, aggregator):
+    db.add_all([Agent(id=0, name="Human", persona="human", model="none")] +
+               [Agent(id=i, name=f"A{i}", persona="p") for i in range(1, 6)])
+    await db.commit()
+    loaded = await db.get(Agent, 3)
+
+    with patch("app.api.chat.broadcast", new_callable=AsyncMock) as mock_bc:
+        n = await set_all_agents_status(AgentStatus.THINKING, "正在分析环境…", db)
+
+    assert n == 5
+    assert loaded.status == "thinking"
+    rows = dict((await db.execute(select(Agent.id, Agent.status))).all())
+    assert rows == {0: "idle", 1: "thinking", 2: "thinking", 3: "thinking", 4: "thinking", 5: "thinking"}
+
+    mock_bc.assert_awaited_once()
+    agents = mock_bc.await_args.args[0]["data"]["agents"]
+    assert sorted(a["agent_id"] for a in agents) == [1, 2, 3, 4, 5]
+    assert {a["activity"] for a in agents} == {"正在分析环境…"}
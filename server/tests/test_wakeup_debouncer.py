@@ -0,0 +1,78 @@
+"""唤醒防抖：一阵连发只决策一次，过时的决策被取消"""
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.services.wakeup_debouncer import WakeupDebouncer
+
+
+@pytest.fixture
+def chat():
+    decide = AsyncMock(return_value=[{"agent_id": 1}])
+    replies = AsyncMock()
+    with patch("app.api.chat.decide_wakeup", decide), patch("app.api.chat.run_wakeup_replies", replies):
+        yield decide, replies
+
+
+@pytest.mark.asyncio
+async def test_burst_decided_once(chat):
+    decide, replies = chat
+    debouncer = WakeupDebouncer(window=0.03, max_wait=1)
+    for batch in (["a"], ["b", "c"], ["d"]):
+        debouncer.submit(batch)
+        await asyncio.sleep(0.01)
+    decide.assert_not_awaited()
+    await asyncio.sleep(0.06)
+
+    decide.assert_awaited_once_with(["a", "b", "c", "d"])
+    replies.assert_awaited_once_with([{"agent_id": 1}])
+    assert debouncer.decisions == 1 and debouncer.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_stale_decision_cancelled(chat):
+    decide, replies = chat
+    gate = asyncio.Event()
+    calls = []
+
+    async def slow_decide(burst):
+        calls.append(list(burst))
+        if len(calls) == 1:
+            await gate.wait()  # 第一次决策卡在小模型调用上
+        return []
+
+    decide.side_effect = slow_decide
+    debouncer = WakeupDebouncer(window=0.01, max_wait=1)
+    debouncer.submit(["a"])
+    await asyncio.sleep(0.03)
+    assert calls == [["a"]]
+
+    debouncer.submit(["b"])
+    await asyncio.sleep(0.03)
+    assert calls == [["a"], ["a", "b"]]
+    assert debouncer.cancelled == 1 and debouncer.decisions == 1
+    replies.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_max_wait_caps_delay(chat):
+    decide, _ = chat
+    debouncer = WakeupDebouncer(window=0.5, max_wait=0.1)
+    for i in range(3):
+        debouncer.submit([i])
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.2)
+    # 静默窗口还没过，但 max_wait 到了就决策
+    decide.assert_awaited_once_with([0, 1, 2])
+    await debouncer.stop()
+
+
+@pytest.mark.asyncio
+async def test_zero_window_decides_each_batch(chat):
+    decide, _ = chat
+    debouncer = WakeupDebouncer(window=0)
+    debouncer.submit(["a"])
+    debouncer.submit(["b"])
+    await asyncio.sleep(0.01)
+    assert [c.args[0] for c in decide.await_args_list] == [["a"], ["b"]]
@@ -94,3 +94,27 @@ async def test_human_message_resets_all_counts(svc, db):
 
     assert svc._no_response_count.get(1, 0) == 0
     assert svc._no_response_count.get(2, 0) == 0
+
+
+# --- process: 防抖取消后重新处理的连发只计一次 ---
+
+@pytest.mark.asyncio
+async def test_reprocessed_burst_counts_once(svc, db):
+    for i in [1, 2]:
+        db.add(Agent(id=i, name=f"agent_{i}", persona="test"))
+    first = Message(agent_id=1, sender_type="agent", content="@agent_2 a", message_type="chat", mentions=[2])
+    second = Message(agent_id=1, sender_type="agent", content="@agent_2 b", message_type="chat", mentions=[2])
+    db.add_all([first, second])
+    await db.commit()
+
+    assert await svc.process([first], online_agent_ids={1, 2}, db=db) == [2]
+    assert svc._no_response_count[1] == 1
+    # 决策被新消息打断，整段 [first, second] 重新处理：上一次的计数作废
+    assert await svc.process([first, second], online_agent_ids={1, 2}, db=db) == [2]
+    assert svc._no_response_count[1] == 1
+
+    third = Message(agent_id=1, sender_type="agent", content="@agent_2 c", message_type="chat", mentions=[2])
+    db.add(third)
+    await db.commit()
+    await svc.process([third], online_agent_ids={1, 2}, db=db)  # 新的一段照常累加
+    assert svc._no_response_count[1] == 2
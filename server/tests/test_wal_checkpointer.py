@@ -0,0 +1,87 @@
+"""SQLite 调优档位 + 后台 WAL checkpoint 测试"""
+import sqlite3
+
+import pytest
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.core.database import engine, get_sqlite_profile, SQLITE_PROFILES
+from app.services.wal_checkpointer import WalCheckpointer
+
+
+@pytest.fixture
+def wal_db(tmp_path):
+    """一个 WAL 模式的库，保持一条读连接打开，阻止连接关闭时的自动 checkpoint"""
+    path = str(tmp_path / "wal.db")
+    keeper = sqlite3.connect(path)
+    keeper.execute("PRAGMA journal_mode=WAL")
+    keeper.execute("PRAGMA wal_autocheckpoint=0")
+    keeper.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, body TEXT)")
+    keeper.executemany("INSERT INTO t (body) VALUES (?)", [("x" * 500,) for _ in range(2000)])
+    keeper.commit()
+    yield path
+    keeper.close()
+
+
+def test_unknown_profile_rejected():
+    with pytest.raises(ValueError):
+        get_sqlite_profile("turbo")
+
+
+def test_profiles_cover_same_pragmas():
+    keys = {frozenset(p) for p in SQLITE_PROFILES.values()}
+    assert len(keys) == 1
+    assert {"mmap_size", "cache_size", "temp_store", "wal_autocheckpoint", "journal_size_limit"} <= set(SQLITE_PROFILES["prod"])
+
+
+@pytest.mark.asyncio
+async def test_connect_hook_applies_profile():
+    profile = get_sqlite_profile(settings.sqlite_profile)
+    async with engine.connect() as conn:
+        cache_size = (await conn.execute(text("PRAGMA cache_size"))).scalar()
+        autockpt = (await conn.execute(text("PRAGMA wal_autocheckpoint"))).scalar()
+        limit = (await conn.execute(text("PRAGMA journal_size_limit"))).scalar()
+    assert cache_size == profile["cache_size"]
+    assert autockpt == profile["wal_autocheckpoint"]
+    assert limit == profile["journal_size_limit"]
+
+
+@pytest.mark.asyncio
+async def test_passive_below_threshold_keeps_wal_file(wal_db):
+    ckpt = WalCheckpointer(wal_db, truncate_threshold_bytes=1 << 40)
+    assert ckpt.wal_size() > 0
+
+    report = await ckpt.checkpoint()
+    assert report["mode"] == "PASSIVE"
+    assert not report["busy"]
+    assert report["checkpointed_frames"] == report["log_frames"] > 0
+    assert report["wal_bytes"] == report["wal_bytes_before"]
+    assert ckpt.last_report is report
+
+
+@pytest.mark.asyncio
+async def test_truncate_above_threshold_shrinks_wal(wal_db):
+    ckpt = WalCheckpointer(wal_db, truncate_threshold_bytes=1024)
+    report = await ckpt.checkpoint()
+    assert report["mode"] == "TRUNCATE"
+    assert report["wal_bytes_before"] > 0
+    assert report["wal_bytes"] == 0
+
+    conn = sqlite3.connect(wal_db)
+    assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 2000
+    conn.close()
+
+
+@pytest.mark.asyncio
+async def test_stop_without_start_truncates(wal_db):
+    ckpt = WalCheckpointer(wal_db, truncate_threshold_bytes=1 << 40)
+    await ckpt.stop()
+    assert ckpt.wal_size() == 0
+    assert ckpt.last_report["mode"] == "TRUNCATE"
+
+
+@pytest.mark.asyncio
+async def test_optimize_runs_through_write_queue(wal_db):
+    ckpt = WalCheckpointer(wal_db)
+    await ckpt.optimize()
+    assert ckpt._last_optimize > 0
@@ -0,0 +1,179 @@
+"""写后缓冲（WriteBehindBuffer）测试：合并计数、晋升、批量插入、定量触发、停止落盘"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, patch
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select, func as sa_func
+
+from app.core.database import Base, engine, async_session
+from app.models import Agent, Message, Memory, MemoryType, LLMUsage, MemoryReference
+from app.services.write_behind import WriteBehindBuffer
+
+
+@pytest_asyncio.fixture(autouse=True)
+async def setup_db():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_session() as db:
+        db.add(Agent(id=0, name="Human", persona="human", model="none"))
+        db.add(Agent(id=1, name="Alice", persona="p"))
+        db.add(Message(id=1, agent_id=1, sender_type="agent", content="hi"))
+        expires = datetime.now(timezone.utc) + timedelta(days=7)
+        db.add(Memory(id=1, agent_id=1, memory_type=MemoryType.SHORT, content="a", access_count=0, expires_at=expires))
+        db.add(Memory(id=2, agent_id=1, memory_type=MemoryType.SHORT, content="b", access_count=3, expires_at=expires))
+        await db.commit()
+    yield
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+
+
+def _usage(agent_id=1):
+    return {
+        "model": "m", "agent_id": agent_id, "prompt_tokens": 10,
+        "completion_tokens": 5, "total_tokens": 15, "latency_ms": 100,
+    }
+
+
+async def _memory(mid: int) -> Memory:
+    async with async_session() as db:
+        return await db.get(Memory, mid)
+
+
+async def _count(model) -> int:
+    async with async_session() as db:
+        return (await db.execute(select(sa_func.count()).select_from(model))).scalar()
+
+
+@pytest.mark.asyncio
+async def test_access_counts_are_merged_and_promoted():
+    """同一 memory 多次命中合并成一次累加；达到阈值晋升为长期记忆"""
+    buf = WriteBehindBuffer()
+    buf.record_memory_access([1, 2])
+    buf.record_memory_access([1, 2])
+    assert buf.pending == 2
+
+    await buf.flush()
+
+    m1, m2 = await _memory(1), await _memory(2)
+    assert m1.access_count == 2
+    assert m1.memory_type == MemoryType.SHORT
+    assert m2.access_count == 5
+    assert m2.memory_type == MemoryType.LONG
+    assert m2.expires_at is None
+    assert buf.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_usage_and_refs_bulk_inserted():
+    buf = WriteBehindBuffer()
+    for _ in range(3):
+        buf.record_llm_usage(_usage())
+    buf.record_memory_refs(1, [1, 2])
+
+    assert await buf.flush() == 5
+    assert await _count(LLMUsage) == 3
+    assert await _count(MemoryReference) == 2
+
+
+@pytest.mark.asyncio
+async def test_size_threshold_triggers_flush():
+    """缓冲达到 max_pending 时不等定时器立即落盘"""
+    buf = WriteBehindBuffer(flush_interval=60, max_pending=3)
+    await buf.start()
+    try:
+        for _ in range(3):
+            buf.record_llm_usage(_usage())
+        for _ in range(50):
+            if await _count(LLMUsage) == 3:
+                break
+            await asyncio.sleep(0.02)
+        assert await _count(LLMUsage) == 3
+    finally:
+        await buf.stop()
+
+
+@pytest.mark.asyncio
+async def test_stop_flushes_pending():
+    buf = WriteBehindBuffer(flush_interval=60)
+    await buf.start()
+    buf.record_llm_usage(_usage())
+    buf.record_memory_access([1])
+    await buf.stop()
+
+    assert not buf.running
+    assert await _count(LLMUsage) == 1
+    assert (await _memory(1)).access_count == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_data():
+    buf = WriteBehindBuffer()
+    buf.record_memory_access([1])
+    buf.record_llm_usage(_usage())
+    with patch("app.services.write_behind.write_queue.submit", new_callable=AsyncMock, side_effect=RuntimeError("disk")):
+        with pytest.raises(RuntimeError):
+            await buf.flush()
+    assert buf.pending == 2
+
+    await buf.flush()
+    assert (await _memory(1)).access_count == 1
+    assert await _count(LLMUsage) == 1
+
+
+@pytest.mark.asyncio
+async def test_bad_row_is_dropped_and_rest_written():
+    """整批失败后逐行重试：写不进去的坏行丢弃，同批其他行照常落盘，缓冲清空"""
+    buf = WriteBehindBuffer()
+    buf.record_memory_access([1])
+    buf.record_llm_usage(_usage())
+    buf.record_llm_usage({**_usage(), "model": None})  # NOT NULL 约束失败
+    buf.record_memory_refs(1, [1])
+
+    assert await buf.flush() == 3
+    assert buf.pending == 0
+    assert (await _memory(1)).access_count == 1
+    assert await _count(LLMUsage) == 1
+    assert await _count(MemoryReference) == 1
+
+
+@pytest.mark.asyncio
+async def test_persistent_failure_drops_after_max_retries():
+    buf = WriteBehindBuffer(max_retries=2)
+    buf.record_llm_usage(_usage())
+    with patch("app.services.write_behind.write_queue.submit", new_callable=AsyncMock, side_effect=RuntimeError("disk")):
+        with pytest.raises(RuntimeError):
+            await buf.flush()
+        assert buf.pending == 1
+        with pytest.raises(RuntimeError):
+            await buf.flush()
+    assert buf.pending == 0
+    assert await buf.flush() == 0
+
+
+@pytest.mark.asyncio
+async def test_search_defers_access_count_when_running():
+    """缓冲运行时 search 不提交，返回值已反映新计数，落盘后一致"""
+    from app.services import write_behind as wb_module
+    from app.services.memory_service import memory_service
+
+    buf = WriteBehindBuffer(flush_interval=60)
+    await buf.start()
+    mock_results = [{"memory_id": 2, "text": "b", "_distance": 0.1}]
+    try:
+        with (
+            patch.object(wb_module, "write_behind", buf),
+            patch("app.services.memory_service.vector_store.search_memories",
+                  new_callable=AsyncMock, return_value=mock_results),
+        ):
+            async with async_session() as db:
+                results = await memory_service.search(1, "b", db=db)
+                assert results[0].access_count == 4
+                assert not db.dirty
+            assert (await _memory(2)).access_count == 3
+    finally:
+        await buf.stop()
+
+    assert (await _memory(2)).access_count == 4
@@ -0,0 +1,158 @@
+"""单写者提交队列（WriteQueue）测试：组提交、SAVEPOINT 隔离、停止前排空"""
+import asyncio
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import event, select, func as sa_func
+
+from app.core.database import Base, engine, async_session, writer_engine, WriteQueue
+from app.models import Agent, Message
+
+
+@pytest_asyncio.fixture(autouse=True)
+async def setup_db():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_session() as db:
+        db.add(Agent(id=0, name="Human", persona="human", model="none"))
+        await db.commit()
+    yield
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+
+
+@pytest.fixture
+def commit_counter():
+    """统计写入者连接上的 COMMIT 次数"""
+    counter = {"n": 0}
+
+    def _on_commit(conn):
+        counter["n"] += 1
+
+    event.listen(writer_engine.sync_engine, "commit", _on_commit)
+    yield counter
+    event.remove(writer_engine.sync_engine, "commit", _on_commit)
+
+
+def _insert_message(content: str):
+    async def work(db):
+        msg = Message(agent_id=0, sender_type="human", content=content)
+        db.add(msg)
+        await db.flush()
+        return msg.id
+    return work
+
+
+async def _count_messages() -> int:
+    async with async_session() as db:
+        return (await db.execute(select(sa_func.count(Message.id)))).scalar()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_submits_are_group_committed(commit_counter):
+    """并发提交的闭包在一个事务里提交"""
+    queue = WriteQueue(batch_window=0.05, max_batch=64)
+    await queue.start()
+    try:
+        ids = await asyncio.gather(*[queue.submit(_insert_message(f"m{i}")) for i in range(20)])
+    finally:
+        await queue.stop()
+
+    assert len(set(ids)) == 20
+    assert await _count_messages() == 20
+    assert commit_counter["n"] == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_work_only_rolls_back_own_savepoint():
+    """一个闭包失败不影响同批其他闭包"""
+    async def bad(db):
+        db.add(Message(agent_id=0, sender_type="human", content="doomed"))
+        await db.flush()
+        raise ValueError("boom")
+
+    queue = WriteQueue(batch_window=0.05)
+    await queue.start()
+    try:
+        results = await asyncio.gather(
+            queue.submit(_insert_message("ok-1")),
+            queue.submit(bad),
+            queue.submit(_insert_message("ok-2")),
+            return_exceptions=True,
+        )
+    finally:
+        await queue.stop()
+
+    assert isinstance(results[1], ValueError)
+    async with async_session() as db:
+        contents = (await db.execute(select(Message.content))).scalars().all()
+    assert sorted(contents) == ["ok-1", "ok-2"]
+
+
+@pytest.mark.asyncio
+async def test_max_batch_splits_commits(commit_counter):
+    """超过 max_batch 拆成多次提交"""
+    queue = WriteQueue(batch_window=0.05, max_batch=5)
+    await queue.start()
+    try:
+        await asyncio.gather(*[queue.submit(_insert_message(f"m{i}")) for i in range(12)])
+    finally:
+        await queue.stop()
+
+    assert await _count_messages() == 12
+    assert commit_counter["n"] == 3
+
+
+@pytest.mark.asyncio
+async def test_stop_drains_pending_work():
+    """stop() 前已入队的闭包都会提交"""
+    queue = WriteQueue(batch_window=0.2)
+    await queue.start()
+    pending = [asyncio.create_task(queue.submit(_insert_message(f"m{i}"))) for i in range(5)]
+    await asyncio.sleep(0)
+    await queue.stop()
+    await asyncio.gather(*pending)
+
+    assert await _count_messages() == 5
+
+
+@pytest.mark.asyncio
+async def test_submit_inline_when_not_running():
+    """写入者未启动时内联执行并提交"""
+    queue = WriteQueue()
+    assert not queue.running
+    msg_id = await queue.submit(_insert_message("inline"))
+
+    async with async_session() as db:
+        msg = await db.get(Message, msg_id)
+    assert msg.content == "inline"
+
+
+@pytest.mark.asyncio
+async def test_submit_with_notices_sends_after_commit_and_drops_on_failure():
+    """notices 在批次提交之后才发；闭包失败时一条都不发"""
+    sent = []
+
+    async def notice(tag):
+        sent.append((tag, await _count_messages()))
+
+    async def ok(db, notices):
+        db.add(Message(agent_id=0, sender_type="human", content="ok"))
+        await db.flush()
+        notices.append(lambda: notice("ok"))
+
+    async def bad(db, notices):
+        notices.append(lambda: notice("bad"))
+        raise ValueError("boom")
+
+    queue = WriteQueue(batch_window=0.01)
+    await queue.start()
+    try:
+        await queue.submit_with_notices(ok)
+        with pytest.raises(ValueError):
+            await queue.submit_with_notices(bad)
+    finally:
+        await queue.stop()
+
+    assert sent == [("ok", 1)]
@@ -0,0 +1,70 @@
+"""集中式心跳时间轮：每连接每圈一次 ping，超时整批驱逐"""
+import asyncio
+
+import pytest
+
+from app.api.ws_heartbeat import HeartbeatWheel
+
+
+def _wheel(slots=4, timeout=10.0):
+    pinged, evicted = [], []
+
+    def send_ping(ws):
+        pinged.append(ws)
+        return ws != "closed"
+
+    wheel = HeartbeatWheel(interval=4.0, slots=slots, timeout=timeout,
+                           send_ping=send_ping, on_evict=evicted.extend)
+    return wheel, pinged, evicted
+
+
+@pytest.mark.asyncio
+async def test_each_connection_pinged_once_per_revolution():
+    wheel, pinged, _ = _wheel()
+    for ws in ("a", "b", "c"):
+        wheel.add(ws)
+    for _ in range(4):
+        wheel.tick()
+    assert sorted(pinged) == ["a", "b", "c"]
+    for _ in range(4):
+        wheel.tick()
+    assert len(pinged) == 6
+    await wheel.stop()
+
+
+@pytest.mark.asyncio
+async def test_zombies_evicted_in_bulk():
+    wheel, pinged, evicted = _wheel(slots=1, timeout=10.0)
+    for ws in ("a", "b", "alive"):
+        wheel.add(ws)
+    now = wheel._last_seen["a"] + 11
+    wheel._last_seen["alive"] = now
+    assert sorted(wheel.tick(now)) == ["a", "b"]
+    assert sorted(evicted) == ["a", "b"]
+    assert pinged == ["alive"] and len(wheel) == 1
+    await wheel.stop()
+
+
+@pytest.mark.asyncio
+async def test_closed_sender_dropped_and_remove():
+    wheel, _, evicted = _wheel(slots=1)
+    wheel.add("closed")
+    wheel.add("gone")
+    wheel.remove("gone")
+    wheel.tick()
+    assert evicted == ["closed"] and len(wheel) == 0
+    await wheel.stop()
+
+
+@pytest.mark.asyncio
+async def test_single_background_task():
+    wheel, pinged, _ = _wheel()
+    wheel.interval = 0.04
+    for i in range(50):
+        wheel.add(i)
+    task = wheel._task
+    assert task is not None
+    await asyncio.sleep(0.1)
+    assert wheel._task is task
+    assert set(pinged) == set(range(50))
+    await wheel.stop()
@@ -0,0 +1,53 @@
+"""WebSocket 帧编码协商：JSON 默认，MessagePack 可选"""
+import pytest
+
+from app.api import ws_protocol
+from app.api.event_log import EventLog
+from app.api.ws_protocol import JSON_CODEC, decode_frame, negotiate
+
+
+def test_default_is_json():
+    codec, sub = negotiate(None, [])
+    assert codec is JSON_CODEC and sub is None
+    assert negotiate("json", ["botciv.json"]) == (JSON_CODEC, "botciv.json")
+
+
+def test_unknown_proto_rejected():
+    with pytest.raises(ValueError):
+        negotiate("protobuf", [])
+
+
+def test_msgpack_falls_back_to_json_when_unavailable(monkeypatch):
+    monkeypatch.setattr(ws_protocol, "MSGPACK_CODEC", None)
+    codec, sub = negotiate(None, ["botciv.msgpack"])
+    assert codec is JSON_CODEC and sub is None
+    assert negotiate("msgpack", ["botciv.msgpack", "botciv.json"]) == (JSON_CODEC, "botciv.json")
+
+
+def test_msgpack_short_keys_roundtrip():
+    msgpack = pytest.importorskip("msgpack")
+    codec, sub = negotiate("msgpack", ["botciv.msgpack"])
+    assert codec.binary and sub == "botciv.msgpack"
+
+    # 与代码同名、以 ~ 开头的原字段名要转义；非 str 键同 JSON 一样转成 str
+    extra = {5: "x", "t": 1, "~a": 2, "other": 3}
+    data = {"type": "new_message", "seq": 3, "data": {"id": 9, "content": "你好", "extra": extra}}
+    frame = codec.encode(data)
+    raw = msgpack.unpackb(frame)
+    assert raw["t"] == "new_message" and raw["s"] == 3
+    assert raw["d"]["extra"] == {"5": "x", "~t": 1, "~~a": 2, "other": 3}
+    assert len(frame) < len(JSON_CODEC.encode(data).encode())
+
+    expected = {**data, "data": {**data["data"], "extra": {"5": "x", "t": 1, "~a": 2, "other": 3}}}
+    assert decode_frame({"bytes": frame}) == expected
+    assert decode_frame({"text": '{"type":"pong"}'}) == {"type": "pong"}
+
+
+def test_event_frames_cached_per_codec():
+    pytest.importorskip("msgpack")
+    codec = ws_protocol.MSGPACK_CODEC
+    event = EventLog().append({"type": "system_event", "data": {"event": "agent_online"}})
+    assert event.frame_for(JSON_CODEC) is event.frame
+    packed = event.frame_for(codec)
+    assert isinstance(packed, bytes) and event.frame_for(codec) is packed
+    assert codec.decode(packed)["seq"] == 1
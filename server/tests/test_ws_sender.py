@@ -0,0 +1,153 @@
+"""WebSocket 每连接发送队列测试：慢连接不阻塞广播、溢出策略、状态事件合并"""
+import asyncio
+import json
+from unittest.mock import patch
+
+import pytest
+
+from app.api import chat
+from app.api.ws_sender import COALESCE, DISCONNECT, DROP_OLDEST, ConnectionSender, coalesce_key
+from app.api.ws_topics import TopicIndex
+
+
+class FakeWS:
+    """记录发出的帧；gate 未放行前 send_text 一直挂起，模拟慢客户端"""
+
+    def __init__(self, slow: bool = False, broken: bool = False):
+        self.sent: list[str] = []
+        self.closed_with: int | None = None
+        self.broken = broken
+        self.gate = asyncio.Event()
+        if not slow:
+            self.gate.set()
+
+    async def send_text(self, text: str):
+        if self.broken:
+            raise RuntimeError("connection reset")
+        await self.gate.wait()
+        self.sent.append(text)
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        self.closed_with = code
+
+
+def _status(agent_id: int, status: str) -> dict:
+    return {"type": "system_event", "data": {"event": "agent_status_change", "agent_id": agent_id, "status": status}}
+
+
+def test_coalesce_key():
+    assert coalesce_key(_status(1, "idle")) == ("agent_status_change", 1)
+    assert coalesce_key({"type": "system_event", "data": {"event": "agent_online", "agent_id": 2}}) == ("presence", 2)
+    assert coalesce_key({"type": "system_event", "data": {"event": "agent_offline", "agent_id": 2}}) == ("presence", 2)
+    assert coalesce_key({"type": "new_message", "data": {"id": 1}}) is None
+
+
+@pytest.mark.asyncio
+async def test_drop_oldest_when_full():
+    ws = FakeWS(slow=True)
+    sender = ConnectionSender(ws, maxsize=3, policy=DROP_OLDEST)
+    await asyncio.sleep(0)
+    assert sender.enqueue("msg")
+    for i in range(5):
+        assert sender.enqueue(str(i), ("agent_status_change", i))
+    assert sender.pending == 3
+    assert sender.dropped == 3
+
+    ws.gate.set()
+    await asyncio.sleep(0.01)
+    assert ws.sent == ["msg", "3", "4"]  # 聊天帧不丢，丢最旧的状态帧
+    await sender.aclose()
+
+
+@pytest.mark.asyncio
+async def test_full_of_chat_frames_disconnects():
+    ws = FakeWS(slow=True)
+    failed = []
+    sender = ConnectionSender(ws, maxsize=2, policy=DROP_OLDEST, on_failed=failed.append)
+    assert sender.enqueue("a") and sender.enqueue("b")
+    assert not sender.enqueue("c")
+    assert sender.dropped == 0
+    await sender._close_task
+    assert sender.closed and failed == [sender]
+    assert ws.closed_with == 1013
+
+
+@pytest.mark.asyncio
+async def test_coalesce_keeps_latest_state_only():
+    ws = FakeWS(slow=True)
+    sender = ConnectionSender(ws, maxsize=10, policy=COALESCE)
+    for status in ("thinking", "executing", "idle"):
+        sender.enqueue(status, ("agent_status_change", 1))
+    sender.enqueue("msg", None)
+    sender.enqueue("other", ("agent_status_change", 2))
+    assert sender.pending == 3
+
+    ws.gate.set()
+    await asyncio.sleep(0.01)
+    assert ws.sent == ["idle", "msg", "other"]
+    await sender.aclose()
+
+
+@pytest.mark.asyncio
+async def test_disconnect_policy_closes_connection():
+    ws = FakeWS(slow=True)
+    failed = []
+    sender = ConnectionSender(ws, maxsize=2, policy=DISCONNECT, on_failed=failed.append)
+    assert sender.enqueue("a") and sender.enqueue("b")
+    assert not sender.enqueue("c")
+    await asyncio.sleep(0)
+    assert sender.closed
+    assert failed == [sender]
+    assert ws.closed_with == 1013
+
+
+def test_unknown_policy_rejected():
+    with pytest.raises(ValueError):
+        ConnectionSender(FakeWS(), policy="block")
+
+
+# ── broadcast 接入 ──
+
+@pytest.mark.asyncio
+async def test_broadcast_not_blocked_by_slow_client():
+    slow, fast = FakeWS(slow=True), FakeWS()
+    with (
+        patch.object(chat, "human_connections", {}),
+        patch.object(chat, "bot_connections", {}),
+        patch.object(chat, "_senders", {}),
+        patch.object(chat, "topic_index", TopicIndex()),
+    ):
+        chat._register_connection(0, slow, "human")
+        chat._register_connection(1, fast, "bot")
+        await asyncio.wait_for(chat.broadcast({"type": "new_message", "data": {"id": 1}}), timeout=0.1)
+        await asyncio.sleep(0.01)
+        assert json.loads(fast.sent[0])["data"]["id"] == 1
+        assert slow.sent == []
+
+        slow.gate.set()
+        await asyncio.sleep(0.01)
+        assert slow.sent == fast.sent
+        for aid, ws in ((0, slow), (1, fast)):
+            chat._remove_connection(aid, ws)
+            await chat._senders.pop(ws).aclose()
+
+
+@pytest.mark.asyncio
+async def test_broadcast_drops_failed_connection():
+    good, bad = FakeWS(), FakeWS(broken=True)
+    human = {}
+    with (
+        patch.object(chat, "human_connections", human),
+        patch.object(chat, "bot_connections", {}),
+        patch.object(chat, "_senders", {}),
+        patch.object(chat, "topic_index", TopicIndex()),
+    ):
+        chat._register_connection(0, good, "human")
+        chat._register_connection(0, bad, "human")
+        await chat.broadcast({"type": "new_message", "data": {"id": 1}})
+        await asyncio.sleep(0.01)
+        assert human == {0: [good]}
+        assert bad not in chat._senders
+        assert len(good.sent) == 1
+        chat._remove_connection(0, good)
+        await chat._senders.pop(good).aclose()
@@ -0,0 +1,47 @@
+"""WebSocket 主题订阅：事件→主题映射与倒排索引"""
+import pytest
+
+from app.api.ws_topics import TOPIC_ALL, TopicIndex, event_topics, parse_topics
+
+
+def _event(event: str, **data) -> dict:
+    return {"type": "system_event", "data": {"event": event, **data}}
+
+
+def test_event_topics():
+    assert event_topics({"type": "new_message", "data": {"agent_id": 1, "mentions": [2, 3]}}) == {
+        "chat", "agent:1", "agent:2", "agent:3",
+    }
+    assert event_topics(_event("agent_status_change", agent_id=4)) == {"status", "agent:4"}
+    assert event_topics(_event("order_traded", seller_id=1, buyer_id=2)) == {"market", "agent:1", "agent:2"}
+    assert event_topics(_event("production_settled", city="长安")) == {"city"}
+    assert event_topics(_event("bounty_claimed", claimed_by=5)) == {"bounty", "agent:5"}
+    assert event_topics(_event("attribute_changed", agents=[{"agent_id": 1}, {"agent_id": 2}])) == {
+        "status", "agent:1", "agent:2",
+    }
+    assert event_topics(_event("something_new")) == {"system"}
+
+
+def test_parse_topics():
+    assert parse_topics(["chat", "agent:7", "*"]) == {"chat", "agent:7", TOPIC_ALL}
+    for bad in (["weather"], ["agent:x"], "chat", [1]):
+        with pytest.raises(ValueError):
+            parse_topics(bad)
+
+
+def test_index_routes_by_interest():
+    idx = TopicIndex()
+    everything, chat_only, agent_3 = object(), object(), object()
+    idx.add(everything)
+    idx.add(chat_only)
+    idx.add(agent_3)
+    idx.replace(chat_only, {"chat"})
+    idx.replace(agent_3, {"agent:3"})
+
+    assert idx.subscribers({"chat", "agent:1"}) == {everything, chat_only}
+    assert idx.subscribers({"market", "agent:3"}) == {everything, agent_3}
+
+    idx.unsubscribe(chat_only, {"chat"})
+    idx.remove(everything)
+    assert idx.subscribers({"chat"}) == set()
+    assert idx.topics_of(chat_only) == set()
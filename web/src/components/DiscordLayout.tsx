@@ -34,12 +34,42 @@ export function DiscordLayout() {
   }, [])
 
   const handleWsMessage = useCallback((msg: WsIncoming) => {
-    if (msg.type === 'new_message') {
+    if (msg.type === 'replay_done') {
+      // 断线期间的事件补不全（服务端重启或断线太久）：重新拉消息和 agent 状态
+      if (msg.data.gap) {
+        fetchMessages().then(setMessages).catch(console.error)
+        fetchAgents().then(setAgents).catch(console.error)
+      }
+    } else if (msg.type === 'new_message') {
       setMessages(prev => {
         // 去重：StrictMode 双连接或网络重放可能导致同一消息到达两次
         if (prev.some(m => m.id === msg.data.id)) return prev
+        // 流式回复：原地替换草稿
+        const draft = msg.data.draft_id ? prev.findIndex(m => m.draft_id === msg.data.draft_id) : -1
+        if (draft >= 0) return prev.map((m, i) => (i === draft ? msg.data : m))
         return [...prev, msg.data]
       })
+    } else if (msg.type === 'message_delta') {
+      const { draft_id, agent_id, agent_name, delta, aborted } = msg.data
+      setMessages(prev => {
+        const i = prev.findIndex(m => m.draft_id === draft_id)
+        if (aborted) return i < 0 ? prev : prev.filter((_, j) => j !== i)
+        if (i < 0) {
+          return [...prev, {
+            id: -(++_sysMsgSeq),
+            agent_id,
+            agent_name,
+            sender_type: 'agent',
+            message_type: 'chat',
+            content: delta || '',
+            mentions: [],
+            created_at: new Date().toISOString(),
+            draft_id,
+          }]
+        }
+        if (prev[i].id > 0) return prev  // 已被最终消息替换
+        return prev.map((m, j) => (j === i ? { ...m, content: m.content + (delta || '') } : m))
+      })
     } else if (msg.type === 'system_event') {
       const { event, agent_id } = msg.data
       setOnlineIds(prev => {
@@ -99,6 +129,14 @@ export function DiscordLayout() {
             : a
         ))
       }
+      // agent_status_batch → 一帧批量更新多个 agent
+      if (msg.data.event === 'agent_status_batch' && msg.data.agents) {
+        const latest = new Map(msg.data.agents.map(s => [s.agent_id, s]))
+        setAgents(prev => prev.map(a => {
+          const s = latest.get(a.id)
+          return s ? { ...a, status: s.status as Agent['status'], activity: s.activity || '' } : a
+        }))
+      }
     }
   }, [pushActivity])
 
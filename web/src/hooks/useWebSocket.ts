@@ -15,6 +15,12 @@ export function useWebSocket(agentId: number, onMessage: (msg: WsIncoming) => vo
   const onMessageRef = useRef(onMessage)
   const [connected, setConnected] = useState<boolean>(false)
   const isMockRef = useRef(false)
+  // 最后收到的广播 seq 及其 epoch，重连时服务端据此补发断线期间的事件；
+  // 服务端重启后 epoch 会变，seq 从头编号
+  const lastSeq = useRef(0)
+  const epoch = useRef('')
+  // 最后收到的消息 id：seq 补不上（gap）时服务端按它从消息表补发聊天消息
+  const lastMessageId = useRef(0)
 
   onMessageRef.current = onMessage
 
@@ -26,7 +32,14 @@ export function useWebSocket(agentId: number, onMessage: (msg: WsIncoming) => vo
       wsRef.current = null
     }
     const protocol = location.protocol === 'https:' ? 'wss:' : 'ws:'
-    const url = `${protocol}//${location.host}/api/ws/${agentId}`
+    const params = new URLSearchParams()
+    if (lastSeq.current > 0) {
+      params.set('since_seq', String(lastSeq.current))
+      params.set('epoch', epoch.current)
+    }
+    if (lastMessageId.current > 0) params.set('since_id', String(lastMessageId.current))
+    const query = params.toString()
+    const url = `${protocol}//${location.host}/api/ws/${agentId}${query ? `?${query}` : ''}`
     const ws = new WebSocket(url)
 
     ws.onopen = () => {
@@ -36,7 +49,27 @@ export function useWebSocket(agentId: number, onMessage: (msg: WsIncoming) => vo
 
     ws.onmessage = (e) => {
       try {
-        const msg: WsIncoming = JSON.parse(e.data)
+        const msg: WsIncoming | { type: 'ping'; seq?: undefined; epoch?: undefined } = JSON.parse(e.data)
+        // 服务端按最后收到的帧判断僵尸连接，空闲标签页靠回 pong 保活
+        if (msg.type === 'ping') {
+          ws.send(JSON.stringify({ type: 'pong' }))
+          return
+        }
+        if (msg.type === 'replay_done') {
+          // 补发结束：以服务端当前的 epoch / seq 为准（gap 时旧 seq 已作废）
+          epoch.current = msg.data.epoch
+          lastSeq.current = msg.data.seq
+        } else if (typeof msg.seq === 'number') {
+          if (msg.epoch && msg.epoch !== epoch.current) {
+            epoch.current = msg.epoch
+            lastSeq.current = msg.seq
+          } else if (msg.seq > lastSeq.current) {
+            lastSeq.current = msg.seq
+          }
+        }
+        if (msg.type === 'new_message' && msg.data.id > lastMessageId.current) {
+          lastMessageId.current = msg.data.id
+        }
         onMessageRef.current(msg)
       } catch {
         // ignore malformed messages
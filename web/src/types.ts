@@ -40,6 +40,8 @@ export interface Message {
   content: string
   mentions: number[]
   created_at: string
+  // 流式回复：草稿与最终消息共用的草稿 id
+  draft_id?: string
 }
 
 // WebSocket 消息协议
@@ -52,12 +54,16 @@ export interface WsSendMessage {
 export interface WsNewMessage {
   type: 'new_message'
   data: Message
+  seq?: number
+  epoch?: string
 }
 
 export interface WsSystemEvent {
   type: 'system_event'
+  seq?: number
+  epoch?: string
   data: {
-    event: 'agent_online' | 'agent_offline' | 'checkin' | 'purchase' | 'agent_action' | 'agent_status_change' | 'resource_transferred' | 'building_construction_started' | 'building_completed'
+    event: 'agent_online' | 'agent_offline' | 'checkin' | 'purchase' | 'agent_action' | 'agent_status_change' | 'agent_status_batch' | 'resource_transferred' | 'building_construction_started' | 'building_completed'
     agent_id: number
     agent_name: string
     timestamp: string
@@ -70,6 +76,8 @@ export interface WsSystemEvent {
     // F35: agent_status_change 字段
     status?: string
     activity?: string
+    // agent_status_batch：窗口内每个 agent 的最终状态
+    agents?: { agent_id: number; agent_name: string; status: string; activity: string }[]
     // M5.1: 转赠事件字段
     from_agent_id?: number
     from_agent_name?: string
@@ -80,7 +88,29 @@ export interface WsSystemEvent {
   }
 }
 
-export type WsIncoming = WsNewMessage | WsSystemEvent
+// 流式回复的草稿增量；最终的 new_message 带同一个 draft_id，替换草稿
+export interface WsMessageDelta {
+  type: 'message_delta'
+  seq?: number
+  epoch?: string
+  data: {
+    draft_id: string
+    agent_id: number
+    agent_name: string
+    delta?: string
+    aborted?: boolean
+  }
+}
+
+// 重连补发结束（gap=true 表示缓冲覆盖不到 since_seq 或服务端重启过，只补了聊天消息，其余状态需重新拉取）
+export interface WsReplayDone {
+  type: 'replay_done'
+  seq?: undefined
+  epoch?: undefined
+  data: { seq: number; epoch: string; replayed: number; gap: boolean }
+}
+
+export type WsIncoming = WsNewMessage | WsMessageDelta | WsSystemEvent | WsReplayDone
 
 // 工作岗位
 export interface Job {